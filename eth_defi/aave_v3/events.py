@@ -6,10 +6,11 @@ Currently we are tracking these events:
 
 - ReserveDataUpdated
 """
-import csv
 import datetime
+import functools
 import logging
-from pathlib import Path
+from contextlib import ExitStack
+from typing import Optional
 
 from requests.adapters import HTTPAdapter
 from tqdm.auto import tqdm
@@ -25,35 +26,20 @@ from eth_defi.event_reader.conversion import (
     convert_uint256_string_to_address,
     decode_data,
 )
-from eth_defi.event_reader.logresult import LogContext
-from eth_defi.event_reader.reader import LogResult, read_events_concurrent
+from eth_defi.event_reader.chunk_planner import JSONFileLogDensityState
+from eth_defi.event_reader.decode_pool import ProcessPoolDecoder
+from eth_defi.event_reader.reader import LogResult, extract_timestamps_json_rpc, prepare_filter, read_events_concurrent
+from eth_defi.event_reader.sink import create_event_sink
 from eth_defi.event_reader.state import ScanState
+from eth_defi.event_reader.timestamp import JSONRPCBatchTimestampExtractor
+from eth_defi.event_reader.timestamp_store import BlockTimestampStore, StoredTimestampExtractor
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
 from eth_defi.event_reader.web3worker import create_thread_pool_executor
-from eth_defi.token import TokenDetails, fetch_erc20_details
-
-# from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.token_cache import TokenCache
 
 logger = logging.getLogger(__name__)
 
 
-class TokenCache(LogContext):
-    """Manage cache of token data when doing ReserveDataUpdated look-up.
-
-    Do not do extra requests for already known tokens.
-    """
-
-    def __init__(self):
-        self.cache = {}
-
-    def get_token_info(self, web3: Web3, address: str) -> TokenDetails:
-        if address not in self.cache:
-            details = fetch_erc20_details(web3, address, raise_on_error=False)
-            logging.warn(f'Fetched ERC20 details for {address}: {details}')
-            self.cache[address] = details
-        return self.cache[address]
-
-
 def get_event_mapping(web3: Web3) -> dict:
     """Returns tracked event types and mapping.
 
@@ -79,6 +65,16 @@ def get_event_mapping(web3: Web3) -> dict:
                 "liquidity_index",
                 "variable_borrow_index",
             ],
+            "field_types": {
+                "block_number": "int64",
+                "timestamp": "datetime",
+                "log_index": "int64",
+                "liquidity_rate": "uint256",
+                "stable_borrow_rate": "uint256",
+                "variable_borrow_rate": "uint256",
+                "liquidity_index": "uint256",
+                "variable_borrow_index": "uint256",
+            },
             "decode_function": decode_reserve_data_updated,
         },
     }
@@ -164,6 +160,11 @@ def aave_v3_fetch_events_to_csv(
     output_folder: str = "/tmp",
     max_workers: int = 16,
     log_info=print,
+    timestamp_store: Optional[BlockTimestampStore] = None,
+    chunk_size: int = 100,
+    log_density_state: Optional[JSONFileLogDensityState] = None,
+    decode_workers: int = 0,
+    output_format: str = "csv",
 ):
     """Fetch all tracked Aave v3 events to CSV files for notebook analysis.
 
@@ -171,6 +172,9 @@ def aave_v3_fetch_events_to_csv(
 
     - `/tmp/aave-v3-{aave_network_name.lower()}-reservedataupdated.csv`
 
+    With `output_format="parquet"` the files are Parquet datasets with `.parquet` suffix,
+    see :py:mod:`eth_defi.event_reader.sink`.
+
     A progress bar and estimation on the completion is rendered for console / Jupyter notebook using `tqdm`.
 
     The scan be resumed using `state` storage to retrieve the last scanned block number from the previous round.
@@ -193,6 +197,21 @@ def aave_v3_fetch_events_to_csv(
         until you exhaust your nodes IO capacity. Experiement with different values
         and see how your node performs.
     :param log_info: Which function to use to output info messages about the progress
+    :param timestamp_store:
+        Persistent block timestamp store for the chain.
+        Rescanning the same block range does not fetch block headers again.
+    :param chunk_size:
+        How many blocks to scan in one eth_getLogs call
+    :param log_density_state:
+        Adapt the eth_getLogs block range to the log density,
+        starting from the density seen in the previous scan.
+        `chunk_size` is then used only for the first scan.
+        Without `timestamp_store`, only the headers of the blocks with logs are fetched.
+    :param decode_workers:
+        Decode events in this many worker processes.
+        By default events are decoded in the calling thread.
+    :param output_format:
+        `csv` or `parquet`
     """
     token_cache = TokenCache()
     http_adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
@@ -219,24 +238,50 @@ def aave_v3_fetch_events_to_csv(
     buffers = {}
 
     for event_name, mapping in event_mapping.items():
-        file_path = f"{output_folder}/aave-v3-{aave_network_name.lower()}-{event_name.lower()}.csv"
-        exists_already = Path(file_path).exists()
-        file_handler = open(file_path, "a")
-        csv_writer = csv.DictWriter(file_handler, fieldnames=mapping["field_names"])
-        if not exists_already:
-            csv_writer.writeheader()
+        sink = create_event_sink(
+            output_format,
+            f"{output_folder}/aave-v3-{aave_network_name.lower()}-{event_name.lower()}",
+            mapping["field_names"],
+            mapping["field_types"],
+        )
 
         # For each event, we have its own
         # counters and handlers in the context dictionary
         buffers[event_name] = {
             "buffer": [],
             "total": 0,
-            "file_handler": file_handler,
-            "csv_writer": csv_writer,
+            "sink": sink,
         }
 
+    flter = prepare_filter(contract_events)
+
+    if decode_workers:
+        decode_pool = ProcessPoolDecoder(
+            {name: functools.partial(mapping["decode_function"], aave_network_name) for name, mapping in event_mapping.items()},
+            max_workers=decode_workers,
+        )
+    else:
+        decode_pool = None
+
+    if log_density_state is not None:
+        chunk_planner = log_density_state.create_planner(flter, initial_chunk_size=chunk_size)
+    else:
+        chunk_planner = None
+
+    if timestamp_store is not None:
+        extract_timestamps = StoredTimestampExtractor(timestamp_store)
+    elif chunk_planner is not None:
+        # The planner grows sparse ranges, fetch the headers of the blocks with logs only
+        extract_timestamps = JSONRPCBatchTimestampExtractor()
+    else:
+        extract_timestamps = extract_timestamps_json_rpc
+
     log_info(f"Scanning block range {restored_start_block:,} - {end_block:,}")
-    with tqdm(total=end_block - restored_start_block) as progress_bar:
+    with tqdm(total=end_block - restored_start_block) as progress_bar, ExitStack() as open_sinks:
+        # Finish the output files also if the scan is interrupted
+        for buffer_data in buffers.values():
+            open_sinks.push(buffer_data["sink"])
+
         #  1. update the progress bar
         #  2. save any events in the buffer in to a file in one go
         def update_progress(
@@ -265,10 +310,9 @@ def aave_v3_fetch_events_to_csv(
                 buffer = buffer_data["buffer"]
 
                 # log_info(f'Writing buffer to file {len(buffer)} events')
-                # write events to csv
-                for entry in buffer:
-                    buffer_data["csv_writer"].writerow(entry)
-                    buffer_data["total"] += 1
+                # write events to the output file
+                buffer_data["sink"].write_batch(buffer)
+                buffer_data["total"] += len(buffer)
 
                 # then reset buffer
                 buffer_data["buffer"] = []
@@ -276,35 +320,50 @@ def aave_v3_fetch_events_to_csv(
             # Sync the state of updated events
             state.save_state(current_block)
 
+            if chunk_planner is not None:
+                log_density_state.update(flter, chunk_planner)
+                log_density_state.save()
+
         # Read specified events in block range
-        for log_result in read_events_concurrent(
+        log_results = read_events_concurrent(
             executor,
             restored_start_block,
             end_block,
             events=contract_events,
-            notify=update_progress,
-            chunk_size=100,
+            notify=decode_pool.wrap_notify(update_progress) if decode_pool else update_progress,
+            chunk_size=chunk_size,
             context=token_cache,
-        ):
-            try:
-                # write to correct buffer
-                event_name = log_result["event"].event_name
-                buffer = buffers[event_name]["buffer"]
-                decode_function = event_mapping[event_name]["decode_function"]
-                decoded_result = decode_function(aave_network_name, log_result)
-                # Note: decoded_result is None if the event is e.g. from Aave v2 contract
-                if decoded_result:
-                    logger.debug(f'Adding event to buffer: {event_name}')
-                    buffer.append(decoded_result)
-            except Exception as e:
-                raise RuntimeError(f"Could not decode {log_result}") from e
-
-    # Write remaining events, close files and print stats
-    for event_name, buffer in buffers.items():
-        if len(buffer["buffer"]) > 0:
-            for entry in buffer["buffer"]:
-                buffer["csv_writer"].writerow(entry)
-                buffer["total"] += 1
-            buffer["buffer"] = []
-        buffer["file_handler"].close()
+            extract_timestamps=extract_timestamps,
+            filter=flter,
+            chunk_planner=chunk_planner,
+        )
+
+        if decode_pool is not None:
+            with decode_pool:
+                for log_result, decoded_result in decode_pool.decode(log_results):
+                    # Note: decoded_result is None if the event is e.g. from Aave v2 contract
+                    if decoded_result:
+                        buffers[log_result["event"].event_name]["buffer"].append(decoded_result)
+        else:
+            for log_result in log_results:
+                try:
+                    # write to correct buffer
+                    event_name = log_result["event"].event_name
+                    buffer = buffers[event_name]["buffer"]
+                    decode_function = event_mapping[event_name]["decode_function"]
+                    decoded_result = decode_function(aave_network_name, log_result)
+                    # Note: decoded_result is None if the event is e.g. from Aave v2 contract
+                    if decoded_result:
+                        logger.debug(f'Adding event to buffer: {event_name}')
+                        buffer.append(decoded_result)
+                except Exception as e:
+                    raise RuntimeError(f"Could not decode {log_result}") from e
+
+        # Write remaining events before the files are closed
+        for event_name, buffer in buffers.items():
+            if len(buffer["buffer"]) > 0:
+                buffer["sink"].write_batch(buffer["buffer"])
+                buffer["total"] += len(buffer["buffer"])
+                buffer["buffer"] = []
+
     state.save_state(end_block)
@@ -0,0 +1,299 @@
+"""JSON-RPC batch requests.
+
+Send many independent JSON-RPC calls in a single HTTP round trip.
+
+- Calls are split to batches by the entry count and the encoded size,
+  and a batch the node says is too large is split further
+
+- JSON-RPC errors are mapped back to the individual calls
+
+- If the node refuses batch requests, or the provider is not HTTP based,
+  the calls are performed one by one
+
+- Any other error for the whole batch, like throttling, is raised
+
+For the async version see :py:mod:`eth_defi.batch_async`.
+
+Example:
+
+.. code-block:: python
+
+    results = batch_request(web3, [("eth_getBlockByNumber", (hex(n), False)) for n in block_numbers])
+    for r in results:
+        if r.ok:
+            print(int(r.result["timestamp"], 16))
+        else:
+            print(f"Call {r.method} failed: {r.error}")
+
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import ujson
+from eth_tester.exceptions import TransactionFailed
+from web3 import HTTPProvider, Web3
+from web3._utils.request import make_post_request
+
+from eth_defi.event_reader.concurrency import is_throttling_error, report_worker_error, report_worker_latency
+from eth_defi.event_reader.raw_json_rpc import RawJSONRPCProvider, call_with_retries
+
+logger = logging.getLogger(__name__)
+
+
+#: A call as (method, params) tuple
+BatchCall = Tuple[str, Sequence[Any]]
+
+#: Error messages of nodes rejecting a batch because of its size
+BATCH_TOO_LARGE_MESSAGES = (
+    "batch too large",
+    "batch size too large",
+    "batch limit",
+    "batch is too large",
+    "too many requests in batch",
+    "exceeds the maximum batch size",
+)
+
+#: Error messages of nodes refusing batch requests altogether
+BATCH_UNSUPPORTED_MESSAGES = (
+    "batch requests are not supported",
+    "batch request is not supported",
+    "batch requests not supported",
+    "batch requests are disabled",
+    "batch is not supported",
+    "batch not supported",
+)
+
+
+class BatchRequestError(Exception):
+    """A call in a batch failed and the caller asked to raise."""
+
+
+@dataclass
+class BatchResult:
+    """The outcome of a single call in a batch."""
+
+    #: JSON-RPC method
+    method: str
+
+    #: Call parameters
+    params: Sequence[Any]
+
+    #: Raw JSON-RPC result, if the call succeeded
+    result: Any = None
+
+    #: JSON-RPC error dict, if the call failed
+    error: Optional[dict] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def get(self) -> Any:
+        """Get the result.
+
+        :raise ValueError:
+            With the JSON-RPC error dict, as web3.py request manager does
+        """
+        if self.error is not None:
+            raise ValueError(self.error)
+        return self.result
+
+
+def encode_batch_entry(request_id: int, call: BatchCall) -> bytes:
+    """Encode a single call of a batch payload."""
+    method, params = call
+    return ujson.dumps({"jsonrpc": "2.0", "method": method, "params": list(params), "id": request_id}).encode("utf-8")
+
+
+def split_batches(encoded: List[bytes], batch_size: int, max_batch_bytes: int) -> Iterable[Tuple[int, int]]:
+    """Split encoded entries to batches.
+
+    :return:
+        Iterable of (first index, last index exclusive) ranges
+    """
+    start = 0
+    size = 0
+    for idx, entry in enumerate(encoded):
+        if idx > start and (idx - start >= batch_size or size + len(entry) > max_batch_bytes):
+            yield start, idx
+            start = idx
+            size = 0
+        size += len(entry) + 1
+    if start < len(encoded):
+        yield start, len(encoded)
+
+
+def encode_batch_payload(encoded: List[bytes]) -> bytes:
+    return b"[" + b",".join(encoded) + b"]"
+
+
+def is_batch_too_large_error(response: Any) -> bool:
+    """Did the node reject the batch for its size."""
+    if not isinstance(response, dict):
+        return False
+    message = str(response.get("error", "")).lower()
+    return any(m in message for m in BATCH_TOO_LARGE_MESSAGES)
+
+
+def is_batch_unsupported_error(response: Any) -> bool:
+    """Did the node refuse batch requests altogether."""
+    if not isinstance(response, dict):
+        return False
+    message = str(response.get("error", "")).lower()
+    return any(m in message for m in BATCH_UNSUPPORTED_MESSAGES)
+
+
+def raise_batch_response_error(response: Any):
+    """Raise the error the node answered a whole batch with.
+
+    Throttling errors are reported to the concurrency limiter of the thread.
+
+    :raise ValueError:
+        With the JSON-RPC error dict, as web3.py request manager does
+    """
+    error = response.get("error", response) if isinstance(response, dict) else response
+    e = ValueError(error)
+    if is_throttling_error(e):
+        report_worker_error(e)
+    raise e
+
+
+def map_batch_response(calls: List[BatchCall], first_id: int, response: Any) -> Optional[List[BatchResult]]:
+    """Map batch response entries back to the calls by their ids.
+
+    :return:
+        Results in the call order,
+        or `None` if the node did not answer with a batch
+    """
+    if not isinstance(response, list):
+        return None
+
+    by_id = {r.get("id"): r for r in response if isinstance(r, dict)}
+    results = []
+    for offset, (method, params) in enumerate(calls):
+        r = by_id.get(first_id + offset)
+        if r is None:
+            results.append(BatchResult(method, params, error={"code": -32603, "message": "No response for the call in the batch"}))
+        elif "error" in r:
+            results.append(BatchResult(method, params, error=r["error"]))
+        else:
+            results.append(BatchResult(method, params, result=r.get("result")))
+    return results
+
+
+def map_single_response(call: BatchCall, response: dict) -> BatchResult:
+    method, params = call
+    if "error" in response:
+        return BatchResult(method, params, error=response["error"])
+    return BatchResult(method, params, result=response.get("result"))
+
+
+def raise_batch_errors(results: List[BatchResult]):
+    for r in results:
+        if not r.ok:
+            raise BatchRequestError(f"JSON-RPC call {r.method}{tuple(r.params)} failed: {r.error}")
+
+
+def _post_batch(provider: HTTPProvider, payload: bytes) -> Any:
+    if isinstance(provider, RawJSONRPCProvider):
+        return provider.post_with_retries(payload)
+
+    def post() -> bytes:
+        started = time.monotonic()
+        raw_response = make_post_request(provider.endpoint_uri, payload, **provider.get_request_kwargs())
+        report_worker_latency(time.monotonic() - started)
+        return raw_response
+
+    # The batch does not go through the middlewares, so retry here
+    raw_response = call_with_retries(post, "batch")
+    return provider.decode_rpc_response(raw_response)
+
+
+def _request_sequentially(web3: Web3, calls: List[BatchCall]) -> List[BatchResult]:
+    provider = web3.provider
+    results = []
+    for call in calls:
+        method, params = call
+        if isinstance(provider, HTTPProvider):
+            # Raw response like in the batch
+            results.append(map_single_response(call, provider.make_request(method, params)))
+        else:
+            try:
+                results.append(BatchResult(method, params, result=web3.manager.request_blocking(method, params)))
+            except (ValueError, TransactionFailed) as e:
+                # eth_tester raises TransactionFailed for reverted eth_call
+                results.append(BatchResult(method, params, error=e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}))
+    return results
+
+
+def _request_batch(web3: Web3, calls: List[BatchCall], encoded: List[bytes], first_id: int) -> List[BatchResult]:
+    response = _post_batch(web3.provider, encode_batch_payload(encoded))
+    results = map_batch_response(calls, first_id, response)
+    if results is not None:
+        return results
+
+    if len(calls) > 1 and is_batch_too_large_error(response):
+        half = len(calls) // 2
+        logger.info("JSON-RPC node rejected a batch of %d calls, splitting: %s", len(calls), response)
+        return _request_batch(web3, calls[:half], encoded[:half], first_id) + _request_batch(web3, calls[half:], encoded[half:], first_id + half)
+
+    if is_batch_unsupported_error(response):
+        # {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'batch requests are not supported'}}
+        logger.info("JSON-RPC node refused a batch request, falling back to single requests: %s", response)
+        return _request_sequentially(web3, calls)
+
+    raise_batch_response_error(response)
+
+
+def batch_request(
+    web3: Web3,
+    calls: Sequence[BatchCall],
+    batch_size: int = 100,
+    max_batch_bytes: int = 1_000_000,
+    raise_on_error: bool = False,
+) -> List[BatchResult]:
+    """Perform JSON-RPC calls using batch requests.
+
+    Results are raw JSON-RPC values, not formatted by web3.py middlewares.
+    The exception is the sequential fallback for providers that are not HTTP based,
+    where the calls go through the Web3 request manager.
+
+    :param web3:
+        Web3 connection
+
+    :param calls:
+        List of (method, params) tuples
+
+    :param batch_size:
+        Maximum calls in a single HTTP request
+
+    :param max_batch_bytes:
+        Maximum encoded payload size of a single HTTP request
+
+    :param raise_on_error:
+        Raise :py:class:`BatchRequestError` if any of the calls failed
+
+    :return:
+        Results in the order of the calls
+
+    :raise ValueError:
+        If the node answered a batch with an error, like throttling,
+        instead of the results
+    """
+    assert batch_size > 0
+    calls = list(calls)
+
+    if not isinstance(web3.provider, HTTPProvider):
+        results = _request_sequentially(web3, calls)
+    else:
+        encoded = [encode_batch_entry(idx, call) for idx, call in enumerate(calls)]
+        results = []
+        for start, end in split_batches(encoded, batch_size, max_batch_bytes):
+            results += _request_batch(web3, calls[start:end], encoded[start:end], start)
+
+    if raise_on_error:
+        raise_batch_errors(results)
+
+    return results
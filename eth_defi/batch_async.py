@@ -0,0 +1,133 @@
+"""JSON-RPC batch requests for async Web3.
+
+The same as :py:mod:`eth_defi.batch`, but the batches are sent concurrently.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Collection, List, Sequence, Type
+
+from eth_tester.exceptions import TransactionFailed
+from web3 import Web3
+from web3._utils.request import async_make_post_request
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+from eth_defi.batch import (
+    BatchCall,
+    BatchResult,
+    encode_batch_entry,
+    encode_batch_payload,
+    is_batch_too_large_error,
+    is_batch_unsupported_error,
+    map_batch_response,
+    map_single_response,
+    raise_batch_errors,
+    raise_batch_response_error,
+    split_batches,
+)
+from eth_defi.event_reader.concurrency import report_worker_error
+from eth_defi.event_reader.provider_pool import ASYNC_RETRYABLE_EXCEPTIONS, AsyncPooledHTTPProvider
+
+logger = logging.getLogger(__name__)
+
+
+async def async_call_with_retries(
+    func: Callable[[], Awaitable[Any]],
+    description: str,
+    retries: int = 5,
+    sleep: float = 5,
+    backoff: float = 1.2,
+    retryable_exceptions: Collection[Type[BaseException]] = ASYNC_RETRYABLE_EXCEPTIONS,
+) -> Any:
+    """Await a coroutine function, retrying with sleep and backoff.
+
+    The same as :py:func:`eth_defi.event_reader.raw_json_rpc.call_with_retries`, for aiohttp.
+
+    :param description:
+        Describe the request in the retry log messages
+    """
+    retryable_exceptions = tuple(retryable_exceptions)
+    for i in range(retries):
+        try:
+            return await func()
+        except retryable_exceptions as e:
+            if i < retries - 1:
+                report_worker_error(e)
+                logger.warning("Encountered JSON-RPC retryable error %s when calling method %s, retrying in %f seconds", e, description, sleep)
+                await asyncio.sleep(sleep)
+                sleep *= backoff
+            else:
+                raise
+
+
+async def _request_sequentially(web3: Web3, calls: List[BatchCall]) -> List[BatchResult]:
+    provider = web3.provider
+
+    async def request(call: BatchCall) -> BatchResult:
+        method, params = call
+        if isinstance(provider, AsyncHTTPProvider):
+            return map_single_response(call, await provider.make_request(method, params))
+        try:
+            return BatchResult(method, params, result=await web3.manager.coro_request(method, params))
+        except (ValueError, TransactionFailed) as e:
+            return BatchResult(method, params, error=e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)})
+
+    return list(await asyncio.gather(*[request(call) for call in calls]))
+
+
+async def _request_batch(web3: Web3, calls: List[BatchCall], encoded: List[bytes], first_id: int) -> List[BatchResult]:
+    provider: AsyncHTTPProvider = web3.provider
+    if isinstance(provider, AsyncPooledHTTPProvider):
+        response: Any = await provider.post_with_retries(encode_batch_payload(encoded))
+    else:
+        payload = encode_batch_payload(encoded)
+        # The batch does not go through the middlewares, so retry here
+        raw_response = await async_call_with_retries(lambda: async_make_post_request(provider.endpoint_uri, payload, **provider.get_request_kwargs()), "batch")
+        response = provider.decode_rpc_response(raw_response)
+    results = map_batch_response(calls, first_id, response)
+    if results is not None:
+        return results
+
+    if len(calls) > 1 and is_batch_too_large_error(response):
+        half = len(calls) // 2
+        logger.info("JSON-RPC node rejected a batch of %d calls, splitting: %s", len(calls), response)
+        first, second = await asyncio.gather(
+            _request_batch(web3, calls[:half], encoded[:half], first_id),
+            _request_batch(web3, calls[half:], encoded[half:], first_id + half),
+        )
+        return first + second
+
+    if is_batch_unsupported_error(response):
+        logger.info("JSON-RPC node refused a batch request, falling back to single requests: %s", response)
+        return await _request_sequentially(web3, calls)
+
+    raise_batch_response_error(response)
+
+
+async def batch_request(
+    web3: Web3,
+    calls: Sequence[BatchCall],
+    batch_size: int = 100,
+    max_batch_bytes: int = 1_000_000,
+    raise_on_error: bool = False,
+) -> List[BatchResult]:
+    """Perform JSON-RPC calls using batch requests.
+
+    See :py:func:`eth_defi.batch.batch_request` for the parameters.
+
+    :return:
+        Results in the order of the calls
+    """
+    assert batch_size > 0
+    calls = list(calls)
+
+    if not isinstance(web3.provider, AsyncHTTPProvider):
+        results = await _request_sequentially(web3, calls)
+    else:
+        encoded = [encode_batch_entry(idx, call) for idx, call in enumerate(calls)]
+        batches = [_request_batch(web3, calls[start:end], encoded[start:end], start) for start, end in split_batches(encoded, batch_size, max_batch_bytes)]
+        results = [r for batch_results in await asyncio.gather(*batches) for r in batch_results]
+
+    if raise_on_error:
+        raise_batch_errors(results)
+
+    return results
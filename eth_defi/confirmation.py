@@ -3,13 +3,16 @@
 import datetime
 import logging
 import time
-from typing import Dict, List, Set, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 from eth_account.datastructures import SignedTransaction
 from hexbytes import HexBytes
-from web3 import Web3
+from web3 import HTTPProvider, Web3
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
 from web3.exceptions import TransactionNotFound
 
+from eth_defi.batch import batch_request
 from eth_defi.hotwallet import SignedTransactionWithNonce
 
 logger = logging.getLogger(__name__)
@@ -19,6 +22,36 @@ class ConfirmationTimedOut(Exception):
     """We exceeded the transaction confirmation timeout."""
 
 
+def _fetch_receipts(web3: Web3, tx_hashes: List[HexBytes]) -> Tuple[int, Dict[HexBytes, Optional[AttributeDict]]]:
+    """Poll the current block number and the receipts of transactions.
+
+    Over HTTP all the calls are done in one JSON-RPC batch.
+
+    :return:
+        Tuple (current block number, tx hash -> receipt or None if not yet mined)
+    """
+    if isinstance(web3.provider, HTTPProvider):
+        calls = [("eth_blockNumber", ())] + [("eth_getTransactionReceipt", (tx_hash.hex(),)) for tx_hash in tx_hashes]
+        results = batch_request(web3, calls)
+        block_number = int(results[0].get(), 16)
+        receipts = {}
+        for tx_hash, result in zip(tx_hashes, results[1:]):
+            raw_receipt = result.get()
+            # Format the raw receipt the same way web3.eth.get_transaction_receipt() does
+            receipts[tx_hash] = AttributeDict.recursive(receipt_formatter(raw_receipt)) if raw_receipt else None
+        return block_number, receipts
+
+    receipts = {}
+    for tx_hash in tx_hashes:
+        try:
+            receipts[tx_hash] = web3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound as e:
+            # BNB Chain get does this instead of returning None
+            logger.debug("Transaction not found yet: %s", e)
+            receipts[tx_hash] = None
+    return web3.eth.block_number, receipts
+
+
 def wait_transactions_to_complete(
     web3: Web3,
     txs: List[Union[HexBytes, str]],
@@ -29,6 +62,7 @@ def wait_transactions_to_complete(
     """Watch multiple transactions executed at parallel.
 
     Use simple poll loop to wait all transactions to complete.
+    Over HTTP, each poll round is a single JSON-RPC batch request.
 
     Example:
 
@@ -72,16 +106,11 @@ def wait_transactions_to_complete(
         # Transaction hashes that receive confirmation on this round
         confirmation_received = set()
 
-        for tx_hash in unconfirmed_txs:
-            try:
-                receipt = web3.eth.get_transaction_receipt(tx_hash)
-            except TransactionNotFound as e:
-                # BNB Chain get does this instead of returning None
-                logger.debug("Transaction not found yet: %s", e)
-                receipt = None
+        block_number, receipts = _fetch_receipts(web3, list(unconfirmed_txs))
 
+        for tx_hash, receipt in receipts.items():
             if receipt:
-                tx_confirmations = web3.eth.block_number - receipt.blockNumber
+                tx_confirmations = block_number - receipt.blockNumber
                 if tx_confirmations >= confirmation_block_count:
                     logger.debug("Confirmed tx %s with %d confirmations", tx_hash.hex(), tx_confirmations)
                     confirmation_received.add(tx_hash)
@@ -1,10 +1,10 @@
 
-import csv
 import logging
 import datetime
+from contextlib import ExitStack
 from pathlib import Path
+from typing import List, Optional
 
-import pandas
 from tqdm.auto import tqdm
 from pandas import DataFrame
 from retry import retry
@@ -21,12 +21,17 @@ from eth_defi.event_reader.conversion import (
 )
 
 from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.event_reader.chunk_planner import JSONFileLogDensityState
 from eth_defi.event_reader.logresult import LogContext
 from eth_defi.event_reader.reader import LogResult, prepare_filter, read_events_concurrent, extract_timestamps_json_rpc
+from eth_defi.event_reader.sink import create_event_sink
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
 from eth_defi.event_reader.web3worker import create_thread_pool_executor
 from eth_defi.event_reader.state import ScanState
+from eth_defi.event_reader.timestamp import JSONRPCBatchTimestampExtractor
+from eth_defi.event_reader.timestamp_store import BlockTimestampStore, StoredTimestampExtractor
 
+from eth_defi.defi_lending.rates import load_accrue_interest_event_dataframe
 from eth_defi.defi_lending.constants import (
     get_lending_market,
     get_token_name_by_deposit_address,
@@ -147,6 +152,17 @@ def get_event_mapping(web3: Web3, chain_id: int, protocol: str) -> dict:
                 "total_reserves",
                 "cash",
     ],
+            "field_types": {
+                "block_number": "int64",
+                "timestamp": "datetime",
+                "log_index": "int64",
+                "borrow_index": "uint256",
+                "borrow_rate_per_block": "uint256",
+                "supply_rate_per_block": "uint256",
+                "total_borrows": "uint256",
+                "total_reserves": "uint256",
+                "cash": "uint256",
+            },
             "decode_function": decode_accrue_interest_events,
         },
     }
@@ -162,6 +178,10 @@ def fetch_events_to_csv(
     output_folder: str = "/tmp",
     max_workers: int = 16,
     log_info=print,
+    timestamp_store: Optional[BlockTimestampStore] = None,
+    chunk_size: int = 100,
+    log_density_state: Optional[JSONFileLogDensityState] = None,
+    output_format: str = "csv",
 ):
     """Fetch all tracked venus events to CSV files for notebook analysis.
 
@@ -169,6 +189,9 @@ def fetch_events_to_csv(
 
     - `/tmp/venus-accrueinterest.csv`
 
+    With `output_format="parquet"` the files are Parquet datasets with `.parquet` suffix,
+    see :py:mod:`eth_defi.event_reader.sink`.
+
     A progress bar and estimation on the completion is rendered for console / Jupyter notebook using `tqdm`.
 
     The scan be resumed using `state` storage to retrieve the last scanned block number from the previous round.
@@ -190,6 +213,18 @@ def fetch_events_to_csv(
         until you exhaust your nodes IO capacity. Experiement with different values
         and see how your node performs.
     :param log_info: Which function to use to output info messages about the progress
+    :param timestamp_store:
+        Persistent block timestamp store for the chain.
+        Rescanning the same block range does not fetch block headers again.
+    :param chunk_size:
+        How many blocks to scan in one eth_getLogs call
+    :param log_density_state:
+        Adapt the eth_getLogs block range to the log density,
+        starting from the density seen in the previous scan.
+        `chunk_size` is then used only for the first scan.
+        Without `timestamp_store`, only the headers of the blocks with logs are fetched.
+    :param output_format:
+        `csv` or `parquet`
     """
     market = get_lending_market(chain_id, protocol)
     market_cache = MarketCache(chain_id, protocol)
@@ -219,24 +254,45 @@ def fetch_events_to_csv(
     buffers = {}
 
     for event_name, mapping in event_mapping.items():
-        file_path = f"{output_folder}/{protocol.lower()}-{event_name.lower()}.csv"
-        exists_already = Path(file_path).exists()
-        file_handler = open(file_path, "a", encoding="utf-8")
-        csv_writer = csv.DictWriter(file_handler, fieldnames=mapping["field_names"])
-        if not exists_already:
-            csv_writer.writeheader()
+        sink = create_event_sink(
+            output_format,
+            f"{output_folder}/{protocol.lower()}-{event_name.lower()}",
+            mapping["field_names"],
+            mapping["field_types"],
+        )
 
         # For each event, we have its own
         # counters and handlers in the context dictionary
         buffers[event_name] = {
             "buffer": [],
             "total": 0,
-            "file_handler": file_handler,
-            "csv_writer": csv_writer,
+            "sink": sink,
         }
 
+    # Prepare filter so that only vtoken address are monitored
+    addresses = [t.deposit_address for t in market.token_contracts.values()]
+    flter = prepare_filter(contract_events)
+    flter.contract_address = addresses
+
+    if log_density_state is not None:
+        chunk_planner = log_density_state.create_planner(flter, initial_chunk_size=chunk_size)
+    else:
+        chunk_planner = None
+
+    if timestamp_store is not None:
+        extract_timestamps = StoredTimestampExtractor(timestamp_store)
+    elif chunk_planner is not None:
+        # The planner grows sparse ranges, fetch the headers of the blocks with logs only
+        extract_timestamps = JSONRPCBatchTimestampExtractor()
+    else:
+        extract_timestamps = extract_timestamps_json_rpc
+
     log_info(f"Scanning block range {restored_start_block:,} - {end_block:,}")
-    with tqdm(total=end_block - restored_start_block) as progress_bar:
+    with tqdm(total=end_block - restored_start_block) as progress_bar, ExitStack() as open_sinks:
+        # Finish the output files also if the scan is interrupted
+        for buffer_data in buffers.values():
+            open_sinks.push(buffer_data["sink"])
+
         #  1. update the progress bar
         #  2. save any events in the buffer in to a file in one go
         def update_progress(
@@ -264,10 +320,9 @@ def fetch_events_to_csv(
             for buffer_data in buffers.values():
                 buffer = buffer_data["buffer"]
 
-                # write events to csv
-                for entry in buffer:
-                    buffer_data["csv_writer"].writerow(entry)
-                    buffer_data["total"] += 1
+                # write events to the output file
+                buffer_data["sink"].write_batch(buffer)
+                buffer_data["total"] += len(buffer)
 
                 # then reset buffer
                 buffer_data["buffer"] = []
@@ -275,10 +330,9 @@ def fetch_events_to_csv(
             # Sync the state of updated events
             state.save_state(current_block)
 
-        # Prepare filter so that only vtoken address are monitored
-        addresses = [t.deposit_address for t in market.token_contracts.values()]
-        flter = prepare_filter(contract_events)
-        flter.contract_address = addresses
+            if chunk_planner is not None:
+                log_density_state.update(flter, chunk_planner)
+                log_density_state.save()
 
         # Read specified events in block range
         for log_result in read_events_concurrent(
@@ -287,10 +341,11 @@ def fetch_events_to_csv(
             end_block,
             events=contract_events,
             notify=update_progress,
-            chunk_size=100,
+            chunk_size=chunk_size,
             context=market_cache,
             filter=flter,
-            extract_timestamps=extract_timestamps_json_rpc,
+            extract_timestamps=extract_timestamps,
+            chunk_planner=chunk_planner,
         ):
             try:
                 # write to correct buffer
@@ -302,9 +357,8 @@ def fetch_events_to_csv(
             except Exception as e:
                 raise RuntimeError(f"Could not decode {log_result}") from e
 
-    # close files and print stats
+    # print stats
     for event_name, buffer in buffers.items():
-        buffer["file_handler"].close()
         log_info(f"Wrote {buffer['total']} {event_name} events")
 
 
@@ -318,23 +372,31 @@ def fetch_events_to_dataframe(
     output_folder: str = "/tmp",
     max_workers: int = 16,
     log_info=print,
+    output_format: str = "csv",
+    columns: Optional[List[str]] = None,
 ) -> DataFrame:
     '''
 
+    :param output_format:
+        `csv` or `parquet`, see :py:func:`fetch_events_to_csv`
+
+    :param columns:
+        Read only these columns to the DataFrame. `timestamp` is always read as the index.
+
     :return:
     '''
 
-    fetch_events_to_csv(json_rpc_url, chain_id, protocol,  state, start_block, end_block, output_folder, max_workers, log_info,)
+    fetch_events_to_csv(json_rpc_url, chain_id, protocol,  state, start_block, end_block, output_folder, max_workers, log_info, output_format=output_format)
 
     restored, restored_block = state.restore_state(start_block)
     assert restored, "ScanState not restored!"
     assert restored_block >= end_block, "Scan not finished"
 
     event_name = "accrueInterest"
-    file_path = f"{output_folder}/{protocol.lower()}-{event_name.lower()}.csv"
-    assert Path(file_path).exists(), "Scanned Event CSV file {} not found!".format(file_path)
+    file_path = f"{output_folder}/{protocol.lower()}-{event_name.lower()}.{output_format}"
+    assert Path(file_path).exists(), "Scanned Event file {} not found!".format(file_path)
 
-    df = pandas.read_csv(file_path, parse_dates=True, index_col="timestamp")
+    df = load_accrue_interest_event_dataframe(output_folder, Path(file_path).name, columns)
 
     return df
 
@@ -15,6 +15,7 @@ from web3 import Web3,exceptions
 from scipy.optimize import bisect
 
 from eth_defi.abi import get_deployed_contract
+from eth_defi.event_reader.sink import load_event_dataframe
 
 from eth_defi.defi_lending.constants import (
     LendingToken,
@@ -112,12 +113,23 @@ class AccruedInterest(NamedTuple):
 def load_accrue_interest_event_dataframe(
     dirname: str = ".",
     filename: str = "venus-accrueinterest.csv",
+    columns: Optional[List[str]] = None,
 ) -> DataFrame:
-    """Load accrue interest event csv"""
+    """Load accrue interest event csv or Parquet dataset.
+
+    :param columns:
+        Read only these columns. `timestamp` is always read as the index.
+    """
 
     fullpath = os.path.join(dirname, filename)
     if os.path.exists(fullpath):
-        df = pandas.read_csv(fullpath, parse_dates=True, index_col="timestamp")
+        if columns is not None and "timestamp" not in columns:
+            columns = ["timestamp"] + list(columns)
+
+        if filename.endswith(".parquet"):
+            df = load_event_dataframe(fullpath, columns).set_index("timestamp")
+        else:
+            df = load_event_dataframe(fullpath, columns, parse_dates=True, index_col="timestamp")
         return df
     else:
         raise FileNotFoundError("{} not found".format(fullpath))
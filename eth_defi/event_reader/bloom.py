@@ -0,0 +1,247 @@
+"""Block header bloom prefiltering for sparse event scans.
+
+Every block header carries `logsBloom`, a 2048-bit bloom filter
+of the addresses and the topics of all the logs in the block.
+When scanning rare events, e.g. the events of a single contract over millions of blocks,
+most `eth_getLogs` ranges are empty. :py:class:`BloomPrefilter` reads the block headers
+in batches first and calls `eth_getLogs` only for the blocks whose bloom
+may contain our logs.
+
+- A block is a candidate if its bloom contains one of the contract addresses
+  *and* one of the event signatures (topic 0) of the filter
+
+- Bloom filters give false positives, never false negatives,
+  so no log is missed
+
+- Header blooms can be kept in a :py:class:`BlockBloomStore`,
+  so rescanning the same block range needs no header requests at all
+
+- The header timestamps are written to a
+  :py:class:`eth_defi.event_reader.timestamp_store.BlockTimestampStore` if one is given,
+  so the candidate blocks need no header requests for their timestamps either
+
+Whether prefiltering pays off depends on the log density:
+reading headers costs one batched call per block,
+while one `eth_getLogs` call covers a whole range.
+Use it for events that appear in a small fraction of the blocks.
+
+Example:
+
+.. code-block:: python
+
+    filter = Filter.create_filter(pair_address, [Pair.events.Sync])
+    bloom_store = BlockBloomStore.open_chain("/tmp/block-blooms", chain_id=1)
+    timestamp_store = BlockTimestampStore.open_chain("/tmp/block-timestamps", chain_id=1)
+
+    prefilter = BloomPrefilter(web3, filter, bloom_store=bloom_store, timestamp_store=timestamp_store)
+
+    for log_result in read_events(
+        web3,
+        start_block,
+        end_block,
+        None,
+        None,
+        chunk_size=1000,
+        filter=filter,
+        extract_timestamps=StoredTimestampExtractor(timestamp_store),
+        bloom_prefilter=prefilter,
+    ):
+        ...
+
+.. note ::
+
+    Like the timestamps, blooms are stored as they are returned for the block number.
+    Only scan finalised blocks with a store.
+
+"""
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from eth_bloom import BloomFilter
+from web3 import Web3
+
+from eth_defi.batch import batch_request
+from eth_defi.event_reader.filter import Filter, get_filter_addresses
+from eth_defi.event_reader.timestamp_store import BlockDataStore, BlockTimestampStore
+
+logger = logging.getLogger(__name__)
+
+
+#: Size of `logsBloom` in bytes
+BLOOM_SIZE = 256
+
+
+class BlockBloomStore(BlockDataStore):
+    """Memory-mapped block number -> `logsBloom` store for a single chain.
+
+    Thread safe. Multiple processes can open the same store.
+
+    Each block takes 256 bytes, so the segments are smaller than with timestamps.
+    """
+
+    item_size = BLOOM_SIZE
+    item_format = None
+    file_suffix = "blooms"
+
+    def __init__(self, path, segment_size: int = 100_000):
+        super().__init__(path, segment_size)
+
+    def validate(self, block_number: int, value: bytes):
+        assert len(value) == BLOOM_SIZE, f"Bloom of block {block_number:,} is {len(value)} bytes"
+
+
+def get_bloom_mask(item: bytes) -> int:
+    """Get the bits a single address or topic sets in a `logsBloom`."""
+    bloom = BloomFilter()
+    bloom.add(item)
+    return int(bloom)
+
+
+class BloomPrefilter:
+    """Find the blocks that may have logs of a filter by their header blooms.
+
+    Pass as `bloom_prefilter` argument to
+    :py:func:`eth_defi.event_reader.reader.read_events`
+    or :py:func:`eth_defi.event_reader.reader.read_events_concurrent`.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        filter: Filter,
+        bloom_store: Optional[BlockBloomStore] = None,
+        timestamp_store: Optional[BlockTimestampStore] = None,
+        header_batch_size: int = 100,
+    ):
+        """
+        :param web3:
+            Web3 connection used to read the headers.
+            With :py:func:`eth_defi.event_reader.reader.read_events_concurrent`
+            the headers are read in the calling thread.
+
+        :param filter:
+            Logs we are looking for
+
+        :param bloom_store:
+            Cache of header blooms
+
+        :param timestamp_store:
+            Write the timestamps of the read headers here
+
+        :param header_batch_size:
+            How many headers to read in one JSON-RPC batch
+        """
+        assert header_batch_size > 0
+        self.web3 = web3
+        self.filter = filter
+        self.bloom_store = bloom_store
+        self.timestamp_store = timestamp_store
+        self.header_batch_size = header_batch_size
+
+        self.address_masks = [get_bloom_mask(bytes.fromhex(a[2:])) for a in get_filter_addresses(filter.contract_address)]
+        self.topic_masks = [get_bloom_mask(bytes.fromhex(t[2:])) for t in filter.topics.keys()]
+
+        #: How many block blooms we have tested
+        self.checked_blocks = 0
+
+        #: How many block headers we have read from the JSON-RPC node
+        self.fetched_headers = 0
+
+        #: How many blocks matched
+        self.candidate_blocks = 0
+
+    def is_candidate(self, bloom: int) -> bool:
+        """May a block with this `logsBloom` have logs of our filter."""
+        if self.address_masks and not any(bloom & mask == mask for mask in self.address_masks):
+            return False
+        return any(bloom & mask == mask for mask in self.topic_masks)
+
+    def fetch_blooms(self, start_block: int, end_block: int) -> Dict[int, int]:
+        """Get the header blooms of a block range.
+
+        Blooms missing from the store are read from the JSON-RPC node and written to the store.
+
+        :return:
+            Block number -> `logsBloom` as int mapping
+        """
+        block_numbers = range(start_block, end_block + 1)
+        if self.bloom_store is not None:
+            found, missing = self.bloom_store.get_many(block_numbers)
+        else:
+            found, missing = {}, list(block_numbers)
+
+        blooms = {block_number: int.from_bytes(bloom, "big") for block_number, bloom in found.items()}
+
+        if missing:
+            results = batch_request(
+                self.web3,
+                [("eth_getBlockByNumber", (hex(block_number), False)) for block_number in missing],
+                batch_size=self.header_batch_size,
+                raise_on_error=True,
+            )
+
+            fetched_blooms = {}
+            timestamps = {}
+            for block_number, result in zip(missing, results):
+                header = result.result
+                assert header is not None, f"Block {block_number:,} is not available"
+                assert int(header["number"], 16) == block_number
+                bloom = bytes.fromhex(header["logsBloom"][2:])
+                fetched_blooms[block_number] = bloom
+                timestamps[block_number] = int(header["timestamp"], 16)
+                blooms[block_number] = int.from_bytes(bloom, "big")
+
+            self.fetched_headers += len(missing)
+
+            if self.bloom_store is not None:
+                self.bloom_store.update(fetched_blooms)
+
+            if self.timestamp_store is not None:
+                self.timestamp_store.update(timestamps)
+
+        return blooms
+
+    def find_candidate_blocks(self, start_block: int, end_block: int) -> Iterable[int]:
+        """Iterate the blocks that may have our logs.
+
+        Lazy: the headers are read one batch at a time as the iterator is advanced.
+        """
+        for first_block in range(start_block, end_block + 1, self.header_batch_size):
+            last_block = min(end_block, first_block + self.header_batch_size - 1)
+            blooms = self.fetch_blooms(first_block, last_block)
+            self.checked_blocks += last_block - first_block + 1
+            for block_number in range(first_block, last_block + 1):
+                if self.is_candidate(blooms[block_number]):
+                    self.candidate_blocks += 1
+                    yield block_number
+
+    def plan_chunks(self, start_block: int, end_block: int, chunk_size: int) -> Iterable[Tuple[int, int]]:
+        """Split a block range to eth_getLogs ranges covering the candidate blocks.
+
+        Candidate blocks closer than `chunk_size` to each other
+        share the same `eth_getLogs` call.
+
+        :return:
+            Iterable of (first block, last block) tuples, inclusive
+        """
+        assert chunk_size > 0
+        first_of_chunk = last_of_chunk = None
+        for block_number in self.find_candidate_blocks(start_block, end_block):
+            if first_of_chunk is not None and block_number - first_of_chunk < chunk_size:
+                last_of_chunk = block_number
+                continue
+
+            if first_of_chunk is not None:
+                yield first_of_chunk, last_of_chunk
+
+            first_of_chunk = last_of_chunk = block_number
+
+        if first_of_chunk is not None:
+            yield first_of_chunk, last_of_chunk
+
+        logger.info(
+            "Bloom prefilter checked %d blocks, read %d headers, found %d candidate blocks",
+            self.checked_blocks,
+            self.fetched_headers,
+            self.candidate_blocks,
+        )
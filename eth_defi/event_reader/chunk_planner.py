@@ -0,0 +1,264 @@
+"""Adaptive eth_getLogs block range sizing.
+
+A fixed `chunk_size` is a bad fit for any long scan:
+early history of a contract is empty and could be read 10k+ blocks at a time,
+whereas dense periods hit the limits of the JSON-RPC providers:
+
+- `query returned more than 10000 results` (Infura, Alchemy)
+
+- `exceed maximum block range: 5000` (BNB Chain, Polygon nodes)
+
+:py:class:`AdaptiveChunkPlanner` grows the block range while the responses are small
+and shrinks it when a response goes over the log budget.
+The readers bisect a block range the node rejects and tell about it the planner.
+
+The observed log density (logs per block) can be persisted per contract and event set
+with :py:class:`JSONFileLogDensityState`, so the next scan starts with a well tuned chunk size.
+
+Example:
+
+.. code-block:: python
+
+    density_state = JSONFileLogDensityState("/tmp/log-density.json")
+    filter = prepare_filter(events)
+    planner = density_state.create_planner(filter)
+
+    for log_result in read_events_concurrent(
+        executor,
+        start_block,
+        end_block,
+        events,
+        None,
+        filter=filter,
+        chunk_planner=planner,
+    ):
+        ...
+
+    density_state.update(filter, planner)
+    density_state.save()
+
+"""
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+from eth_defi.event_reader.concurrency import is_throttling_error
+from eth_defi.event_reader.filter import Filter
+
+logger = logging.getLogger(__name__)
+
+
+#: Error messages JSON-RPC providers give when eth_getLogs range is too wide
+#: or the response would be too large.
+#: Generic messages like `limit exceeded` are left out, as they are also used for rate limiting.
+LOG_RANGE_ERROR_MESSAGES = (
+    "query returned more than",
+    "exceed maximum block range",
+    "block range is too wide",
+    "block range too large",
+    "log response size exceeded",
+    "response size exceeded",
+    "logs matched by query exceeds limit",
+    "query exceeds max results",
+)
+
+
+_MAX_BLOCK_RANGE_PATTERN = re.compile(r"maximum block range:?\s*(\d+)")
+
+
+def is_log_range_error(e: Exception) -> bool:
+    """Did the JSON-RPC node reject eth_getLogs because the block range was too wide.
+
+    Web3.py raises JSON-RPC errors as `ValueError` with the error dict as the argument.
+
+    Throttling errors are never range errors: bisecting them would only
+    multiply the requests to a node that asked us to slow down.
+    """
+    if not isinstance(e, ValueError):
+        return False
+    if is_throttling_error(e):
+        return False
+    message = str(e).lower()
+    return any(m in message for m in LOG_RANGE_ERROR_MESSAGES)
+
+
+def get_max_block_range(e: Exception) -> Optional[int]:
+    """Parse the maximum allowed block range from a JSON-RPC error, if the node tells it."""
+    match = _MAX_BLOCK_RANGE_PATTERN.search(str(e).lower())
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def get_filter_key(filter: Filter) -> str:
+    """Identify the contracts and events a filter is scanning.
+
+    Used as the key for the persisted log density.
+    """
+    address = filter.contract_address
+    if not address:
+        addresses = "*"
+    elif isinstance(address, str):
+        addresses = address.lower()
+    else:
+        addresses = ",".join(sorted(a.lower() for a in address))
+    topics = ",".join(sorted(filter.topics.keys()))
+    return f"{addresses}/{topics}"
+
+
+class AdaptiveChunkPlanner:
+    """Decide the size of the next eth_getLogs block range.
+
+    - Keeps exponential moving average of logs per block
+
+    - Aims each block range to return around `target_logs` logs
+
+    - Grows at most `growth` times the last completed range
+
+    - Halves the block range when the node rejects a range
+
+    Thread safe: concurrent readers plan ranges in the main thread,
+    but report rejections from the worker threads.
+    """
+
+    def __init__(
+        self,
+        initial_chunk_size: int = 100,
+        min_chunk_size: int = 1,
+        max_chunk_size: int = 100_000,
+        target_logs: int = 2_000,
+        growth: float = 2.0,
+        smoothing: float = 0.3,
+        density: Optional[float] = None,
+    ):
+        """
+        :param initial_chunk_size:
+            Block range to start with, if we do not know the log density yet
+
+        :param min_chunk_size:
+            Never go below this range
+
+        :param max_chunk_size:
+            Never go above this range
+
+        :param target_logs:
+            How many logs we would like to receive per eth_getLogs call.
+            Also the log budget: a response exceeding this shrinks the next range.
+
+        :param growth:
+            Maximum multiplier of the block range between two calls
+
+        :param smoothing:
+            Weight of the latest response in the log density moving average
+
+        :param density:
+            Known logs per block from a previous scan
+        """
+        assert 1 <= min_chunk_size <= max_chunk_size
+        assert target_logs > 0
+        assert growth > 1
+        assert 0 < smoothing <= 1
+
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_logs = target_logs
+        self.growth = growth
+        self.smoothing = smoothing
+        self.density = density
+
+        if density is not None:
+            initial_chunk_size = target_logs / density if density > 0 else max_chunk_size
+
+        self.chunk_size = self._clamp(initial_chunk_size)
+        self.lock = threading.Lock()
+
+    def _clamp(self, chunk_size: float) -> int:
+        return int(max(self.min_chunk_size, min(self.max_chunk_size, chunk_size)))
+
+    def next_chunk_size(self) -> int:
+        """How many blocks the next eth_getLogs call should cover."""
+        return self.chunk_size
+
+    def record_success(self, block_count: int, log_count: int):
+        """Tune the block range after eth_getLogs responses for a range have been received.
+
+        :param block_count:
+            How many blocks the range had
+
+        :param log_count:
+            How many logs the range had
+        """
+        assert block_count > 0
+        with self.lock:
+            density = log_count / block_count
+            if self.density is None:
+                self.density = density
+            else:
+                self.density = self.smoothing * density + (1 - self.smoothing) * self.density
+
+            if log_count > self.target_logs:
+                # Over the budget, shrink to what this response would have needed
+                wanted = block_count * self.target_logs / log_count
+            elif self.density > 0:
+                wanted = min(self.target_logs / self.density, block_count * self.growth)
+            else:
+                wanted = block_count * self.growth
+
+            self.chunk_size = self._clamp(wanted)
+
+    def record_failure(self, block_count: int, e: Optional[Exception] = None):
+        """The node rejected a block range.
+
+        :param block_count:
+            How many blocks the rejected range had
+
+        :param e:
+            The JSON-RPC error.
+            If it tells the maximum block range of the node, we never go above it again.
+        """
+        with self.lock:
+            max_block_range = get_max_block_range(e) if e else None
+            if max_block_range:
+                self.max_chunk_size = max(self.min_chunk_size, min(self.max_chunk_size, max_block_range))
+            self.chunk_size = self._clamp(min(self.chunk_size, block_count // 2))
+
+        logger.info("eth_getLogs rejected range of %d blocks, chunk size is now %d", block_count, self.chunk_size)
+
+
+class JSONFileLogDensityState:
+    """Persist observed log densities between scans in a JSON file.
+
+    Keyed by the contract addresses and the event signatures of a filter.
+    """
+
+    def __init__(self, fname: str):
+        """
+        :param fname:
+            In which file we store the densities
+        """
+        self.fname = fname
+        self.densities: Dict[str, float] = {}
+        if os.path.exists(fname):
+            with open(fname, "rt", encoding="utf-8") as f:
+                self.densities = json.load(f)
+
+    def create_planner(self, filter: Filter, **kwargs) -> AdaptiveChunkPlanner:
+        """Create a planner starting from the density of the previous scan.
+
+        :param kwargs:
+            Passed to :py:class:`AdaptiveChunkPlanner`
+        """
+        return AdaptiveChunkPlanner(density=self.densities.get(get_filter_key(filter)), **kwargs)
+
+    def update(self, filter: Filter, planner: AdaptiveChunkPlanner):
+        """Remember the density the planner ended up with."""
+        if planner.density is not None:
+            self.densities[get_filter_key(filter)] = planner.density
+
+    def save(self):
+        """Write the densities to the file."""
+        with open(self.fname, "wt", encoding="utf-8") as f:
+            json.dump(self.densities, f, indent=2)
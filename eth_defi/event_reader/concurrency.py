@@ -0,0 +1,327 @@
+"""Adaptive concurrency for the event reader workers.
+
+A fixed number of worker threads is either too many for the JSON-RPC node,
+triggering HTTP 429 throttling and retry storms, or too few, wasting the node capacity.
+:py:class:`AIMDConcurrencyLimiter` finds the limit like TCP congestion control does:
+
+- Additive increase: after a full round of requests at the current limit
+  with healthy latency, allow one more request in flight
+
+- Multiplicative decrease: on throttling or a timeout, halve the limit.
+  Only one decrease per round, as the requests already in flight
+  report the same congestion.
+
+- Latency is healthy when its moving average is below `latency_tolerance` times
+  the lowest recent latency. Otherwise the limit is kept as is.
+
+The limiter is shared by the workers of
+:py:func:`eth_defi.event_reader.web3worker.create_thread_pool_executor`.
+Each block range task takes a slot for its duration.
+Retryable errors seen inside the retry loops of
+:py:func:`eth_defi.middleware.exception_retry_middleware`,
+:py:func:`eth_defi.event_reader.raw_json_rpc.call_with_retries`
+and :py:class:`eth_defi.event_reader.provider_pool.PooledJSONRPCProvider`
+are reported with :py:func:`report_worker_error`.
+
+The latency is measured per JSON-RPC HTTP request, not per task,
+as a task makes a varying number of requests and its duration grows with the number of logs.
+The providers and the retry middleware report it with :py:func:`report_worker_latency`.
+
+The current limit and the reason of the last change are passed to
+the progress callback of :py:func:`eth_defi.event_reader.reader.read_events_concurrent`
+as `concurrency` keyword argument.
+
+Example:
+
+.. code-block:: python
+
+    limiter = AIMDConcurrencyLimiter(initial_limit=4, max_limit=32)
+    executor = create_thread_pool_executor(web3_factory, context=token_cache, concurrency_limiter=limiter)
+
+    def update_progress(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context, concurrency=None):
+        if concurrency:
+            progress_bar.set_postfix(workers=concurrency.limit)
+
+    for log_result in read_events_concurrent(executor, start_block, end_block, events, update_progress):
+        ...
+
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Deque, Iterator, Optional
+
+from requests.exceptions import HTTPError, Timeout
+
+logger = logging.getLogger(__name__)
+
+
+#: HTTP status codes of a node telling us to slow down
+THROTTLING_STATUS_CODES = (429, 503)
+
+#: JSON-RPC error messages of a node telling us to slow down
+THROTTLING_ERROR_MESSAGES = (
+    "rate limit",
+    "too many requests",
+    "request rate exceeded",
+    "capacity exceeded",
+    "throttl",
+)
+
+
+_thread_local_storage = threading.local()
+
+
+def is_throttling_error(e: BaseException) -> bool:
+    """Did the JSON-RPC node tell us to slow down, or did a request time out."""
+    if isinstance(e, Timeout):
+        return True
+
+    if isinstance(e, HTTPError):
+        return e.response is not None and e.response.status_code in THROTTLING_STATUS_CODES
+
+    if isinstance(e, ValueError):
+        message = str(e).lower()
+        return any(m in message for m in THROTTLING_ERROR_MESSAGES)
+
+    return False
+
+
+@dataclass
+class ConcurrencyChange:
+    """A change of the concurrency limit."""
+
+    #: UNIX timestamp of the change
+    timestamp: float
+
+    #: The limit before the change
+    previous_limit: int
+
+    #: The new limit
+    limit: int
+
+    #: Human readable reason
+    reason: str
+
+
+@dataclass
+class ConcurrencyStatus:
+    """Snapshot of a limiter passed to the progress callbacks."""
+
+    #: How many requests can be in flight
+    limit: int
+
+    #: How many requests are in flight
+    in_flight: int
+
+    #: Moving average of the request latency, seconds
+    latency: Optional[float]
+
+    #: The latest change of the limit, if any
+    last_change: Optional[ConcurrencyChange]
+
+
+class AIMDConcurrencyLimiter:
+    """Additive increase, multiplicative decrease limit for in-flight requests.
+
+    Thread safe.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: int = 1,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        latency_window: int = 100,
+        history_size: int = 100,
+    ):
+        """
+        :param initial_limit:
+            Requests in flight at the start
+
+        :param min_limit:
+            Never go below this
+
+        :param max_limit:
+            Never go above this.
+            The thread pool executor has this many workers.
+
+        :param increase:
+            How much to raise the limit after a healthy round
+
+        :param decrease_factor:
+            Multiply the limit by this on throttling
+
+        :param latency_tolerance:
+            Latency is healthy when its moving average is below
+            this many times the lowest recent latency
+
+        :param smoothing:
+            Weight of the newest sample in the latency moving average
+
+        :param latency_window:
+            How many latest latencies the lowest recent latency is taken from
+
+        :param history_size:
+            How many limit changes to remember
+        """
+        assert 0 < min_limit <= initial_limit <= max_limit
+        assert 0 < decrease_factor < 1
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+
+        #: How many slots are taken
+        self.in_flight = 0
+
+        #: Moving average of the latency, seconds
+        self.latency: Optional[float] = None
+
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+
+        #: Healthy completions since the last change
+        self.healthy_completions = 0
+
+        #: Bumped on every decrease. Slots taken before it do not cause another decrease.
+        self.generation = 0
+
+        #: The latest changes of the limit
+        self.changes: Deque[ConcurrencyChange] = deque(maxlen=history_size)
+
+        self.condition = threading.Condition()
+
+    def __repr__(self):
+        return f"<AIMDConcurrencyLimiter limit:{self.limit} in flight:{self.in_flight} latency:{self.latency}>"
+
+    @property
+    def last_change(self) -> Optional[ConcurrencyChange]:
+        return self.changes[-1] if self.changes else None
+
+    def get_status(self) -> ConcurrencyStatus:
+        with self.condition:
+            return ConcurrencyStatus(limit=self.limit, in_flight=self.in_flight, latency=self.latency, last_change=self.last_change)
+
+    def acquire(self) -> int:
+        """Wait for a free slot.
+
+        :return:
+            The generation the slot was taken in
+        """
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+            return self.generation
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold a slot for the duration of a task.
+
+        The latencies and the throttling errors reported from this thread
+        while the slot is held are matched to it.
+        """
+        generation = self.acquire()
+        _thread_local_storage.limiter = self
+        _thread_local_storage.generation = generation
+        try:
+            yield
+        except Exception as e:
+            self.record_error(e, generation)
+            raise
+        finally:
+            _thread_local_storage.limiter = None
+            self.release()
+
+    def _change(self, limit: int, reason: str):
+        change = ConcurrencyChange(time.time(), self.limit, limit, reason)
+        self.changes.append(change)
+        self.limit = limit
+        self.healthy_completions = 0
+        logger.info("Concurrency limit %d -> %d: %s", change.previous_limit, limit, reason)
+        self.condition.notify_all()
+
+    def record_success(self, latency: float):
+        """A JSON-RPC request completed.
+
+        :param latency:
+            Seconds the HTTP request took
+        """
+        with self.condition:
+            self.latencies.append(latency)
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+
+            baseline = min(self.latencies)
+            if self.latency > baseline * self.latency_tolerance:
+                # Queueing at the node, do not push harder
+                self.healthy_completions = 0
+                return
+
+            self.healthy_completions += 1
+            if self.healthy_completions >= self.limit and self.limit < self.max_limit:
+                limit = min(self.max_limit, self.limit + self.increase)
+                self._change(limit, f"healthy round, latency {self.latency * 1000:.0f} ms")
+
+    def record_error(self, e: BaseException, generation: Optional[int] = None) -> bool:
+        """A request failed or is being retried.
+
+        :param generation:
+            The generation of the slot of the request
+
+        :return:
+            True if the limit was decreased
+        """
+        if not is_throttling_error(e):
+            return False
+
+        with self.condition:
+            if generation is not None and generation < self.generation:
+                # Already backed off for the requests started before the last decrease
+                return False
+
+            self.generation += 1
+            limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+            if limit == self.limit:
+                return False
+            self._change(limit, f"throttled: {e}")
+            return True
+
+
+def report_worker_error(e: BaseException):
+    """Tell the limiter of the current thread about a retryable error.
+
+    Called from the retry loops, so the throttling is seen
+    even if the retry succeeds. Does nothing outside a limiter slot.
+    """
+    limiter: Optional[AIMDConcurrencyLimiter] = getattr(_thread_local_storage, "limiter", None)
+    if limiter is not None:
+        limiter.record_error(e, _thread_local_storage.generation)
+
+
+def report_worker_latency(latency: float):
+    """Tell the limiter of the current thread about a successful JSON-RPC request.
+
+    Called around the HTTP requests, so the latency does not depend
+    on how many requests or logs a task has. Does nothing outside a limiter slot.
+    """
+    limiter: Optional[AIMDConcurrencyLimiter] = getattr(_thread_local_storage, "limiter", None)
+    if limiter is not None:
+        limiter.record_success(latency)
@@ -0,0 +1,225 @@
+"""Decode event logs in a process pool.
+
+The event readers parallelise the JSON-RPC IO, but the decoding of the logs
+(splitting hex data, converting to ints, formatting timestamps) runs in the single consumer thread.
+On a big backfill this consumer becomes CPU bound.
+
+:py:class:`ProcessPoolDecoder` ships batches of raw logs to a :py:class:`concurrent.futures.ProcessPoolExecutor`,
+decodes them there with registered decoder functions, and yields the results in the original order.
+
+- Decoders must be picklable: module level functions, or :py:func:`functools.partial` of them
+
+- Decoders receive the log without `event` and `context` entries,
+  as these hold Web3 objects that cannot be moved to another process.
+  Decoders needing them (e.g. to look up token details over JSON-RPC)
+  are registered as local decoders and run in the calling process.
+
+Example:
+
+.. code-block:: python
+
+    with ProcessPoolDecoder({"Swap": decode_swap, "Mint": decode_mint}, {"PoolCreated": decode_pool_created}) as decoder:
+        for log_result, decoded in decoder.decode(
+            read_events_concurrent(
+                executor,
+                start_block,
+                end_block,
+                events,
+                decoder.wrap_notify(update_progress),
+                context=token_cache,
+            )
+        ):
+            event_name = log_result["event"].event_name
+            buffers[event_name].append(decoded)
+
+"""
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from eth_defi.event_reader.logresult import LogResult
+from eth_defi.event_reader.reader import ProgressUpdate
+
+logger = logging.getLogger(__name__)
+
+
+#: Decoders installed in a worker process by :py:func:`_initialise_worker`
+_worker_decoders: Dict[str, Callable[[LogResult], Any]] = {}
+
+
+def _initialise_worker(decoders: Dict[str, Callable[[LogResult], Any]]):
+    global _worker_decoders
+    _worker_decoders = decoders
+
+
+def _decode_batch(batch: List[Tuple[str, dict]]) -> List[Any]:
+    """Decode a batch of logs in a worker process."""
+    results = []
+    for event_name, log in batch:
+        try:
+            results.append(_worker_decoders[event_name](log))
+        except Exception as e:
+            raise RuntimeError(f"Could not decode {log}") from e
+    return results
+
+
+def _strip_log(log: LogResult) -> dict:
+    """Drop entries that cannot be pickled."""
+    stripped = log.copy()
+    stripped["event"] = None
+    stripped["context"] = None
+    return stripped
+
+
+class ProcessPoolDecoder:
+    """Decode logs in multiple processes, keeping the order.
+
+    Use as a context manager to shut down the worker processes.
+    """
+
+    def __init__(
+        self,
+        decoders: Dict[str, Callable[[LogResult], Any]],
+        local_decoders: Optional[Dict[str, Callable[[LogResult], Any]]] = None,
+        max_workers: Optional[int] = None,
+        batch_size: int = 500,
+        max_pending_batches: Optional[int] = None,
+        mp_context=None,
+    ):
+        """
+        :param decoders:
+            Event name -> picklable decoder function, run in the worker processes
+
+        :param local_decoders:
+            Event name -> decoder function, run in the calling process.
+            For decoders needing the log context or Web3 connection.
+
+        :param max_workers:
+            Number of worker processes. Defaults to the number of CPUs.
+
+        :param batch_size:
+            How many logs to send to a worker process at once
+
+        :param max_pending_batches:
+            How many batches can be decoding or waiting to be consumed at a time.
+            Defaults to twice the number of worker processes.
+
+        :param mp_context:
+            Multiprocessing context, see :py:class:`concurrent.futures.ProcessPoolExecutor`
+        """
+        assert batch_size > 0
+        max_workers = max_workers or os.cpu_count() or 1
+        self.decoders = decoders
+        self.local_decoders = local_decoders or {}
+        self.batch_size = batch_size
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=_initialise_worker,
+            initargs=(decoders,),
+        )
+        self.max_pending_batches = max_pending_batches or max_workers * 2
+
+        # Position in the log stream -> progress notification waiting for the logs before it to be yielded
+        self.notifications: Deque[Tuple[int, tuple, dict]] = deque()
+        self.consumed = 0
+        self.notify: Optional[ProgressUpdate] = None
+
+    def __enter__(self) -> "ProcessPoolDecoder":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def wrap_notify(self, notify: Optional[ProgressUpdate]) -> Optional[ProgressUpdate]:
+        """Delay the progress notifications of a reader until the logs before them have been decoded.
+
+        The readers call `notify` before they yield the logs of a block range.
+        As the decoder reads ahead, the notification would arrive before
+        the logs of the earlier block ranges are decoded.
+        Pass the wrapped notify to the reader, so that a progress callback
+        flushing the decoded events and saving the scan state sees all the events before the block.
+        """
+        if notify is None:
+            return None
+
+        self.notify = notify
+
+        def deferred_notify(*args, **kwargs):
+            self.notifications.append((self.consumed, args, kwargs))
+
+        return deferred_notify
+
+    def _fire_notifications(self, position: int):
+        while self.notifications and self.notifications[0][0] <= position:
+            _, args, kwargs = self.notifications.popleft()
+            self.notify(*args, **kwargs)
+
+    def _count(self, logs: Iterable[LogResult]) -> Iterable[LogResult]:
+        for log in logs:
+            self.consumed += 1
+            yield log
+
+    def decode(self, logs: Iterable[LogResult]) -> Iterable[Tuple[LogResult, Any]]:
+        """Decode logs.
+
+        :param logs:
+            Logs from an event reader
+
+        :return:
+            Iterable of (log, decoded) tuples in the order of the logs.
+
+        :raise KeyError:
+            If there is no decoder for an event
+        """
+        self.consumed = 0
+        self.notifications.clear()
+        logs = self._count(logs)
+        pending: Deque[Tuple[List[LogResult], Optional[Future]]] = deque()
+        yielded = 0
+
+        def submit_more():
+            while len(pending) < self.max_pending_batches:
+                batch = list(islice(logs, self.batch_size))
+                if not batch:
+                    return
+                remote = [(log["event"].event_name, _strip_log(log)) for log in batch if log["event"].event_name in self.decoders]
+                future = self.executor.submit(_decode_batch, remote) if remote else None
+                pending.append((batch, future))
+
+        try:
+            submit_more()
+
+            while pending:
+                batch, future = pending.popleft()
+                results = iter(future.result()) if future is not None else iter(())
+                submit_more()
+
+                for log in batch:
+                    self._fire_notifications(yielded)
+                    event_name = log["event"].event_name
+                    if event_name in self.decoders:
+                        decoded = next(results)
+                    else:
+                        local_decoder = self.local_decoders.get(event_name)
+                        if local_decoder is None:
+                            raise KeyError(f"No decoder registered for event {event_name}")
+                        try:
+                            decoded = local_decoder(log)
+                        except Exception as e:
+                            raise RuntimeError(f"Could not decode {log}") from e
+                    yield log, decoded
+                    yielded += 1
+
+            self._fire_notifications(yielded)
+        finally:
+            for batch, future in pending:
+                if future is not None:
+                    future.cancel()
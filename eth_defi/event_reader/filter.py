@@ -4,7 +4,7 @@ Wrap low-level JSON-RPC filters with more manageable Python code.
 """
 
 from dataclasses import dataclass
-from typing import Dict, Optional, List, Type
+from typing import Dict, Iterable, Optional, List, Type, Union
 
 from eth_bloom import BloomFilter
 from web3.contract import ContractEvent
@@ -24,22 +24,47 @@ class Filter:
     #: Preconstructed topic hash -> Event mapping
     topics: Dict[str, ContractEvent]
 
-    #: Bloom filter to match block headers
-    #: TODO: Currently unsupported
+    #: Bloom of the contract addresses and the event signatures.
+    #: Block headers are matched against the per address and per signature bits,
+    #: see :py:mod:`eth_defi.event_reader.bloom`.
     bloom: Optional[BloomFilter]
 
-    #: Get events from a single contract only
-    contract_address: Optional[str] = None
+    #: Get events from a single contract only,
+    #: or from any of the listed contracts
+    contract_address: Optional[Union[str, List[str]]] = None
 
     @staticmethod
-    def create_filter(address: Optional[str], event_types: List[Type[ContractEvent]]) -> "Filter":
+    def create_filter(address: Optional[Union[str, List[str]]], event_types: List[Type[ContractEvent]]) -> "Filter":
 
         topics = {event_type.build_filter().topics[0]: event_type for event_type in event_types}
 
         filter = Filter(
             contract_address=address,
-            bloom=None,
+            bloom=create_filter_bloom(address, topics.keys()),
             topics=topics,
         )
 
         return filter
+
+
+def get_filter_addresses(contract_address: Optional[Union[str, List[str]]]) -> List[str]:
+    """Get the contract addresses of a filter as a list."""
+    if not contract_address:
+        return []
+    if isinstance(contract_address, str):
+        return [contract_address]
+    return list(contract_address)
+
+
+def create_filter_bloom(contract_address: Optional[Union[str, List[str]]], topics: Iterable[str]) -> BloomFilter:
+    """Build a bloom of the contract addresses and the event signatures of a filter.
+
+    A block header may contain our logs only if its bloom has
+    all the bits of one of the addresses and all the bits of one of the signatures.
+    """
+    bloom = BloomFilter()
+    for address in get_filter_addresses(contract_address):
+        bloom.add(bytes.fromhex(address[2:]))
+    for topic in topics:
+        bloom.add(bytes.fromhex(topic[2:]))
+    return bloom
@@ -0,0 +1,537 @@
+"""Multi-endpoint JSON-RPC provider pool.
+
+Spread the JSON-RPC requests over several nodes of varying quality.
+:py:class:`ProviderPool` keeps the health of each endpoint
+and is shared by all Web3 connections using it, including the worker threads
+of :py:func:`eth_defi.event_reader.web3worker.create_thread_pool_executor`.
+
+- Requests are distributed randomly, weighted by the measured latency and error rate
+  of each endpoint, so the fast nodes get most of the traffic, but the others are
+  still sampled
+
+- A request failing with an HTTP level error is tried again on another endpoint,
+  sleeping with backoff only after all endpoints have failed
+
+- Circuit breaker: an endpoint failing `failure_threshold` times in row is ejected
+  for `cooldown` seconds, after which a single trial request decides if it comes back
+
+- Hedging: if a request is slower than the `hedge_percentile` latency of its endpoint,
+  the same request is sent to a second endpoint and the first response wins.
+  Only methods web3.py considers safe to retry are hedged.
+
+JSON-RPC errors in a successful HTTP response, like a too wide `eth_getLogs` range,
+are answers from a healthy node and are passed to the caller as is.
+
+Example:
+
+.. code-block:: python
+
+    pool = ProviderPool([
+        os.environ["JSON_RPC_ANKR"],
+        os.environ["JSON_RPC_QUICKNODE"],
+        os.environ["JSON_RPC_BINANCE"],
+    ], hedge_percentile=0.95)
+
+    web3_factory = PooledWeb3Factory(pool, HTTPAdapter(pool_connections=16, pool_maxsize=16))
+    executor = create_thread_pool_executor(web3_factory, context=token_cache, max_workers=16)
+
+    # The async path
+    web3 = create_async_pooled_web3(pool)
+
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+from typing import Any, Collection, Deque, List, Optional, Type
+
+import aiohttp
+import ujson
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3._utils.request import async_make_post_request
+from web3.eth import AsyncEth
+from web3.middleware.exception_retry_request import check_if_retry_on_failure
+from web3.providers.async_rpc import AsyncHTTPProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from eth_defi.event_reader.concurrency import report_worker_error, report_worker_latency
+from eth_defi.event_reader.raw_json_rpc import RETRYABLE_EXCEPTIONS, RawJSONRPCProvider
+
+logger = logging.getLogger(__name__)
+
+
+#: HTTP level errors of the async provider after which we try another endpoint
+ASYNC_RETRYABLE_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class EndpointHealth:
+    """Measured health of a single JSON-RPC endpoint.
+
+    Updated by :py:class:`ProviderPool` under its lock.
+    """
+
+    def __init__(self, url: str, latency_window: int):
+        #: JSON-RPC HTTP(S) URL
+        self.url = url
+
+        #: Exponential moving average of successful request latency, seconds,
+        #: or `None` before the first response
+        self.latency: Optional[float] = None
+
+        #: Exponential moving average of failed requests, 0...1
+        self.error_rate = 0.0
+
+        #: The latest successful request latencies for the hedging threshold
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+
+        #: Failures since the last success
+        self.consecutive_failures = 0
+
+        #: Circuit breaker is open and the endpoint gets no requests until this `time.monotonic()`
+        self.open_until: Optional[float] = None
+
+        #: A trial request after the cooldown is in flight
+        self.trial_in_flight = False
+
+        self.requests = 0
+        self.failures = 0
+
+    def __repr__(self):
+        return f"<Endpoint {self.url} latency:{self.latency} error rate:{self.error_rate:.2f} open:{self.open_until is not None}>"
+
+    @property
+    def is_open(self) -> bool:
+        """Is the endpoint ejected by the circuit breaker."""
+        return self.open_until is not None
+
+
+class ProviderPool:
+    """Shared health state and endpoint selection of multiple JSON-RPC endpoints.
+
+    Thread safe. Create one pool and share it between all the connections.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        error_penalty: float = 10.0,
+        smoothing: float = 0.2,
+        initial_latency: float = 0.1,
+        latency_window: int = 100,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        hedge_max_workers: int = 4,
+        retries: int = 5,
+        sleep: float = 5,
+        backoff: float = 1.2,
+        timeout: float = 10,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        :param urls:
+            JSON-RPC HTTP(S) URLs
+
+        :param failure_threshold:
+            Open the circuit breaker after this many failures in row
+
+        :param cooldown:
+            Seconds an ejected endpoint gets no requests
+
+        :param error_penalty:
+            How much the error rate slows down an endpoint in the selection.
+            An endpoint failing half of the requests is treated as `1 + error_penalty * 0.5` times slower.
+
+        :param smoothing:
+            Weight of the newest sample in the latency and the error rate averages
+
+        :param initial_latency:
+            Assumed latency of the endpoints before any of them has answered.
+            Later an endpoint that has not answered yet is assumed to be as fast as the fastest one.
+
+        :param latency_window:
+            How many latest latencies are used for the hedging threshold
+
+        :param hedge_percentile:
+            Send the request to a second endpoint if it takes longer than this latency percentile
+            of its endpoint, e.g. `0.95`. `None` disables hedging.
+
+        :param hedge_min_samples:
+            Do not hedge before an endpoint has this many latency samples
+
+        :param hedge_max_workers:
+            Threads for the hedged requests of each synchronous provider.
+            Every provider has its own threads, so the requests of one worker
+            never wait behind the requests of the others.
+            Two is enough for a request and its hedge,
+            the rest let new requests go while the losers of the earlier hedges finish.
+
+        :param retries:
+            How many times to try a request, each time on a different endpoint when possible
+
+        :param sleep:
+            Seconds to sleep after all endpoints have failed a request
+
+        :param backoff:
+            Multiply the sleep by this for each following round
+
+        :param timeout:
+            HTTP request timeout in seconds
+
+        :param rng:
+            Random generator for the endpoint selection
+        """
+        assert len(urls) > 0, "Need at least one endpoint"
+        assert failure_threshold > 0
+        assert hedge_percentile is None or 0 < hedge_percentile < 1
+        assert hedge_max_workers >= 2
+        self.endpoints = [EndpointHealth(url, latency_window) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.error_penalty = error_penalty
+        self.smoothing = smoothing
+        self.initial_latency = initial_latency
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_workers = hedge_max_workers
+        self.retries = retries
+        self.sleep = sleep
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.hedge_executors: "weakref.WeakSet[ThreadPoolExecutor]" = weakref.WeakSet()
+
+        #: How many requests were sent to a second endpoint
+        self.hedged_requests = 0
+
+    def get_weight(self, endpoint: EndpointHealth, unmeasured_latency: float) -> float:
+        """Selection weight of an endpoint, higher is better.
+
+        :param unmeasured_latency:
+            Latency to assume if the endpoint has not answered yet
+        """
+        latency = endpoint.latency if endpoint.latency is not None else unmeasured_latency
+        return 1 / (max(latency, 1e-6) * (1 + self.error_penalty * endpoint.error_rate))
+
+    def choose(self, exclude: Collection[EndpointHealth] = ()) -> Optional[EndpointHealth]:
+        """Pick an endpoint for a request.
+
+        :param exclude:
+            Endpoints already tried for this request
+
+        :return:
+            The endpoint, or `None` if all the candidates have been excluded
+        """
+        now = time.monotonic()
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+
+            available = []
+            for endpoint in candidates:
+                if endpoint.open_until is None:
+                    available.append(endpoint)
+                elif endpoint.open_until <= now and not endpoint.trial_in_flight:
+                    # Half-open: let one request through to see if the endpoint has recovered
+                    endpoint.trial_in_flight = True
+                    return endpoint
+
+            if not available:
+                # Everything is ejected, try the one coming back first rather than fail
+                return min(candidates, key=lambda e: e.open_until)
+
+            # Be optimistic about the endpoints we have not heard from, so they get tried
+            measured = [e.latency for e in self.endpoints if e.latency is not None]
+            unmeasured_latency = min(measured) if measured else self.initial_latency
+            return self.rng.choices(available, weights=[self.get_weight(e, unmeasured_latency) for e in available])[0]
+
+    def record_success(self, endpoint: EndpointHealth, latency: float):
+        with self.lock:
+            endpoint.requests += 1
+            endpoint.latencies.append(latency)
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (latency - endpoint.latency)
+            endpoint.error_rate -= self.smoothing * endpoint.error_rate
+            endpoint.consecutive_failures = 0
+            endpoint.trial_in_flight = False
+            if endpoint.open_until is not None:
+                logger.info("JSON-RPC endpoint %s is back", endpoint.url)
+                endpoint.open_until = None
+
+    def record_failure(self, endpoint: EndpointHealth, error: BaseException):
+        with self.lock:
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.error_rate += self.smoothing * (1 - endpoint.error_rate)
+            endpoint.consecutive_failures += 1
+            endpoint.trial_in_flight = False
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                if endpoint.open_until is None:
+                    logger.warning("JSON-RPC endpoint %s failed %d times in row, ejecting it for %f seconds: %s", endpoint.url, endpoint.consecutive_failures, self.cooldown, error)
+                endpoint.open_until = time.monotonic() + self.cooldown
+
+    def get_hedge_delay(self, endpoint: EndpointHealth) -> Optional[float]:
+        """How long to wait for an endpoint before hedging.
+
+        :return:
+            Seconds, or `None` if the request should not be hedged
+        """
+        if self.hedge_percentile is None or len(self.endpoints) < 2:
+            return None
+        with self.lock:
+            if len(endpoint.latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(endpoint.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile))]
+
+    def create_hedge_executor(self) -> ThreadPoolExecutor:
+        """Create the hedging threads of a synchronous provider."""
+        executor = ThreadPoolExecutor(max_workers=self.hedge_max_workers, thread_name_prefix="hedge")
+        with self.lock:
+            self.hedge_executors.add(executor)
+        return executor
+
+    def close(self):
+        """Release the hedging threads of all the providers."""
+        with self.lock:
+            executors = list(self.hedge_executors)
+            self.hedge_executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+
+class PooledJSONRPCProvider(RawJSONRPCProvider):
+    """Synchronous provider sending the requests to the endpoints of a :py:class:`ProviderPool`.
+
+    A :py:class:`eth_defi.event_reader.raw_json_rpc.RawJSONRPCProvider`,
+    so the event reader lean request path and the batch requests use the pool as well.
+    """
+
+    def __init__(self, pool: ProviderPool, http_adapter: Optional[HTTPAdapter] = None, retryable_exceptions: Collection[Type[BaseException]] = RETRYABLE_EXCEPTIONS):
+        """
+        :param pool:
+            Shared endpoint pool
+
+        :param http_adapter:
+            Connection pool to use. Share one between the worker threads
+            to limit the number of open connections.
+        """
+        super().__init__(
+            pool.endpoints[0].url,
+            http_adapter,
+            timeout=pool.timeout,
+            retries=pool.retries,
+            sleep=pool.sleep,
+            backoff=pool.backoff,
+            retryable_exceptions=retryable_exceptions,
+        )
+        self.pool = pool
+
+        #: Threads of this provider for the hedged requests, created on the first hedged request
+        self.hedge_executor: Optional[ThreadPoolExecutor] = None
+
+    def __str__(self) -> str:
+        return f"Pooled RPC connection to {len(self.pool.endpoints)} endpoints"
+
+    def post_to(self, endpoint: EndpointHealth, request_data: bytes) -> Any:
+        """Post to a given endpoint and record the outcome."""
+        started = time.monotonic()
+        try:
+            response = self.session.post(endpoint.url, data=request_data, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+        except self.retryable_exceptions as e:
+            self.pool.record_failure(endpoint, e)
+            raise
+        latency = time.monotonic() - started
+        self.pool.record_success(endpoint, latency)
+        # Does nothing in the hedging threads, the caller reports the hedged requests
+        report_worker_latency(latency)
+        # requests decompresses gzip transparently
+        return ujson.loads(response.content)
+
+    def post(self, request_data: bytes) -> Any:
+        """Post once to the best endpoint, without failover or hedging."""
+        return self.post_to(self.pool.choose(), request_data)
+
+    def post_hedged(self, endpoint: EndpointHealth, request_data: bytes) -> Any:
+        """Post to an endpoint, and to a second one if the first is slow."""
+        delay = self.pool.get_hedge_delay(endpoint)
+        if delay is None:
+            return self.post_to(endpoint, request_data)
+
+        # The requests run in the hedging threads, so report the latency seen by the caller
+        started = time.monotonic()
+        response = self._race_hedged(endpoint, request_data, delay)
+        report_worker_latency(time.monotonic() - started)
+        return response
+
+    def _race_hedged(self, endpoint: EndpointHealth, request_data: bytes, delay: float) -> Any:
+        if self.hedge_executor is None:
+            self.hedge_executor = self.pool.create_hedge_executor()
+        executor = self.hedge_executor
+
+        first = executor.submit(self.post_to, endpoint, request_data)
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+
+        second_endpoint = self.pool.choose(exclude=[endpoint])
+        if second_endpoint is None:
+            return first.result()
+
+        logger.debug("Hedging a request slower than %f seconds at %s to %s", delay, endpoint.url, second_endpoint.url)
+        with self.pool.lock:
+            self.pool.hedged_requests += 1
+        second = executor.submit(self.post_to, second_endpoint, request_data)
+
+        done, not_done = wait([first, second], return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+
+        # The first finisher failed, the other one decides
+        for future in not_done:
+            return future.result()
+        return first.result()
+
+    def post_with_retries(self, request_data: bytes, description: str = "batch") -> Any:
+        """Post, failing over to the other endpoints on HTTP level errors.
+
+        Sleeps with backoff only after every endpoint has failed.
+        """
+        tried: List[EndpointHealth] = []
+        sleep = self.sleep
+        for i in range(self.retries):
+            endpoint = self.pool.choose(exclude=tried)
+            if endpoint is None:
+                logger.warning("All JSON-RPC endpoints failed %s, retrying in %f seconds", description, sleep)
+                time.sleep(sleep)
+                sleep *= self.backoff
+                tried = []
+                endpoint = self.pool.choose()
+            tried.append(endpoint)
+
+            try:
+                return self.post_hedged(endpoint, request_data)
+            except self.retryable_exceptions as e:
+                if i < self.retries - 1:
+                    report_worker_error(e)
+                    logger.warning("Encountered JSON-RPC retryable error %s at %s when calling method %s, trying another endpoint", e, endpoint.url, description)
+                else:
+                    raise
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Perform a request through web3.py request manager.
+
+        The methods web3.py considers safe to retry fail over and are hedged.
+        """
+        request_data = self.encode_rpc_request(method, params)
+        if check_if_retry_on_failure(method):
+            return self.post_with_retries(request_data, method)
+        return self.post(request_data)
+
+
+class AsyncPooledHTTPProvider(AsyncHTTPProvider):
+    """Async provider sending the requests to the endpoints of a :py:class:`ProviderPool`."""
+
+    def __init__(self, pool: ProviderPool, retryable_exceptions: Collection[Type[BaseException]] = ASYNC_RETRYABLE_EXCEPTIONS):
+        super().__init__(pool.endpoints[0].url, request_kwargs={"timeout": aiohttp.ClientTimeout(pool.timeout)})
+        self.pool = pool
+        self.retryable_exceptions = tuple(retryable_exceptions)
+
+    def __str__(self) -> str:
+        return f"Pooled async RPC connection to {len(self.pool.endpoints)} endpoints"
+
+    async def post_to(self, endpoint: EndpointHealth, request_data: bytes) -> Any:
+        """Post to a given endpoint and record the outcome."""
+        started = time.monotonic()
+        try:
+            raw_response = await async_make_post_request(endpoint.url, request_data, **self.get_request_kwargs())
+        except self.retryable_exceptions as e:
+            self.pool.record_failure(endpoint, e)
+            raise
+        self.pool.record_success(endpoint, time.monotonic() - started)
+        return self.decode_rpc_response(raw_response)
+
+    async def post_hedged(self, endpoint: EndpointHealth, request_data: bytes) -> Any:
+        """Post to an endpoint, and to a second one if the first is slow. The loser is cancelled."""
+        delay = self.pool.get_hedge_delay(endpoint)
+        if delay is None:
+            return await self.post_to(endpoint, request_data)
+
+        first = asyncio.ensure_future(self.post_to(endpoint, request_data))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        second_endpoint = self.pool.choose(exclude=[endpoint])
+        if second_endpoint is None:
+            return await first
+
+        logger.debug("Hedging a request slower than %f seconds at %s to %s", delay, endpoint.url, second_endpoint.url)
+        with self.pool.lock:
+            self.pool.hedged_requests += 1
+        second = asyncio.ensure_future(self.post_to(second_endpoint, request_data))
+
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+            # Both failed
+            return first.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def post_with_retries(self, request_data: bytes, description: str = "batch") -> Any:
+        """Post, failing over to the other endpoints on HTTP level errors.
+
+        Sleeps with backoff only after every endpoint has failed.
+        """
+        tried: List[EndpointHealth] = []
+        sleep = self.pool.sleep
+        for i in range(self.pool.retries):
+            endpoint = self.pool.choose(exclude=tried)
+            if endpoint is None:
+                logger.warning("All JSON-RPC endpoints failed %s, retrying in %f seconds", description, sleep)
+                await asyncio.sleep(sleep)
+                sleep *= self.pool.backoff
+                tried = []
+                endpoint = self.pool.choose()
+            tried.append(endpoint)
+
+            try:
+                return await self.post_hedged(endpoint, request_data)
+            except self.retryable_exceptions as e:
+                if i < self.pool.retries - 1:
+                    logger.warning("Encountered JSON-RPC retryable error %s at %s when calling method %s, trying another endpoint", e, endpoint.url, description)
+                else:
+                    raise
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        if check_if_retry_on_failure(method):
+            return await self.post_with_retries(request_data, method)
+        return await self.post_to(self.pool.choose(), request_data)
+
+
+def create_async_pooled_web3(pool: ProviderPool) -> Web3:
+    """Create an async Web3 connection using a provider pool.
+
+    The pool does the failover, so no retry middleware is installed.
+    """
+    return Web3(AsyncPooledHTTPProvider(pool), modules={"eth": [AsyncEth]}, middlewares=[])
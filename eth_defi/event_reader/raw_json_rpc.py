@@ -0,0 +1,227 @@
+"""Lean JSON-RPC transport for the event reader hot path.
+
+Even with :py:func:`eth_defi.event_reader.fast_json_rpc.patch_web3`,
+every `eth_getLogs` call goes through `web3.manager.request_blocking`,
+the middleware onion and the provider's request building.
+For a scan doing tens of thousands of calls this overhead shows up in the profiles.
+
+:py:class:`RawJSONRPCProvider` is a drop-in `HTTPProvider` that
+
+- posts pre-encoded request bytes over its own pooled keep-alive session
+
+- asks for gzip compressed responses
+
+- decodes the response with `ujson` straight to the result dicts,
+  so `eth_getLogs` results are ready to be used as :py:class:`eth_defi.event_reader.logresult.LogResult`
+
+- retries like :py:func:`eth_defi.middleware.http_retry_request_with_sleep_middleware`
+  when called through :py:func:`make_raw_request`
+
+The reader calls JSON-RPC through :py:func:`make_raw_request`,
+which uses the lean path when the worker Web3 has this provider,
+and the normal web3.py request manager otherwise.
+
+Example:
+
+.. code-block:: python
+
+    web3_factory = TunedWeb3Factory(json_rpc_url, http_adapter, raw_json_rpc=True)
+    executor = create_thread_pool_executor(web3_factory, context, max_workers=16)
+    for log in read_events_concurrent(executor, start_block, end_block, events, notify):
+        ...
+
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Collection, Dict, Optional, Type
+
+import requests
+import ujson
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout, TooManyRedirects
+from web3 import HTTPProvider, Web3
+from web3.middleware.exception_retry_request import check_if_retry_on_failure
+from web3.types import RPCEndpoint, RPCResponse
+
+from eth_defi.event_reader.concurrency import report_worker_error, report_worker_latency
+
+logger = logging.getLogger(__name__)
+
+
+#: Errors retried by :py:meth:`RawJSONRPCProvider.request_result`,
+#: the same as :py:func:`eth_defi.middleware.http_retry_request_with_sleep_middleware`
+RETRYABLE_EXCEPTIONS = (ConnectionError, HTTPError, Timeout, TooManyRedirects)
+
+
+def call_with_retries(
+    func: Callable[[], Any],
+    description: str,
+    retries: int = 5,
+    sleep: float = 5,
+    backoff: float = 1.2,
+    retryable_exceptions: Collection[Type[BaseException]] = RETRYABLE_EXCEPTIONS,
+) -> Any:
+    """Call a function, retrying with sleep and backoff.
+
+    The defaults match :py:func:`eth_defi.middleware.http_retry_request_with_sleep_middleware`.
+
+    :param description:
+        Describe the request in the retry log messages
+    """
+    retryable_exceptions = tuple(retryable_exceptions)
+    for i in range(retries):
+        try:
+            return func()
+        except retryable_exceptions as e:
+            if i < retries - 1:
+                report_worker_error(e)
+                logger.warning("Encountered JSON-RPC retryable error %s when calling method %s, retrying in %f seconds", e, description, sleep)
+                time.sleep(sleep)
+                sleep *= backoff
+            else:
+                raise
+
+
+class RawJSONRPCProvider(HTTPProvider):
+    """HTTP provider with a lean request path.
+
+    Because this is a subclass of `HTTPProvider`, the Web3 instance
+    stays fully usable for contract calls and other web3.py APIs.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri: str,
+        http_adapter: Optional[HTTPAdapter] = None,
+        timeout: float = 10,
+        retries: int = 5,
+        sleep: float = 5,
+        backoff: float = 1.2,
+        retryable_exceptions: Collection[Type[BaseException]] = RETRYABLE_EXCEPTIONS,
+    ):
+        """
+        :param endpoint_uri:
+            JSON-RPC HTTP(S) URL
+
+        :param http_adapter:
+            Connection pool to use. Share one between the worker threads
+            to limit the number of open connections.
+
+        :param timeout:
+            HTTP request timeout in seconds
+
+        :param retries:
+            How many times to try a request
+
+        :param sleep:
+            Seconds to sleep before the first retry
+
+        :param backoff:
+            Multiply the sleep by this for each following retry
+        """
+        session = requests.Session()
+        if http_adapter is not None:
+            session.mount("http://", http_adapter)
+            session.mount("https://", http_adapter)
+        super().__init__(endpoint_uri, request_kwargs={"timeout": timeout}, session=session)
+
+        self.session = session
+        self.timeout = timeout
+        self.retries = retries
+        self.sleep = sleep
+        self.backoff = backoff
+        self.retryable_exceptions = tuple(retryable_exceptions)
+        self.headers = {
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
+        }
+        self.request_counter = itertools.count()
+        self.request_counter_lock = threading.Lock()
+        # method name -> encoded request prefix
+        self.encoded_methods: Dict[str, bytes] = {}
+
+    def encode_rpc_request(self, method: RPCEndpoint, params: Any) -> bytes:
+        """Encode a request without going through web3.py JSON encoding."""
+        prefix = self.encoded_methods.get(method)
+        if prefix is None:
+            prefix = self.encoded_methods[method] = b'{"jsonrpc":"2.0","method":"' + method.encode("ascii") + b'","params":'
+        with self.request_counter_lock:
+            request_id = next(self.request_counter)
+        return b"%s%s,\"id\":%d}" % (prefix, ujson.dumps(params).encode("utf-8"), request_id)
+
+    def post(self, request_data: bytes) -> Any:
+        """Post encoded request bytes and decode the response."""
+        started = time.monotonic()
+        response = self.session.post(
+            self.endpoint_uri,
+            data=request_data,
+            headers=self.headers,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        report_worker_latency(time.monotonic() - started)
+        # requests decompresses gzip transparently
+        return ujson.loads(response.content)
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Perform a single request without retries.
+
+        Called by web3.py request manager, so the middlewares still apply.
+        """
+        return self.post(self.encode_rpc_request(method, params))
+
+    def post_with_retries(self, request_data: bytes, description: str = "batch") -> Any:
+        """Post encoded request bytes, retrying on HTTP level errors.
+
+        :param description:
+            Describe the request in the retry log messages
+        """
+        return call_with_retries(
+            lambda: self.post(request_data),
+            description,
+            retries=self.retries,
+            sleep=self.sleep,
+            backoff=self.backoff,
+            retryable_exceptions=self.retryable_exceptions,
+        )
+
+    def request_result(self, method: RPCEndpoint, params: Any) -> Any:
+        """Perform a request bypassing the web3.py request manager.
+
+        Only the methods web3.py considers safe to retry are retried.
+
+        :return:
+            The `result` of the JSON-RPC response
+
+        :raise ValueError:
+            If the node returned a JSON-RPC error.
+            The argument is the error dict, like web3.py request manager does.
+        """
+        request_data = self.encode_rpc_request(method, params)
+        if check_if_retry_on_failure(method):
+            response = self.post_with_retries(request_data, method)
+        else:
+            response = self.post(request_data)
+
+        if "error" in response:
+            raise ValueError(response["error"])
+
+        return response.get("result")
+
+
+def make_raw_request(web3: Web3, method: str, params: Any) -> Any:
+    """Perform a JSON-RPC request on the hot path of the event reader.
+
+    - With :py:class:`RawJSONRPCProvider` bypass web3.py request manager and middlewares
+
+    - Otherwise use `web3.manager.request_blocking`
+
+    :return:
+        The raw `result` of the JSON-RPC response, without any web3.py formatting
+    """
+    provider = web3.provider
+    if isinstance(provider, RawJSONRPCProvider):
+        return provider.request_result(method, params)
+    return web3.manager.request_blocking(method, params)
@@ -10,17 +10,26 @@ For further reading see:
 
 import logging
 import threading
-from typing import Callable, Dict, Iterable, List, Optional, Protocol
+from collections import deque
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterable, List, Optional, Protocol, Tuple, Union
 
-import futureproof
 from eth_bloom import BloomFilter
 from futureproof import ThreadPoolExecutor
 from web3 import Web3
 from web3.contract import ContractEvent
 
+from eth_defi.batch import batch_request
+from eth_defi.event_reader.chunk_planner import AdaptiveChunkPlanner, is_log_range_error
+from eth_defi.event_reader.concurrency import ConcurrencyStatus
 from eth_defi.event_reader.filter import Filter
 from eth_defi.event_reader.logresult import LogContext, LogResult
-from eth_defi.event_reader.web3worker import get_worker_web3
+from eth_defi.event_reader.raw_json_rpc import make_raw_request
+from eth_defi.event_reader.timestamp import BlockTimestampExtractor, get_log_block_numbers
+from eth_defi.event_reader.web3worker import get_worker_concurrency_limiter, get_worker_web3
+
+if TYPE_CHECKING:
+    from eth_defi.event_reader.bloom import BloomPrefilter
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +52,7 @@ class ProgressUpdate(Protocol):
         total_events: int,
         last_timestamp: Optional[int],
         context: LogContext,
+        concurrency: Optional[ConcurrencyStatus] = None,
     ):
         """
         :param current_block:
@@ -66,6 +76,11 @@ class ProgressUpdate(Protocol):
 
         :param context:
             Current context
+
+        :param concurrency:
+            The current concurrency limit and the reason of its last change.
+            Only passed by :py:func:`read_events_concurrent`
+            when the executor has a concurrency limiter.
         """
 
 
@@ -86,8 +101,10 @@ def extract_timestamps_json_rpc(
     logging.debug("Extracting timestamps for logs %d - %d", start_block, end_block)
 
     # Collect block timestamps from the headers
-    for block_num in range(start_block, end_block + 1):
-        raw_result = web3.manager.request_blocking("eth_getBlockByNumber", (hex(block_num), False))
+    block_numbers = range(start_block, end_block + 1)
+    results = batch_request(web3, [("eth_getBlockByNumber", (hex(block_num), False)) for block_num in block_numbers], raise_on_error=True)
+    for block_num, result in zip(block_numbers, results):
+        raw_result = result.result
         data_block_number = raw_result["number"]
         assert type(data_block_number) == str, "Some automatic data conversion occured from JSON-RPC data. Make sure that you have cleared middleware onion for web3"
         assert int(raw_result["number"], 16) == block_num
@@ -102,7 +119,7 @@ def extract_events(
     end_block: int,
     filter: Filter,
     context: Optional[LogContext] = None,
-    extract_timestamps: Optional[Callable] = extract_timestamps_json_rpc,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
 ) -> Iterable[LogResult]:
     """Perform eth_getLogs call over a block range.
 
@@ -116,7 +133,10 @@ def extract_events(
         Internal filter used to match logs
 
     :param extract_timestamps:
-        Method to get the block timestamps
+        Method to get the block timestamps.
+
+        A :py:class:`eth_defi.event_reader.timestamp.BlockTimestampExtractor`
+        is asked only for the blocks that have logs.
 
     :param context:
         Passed to the all generated logs
@@ -141,11 +161,16 @@ def extract_events(
     # logging.debug("Extracting logs %s", filter_params)
     # logging.info("Log range %d - %d", start_block, end_block)
 
-    logs = web3.manager.request_blocking("eth_getLogs", (filter_params,))
+    logs = make_raw_request(web3, "eth_getLogs", (filter_params,))
 
     if logs:
 
-        if extract_timestamps is not None:
+        # Timestamps keyed by block number instead of block hash
+        by_block_number = isinstance(extract_timestamps, BlockTimestampExtractor)
+
+        if by_block_number:
+            timestamps = extract_timestamps.fetch_timestamps(web3, get_log_block_numbers(logs))
+        elif extract_timestamps is not None:
             timestamps = extract_timestamps(web3, start_block, end_block)
 
         for log in logs:
@@ -156,18 +181,62 @@ def extract_events(
             log["context"] = context
             log["event"] = filter.topics[event_signature]
             try:
-                log["timestamp"] = timestamps[block_hash] if extract_timestamps else None
+                if by_block_number:
+                    log["timestamp"] = timestamps[block_number]
+                else:
+                    log["timestamp"] = timestamps[block_hash] if extract_timestamps else None
             except KeyError as e:
                 raise RuntimeError(f"Timestamp missing for block number {block_number:,}, hash {block_hash}, our timestamp table has {len(timestamps)} blocks") from e
             yield log
 
 
+def extract_events_bisect(
+    web3: Web3,
+    start_block: int,
+    end_block: int,
+    filter: Filter,
+    context: Optional[LogContext] = None,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
+) -> List[LogResult]:
+    """Perform eth_getLogs call over a block range, splitting the range if the node rejects it.
+
+    If the JSON-RPC node refuses the range as too wide or having too many results,
+    the range is bisected until the halves go through.
+
+    :param chunk_planner:
+        Informed about the rejected and completed ranges
+
+    :return:
+        Logs of the whole range in the block order
+    """
+    try:
+        events = list(extract_events(web3, start_block, end_block, filter, context, extract_timestamps))
+        if chunk_planner is not None:
+            chunk_planner.record_success(end_block - start_block + 1, len(events))
+        return events
+    except ValueError as e:
+        if start_block == end_block or not is_log_range_error(e):
+            raise
+
+        logger.info("Splitting rejected eth_getLogs range %d - %d: %s", start_block, end_block, e)
+
+        if chunk_planner is not None:
+            chunk_planner.record_failure(end_block - start_block + 1, e)
+
+        middle = (start_block + end_block) // 2
+        first_half = extract_events_bisect(web3, start_block, middle, filter, context, extract_timestamps, chunk_planner)
+        second_half = extract_events_bisect(web3, middle + 1, end_block, filter, context, extract_timestamps, chunk_planner)
+        return first_half + second_half
+
+
 def extract_events_concurrent(
     start_block: int,
     end_block: int,
     filter: Filter,
     context: Optional[LogContext] = None,
-    extract_timestamps: Optional[Callable] = extract_timestamps_json_rpc,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
 ) -> List[LogResult]:
     """Concurrency happy event extractor.
 
@@ -175,14 +244,61 @@ def extract_events_concurrent(
 
     Assumes the web3 connection is preset when the concurrent worker has been created,
     see `get_worker_web3()`.
+
+    :param chunk_planner:
+        If given, bisect the ranges the node rejects.
+        See :py:func:`extract_events_bisect`.
     """
     logger.debug("Starting block scan %d - %d at thread %d for %d different events", start_block, end_block, threading.get_ident(), len(filter.topics))
     web3 = get_worker_web3()
     assert web3 is not None
+
+    limiter = get_worker_concurrency_limiter()
+    if limiter is not None:
+        # Wait until the node has capacity for one more block range
+        with limiter.slot():
+            return _extract_events_worker(web3, start_block, end_block, filter, context, extract_timestamps, chunk_planner)
+
+    return _extract_events_worker(web3, start_block, end_block, filter, context, extract_timestamps, chunk_planner)
+
+
+def _extract_events_worker(
+    web3: Web3,
+    start_block: int,
+    end_block: int,
+    filter: Filter,
+    context: Optional[LogContext],
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]],
+    chunk_planner: Optional[AdaptiveChunkPlanner],
+) -> List[LogResult]:
+    if chunk_planner is not None:
+        return extract_events_bisect(web3, start_block, end_block, filter, context, extract_timestamps, chunk_planner)
     events = list(extract_events(web3, start_block, end_block, filter, context, extract_timestamps))
     return events
 
 
+def plan_chunks(
+    start_block: int,
+    end_block: int,
+    chunk_size: int,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
+) -> Iterable[Tuple[int, int]]:
+    """Split a block range to eth_getLogs ranges.
+
+    Lazy: with a chunk planner, the size of each range
+    is decided only when the range is taken from the iterator.
+
+    :return:
+        Iterable of (first block, last block) tuples, inclusive
+    """
+    block_num = start_block
+    while block_num <= end_block:
+        size = chunk_planner.next_chunk_size() if chunk_planner is not None else chunk_size
+        last_of_chunk = min(end_block, block_num + size - 1)
+        yield block_num, last_of_chunk
+        block_num = last_of_chunk + 1
+
+
 def prepare_filter(events: List[ContractEvent]) -> Filter:
     """Creates internal filter to match contract events."""
 
@@ -191,12 +307,10 @@ def prepare_filter(events: List[ContractEvent]) -> Filter:
     topics = {}
 
     for event in events:
-        signatures = event.build_filter().topics
-
-        for signature in signatures:
-            topics[signature] = event
-            # TODO: Confirm correct usage of bloom filter for topics
-            bloom.add(bytes.fromhex(signature[2:]))
+        # Only the event signature, topic 0, is known for any log of the event
+        signature = event.build_filter().topics[0]
+        topics[signature] = event
+        bloom.add(bytes.fromhex(signature[2:]))
 
     filter = Filter(topics, bloom)
 
@@ -211,8 +325,10 @@ def read_events(
     notify: Optional[ProgressUpdate],
     chunk_size: int = 100,
     context: Optional[LogContext] = None,
-    extract_timestamps: Optional[Callable] = extract_timestamps_json_rpc,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
     filter: Optional[Filter] = None,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
+    bloom_prefilter: Optional["BloomPrefilter"] = None,
 ) -> Iterable[LogResult]:
     """Reads multiple events from the blockchain.
 
@@ -286,7 +402,8 @@ def read_events(
         Last block to process (inclusive)
 
     :param extract_timestamps:
-        Override for different block timestamp extraction methods
+        Override for different block timestamp extraction methods.
+        See :py:mod:`eth_defi.event_reader.timestamp`.
 
     :param chunk_size:
         How many blocks to scan in one eth_getLogs call
@@ -296,6 +413,18 @@ def read_events(
 
     :param filter:
         Pass a custom event filter for the readers
+
+    :param chunk_planner:
+        Adapt the block range of each eth_getLogs call to the log density
+        and split the ranges the node rejects.
+        `chunk_size` is ignored.
+        See :py:mod:`eth_defi.event_reader.chunk_planner`.
+
+    :param bloom_prefilter:
+        Read the block headers first and call eth_getLogs only for the blocks
+        whose `logsBloom` may have our logs.
+        Candidate blocks closer than `chunk_size` to each other share a call.
+        See :py:mod:`eth_defi.event_reader.bloom`.
     """
 
     assert type(start_block) == int
@@ -312,18 +441,21 @@ def read_events(
 
     last_timestamp = None
 
-    for block_num in range(start_block, end_block + 1, chunk_size):
+    for block_num, last_of_chunk in _plan_chunks(start_block, end_block, chunk_size, chunk_planner, bloom_prefilter):
 
         # Ping our master
         if notify is not None:
-            notify(block_num, start_block, end_block, chunk_size, total_events, last_timestamp, context)
-
-        last_of_chunk = min(end_block, block_num + chunk_size - 1)
+            notify(block_num, start_block, end_block, _get_notified_chunk_size(block_num, last_of_chunk, chunk_size, chunk_planner, bloom_prefilter), total_events, last_timestamp, context)
 
         # logger.info("Extracting %d - %d", block_num, last_of_chunk)
 
-        # Stream the events
-        for event in extract_events(web3, block_num, last_of_chunk, filter, context, extract_timestamps):
+        if chunk_planner is not None:
+            events = extract_events_bisect(web3, block_num, last_of_chunk, filter, context, extract_timestamps, chunk_planner)
+        else:
+            # Stream the events
+            events = extract_events(web3, block_num, last_of_chunk, filter, context, extract_timestamps)
+
+        for event in events:
             last_timestamp = event.get("timestamp")
             total_events += 1
             yield event
@@ -337,8 +469,11 @@ def read_events_concurrent(
     notify: Optional[ProgressUpdate],
     chunk_size: int = 100,
     context: Optional[LogContext] = None,
-    extract_timestamps: Optional[Callable] = extract_timestamps_json_rpc,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
     filter: Optional[Filter] = None,
+    max_pending_chunks: Optional[int] = None,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
+    bloom_prefilter: Optional["BloomPrefilter"] = None,
 ) -> Iterable[LogResult]:
     """Reads multiple events from the blockchain parallel using a thread pool for IO.
 
@@ -349,6 +484,12 @@ def read_events_concurrent(
     - Even though we receive data from JSON-RPC API in random order,
       the iterable results are always in the correct order (and processes in a single thread)
 
+    - Uses a sliding window of block ranges: only `max_pending_chunks` ranges are in flight
+      or waiting to be consumed at a time, so the memory usage stays flat regardless
+      of the length of the scanned block range
+
+    - Backpressure: a slow consumer stops new `eth_getLogs` requests from being submitted
+
     - Returns events as a dict for optimal performance
 
     - Can resume scan
@@ -412,7 +553,8 @@ def read_events_concurrent(
         Last block to process (inclusive)
 
     :param extract_timestamps:
-        Override for different block timestamp extraction methods
+        Override for different block timestamp extraction methods.
+        See :py:mod:`eth_defi.event_reader.timestamp`.
 
     :param chunk_size:
         How many blocks to scan in one eth_getLogs call
@@ -422,6 +564,24 @@ def read_events_concurrent(
 
     :param filter:
         Pass a custom event filter for the readers
+
+    :param max_pending_chunks:
+        How many block ranges can be in flight or completed but not yet consumed at a time.
+        Defaults to twice the number of the executor workers.
+        With a concurrency limiter only its current limit of them are read at a time,
+        see :py:func:`eth_defi.event_reader.web3worker.create_thread_pool_executor`.
+
+    :param chunk_planner:
+        Adapt the block range of each eth_getLogs call to the log density
+        and split the ranges the node rejects.
+        `chunk_size` is ignored.
+        See :py:mod:`eth_defi.event_reader.chunk_planner`.
+
+    :param bloom_prefilter:
+        Read the block headers first and call eth_getLogs only for the blocks
+        whose `logsBloom` may have our logs.
+        Candidate blocks closer than `chunk_size` to each other share a call.
+        See :py:mod:`eth_defi.event_reader.bloom`.
     """
 
     total_events = 0
@@ -431,74 +591,99 @@ def read_events_concurrent(
     if filter is None:
         filter = prepare_filter(events)
 
-    # For futureproof usage see
-    # https://github.com/yeraydiazdiaz/futureproof
-    tm = futureproof.TaskManager(executor, error_policy=futureproof.ErrorPolicyEnum.RAISE)
-
-    # Build a list of all tasks
-    # block number -> arguments
-    task_list: Dict[int, tuple] = {}
-    completed_tasks: Dict[int, tuple] = {}
-
-    for block_num in range(start_block, end_block + 1, chunk_size):
-        last_of_chunk = min(end_block, block_num + chunk_size)
-        task_list[block_num] = (
-            block_num,
-            last_of_chunk,
-            filter,
-            context,
-            extract_timestamps,
-        )
-
-    # Run all tasks and handle backpressure
-    tm.map(extract_events_concurrent, list(task_list.values()))
-
-    logger.debug("Submitted %d tasks", len(task_list))
-
-    # Complete the tasks.
-    # Always guarantee the block order for the caller,
-    # so that events are iterated in the correct order
-    for task in tm.as_completed():
-        block_num = task.args[0]  # Peekaboo
-        completed_tasks[block_num] = task
-        logger.debug("Completed block range at block %d", block_num)
-
-        # Iterate through the start for the task list
-        # and then yield the completed blocks forward
-        tasks_pending = list(task_list.keys())  # By a block number
-
-        # Iterate through the tasks in their correct order
-        for block_num in tasks_pending:
-
-            # The first task at the head of pending list is complete
-            if block_num in completed_tasks:
-
-                # Remove task from our list
-                task = completed_tasks.pop(block_num)
-                del task_list[block_num]
-
-                if isinstance(task.result, Exception):
-                    raise AssertionError("Should not never happen")
-
-                # Ping our master
-                if notify is not None:
-                    notify(block_num, start_block, end_block, chunk_size, total_events, last_timestamp, context)
-
-                assert task.result is not None, f"Result missing for the task: {task}"
-
-                log_results: List[LogResult] = task.result
-
-                logger.debug("Result is %s", log_results)
-
-                for log in log_results:
-                    last_timestamp = log.get("timestamp")
-                    yield log
-                    total_events += 1
-
-            else:
-                # This task is not yet completed,
-                # but block ranges after this task are.
-                # Because we need to return events in their order,
-                # we try to return events from this completed tasks later,
-                # when we have some results from earlier tasks first.
-                break
+    if max_pending_chunks is None:
+        max_pending_chunks = executor.max_workers * 2
+
+    concurrency_limiter = getattr(executor, "concurrency_limiter", None)
+
+    assert max_pending_chunks > 0, f"max_pending_chunks must be positive, got {max_pending_chunks}"
+
+    # Lazily generate (first block, last block) ranges,
+    # so we never materialise the task list for the whole scan range
+    chunks = _plan_chunks(start_block, end_block, chunk_size, chunk_planner, bloom_prefilter)
+
+    # Submitted block ranges in the block order.
+    # The head of the queue is always the next range we need to yield.
+    pending: Deque[Tuple[int, int, Future]] = deque()
+
+    def submit_more():
+        # Fill the sliding window up to its maximum size
+        while len(pending) < max_pending_chunks:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            first_of_chunk, last_of_chunk = chunk
+            future = executor.submit(
+                extract_events_concurrent,
+                first_of_chunk,
+                last_of_chunk,
+                filter,
+                context,
+                extract_timestamps,
+                chunk_planner,
+            )
+            pending.append((first_of_chunk, last_of_chunk, future))
+
+    try:
+        submit_more()
+
+        # Always guarantee the block order for the caller,
+        # so that events are iterated in the correct order.
+        # Blocks until the oldest block range is complete,
+        # even if later block ranges have already completed.
+        while pending:
+            block_num, last_of_chunk, future = pending.popleft()
+
+            # Raises the exception from the worker thread, if any
+            log_results: List[LogResult] = future.result()
+
+            logger.debug("Completed block range at block %d", block_num)
+
+            # Keep the workers busy while the caller processes this range.
+            # If the caller is slow, we stop submitting new eth_getLogs requests
+            # because the generator is not advanced.
+            submit_more()
+
+            # Ping our master
+            if notify is not None:
+                notified_chunk_size = _get_notified_chunk_size(block_num, last_of_chunk, chunk_size, chunk_planner, bloom_prefilter)
+                if concurrency_limiter is not None:
+                    notify(block_num, start_block, end_block, notified_chunk_size, total_events, last_timestamp, context, concurrency=concurrency_limiter.get_status())
+                else:
+                    notify(block_num, start_block, end_block, notified_chunk_size, total_events, last_timestamp, context)
+
+            for log in log_results:
+                last_timestamp = log.get("timestamp")
+                yield log
+                total_events += 1
+    finally:
+        # The caller aborted the iteration or we had an exception
+        for block_num, last_of_chunk, future in pending:
+            future.cancel()
+
+
+def _plan_chunks(
+    start_block: int,
+    end_block: int,
+    chunk_size: int,
+    chunk_planner: Optional[AdaptiveChunkPlanner],
+    bloom_prefilter: Optional["BloomPrefilter"],
+) -> Iterable[Tuple[int, int]]:
+    if bloom_prefilter is not None:
+        assert chunk_planner is None, "Cannot use both a chunk planner and a bloom prefilter"
+        return bloom_prefilter.plan_chunks(start_block, end_block, chunk_size)
+    return plan_chunks(start_block, end_block, chunk_size, chunk_planner)
+
+
+def _get_notified_chunk_size(
+    first_block: int,
+    last_block: int,
+    chunk_size: int,
+    chunk_planner: Optional[AdaptiveChunkPlanner],
+    bloom_prefilter: Optional["BloomPrefilter"] = None,
+) -> int:
+    # Progress bars update by the chunk size,
+    # so with variable ranges we need to tell the actual range
+    if chunk_planner is not None or bloom_prefilter is not None:
+        return last_block - first_block + 1
+    return chunk_size
@@ -3,13 +3,17 @@
 """
 import logging
 import asyncio
-from typing import Callable, Dict, AsyncIterable, List, Optional, Protocol
+from collections import deque
+from typing import Callable, Deque, Dict, AsyncIterable, List, Optional, Protocol, Tuple, Union
 from web3 import Web3
 from web3.contract import ContractEvent
 
+from eth_defi.event_reader.chunk_planner import AdaptiveChunkPlanner, is_log_range_error
 from eth_defi.event_reader.filter import Filter
 from eth_defi.event_reader.logresult import LogContext, LogResult
+from eth_defi.event_reader.timestamp import BlockTimestampExtractor, get_log_block_numbers
 from eth_defi.event_reader.reader import (
+    plan_chunks,
     prepare_filter,
     ProgressUpdate
 )
@@ -55,7 +59,7 @@ async def extract_events(
     end_block: int,
     filter: Filter,
     context: Optional[LogContext] = None,
-    extract_timestamps: Optional[Callable] = extract_timestamps_json_rpc,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
 ) -> AsyncIterable[LogResult]:
     """Perform eth_getLogs call over a block range.
 
@@ -69,7 +73,10 @@ async def extract_events(
         Internal filter used to match logs
 
     :param extract_timestamps:
-        Method to get the block timestamps
+        Method to get the block timestamps.
+
+        A :py:class:`eth_defi.event_reader.timestamp.BlockTimestampExtractor`
+        is asked only for the blocks that have logs.
 
     :param context:
         Passed to the all generated logs
@@ -98,18 +105,26 @@ async def extract_events(
 
     if logs:
 
-        if extract_timestamps is not None:
+        # Timestamps keyed by block number instead of block hash
+        by_block_number = isinstance(extract_timestamps, BlockTimestampExtractor)
+
+        if by_block_number:
+            timestamps = await extract_timestamps.fetch_timestamps_async(web3, get_log_block_numbers(logs))
+        elif extract_timestamps is not None:
             timestamps = await extract_timestamps(web3, start_block, end_block)
 
         for log in logs:
             block_hash = log["blockHash"]
-            block_number = log["blockNumber"]
+            block_number = int(log["blockNumber"], 16)
             # Retrofit our information to the dict
             event_signature = log["topics"][0]
             log["context"] = context
             log["event"] = filter.topics[event_signature]
             try:
-                log["timestamp"] = timestamps[block_hash] if extract_timestamps else None
+                if by_block_number:
+                    log["timestamp"] = timestamps[block_number]
+                else:
+                    log["timestamp"] = timestamps[block_hash] if extract_timestamps else None
             except KeyError as e:
                 raise RuntimeError(f"Timestamp missing for block number {block_number:,}, hash {block_hash}, our timestamp table has {len(timestamps)} blocks") from e
             yield log
@@ -123,7 +138,7 @@ async def read_events(
     notify: Optional[ProgressUpdate],
     chunk_size: int = 100,
     context: Optional[LogContext] = None,
-    extract_timestamps: Optional[Callable] = extract_timestamps_json_rpc,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
     filter: Optional[Filter] = None,
 ) -> AsyncIterable[LogResult]:
     """Reads multiple events from the blockchain.
@@ -198,7 +213,8 @@ async def read_events(
         Last block to process (inclusive)
 
     :param extract_timestamps:
-        Override for different block timestamp extraction methods
+        Override for different block timestamp extraction methods.
+        See :py:mod:`eth_defi.event_reader.timestamp`.
 
     :param chunk_size:
         How many blocks to scan in one eth_getLogs call
@@ -240,3 +256,194 @@ async def read_events(
             total_events += 1
             yield event
 
+
+async def extract_events_bisect(
+    web3: Web3,
+    start_block: int,
+    end_block: int,
+    filter: Filter,
+    context: Optional[LogContext] = None,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
+) -> List[LogResult]:
+    """Perform eth_getLogs call over a block range, splitting the range if the node rejects it.
+
+    Async version of :py:func:`eth_defi.event_reader.reader.extract_events_bisect`.
+    Without `chunk_planner` JSON-RPC errors are raised as is.
+
+    :return:
+        Logs of the whole range in the block order
+    """
+    try:
+        events = [log async for log in extract_events(web3, start_block, end_block, filter, context, extract_timestamps)]
+        if chunk_planner is not None:
+            chunk_planner.record_success(end_block - start_block + 1, len(events))
+        return events
+    except ValueError as e:
+        if chunk_planner is None or start_block == end_block or not is_log_range_error(e):
+            raise
+
+        logger.info("Splitting rejected eth_getLogs range %d - %d: %s", start_block, end_block, e)
+        chunk_planner.record_failure(end_block - start_block + 1, e)
+
+        middle = (start_block + end_block) // 2
+        first_half = await extract_events_bisect(web3, start_block, middle, filter, context, extract_timestamps, chunk_planner)
+        second_half = await extract_events_bisect(web3, middle + 1, end_block, filter, context, extract_timestamps, chunk_planner)
+        return first_half + second_half
+
+
+async def read_events_concurrent(
+    web3: Web3,
+    start_block: int,
+    end_block: int,
+    events: List[ContractEvent],
+    notify: Optional[ProgressUpdate],
+    chunk_size: int = 100,
+    context: Optional[LogContext] = None,
+    extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
+    filter: Optional[Filter] = None,
+    max_concurrency: int = 16,
+    rate_limiter: Optional[asyncio.Semaphore] = None,
+    chunk_planner: Optional[AdaptiveChunkPlanner] = None,
+) -> AsyncIterable[LogResult]:
+    """Reads multiple events from the blockchain concurrently on a single event loop.
+
+    Asyncio counterpart of :py:func:`eth_defi.event_reader.reader.read_events_concurrent`.
+
+    - Keeps `max_concurrency` block ranges in flight as coroutines,
+      so we get the throughput of a thread pool without threads and
+      a HTTP session per thread
+
+    - Even though the block ranges complete in random order,
+      the results are always yielded in the block order
+
+    - Backpressure: a slow consumer stops new block ranges from being started
+
+    Example:
+
+    .. code-block:: python
+
+        web3 = Web3(
+            AsyncHTTPProvider(json_rpc_url),
+            modules={"eth": [AsyncEth]},
+            middlewares=[],
+        )
+
+        async for log_result in read_events_concurrent(
+            web3,
+            start_block,
+            end_block,
+            events,
+            None,
+            chunk_size=100,
+            context=market_cache,
+            max_concurrency=16,
+            rate_limiter=NODE_RATE_LIMITER,
+        ):
+            out.append(decode_accrue_interest(log_result))
+
+    :param web3:
+        Web3 instance using an async provider, with middleware cleared
+
+    :param events:
+        List of Web3.py contract event classes to scan for
+
+    :param notify:
+        Optional callback to be called before yielding events of each chunk
+
+    :param start_block:
+        First block to process (inclusive)
+
+    :param end_block:
+        Last block to process (inclusive)
+
+    :param chunk_size:
+        How many blocks to scan in one eth_getLogs call
+
+    :param context:
+        Passed to the all generated logs
+
+    :param extract_timestamps:
+        Override for different block timestamp extraction methods.
+        See :py:mod:`eth_defi.event_reader.timestamp`.
+
+    :param filter:
+        Pass a custom event filter for the readers
+
+    :param max_concurrency:
+        How many block ranges can be in flight or completed but not yet consumed at a time
+
+    :param rate_limiter:
+        A semaphore acquired for each block range, e.g. :py:data:`eth_defi.rate.NODE_RATE_LIMITER`.
+        To rate limit every JSON-RPC request, including block headers,
+        use :py:func:`eth_defi.rate.async_rate_limiter_middleware` instead.
+
+    :param chunk_planner:
+        Adapt the block range of each eth_getLogs call to the log density
+        and split the ranges the node rejects.
+        `chunk_size` is ignored.
+        See :py:mod:`eth_defi.event_reader.chunk_planner`.
+    """
+
+    assert type(start_block) == int
+    assert type(end_block) == int
+    assert max_concurrency > 0, f"max_concurrency must be positive, got {max_concurrency}"
+
+    total_events = 0
+
+    last_timestamp = None
+
+    if filter is None:
+        filter = prepare_filter(events)
+
+    chunks = plan_chunks(start_block, end_block, chunk_size, chunk_planner)
+
+    # Started block ranges in the block order.
+    # The head of the queue is always the next range we need to yield.
+    pending: Deque[Tuple[int, int, asyncio.Task]] = deque()
+
+    async def extract_chunk(first_of_chunk: int, last_of_chunk: int) -> List[LogResult]:
+        if rate_limiter is not None:
+            async with rate_limiter:
+                return await extract_events_bisect(web3, first_of_chunk, last_of_chunk, filter, context, extract_timestamps, chunk_planner)
+        return await extract_events_bisect(web3, first_of_chunk, last_of_chunk, filter, context, extract_timestamps, chunk_planner)
+
+    def start_more():
+        # Fill the window up to its maximum size
+        while len(pending) < max_concurrency:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            first_of_chunk, last_of_chunk = chunk
+            task = asyncio.create_task(extract_chunk(first_of_chunk, last_of_chunk))
+            pending.append((first_of_chunk, last_of_chunk, task))
+
+    try:
+        start_more()
+
+        while pending:
+            block_num, last_of_chunk, task = pending.popleft()
+
+            # Raises the exception from the coroutine, if any
+            log_results = await task
+
+            logger.debug("Completed block range at block %d", block_num)
+
+            start_more()
+
+            # Ping our master
+            if notify is not None:
+                notified_chunk_size = last_of_chunk - block_num + 1 if chunk_planner is not None else chunk_size
+                notify(block_num, start_block, end_block, notified_chunk_size, total_events, last_timestamp, context)
+
+            for log in log_results:
+                last_timestamp = log.get("timestamp")
+                yield log
+                total_events += 1
+    finally:
+        # The caller aborted the iteration or we had an exception.
+        # Let the block ranges in flight finish instead of cancelling them:
+        # web3.py leaks its HTTP session cache lock if a request
+        # is cancelled while waiting for the lock.
+        if pending:
+            await asyncio.gather(*[task for block_num, last_of_chunk, task in pending], return_exceptions=True)
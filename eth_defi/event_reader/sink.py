@@ -0,0 +1,335 @@
+"""Output sinks for decoded events.
+
+The `fetch_events_to_csv` exporters buffer decoded events and flush them
+to a sink every time the scanner reports progress.
+
+- :py:class:`CSVEventSink` is the classic row-by-row CSV output
+
+- :py:class:`ParquetEventSink` writes a Parquet dataset, one part file per flush.
+  Columns are typed, so reading back does not need to parse text,
+  and a notebook can read only the columns it needs.
+
+256-bit values do not fit into any native Arrow or pandas integer type
+(`decimal256` has only 76 digits of precision, a `uint256` may have 78).
+They are stored as 32 byte big-endian fixed size binary columns,
+`int256` in two's complement, and converted back to exact Python ints by :py:func:`read_parquet_events`.
+
+Parquet files cannot be appended after their footer has been written,
+and a file without its footer cannot be read at all.
+:py:class:`ParquetEventSink` writes a directory of part files, a complete part for every flush.
+A part is written to a hidden temporary file and renamed in place,
+so a killed scan leaves only readable parts behind
+and the saved scan state never points past rows that were lost.
+The directory is read as a single table
+by :py:func:`read_parquet_events` and by `pandas.read_parquet`.
+
+Parquet support needs `pyarrow` to be installed.
+
+Example:
+
+.. code-block:: python
+
+    with create_event_sink("parquet", "/tmp/uniswap-v3-swap", field_names, field_types) as sink:
+        sink.write_batch(decoded_swaps)
+
+    df = load_event_dataframe("/tmp/uniswap-v3-swap.parquet", columns=["block_number", "amount0"])
+
+"""
+import abc
+import csv
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from eth_defi.event_reader.columnar import _words_to_int
+
+logger = logging.getLogger(__name__)
+
+
+#: Column types understood by :py:class:`ParquetEventSink`.
+#:
+#: Columns without a type are stored as strings.
+SUPPORTED_FIELD_TYPES = {"string", "int64", "float64", "datetime", "uint256", "int256"}
+
+#: Parquet field metadata key telling the Solidity integer type of a binary column
+ETH_TYPE_METADATA_KEY = b"eth_type"
+
+_PART_PATTERN = re.compile(r"part-(\d+)\.parquet$")
+
+
+class EventSink(abc.ABC):
+    """Write decoded event rows to storage.
+
+    Use as a context manager to close the sink.
+    """
+
+    @abc.abstractmethod
+    def write_batch(self, rows: List[dict]):
+        """Write rows buffered since the last flush.
+
+        After this returns the rows must be durable,
+        as the scan state is saved next.
+        """
+
+    @abc.abstractmethod
+    def close(self):
+        """Finish writing."""
+
+    def __enter__(self) -> "EventSink":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CSVEventSink(EventSink):
+    """Append rows to a CSV file.
+
+    The header is written only when the file is created,
+    so a resumed scan continues the same file.
+    """
+
+    def __init__(self, file_path: Union[str, Path], field_names: List[str]):
+        """
+        :param file_path:
+            CSV file to append to
+
+        :param field_names:
+            Columns in the output order
+        """
+        self.file_path = Path(file_path)
+        exists_already = self.file_path.exists()
+        self.file_handler = open(self.file_path, "a", encoding="utf-8", newline="")
+        self.csv_writer = csv.DictWriter(self.file_handler, fieldnames=field_names)
+        if not exists_already:
+            self.csv_writer.writeheader()
+
+    def write_batch(self, rows: List[dict]):
+        self.csv_writer.writerows(rows)
+        self.file_handler.flush()
+
+    def close(self):
+        self.file_handler.close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _encode_int(value: Optional[int], signed: bool) -> Optional[bytes]:
+    if value is None:
+        return None
+    return int(value).to_bytes(32, "big", signed=signed)
+
+
+class ParquetEventSink(EventSink):
+    """Write rows to a Parquet dataset directory.
+
+    Every :py:meth:`write_batch` call writes a complete part file,
+    so the rows are readable as soon as it returns, even if the process is killed later.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        field_names: List[str],
+        field_types: Optional[Dict[str, str]] = None,
+        compression: str = "zstd",
+    ):
+        """
+        :param path:
+            Dataset directory. Created if it does not exist.
+
+        :param field_names:
+            Columns in the output order
+
+        :param field_types:
+            Column name -> type, see :py:data:`SUPPORTED_FIELD_TYPES`.
+            Columns without a type are stored as strings.
+
+        :param compression:
+            Parquet compression codec
+        """
+        pa = _import_pyarrow()
+
+        field_types = field_types or {}
+        for name, field_type in field_types.items():
+            assert field_type in SUPPORTED_FIELD_TYPES, f"Unsupported type {field_type} for column {name}"
+
+        self.path = Path(path)
+        self.field_names = field_names
+        self.field_types = {name: field_types.get(name, "string") for name in field_names}
+        self.compression = compression
+        self.schema = pa.schema([self._create_field(name, self.field_types[name]) for name in field_names])
+        self.total = 0
+        self.parts = 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        # Left over by a killed scan, never renamed in place
+        for temp_path in self.path.glob(".part-*.tmp"):
+            temp_path.unlink()
+
+        # Continue the numbering of the earlier sessions
+        existing_parts = [int(m.group(1)) for m in (_PART_PATTERN.match(p.name) for p in self.path.glob("part-*.parquet")) if m]
+        self.next_part = max(existing_parts) + 1 if existing_parts else 0
+
+    @staticmethod
+    def _create_field(name: str, field_type: str):
+        import pyarrow as pa
+
+        if field_type == "int64":
+            return pa.field(name, pa.int64())
+        elif field_type == "float64":
+            return pa.field(name, pa.float64())
+        elif field_type == "datetime":
+            return pa.field(name, pa.timestamp("s"))
+        elif field_type in ("uint256", "int256"):
+            return pa.field(name, pa.binary(32), metadata={ETH_TYPE_METADATA_KEY: field_type.encode()})
+        else:
+            return pa.field(name, pa.string())
+
+    def _create_column(self, name: str, values: list):
+        import pyarrow as pa
+
+        field_type = self.field_types[name]
+        if field_type in ("uint256", "int256"):
+            signed = field_type == "int256"
+            values = [_encode_int(v, signed) for v in values]
+        elif field_type == "datetime":
+            values = [pd.Timestamp(v).to_pydatetime() if v is not None else None for v in values]
+        return pa.array(values, type=self.schema.field(name).type)
+
+    def write_batch(self, rows: List[dict]):
+        if not rows:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = [self._create_column(name, [row.get(name) for row in rows]) for name in self.field_names]
+        table = pa.Table.from_arrays(columns, schema=self.schema)
+
+        # Hidden files are skipped when the dataset is read
+        part_name = f"part-{self.next_part:08d}.parquet"
+        temp_path = self.path / f".{part_name}.tmp"
+        pq.write_table(table, temp_path, row_group_size=len(rows), compression=self.compression)
+        os.replace(temp_path, self.path / part_name)
+
+        self.next_part += 1
+        self.parts += 1
+        self.total += len(rows)
+
+    def close(self):
+        if self.parts:
+            logger.info("Wrote %d rows in %d parts to %s", self.total, self.parts, self.path)
+
+
+def create_event_sink(
+    output_format: str,
+    base_path: Union[str, Path],
+    field_names: List[str],
+    field_types: Optional[Dict[str, str]] = None,
+) -> EventSink:
+    """Create a sink for an exporter.
+
+    :param output_format:
+        `csv` or `parquet`
+
+    :param base_path:
+        Output path without the file suffix
+
+    :param field_names:
+        Columns in the output order
+
+    :param field_types:
+        Column types for typed formats, see :py:data:`SUPPORTED_FIELD_TYPES`
+
+    :return:
+        Sink writing to `base_path` + `.csv` or `.parquet`
+    """
+    if output_format == "csv":
+        return CSVEventSink(f"{base_path}.csv", field_names)
+    elif output_format == "parquet":
+        return ParquetEventSink(f"{base_path}.parquet", field_names, field_types)
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+
+def _decode_int_column(column, signed: bool) -> np.ndarray:
+    """Convert a 32 byte fixed size binary Arrow column to exact Python ints."""
+    array = column.combine_chunks() if hasattr(column, "combine_chunks") else column
+    if array.null_count == 0:
+        data = np.frombuffer(array.buffers()[1], dtype=np.uint8)
+        raw = data[array.offset * 32 : (array.offset + len(array)) * 32].reshape(len(array), 32)
+        return _words_to_int(raw, signed)
+
+    values = np.empty(len(array), dtype=object)
+    values[:] = [int.from_bytes(v, "big", signed=signed) if v is not None else None for v in array.to_pylist()]
+    return values
+
+
+def read_parquet_events(path: Union[str, Path], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read a Parquet dataset written by :py:class:`ParquetEventSink`.
+
+    Only the requested columns are read from the disk.
+    `uint256` and `int256` columns are converted to exact Python ints.
+
+    :param path:
+        Dataset directory or a single Parquet file
+
+    :param columns:
+        Columns to read. Read all columns by default.
+
+    :return:
+        DataFrame with the columns in the stored order
+    """
+    _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=columns)
+
+    int_columns = {}
+    for field in table.schema:
+        eth_type = (field.metadata or {}).get(ETH_TYPE_METADATA_KEY)
+        if eth_type is not None:
+            int_columns[field.name] = eth_type.decode() == "int256"
+
+    df = table.drop(list(int_columns.keys())).to_pandas()
+    for name, signed in int_columns.items():
+        df[name] = _decode_int_column(table.column(name), signed)
+
+    return df[table.column_names]
+
+
+def load_event_dataframe(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    **read_csv_kwargs,
+) -> pd.DataFrame:
+    """Load an event export, CSV or Parquet.
+
+    Parquet is detected by the `.parquet` suffix.
+
+    :param path:
+        Output file or Parquet dataset directory of an exporter
+
+    :param columns:
+        Columns to read. Read all columns by default.
+
+    :param read_csv_kwargs:
+        Extra arguments passed to :py:func:`pandas.read_csv` for CSV files
+    """
+    if str(path).endswith(".parquet"):
+        return read_parquet_events(path, columns)
+    return pd.read_csv(path, usecols=columns, **read_csv_kwargs)
@@ -0,0 +1,128 @@
+"""Block timestamp extraction for the event reader.
+
+:py:func:`eth_defi.event_reader.reader.extract_timestamps_json_rpc` fetches a header
+for every block in the scanned chunk, even if the block has no matching logs.
+Extractors in this module only receive the block numbers that actually carry logs
+and fetch their headers using JSON-RPC batch requests.
+
+Example:
+
+.. code-block:: python
+
+    for log_result in read_events_concurrent(
+        executor,
+        start_block,
+        end_block,
+        events,
+        None,
+        chunk_size=100,
+        context=token_cache,
+        extract_timestamps=JSONRPCBatchTimestampExtractor(),
+    ):
+        ...
+
+"""
+import abc
+import logging
+from typing import Collection, Dict, List
+
+from web3 import Web3
+
+from eth_defi.batch import BatchCall, BatchResult, batch_request
+from eth_defi.batch_async import batch_request as batch_request_async
+
+logger = logging.getLogger(__name__)
+
+
+class BlockTimestampExtractor(abc.ABC):
+    """Look up block timestamps for the blocks that have logs.
+
+    Pass an instance as `extract_timestamps` argument of
+    :py:func:`eth_defi.event_reader.reader.read_events`,
+    :py:func:`eth_defi.event_reader.reader.read_events_concurrent`
+    or :py:func:`eth_defi.event_reader.reader_async.read_events`.
+
+    Unlike plain timestamp extractor functions, which are called with the whole block range of a chunk,
+    the reader calls the extractor only with the distinct block numbers found in the `eth_getLogs` result.
+    """
+
+    @abc.abstractmethod
+    def fetch_timestamps(self, web3: Web3, block_numbers: Collection[int]) -> Dict[int, int]:
+        """Get timestamps for blocks.
+
+        :param web3:
+            Web3 connection of the calling worker
+
+        :param block_numbers:
+            Distinct block numbers we need timestamps for
+
+        :return:
+            block number -> UNIX timestamp mapping
+        """
+
+    async def fetch_timestamps_async(self, web3: Web3, block_numbers: Collection[int]) -> Dict[int, int]:
+        """Get timestamps for blocks using an async Web3 connection.
+
+        :return:
+            block number -> UNIX timestamp mapping
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support async Web3")
+
+
+class JSONRPCBatchTimestampExtractor(BlockTimestampExtractor):
+    """Fetch block headers as JSON-RPC batch requests.
+
+    - One HTTP request per `batch_size` blocks instead of a request per block
+
+    - For the async Web3 the batches are sent concurrently
+
+    - If the provider is not HTTP based, or the node refuses batch requests,
+      fall back to one `eth_getBlockByNumber` call per block
+    """
+
+    def __init__(self, batch_size: int = 100):
+        """
+        :param batch_size:
+            How many block headers to ask in a single batch request
+        """
+        assert batch_size > 0
+        self.batch_size = batch_size
+
+    def fetch_timestamps(self, web3: Web3, block_numbers: Collection[int]) -> Dict[int, int]:
+        block_numbers = sorted(block_numbers)
+        results = batch_request(web3, _get_header_calls(block_numbers), batch_size=self.batch_size)
+        return _extract_timestamps(block_numbers, _get_headers(block_numbers, results))
+
+    async def fetch_timestamps_async(self, web3: Web3, block_numbers: Collection[int]) -> Dict[int, int]:
+        block_numbers = sorted(block_numbers)
+        results = await batch_request_async(web3, _get_header_calls(block_numbers), batch_size=self.batch_size)
+        return _extract_timestamps(block_numbers, _get_headers(block_numbers, results))
+
+
+def get_log_block_numbers(logs: List[dict]) -> Collection[int]:
+    """Get distinct block numbers of raw `eth_getLogs` results."""
+    return {int(log["blockNumber"], 16) for log in logs}
+
+
+def _get_header_calls(block_numbers: List[int]) -> List[BatchCall]:
+    return [("eth_getBlockByNumber", (hex(block_number), False)) for block_number in block_numbers]
+
+
+def _get_headers(block_numbers: List[int], results: List[BatchResult]) -> List[dict]:
+    headers = []
+    for block_number, r in zip(block_numbers, results):
+        if not r.ok:
+            raise RuntimeError(f"Could not fetch block header for block {block_number:,}: {r.error}")
+        headers.append(r.result)
+    return headers
+
+
+def _extract_timestamps(block_numbers: List[int], headers: List[dict]) -> Dict[int, int]:
+    timestamps = {}
+    for block_number, header in zip(block_numbers, headers):
+        assert header is not None, f"Node does not have block {block_number:,}"
+        data_block_number = header["number"]
+        assert type(data_block_number) == str, "Some automatic data conversion occured from JSON-RPC data. Make sure that you have cleared middleware onion for web3"
+        assert int(data_block_number, 16) == block_number
+        timestamps[block_number] = int(header["timestamp"], 16)
+    return timestamps
@@ -0,0 +1,318 @@
+"""Persistent block timestamp store.
+
+Block timestamps never change once the block is final,
+but every scan would fetch them again from the JSON-RPC node.
+:py:class:`BlockTimestampStore` keeps them on a disk in memory-mapped files,
+so rescanning the same block range needs no block header requests.
+
+- Timestamps are stored as `uint32` array indexed by the block number
+
+- A bitmap tells which slots are filled
+
+- The store is split to fixed size segment files, created as sparse files,
+  so a chain with tens of millions blocks takes only the disk space of the blocks we have seen
+
+- Lookups do not take any locks and can be done by any number of threads
+  and processes having the same store open
+
+- Writes take a thread lock and an advisory file lock (on POSIX),
+  so multiple processes can fill the same store
+
+- :py:class:`BlockDataStore` is the generic fixed size value store,
+  also used for the header blooms in :py:mod:`eth_defi.event_reader.bloom`
+
+Example:
+
+.. code-block:: python
+
+    store = BlockTimestampStore.open_chain("/tmp/block-timestamps", chain_id=1)
+    extract_timestamps = StoredTimestampExtractor(store)
+
+    for log_result in read_events_concurrent(
+        executor,
+        start_block,
+        end_block,
+        events,
+        None,
+        chunk_size=100,
+        context=token_cache,
+        extract_timestamps=extract_timestamps,
+    ):
+        ...
+
+.. note ::
+
+    Timestamps are stored as they are returned for the block number.
+    Only scan finalised blocks with a store, as a chain reorganisation
+    near the chain tip may change the timestamp of a block number.
+
+"""
+import logging
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Tuple, Union
+
+from web3 import Web3
+
+from eth_defi.event_reader.timestamp import BlockTimestampExtractor, JSONRPCBatchTimestampExtractor
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+#: How many blocks are stored in a single segment file.
+#:
+#: 4 MB timestamps + 125 kB bitmap per file.
+DEFAULT_SEGMENT_SIZE = 1_000_000
+
+
+class _Segment:
+    """One memory-mapped segment file.
+
+    Fixed size items followed by the bitmap of the filled slots.
+    """
+
+    def __init__(self, path: Path, segment_size: int, item_size: int, item_format: Optional[str]):
+        self.path = path
+        self.segment_size = segment_size
+        self.item_size = item_size
+        self.item_format = item_format
+        file_size = segment_size * item_size + segment_size // 8
+
+        self.file = open(path, "a+b")
+        if os.fstat(self.file.fileno()).st_size < file_size:
+            # Sparse file, unwritten pages do not take disk space.
+            # Growing the file from multiple processes is safe, as they truncate to the same size.
+            self.file.truncate(file_size)
+
+        self.mmap = mmap.mmap(self.file.fileno(), file_size)
+        self.items = memoryview(self.mmap)[0 : segment_size * item_size]
+        if item_format:
+            self.items = self.items.cast(item_format)
+        self.bitmap = memoryview(self.mmap)[segment_size * item_size :]
+
+    def get(self, offset: int):
+        if self.bitmap[offset >> 3] & (1 << (offset & 7)):
+            if self.item_format:
+                return self.items[offset]
+            return bytes(self.items[offset * self.item_size : (offset + 1) * self.item_size])
+        return None
+
+    def set(self, offset: int, value):
+        # Write the value before marking the slot filled,
+        # so lock-free readers never see a filled slot without a value
+        if self.item_format:
+            self.items[offset] = value
+        else:
+            self.items[offset * self.item_size : (offset + 1) * self.item_size] = value
+        self.bitmap[offset >> 3] |= 1 << (offset & 7)
+
+    def flush(self):
+        self.mmap.flush()
+
+    def close(self):
+        self.items.release()
+        self.bitmap.release()
+        self.mmap.close()
+        self.file.close()
+
+
+class BlockDataStore:
+    """Memory-mapped block number -> fixed size value store for a single chain.
+
+    Thread safe. Multiple processes can open the same store.
+
+    Subclasses set the item layout.
+    """
+
+    #: Bytes per block
+    item_size: int
+
+    #: :py:class:`memoryview` format of an item, or `None` for raw bytes
+    item_format: Optional[str]
+
+    #: Segment file name suffix
+    file_suffix: str
+
+    def __init__(self, path: Union[str, Path], segment_size: int = DEFAULT_SEGMENT_SIZE):
+        """
+        :param path:
+            Folder where the segment files are stored.
+            Use a separate folder for each chain.
+
+        :param segment_size:
+            How many blocks are stored in a single file.
+            Must be the same for all users of the folder.
+        """
+        assert segment_size > 0 and segment_size % 8 == 0, f"Bad segment size {segment_size}"
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.segments: Dict[int, _Segment] = {}
+        self.lock = threading.RLock()
+
+    @classmethod
+    def open_chain(cls, base_path: Union[str, Path], chain_id: int, segment_size: Optional[int] = None) -> "BlockDataStore":
+        """Open the store of a chain in a shared folder.
+
+        :param base_path:
+            Folder holding the stores of all chains
+
+        :param chain_id:
+            Chain id, e.g. `1` for Ethereum mainnet
+        """
+        if segment_size is None:
+            return cls(Path(base_path) / str(chain_id))
+        return cls(Path(base_path) / str(chain_id), segment_size)
+
+    def _get_segment(self, segment_id: int) -> _Segment:
+        segment = self.segments.get(segment_id)
+        if segment is None:
+            with self.lock:
+                segment = self.segments.get(segment_id)
+                if segment is None:
+                    segment = _Segment(self.path / f"{segment_id:06d}.{self.file_suffix}", self.segment_size, self.item_size, self.item_format)
+                    self.segments[segment_id] = segment
+        return segment
+
+    def get(self, block_number: int) -> Optional[Any]:
+        """Get a stored value.
+
+        :return:
+            The value or `None` if the block is not in the store
+        """
+        segment_id, offset = divmod(block_number, self.segment_size)
+        return self._get_segment(segment_id).get(offset)
+
+    def get_many(self, block_numbers: Collection[int]) -> Tuple[Dict[int, Any], List[int]]:
+        """Look up multiple values.
+
+        :return:
+            Tuple (found block number -> value mapping, missing block numbers)
+        """
+        found = {}
+        missing = []
+        for block_number in block_numbers:
+            value = self.get(block_number)
+            if value is None:
+                missing.append(block_number)
+            else:
+                found[block_number] = value
+        return found, missing
+
+    def validate(self, block_number: int, value: Any):
+        """Check a value fits the store before writing it."""
+
+    def update(self, values: Dict[int, Any]):
+        """Write new values to the store.
+
+        :param values:
+            Block number -> value mapping
+        """
+        if not values:
+            return
+
+        with self.lock, _FileLock(self.path / "write.lock"):
+            for block_number, value in values.items():
+                self.validate(block_number, value)
+                segment_id, offset = divmod(block_number, self.segment_size)
+                self._get_segment(segment_id).set(offset, value)
+
+        logger.debug("Stored %d block %s", len(values), self.file_suffix)
+
+    def flush(self):
+        """Flush written values to the disk."""
+        with self.lock:
+            for segment in self.segments.values():
+                segment.flush()
+
+    def close(self):
+        """Flush and close all the segment files."""
+        with self.lock:
+            for segment in self.segments.values():
+                segment.flush()
+                segment.close()
+            self.segments = {}
+
+    def __len__(self) -> int:
+        """How many blocks have a value stored in the opened segments."""
+        return sum(bin(int.from_bytes(s.bitmap, "little")).count("1") for s in self.segments.values())
+
+
+class BlockTimestampStore(BlockDataStore):
+    """Memory-mapped block number -> UNIX timestamp store for a single chain.
+
+    Thread safe. Multiple processes can open the same store.
+    """
+
+    item_size = 4
+    item_format = "I"
+    file_suffix = "timestamps"
+
+    def validate(self, block_number: int, value: int):
+        assert 0 <= value < 2**32, f"Timestamp {value} for block {block_number:,} does not fit uint32"
+
+
+class StoredTimestampExtractor(BlockTimestampExtractor):
+    """Serve block timestamps from a :py:class:`BlockTimestampStore`.
+
+    Pass as `extract_timestamps` argument to the event readers.
+    Blocks missing from the store are fetched in batches
+    and written to the store.
+    """
+
+    def __init__(self, store: BlockTimestampStore, fetcher: Optional[BlockTimestampExtractor] = None):
+        """
+        :param store:
+            Persistent store of a chain we are scanning
+
+        :param fetcher:
+            How to fetch the missing timestamps.
+            Defaults to :py:class:`eth_defi.event_reader.timestamp.JSONRPCBatchTimestampExtractor`.
+        """
+        self.store = store
+        self.fetcher = fetcher or JSONRPCBatchTimestampExtractor()
+
+    def fetch_timestamps(self, web3: Web3, block_numbers: Collection[int]) -> Dict[int, int]:
+        found, missing = self.store.get_many(block_numbers)
+        if missing:
+            fetched = self.fetcher.fetch_timestamps(web3, missing)
+            self.store.update(fetched)
+            found.update(fetched)
+        return found
+
+    async def fetch_timestamps_async(self, web3: Web3, block_numbers: Collection[int]) -> Dict[int, int]:
+        found, missing = self.store.get_many(block_numbers)
+        if missing:
+            fetched = await self.fetcher.fetch_timestamps_async(web3, missing)
+            self.store.update(fetched)
+            found.update(fetched)
+        return found
+
+
+class _FileLock:
+    """Advisory inter-process lock for the writers."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, "a")
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.file is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
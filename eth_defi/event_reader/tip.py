@@ -0,0 +1,303 @@
+"""Chain tip log follower with chain reorganisation detection.
+
+Live feeds that re-read a fixed number of recent blocks on every poll
+pay for the same `eth_getLogs` over and over, and still miss
+reorganisations deeper than the lookback window.
+:py:class:`ChainTipFollower` instead
+
+- Remembers the hashes of the recently read blocks in a small ring buffer
+
+- Reads only the new blocks on each poll, with their headers in one JSON-RPC batch
+
+- Checks that each new block builds on the block we have read before it.
+  On a parent hash mismatch it walks back the remembered blocks to find the fork point.
+
+- Tells about the rolled back blocks with :py:class:`ChainRollback`
+  and returns the logs of those blocks again with `removed=True`,
+  the same way `eth_subscribe("logs")` does
+
+Consumers can undo the rolled back blocks without rescanning,
+see :py:meth:`eth_defi.price_oracle.oracle.PriceOracle.rollback`.
+
+Example:
+
+.. code-block:: python
+
+    filter = Filter.create_filter(pair_address, [Pair.events.Sync])
+    follower = ChainTipFollower(web3, filter)
+
+    while True:
+        update = follower.poll()
+        if update.rollback:
+            oracle.rollback(update.rollback.last_valid_block)
+        for log in update.logs:
+            ...
+        time.sleep(1)
+
+"""
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+from eth_defi.batch import batch_request
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.logresult import LogContext, LogResult
+from eth_defi.event_reader.raw_json_rpc import make_raw_request
+
+logger = logging.getLogger(__name__)
+
+
+class ChainReorganisationTooDeep(Exception):
+    """None of the remembered blocks is on the canonical chain anymore.
+
+    Increase `history_size` of :py:class:`ChainTipFollower`
+    or rescan the affected blocks.
+    """
+
+
+@dataclass
+class BlockRecord:
+    """A block read by :py:class:`ChainTipFollower`."""
+
+    block_number: int
+
+    block_hash: str
+
+    parent_hash: str
+
+    #: UNIX timestamp
+    timestamp: int
+
+
+@dataclass
+class ChainRollback:
+    """The chain was reorganised and the blocks we had read were replaced."""
+
+    #: The newest block that is still on the canonical chain.
+    #: All blocks after this were rolled back.
+    last_valid_block: int
+
+    #: The rolled back blocks, the oldest first
+    removed_blocks: List[BlockRecord]
+
+
+@dataclass
+class TipUpdate:
+    """The result of :py:meth:`ChainTipFollower.poll`."""
+
+    #: Set if the chain was reorganised since the last poll.
+    #: The rollback is applied before the new logs.
+    rollback: Optional[ChainRollback]
+
+    #: Logs of the rolled back blocks with `removed=True`, the newest first
+    removed_logs: List[LogResult]
+
+    #: Logs of the new blocks in the block order
+    logs: List[LogResult]
+
+    #: The newest block read so far
+    tip: Optional[BlockRecord]
+
+
+class ChainTipFollower:
+    """Read logs from new blocks as they appear at the chain tip.
+
+    Call :py:meth:`poll` periodically.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        filter: Filter,
+        start_block: Optional[int] = None,
+        context: Optional[LogContext] = None,
+        history_size: int = 128,
+        max_blocks_per_poll: int = 1000,
+    ):
+        """
+        :param web3:
+            Web3 connection. Middlewares should be cleared, as the headers and logs are read raw.
+
+        :param filter:
+            Logs to read
+
+        :param start_block:
+            The first block to read.
+            If not given, start from the chain tip at the first poll.
+
+        :param context:
+            Passed to all logs
+
+        :param history_size:
+            How many recent blocks to remember to detect and roll back reorganisations.
+            Reorganisations deeper than this raise :py:class:`ChainReorganisationTooDeep`.
+
+        :param max_blocks_per_poll:
+            Read at most this many blocks in one poll, so catching up with the chain
+            does not turn into one huge request.
+        """
+        assert history_size > 0
+        assert max_blocks_per_poll > 0
+        self.web3 = web3
+        self.filter = filter
+        self.context = context
+        self.history_size = history_size
+        self.max_blocks_per_poll = max_blocks_per_poll
+
+        # The next block to read
+        self.next_block = start_block
+
+        # Recently read blocks, the oldest first
+        self.blocks: Deque[BlockRecord] = deque()
+
+        # Block number -> logs of the remembered blocks
+        self.block_logs: Dict[int, List[LogResult]] = {}
+
+    def get_tip(self) -> Optional[BlockRecord]:
+        """The newest block read so far."""
+        if self.blocks:
+            return self.blocks[-1]
+        return None
+
+    def poll(self) -> TipUpdate:
+        """Read the blocks that have appeared since the last poll.
+
+        :raise ChainReorganisationTooDeep:
+            If the fork point is older than the remembered blocks
+        """
+        head = int(make_raw_request(self.web3, "eth_blockNumber", []), 16)
+        if self.next_block is None:
+            self.next_block = head
+
+        rollback = None
+        removed_logs = []
+
+        while True:
+            headers = self._fetch_headers(self.next_block, min(head, self.next_block + self.max_blocks_per_poll - 1))
+            if not headers:
+                return TipUpdate(rollback, removed_logs, [], self.get_tip())
+
+            tip = self.get_tip()
+            if tip is None or headers[0]["parentHash"] == tip.block_hash:
+                break
+
+            # The chain can be reorganised again while we roll back
+            new_rollback, logs = self._roll_back()
+            if rollback is not None:
+                new_rollback.removed_blocks += rollback.removed_blocks
+            rollback = new_rollback
+            removed_logs += logs
+
+        headers = self._get_linked(headers)
+        logs = self._fetch_logs(headers)
+
+        for header in headers:
+            block = BlockRecord(
+                block_number=int(header["number"], 16),
+                block_hash=header["hash"],
+                parent_hash=header["parentHash"],
+                timestamp=int(header["timestamp"], 16),
+            )
+            self.blocks.append(block)
+            self.block_logs[block.block_number] = []
+
+        for log in logs:
+            self.block_logs[int(log["blockNumber"], 16)].append(log)
+
+        while len(self.blocks) > self.history_size:
+            forgotten = self.blocks.popleft()
+            del self.block_logs[forgotten.block_number]
+
+        self.next_block += len(headers)
+
+        return TipUpdate(rollback, removed_logs, logs, self.get_tip())
+
+    def _fetch_headers(self, first_block: int, last_block: int) -> List[dict]:
+        if first_block > last_block:
+            return []
+        block_numbers = range(first_block, last_block + 1)
+        results = batch_request(self.web3, [("eth_getBlockByNumber", (hex(block_number), False)) for block_number in block_numbers], raise_on_error=True)
+        headers = []
+        for block_number, r in zip(block_numbers, results):
+            header = r.result
+            # A load balanced node may not have seen the block yet
+            if header is None:
+                break
+            assert type(header["number"]) == str, "Some automatic data conversion occured from JSON-RPC data. Make sure that you have cleared middleware onion for web3"
+            assert int(header["number"], 16) == block_number
+            headers.append(header)
+        return headers
+
+    def _get_linked(self, headers: List[dict]) -> List[dict]:
+        """Drop the headers after a broken parent link.
+
+        The chain was reorganised between the header reads of the batch.
+        The rest of the blocks are read again on the next poll.
+        """
+        for idx in range(1, len(headers)):
+            if headers[idx]["parentHash"] != headers[idx - 1]["hash"]:
+                logger.info("Block %d does not build on the block before it, reading it again on the next poll", int(headers[idx]["number"], 16))
+                return headers[:idx]
+        return headers
+
+    def _fetch_logs(self, headers: List[dict]) -> List[LogResult]:
+        """Read the logs of the new blocks.
+
+        If a log comes from a different block than the header we have, the chain was reorganised
+        between the header and log reads. The headers from that block onwards are dropped
+        and read again on the next poll.
+        """
+        first_block = int(headers[0]["number"], 16)
+        last_block = int(headers[-1]["number"], 16)
+
+        filter_params = {
+            "topics": [list(self.filter.topics.keys())],
+            "fromBlock": hex(first_block),
+            "toBlock": hex(last_block),
+        }
+
+        if self.filter.contract_address:
+            filter_params["address"] = self.filter.contract_address
+
+        raw_logs = make_raw_request(self.web3, "eth_getLogs", (filter_params,))
+
+        logs = []
+        for log in raw_logs:
+            block_number = int(log["blockNumber"], 16)
+            header = headers[block_number - first_block]
+            if log["blockHash"] != header["hash"]:
+                logger.info("Log of block %d is from a different fork than the header, reading the block again on the next poll", block_number)
+                del headers[block_number - first_block :]
+                break
+            log["context"] = self.context
+            log["event"] = self.filter.topics[log["topics"][0]]
+            log["timestamp"] = int(header["timestamp"], 16)
+            logs.append(log)
+
+        return logs
+
+    def _roll_back(self) -> Tuple[ChainRollback, List[LogResult]]:
+        """Find the fork point and forget the blocks after it."""
+        block_numbers = [block.block_number for block in self.blocks]
+        results = batch_request(self.web3, [("eth_getBlockByNumber", (hex(block_number), False)) for block_number in block_numbers], raise_on_error=True)
+        canonical = {block_number: r.result["hash"] for block_number, r in zip(block_numbers, results) if r.result is not None}
+
+        removed_blocks = []
+        removed_logs = []
+        while self.blocks and canonical.get(self.blocks[-1].block_number) != self.blocks[-1].block_hash:
+            block = self.blocks.pop()
+            removed_blocks.append(block)
+            removed_logs += [dict(log, removed=True) for log in reversed(self.block_logs.pop(block.block_number))]
+
+        if not self.blocks:
+            raise ChainReorganisationTooDeep(f"None of the {len(removed_blocks)} remembered blocks {removed_blocks[-1].block_number:,} - {removed_blocks[0].block_number:,} is on the canonical chain")
+
+        last_valid_block = self.blocks[-1].block_number
+        removed_blocks.reverse()
+        logger.warning("Chain reorganisation, rolling back %d blocks to block %d", len(removed_blocks), last_valid_block)
+
+        self.next_block = last_valid_block + 1
+        return ChainRollback(last_valid_block, removed_blocks), removed_logs
@@ -1,7 +1,7 @@
 """Web3 connection factory."""
 
 # For typing.Protocol see https://stackoverflow.com/questions/68472236/type-hint-for-callable-that-takes-kwargs
-from typing import Protocol
+from typing import Optional, Protocol
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -9,6 +9,8 @@ from web3 import HTTPProvider, Web3
 
 from eth_defi.event_reader.fast_json_rpc import patch_web3
 from eth_defi.event_reader.logresult import LogContext
+from eth_defi.event_reader.provider_pool import PooledJSONRPCProvider, ProviderPool
+from eth_defi.event_reader.raw_json_rpc import RawJSONRPCProvider
 from eth_defi.middleware import http_retry_request_with_sleep_middleware
 
 
@@ -25,9 +27,22 @@ class Web3Factory(Protocol):
 class TunedWeb3Factory(Web3Factory):
     """Create a connection"""
 
-    def __init__(self, json_rpc_url: str, http_adapter: HTTPAdapter):
+    def __init__(self, json_rpc_url: str, http_adapter: HTTPAdapter, raw_json_rpc: bool = False):
+        """
+        :param json_rpc_url:
+            JSON-RPC HTTP(S) URL
+
+        :param http_adapter:
+            Connection pool shared by the created connections
+
+        :param raw_json_rpc:
+            Use :py:class:`eth_defi.event_reader.raw_json_rpc.RawJSONRPCProvider`,
+            so that the event reader `eth_getLogs` and `eth_getBlockByNumber` calls
+            bypass web3.py request manager.
+        """
         self.json_rpc_url = json_rpc_url
         self.http_adapter = http_adapter
+        self.raw_json_rpc = raw_json_rpc
 
     def __call__(self, context: LogContext) -> Web3:
         """Create a new Web3 connection.
@@ -37,16 +52,48 @@ class TunedWeb3Factory(Web3Factory):
         - Patch for ujson
         """
 
-        # Reuse HTTPS session for HTTP 1.1 keep-alive
-        session = requests.Session()
-        session.mount("https://", self.http_adapter)
+        if self.raw_json_rpc:
+            # Has its own keep-alive session and ujson decoding
+            web3 = Web3(RawJSONRPCProvider(self.json_rpc_url, self.http_adapter))
+        else:
+            # Reuse HTTPS session for HTTP 1.1 keep-alive
+            session = requests.Session()
+            session.mount("https://", self.http_adapter)
 
-        web3 = Web3(HTTPProvider(self.json_rpc_url, session=session))
+            web3 = Web3(HTTPProvider(self.json_rpc_url, session=session))
 
-        # Enable faster ujson reads
-        patch_web3(web3)
+            # Enable faster ujson reads
+            patch_web3(web3)
 
         web3.middleware_onion.clear()
         web3.middleware_onion.inject(http_retry_request_with_sleep_middleware, layer=0)
 
         return web3
+
+
+class PooledWeb3Factory(Web3Factory):
+    """Create connections sharing a multi-endpoint provider pool.
+
+    See :py:mod:`eth_defi.event_reader.provider_pool`.
+    """
+
+    def __init__(self, pool: ProviderPool, http_adapter: Optional[HTTPAdapter] = None):
+        """
+        :param pool:
+            Endpoints and their health, shared by all the created connections
+
+        :param http_adapter:
+            Connection pool shared by the created connections
+        """
+        self.pool = pool
+        self.http_adapter = http_adapter
+
+    def __call__(self, context: LogContext) -> Web3:
+        """Create a new Web3 connection.
+
+        The provider fails over between the endpoints by itself,
+        so no retry middleware is installed.
+        """
+        web3 = Web3(PooledJSONRPCProvider(self.pool, self.http_adapter))
+        web3.middleware_onion.clear()
+        return web3
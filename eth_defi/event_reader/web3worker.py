@@ -2,10 +2,12 @@
 
 import logging
 import threading
+from typing import Optional
 
 import futureproof
 from web3 import Web3
 
+from eth_defi.event_reader.concurrency import AIMDConcurrencyLimiter
 from eth_defi.event_reader.logresult import LogContext
 from eth_defi.event_reader.web3factory import Web3Factory
 
@@ -24,17 +26,41 @@ def get_worker_web3() -> Web3:
     return _thread_local_storage.web3
 
 
-def create_thread_pool_executor(factory: Web3Factory, context: LogContext, max_workers=16) -> futureproof.ThreadPoolExecutor:
+def get_worker_concurrency_limiter() -> Optional[AIMDConcurrencyLimiter]:
+    """Get the concurrency limiter shared by the workers, if any."""
+    return getattr(_thread_local_storage, "concurrency_limiter", None)
+
+
+def create_thread_pool_executor(
+    factory: Web3Factory,
+    context: LogContext,
+    max_workers: Optional[int] = None,
+    concurrency_limiter: Optional[AIMDConcurrencyLimiter] = None,
+) -> futureproof.ThreadPoolExecutor:
     """Create a thread pool executor.
 
     All pool members have the thread locals initialized at start,
     so that there is Web3 connection available.
+
+    :param max_workers:
+        How many worker threads.
+        Defaults to 16, or to the maximum limit of the concurrency limiter.
+
+    :param concurrency_limiter:
+        Adapt the number of block ranges read at a time to the JSON-RPC node capacity.
+        The limiter is available as `concurrency_limiter` attribute of the executor.
+        See :py:mod:`eth_defi.event_reader.concurrency`.
     """
 
+    if max_workers is None:
+        max_workers = concurrency_limiter.max_limit if concurrency_limiter is not None else 16
+
     def init():
         _thread_local_storage.web3 = factory(context)
+        _thread_local_storage.concurrency_limiter = concurrency_limiter
         logger.debug("Worker thread %d initialized", threading.get_ident())
 
     executor = futureproof.ThreadPoolExecutor(max_workers=max_workers, initializer=init)
+    executor.concurrency_limiter = concurrency_limiter
 
     return executor
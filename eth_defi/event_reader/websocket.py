@@ -0,0 +1,305 @@
+"""Live event reader using websocket log subscriptions.
+
+HTTP polling reads new logs at best once per poll interval.
+:py:class:`WebSocketLogReader` subscribes to `eth_subscribe("logs")` instead,
+so the node pushes the logs as soon as it sees a new block.
+
+- Logs are yielded as :py:class:`eth_defi.event_reader.logresult.LogResult` dicts
+  with `context`, `event` and `timestamp` filled in, like the HTTP readers do
+
+- On a disconnect the reader reconnects with exponential back off, subscribes again
+  and reads the logs of the missed blocks with `eth_getLogs`, so no log is lost
+
+- Logs the node retracts in a chain reorganisation are yielded with `removed=True`
+
+The same websocket connection is used for the subscription,
+the missed block backfill and the block header reads for timestamps.
+
+Example:
+
+.. code-block:: python
+
+    filter = Filter.create_filter(pair_address, [Pair.events.Sync])
+    reader = WebSocketLogReader("wss://bsc-ws-node.nariox.org:443", filter)
+
+    async for log in reader:
+        if log["removed"]:
+            ...
+        else:
+            ...
+
+.. note ::
+
+    Needs `websockets` package, installed as a dependency of web3.py.
+
+.. note ::
+
+    Logs retracted while the connection was down are not reported as removed.
+    Use :py:class:`eth_defi.event_reader.tip.ChainTipFollower` if every reorganisation must be seen.
+
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import ujson
+import websockets
+
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.logresult import LogContext, LogResult
+
+logger = logging.getLogger(__name__)
+
+
+#: Errors after which we reconnect
+CONNECTION_ERRORS = (websockets.exceptions.WebSocketException, OSError, asyncio.TimeoutError)
+
+
+class _WebSocketJSONRPC:
+    """JSON-RPC over a single websocket connection.
+
+    Responses are matched to the requests by their id.
+    Subscription notifications go to a queue.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.next_id = 1
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.notifications: asyncio.Queue = asyncio.Queue()
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    async def request(self, method: str, params: List[Any]) -> Any:
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        await self.websocket.send(ujson.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+        return await future
+
+    async def get_notification(self) -> dict:
+        """Wait for the next subscription notification.
+
+        :raise websockets.exceptions.ConnectionClosed:
+            When the connection is lost
+        """
+        notification = await self.notifications.get()
+        if isinstance(notification, Exception):
+            raise notification
+        return notification
+
+    async def _receive(self):
+        try:
+            async for message in self.websocket:
+                data = ujson.loads(message)
+                if data.get("method") == "eth_subscription":
+                    self.notifications.put_nowait(data["params"])
+                    continue
+
+                future = self.pending.pop(data.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in data:
+                    # Web3.py raises JSON-RPC errors as ValueError
+                    future.set_exception(ValueError(data["error"]))
+                else:
+                    future.set_result(data.get("result"))
+
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        except Exception as e:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            self.pending.clear()
+            self.notifications.put_nowait(e)
+
+    async def close(self):
+        self.receiver.cancel()
+        await self.websocket.close()
+
+
+class WebSocketLogReader:
+    """Stream logs of a filter from a websocket JSON-RPC endpoint.
+
+    Iterate the reader with `async for`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        filter: Filter,
+        context: Optional[LogContext] = None,
+        start_block: Optional[int] = None,
+        extract_timestamps: bool = True,
+        backfill_chunk_size: int = 1000,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        timestamp_cache_size: int = 256,
+    ):
+        """
+        :param url:
+            Websocket JSON-RPC URL, `ws://` or `wss://`
+
+        :param filter:
+            Logs to subscribe to
+
+        :param context:
+            Passed to all logs
+
+        :param start_block:
+            Read the logs from this block onwards with `eth_getLogs` before the live logs.
+            If not given, only the logs of the blocks after connecting are yielded.
+
+        :param extract_timestamps:
+            Read the block headers to fill in the log timestamps.
+            Otherwise timestamps are `None`.
+
+        :param backfill_chunk_size:
+            Block range of `eth_getLogs` calls when reading the missed blocks
+
+        :param reconnect_delay:
+            Seconds to wait before the first reconnect attempt, doubled after every failed attempt
+
+        :param max_reconnect_delay:
+            The maximum seconds between reconnect attempts
+
+        :param timestamp_cache_size:
+            How many block timestamps to remember
+        """
+        assert backfill_chunk_size > 0
+        self.url = url
+        self.filter = filter
+        self.context = context
+        self.extract_timestamps = extract_timestamps
+        self.backfill_chunk_size = backfill_chunk_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.timestamp_cache_size = timestamp_cache_size
+
+        #: The newest block we have yielded logs for,
+        #: or the chain tip when we subscribed.
+        #: Missed blocks are read from here after a reconnect.
+        self.last_block: Optional[int] = start_block - 1 if start_block is not None else None
+
+        #: (block hash, log index) of the yielded logs of :py:attr:`last_block`
+        self.last_block_logs: Set[Tuple[str, str]] = set()
+
+        #: How many times we have connected
+        self.connections = 0
+
+        # Block hash -> UNIX timestamp
+        self.timestamps: OrderedDict[str, int] = OrderedDict()
+
+    def __aiter__(self) -> AsyncIterator[LogResult]:
+        return self.read()
+
+    async def read(self) -> AsyncIterator[LogResult]:
+        """Yield logs forever, reconnecting as needed."""
+        delay = self.reconnect_delay
+        while True:
+            try:
+                websocket = await websockets.connect(self.url, max_size=None)
+            except CONNECTION_ERRORS as e:
+                logger.warning("Could not connect %s: %s, retrying in %f seconds", self.url, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = self.reconnect_delay
+            self.connections += 1
+            connection = _WebSocketJSONRPC(websocket)
+            try:
+                async for log in self._read_connection(connection):
+                    yield log
+            except CONNECTION_ERRORS as e:
+                logger.warning("Lost connection to %s after block %s: %s", self.url, self.last_block, e)
+            finally:
+                await connection.close()
+
+    async def _read_connection(self, connection: _WebSocketJSONRPC) -> AsyncIterator[LogResult]:
+        # Subscribe first, so the logs of the blocks appearing during the backfill are queued
+        subscription_params = {"topics": [list(self.filter.topics.keys())]}
+        if self.filter.contract_address:
+            subscription_params["address"] = self.filter.contract_address
+        subscription_id = await connection.request("eth_subscribe", ["logs", subscription_params])
+
+        head = int(await connection.request("eth_blockNumber", []), 16)
+
+        # Logs yielded by the backfill that may be sent again by the subscription
+        backfilled: Set[Tuple[str, str]] = set()
+
+        if self.last_block is None:
+            self.last_block = head
+        else:
+            # Read the last block again if we may have missed some of its logs
+            backfill_start = self.last_block if self.last_block_logs else self.last_block + 1
+            for first_block in range(backfill_start, head + 1, self.backfill_chunk_size):
+                last_block = min(head, first_block + self.backfill_chunk_size - 1)
+                for log in await self._get_logs(connection, first_block, last_block):
+                    key = (log["blockHash"], log["logIndex"])
+                    if key in self.last_block_logs:
+                        continue
+                    backfilled.add(key)
+                    yield await self._prepare(connection, log)
+
+        while True:
+            notification = await connection.get_notification()
+            if notification["subscription"] != subscription_id:
+                continue
+
+            log = notification["result"]
+            key = (log["blockHash"], log["logIndex"])
+            if not log.get("removed"):
+                if int(log["blockNumber"], 16) > head:
+                    backfilled.clear()
+                elif key in backfilled or key in self.last_block_logs:
+                    continue
+            yield await self._prepare(connection, log)
+
+    async def _get_logs(self, connection: _WebSocketJSONRPC, first_block: int, last_block: int) -> List[dict]:
+        filter_params = {
+            "topics": [list(self.filter.topics.keys())],
+            "fromBlock": hex(first_block),
+            "toBlock": hex(last_block),
+        }
+        if self.filter.contract_address:
+            filter_params["address"] = self.filter.contract_address
+        logger.info("Reading missed logs of blocks %d - %d", first_block, last_block)
+        return await connection.request("eth_getLogs", [filter_params])
+
+    async def _get_timestamp(self, connection: _WebSocketJSONRPC, log: dict) -> Optional[int]:
+        block_hash = log["blockHash"]
+        timestamp = self.timestamps.get(block_hash)
+        if timestamp is not None:
+            return timestamp
+
+        header = await connection.request("eth_getBlockByHash", [block_hash, False])
+        if header is None:
+            # A removed log of a block the node has already forgotten
+            return None
+
+        timestamp = int(header["timestamp"], 16)
+        self.timestamps[block_hash] = timestamp
+        if len(self.timestamps) > self.timestamp_cache_size:
+            self.timestamps.popitem(last=False)
+        return timestamp
+
+    async def _prepare(self, connection: _WebSocketJSONRPC, log: dict) -> LogResult:
+        """Fill in our fields and keep track of the yielded blocks."""
+        log["context"] = self.context
+        log["event"] = self.filter.topics[log["topics"][0]]
+        log["timestamp"] = await self._get_timestamp(connection, log) if self.extract_timestamps else None
+        log.setdefault("removed", False)
+
+        block_number = int(log["blockNumber"], 16)
+        key = (log["blockHash"], log["logIndex"])
+        if log["removed"]:
+            self.last_block_logs.discard(key)
+        elif block_number > self.last_block:
+            self.last_block = block_number
+            self.last_block_logs = {key}
+        elif block_number == self.last_block:
+            self.last_block_logs.add(key)
+
+        return log
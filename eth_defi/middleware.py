@@ -24,6 +24,9 @@ from requests.exceptions import (
 from web3.middleware.exception_retry_request import check_if_retry_on_failure
 from web3.types import RPCEndpoint, RPCResponse
 
+from eth_defi.event_reader.concurrency import report_worker_error, report_worker_latency
+from eth_defi.event_reader.raw_json_rpc import RawJSONRPCProvider
+
 
 logger = logging.getLogger(__name__)
 
@@ -43,27 +46,36 @@ def exception_retry_middleware(
     See :py:func:`http_retry_request_with_sleep_middleware` for usage.
 
     """
-    def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
-        nonlocal sleep
+    def request(method: RPCEndpoint, params: Any) -> RPCResponse:
+        started = time.monotonic()
+        response = make_request(method, params)
+        # Our own providers report the latency of their HTTP requests
+        if not isinstance(getattr(web3, "provider", None), RawJSONRPCProvider):
+            report_worker_latency(time.monotonic() - started)
+        return response
 
+    def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
         # Check if the method is whitelisted
         if check_if_retry_on_failure(method):
+            # Every request starts from the initial sleep
+            delay = sleep
             for i in range(retries):
                 try:
-                    return make_request(method, params)
+                    return request(method, params)
                 # https://github.com/python/mypy/issues/5349
                 except errors as e:  # type: ignore
                     if i < retries - 1:
-                        logger.warning("Encountered JSON-RPC retryable error %s when calling method %s, retrying in %f seconds", e, method, sleep)
-                        time.sleep(sleep)
-                        sleep *= backoff
+                        report_worker_error(e)
+                        logger.warning("Encountered JSON-RPC retryable error %s when calling method %s, retrying in %f seconds", e, method, delay)
+                        time.sleep(delay)
+                        delay *= backoff
                         continue
                     else:
                         raise
             return None
         else:
             try:
-                return make_request(method, params)
+                return request(method, params)
             except Exception as e:
                 # Be verbose so that we know our whitelist is missing methods
                 raise RuntimeError(f"JSON-RPC failed for non-whitelisted method {method}: {e}") from e
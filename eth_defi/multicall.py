@@ -0,0 +1,397 @@
+"""Batched smart contract reads with Multicall.
+
+Read on-chain state with one `eth_call` per many contract function calls
+instead of one `eth_call` per value.
+
+- Calls are packed into Multicall `tryAggregate` calls, so a failing call
+  does not revert the others
+
+- All calls are performed at the same pinned block, even if they need to be split
+  over several `eth_call` requests
+
+- Calls are split by the call count, the calldata size and the gas budget,
+  and an aggregate call the node fails to execute is split further
+
+- Results are ABI decoded and normalised the same way as `ContractFunction.call()` does
+
+Multicall3 is deployed at the same address on most EVM chains
+and is compatible with the bundled Multicall2 ABI `tryAggregate`.
+For local test chains deploy a Multicall contract with :py:func:`deploy_multicall`,
+or use :py:func:`batch_call` that sends plain `eth_call` requests in a JSON-RPC batch.
+
+For the async version see :py:mod:`eth_defi.multicall_async`.
+
+Example:
+
+.. code-block:: python
+
+    token = get_deployed_contract(web3, "ERC20MockDecimals.json", token_address)
+    calls = [
+        token.functions.symbol(),
+        token.functions.decimals(),
+        token.functions.balanceOf(holder),
+    ]
+    symbol, decimals, balance = [r.get() for r in multicall(web3, calls)]
+
+"""
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+from eth_abi.exceptions import DecodingError
+from eth_typing import HexAddress
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3.contract import Contract, ContractFunction
+from web3.exceptions import ContractLogicError
+from web3.types import BlockIdentifier
+
+from eth_defi.abi import get_deployed_contract
+from eth_defi.batch import BatchCall, BatchResult, batch_request
+from eth_defi.deploy import deploy_contract
+
+logger = logging.getLogger(__name__)
+
+
+#: Multicall3 address, the same on most EVM chains.
+#:
+#: See https://www.multicall3.com/deployments
+MULTICALL3_ADDRESS = "0xcA11bde05779D8E3cA5a6c7fAC6Bd7a19dEb0B7F"
+
+#: ABI encoding overhead of a single call in `tryAggregate` calldata:
+#: tuple offset, target address, bytes offset and bytes length
+CALL_ENCODING_OVERHEAD = 4 * 32
+
+#: JSON-RPC error code Geth and compatibles use for reverted `eth_call`
+REVERT_ERROR_CODE = 3
+
+#: JSON-RPC error messages of nodes telling the `eth_call` was executed and failed
+REVERT_ERROR_MESSAGES = (
+    "revert",
+    "vm exception",
+    "invalid opcode",
+    "out of gas",
+    "stack underflow",
+    "invalid jump",
+)
+
+
+class MulticallError(Exception):
+    """A call that was not allowed to fail failed."""
+
+
+@dataclass
+class MulticallCall:
+    """A contract function call in a multicall.
+
+    Bare `ContractFunction` instances are accepted as calls that are allowed to fail.
+    """
+
+    #: Bound contract function, e.g. `token.functions.balanceOf(holder)`
+    function: ContractFunction
+
+    #: If set, a failure of this call is reported in the result.
+    #: Otherwise :py:class:`MulticallError` is raised.
+    allow_failure: bool = True
+
+
+@dataclass
+class MulticallResult:
+    """The outcome of a single call in a multicall."""
+
+    #: The called function
+    function: ContractFunction
+
+    #: Did the call succeed and the return data decode
+    success: bool
+
+    #: Raw return data, or revert data if the call failed
+    return_data: bytes
+
+    #: Did the call revert.
+    #:
+    #: Unsuccessful calls that did not revert returned data
+    #: that could not be decoded with the function ABI.
+    reverted: bool = False
+
+    #: Decoded return value.
+    #:
+    #: A single value for functions with one output, a tuple otherwise.
+    result: Any = None
+
+    #: Human readable failure reason
+    error: Optional[str] = None
+
+    def get(self) -> Any:
+        """Get the decoded return value.
+
+        :raise MulticallError:
+            If the call failed
+        """
+        if not self.success:
+            raise MulticallError(f"Call {self.function} to {self.function.address} failed: {self.error}")
+        return self.result
+
+
+def normalise_calls(calls: Iterable[Union[ContractFunction, MulticallCall]]) -> List[MulticallCall]:
+    return [c if isinstance(c, MulticallCall) else MulticallCall(c) for c in calls]
+
+
+def encode_call(call: MulticallCall) -> Tuple[HexAddress, bytes]:
+    """Encode a call as a `(target, calldata)` tuple of `tryAggregate`."""
+    function = call.function
+    assert function.address, f"Contract function {function} is not bound to a deployed contract"
+    return function.address, HexBytes(function._encode_transaction_data())
+
+
+def split_calls(
+    encoded: List[Tuple[HexAddress, bytes]],
+    max_calls: int,
+    max_calldata_bytes: int,
+    gas_limit: Optional[int] = None,
+    gas_per_call: int = 1_000_000,
+) -> Iterable[Tuple[int, int]]:
+    """Split encoded calls to aggregate calls.
+
+    :return:
+        Iterable of (first index, last index exclusive) ranges
+    """
+    if gas_limit is not None:
+        max_calls = max(1, min(max_calls, gas_limit // gas_per_call))
+
+    start = 0
+    size = 0
+    for idx, (target, data) in enumerate(encoded):
+        call_size = len(data) + CALL_ENCODING_OVERHEAD
+        if idx > start and (idx - start >= max_calls or size + call_size > max_calldata_bytes):
+            yield start, idx
+            start = idx
+            size = 0
+        size += call_size
+    if start < len(encoded):
+        yield start, len(encoded)
+
+
+def decode_result(web3: Web3, call: MulticallCall, success: bool, return_data: bytes) -> MulticallResult:
+    """Decode the return data of a call like `ContractFunction.call()` does."""
+    function = call.function
+    return_data = bytes(return_data)
+
+    if not success:
+        return MulticallResult(function, False, return_data, reverted=True, error="Call reverted")
+
+    output_types = get_abi_output_types(function.abi)
+    try:
+        decoded = web3.codec.decode(output_types, return_data)
+    except (DecodingError, OverflowError) as e:
+        # Empty return data when calling an address without code,
+        # or a token returning bytes32 instead of string
+        return MulticallResult(function, False, return_data, error=f"Could not decode {output_types}: {e}")
+
+    normalizers = itertools.chain(BASE_RETURN_NORMALIZERS, function._return_data_normalizers)
+    normalised = map_abi_data(normalizers, output_types, decoded)
+    result = normalised[0] if len(normalised) == 1 else tuple(normalised)
+    return MulticallResult(function, True, return_data, result=result)
+
+
+def raise_multicall_errors(calls: List[MulticallCall], results: List[MulticallResult]):
+    for call, r in zip(calls, results):
+        if not r.success and not call.allow_failure:
+            r.get()
+
+
+def get_multicall_contract(web3: Web3, address: HexAddress = MULTICALL3_ADDRESS) -> Contract:
+    """Get a proxy to a deployed Multicall contract."""
+    return get_deployed_contract(web3, "Multicall2.json", address)
+
+
+def deploy_multicall(web3: Web3, deployer: HexAddress) -> Contract:
+    """Deploy a Multicall contract.
+
+    For test chains like `eth_tester` and Ganache
+    that do not have Multicall3 deployed.
+
+    .. code-block:: python
+
+        multicall_contract = deploy_multicall(web3, deployer)
+        results = multicall(web3, calls, multicall_address=multicall_contract.address)
+
+    :param web3:
+        Web3 instance
+
+    :param deployer:
+        Deployer account
+
+    :return:
+        The deployed Multicall contract
+    """
+    return deploy_contract(web3, "Multicall2.json", deployer)
+
+
+def _aggregate(
+    web3: Web3,
+    multicall_contract: Contract,
+    calls: List[MulticallCall],
+    encoded: List[Tuple[HexAddress, bytes]],
+    block_identifier: BlockIdentifier,
+    transaction: dict,
+) -> List[MulticallResult]:
+    try:
+        results = multicall_contract.functions.tryAggregate(False, encoded).call(transaction, block_identifier=block_identifier)
+    except (ContractLogicError, ValueError) as e:
+        # Out of gas, response too large, etc.
+        if len(calls) == 1:
+            return [MulticallResult(calls[0].function, False, b"", reverted=True, error=str(e))]
+        half = len(calls) // 2
+        logger.info("Multicall of %d calls failed, splitting: %s", len(calls), e)
+        return _aggregate(web3, multicall_contract, calls[:half], encoded[:half], block_identifier, transaction) + _aggregate(web3, multicall_contract, calls[half:], encoded[half:], block_identifier, transaction)
+
+    return [decode_result(web3, call, success, return_data) for call, (success, return_data) in zip(calls, results)]
+
+
+def multicall(
+    web3: Web3,
+    calls: Sequence[Union[ContractFunction, MulticallCall]],
+    block_identifier: Optional[BlockIdentifier] = None,
+    multicall_address: HexAddress = MULTICALL3_ADDRESS,
+    max_calls: int = 500,
+    max_calldata_bytes: int = 100_000,
+    gas_limit: Optional[int] = None,
+    gas_per_call: int = 1_000_000,
+) -> List[MulticallResult]:
+    """Perform many contract function calls with Multicall.
+
+    :param web3:
+        Web3 connection
+
+    :param calls:
+        Bound contract functions, or :py:class:`MulticallCall` to disallow failures
+
+    :param block_identifier:
+        Block number or hash to perform the calls at.
+        If not given, the calls are pinned to the latest block number.
+
+    :param multicall_address:
+        Address of a deployed Multicall2 or Multicall3 contract
+
+    :param max_calls:
+        Maximum calls in a single `eth_call`
+
+    :param max_calldata_bytes:
+        Maximum encoded calldata of the calls in a single `eth_call`
+
+    :param gas_limit:
+        Gas given to a single `eth_call`.
+        If not given, the node default is used.
+
+    :param gas_per_call:
+        Gas budget of a single call, to split the calls within `gas_limit`
+
+    :return:
+        Results in the order of the calls
+
+    :raise MulticallError:
+        If a call with `allow_failure=False` failed
+    """
+    assert max_calls > 0
+    calls = normalise_calls(calls)
+    if not calls:
+        return []
+
+    if block_identifier is None:
+        block_identifier = web3.eth.block_number
+
+    multicall_contract = get_multicall_contract(web3, multicall_address)
+    transaction = {"gas": gas_limit} if gas_limit is not None else {}
+    encoded = [encode_call(call) for call in calls]
+
+    results = []
+    for start, end in split_calls(encoded, max_calls, max_calldata_bytes, gas_limit, gas_per_call):
+        results += _aggregate(web3, multicall_contract, calls[start:end], encoded[start:end], block_identifier, transaction)
+
+    raise_multicall_errors(calls, results)
+    return results
+
+
+def encode_eth_call(call: MulticallCall, block_identifier: BlockIdentifier) -> BatchCall:
+    """Encode a call as a plain `eth_call` of a JSON-RPC batch."""
+    target, data = encode_call(call)
+    if isinstance(block_identifier, int):
+        block_identifier = hex(block_identifier)
+    elif isinstance(block_identifier, bytes):
+        block_identifier = "0x" + bytes(block_identifier).hex()
+    return "eth_call", ({"to": target, "data": "0x" + bytes(data).hex()}, block_identifier)
+
+
+def is_revert_error(error: Any) -> bool:
+    """Was a JSON-RPC error of `eth_call` caused by the call itself failing.
+
+    Other errors, like rate limits or a node not answering a call of a batch,
+    tell nothing about the call and it may succeed if tried again.
+    """
+    if not isinstance(error, dict):
+        return False
+    if error.get("code") == REVERT_ERROR_CODE or error.get("data"):
+        return True
+    message = str(error.get("message", "")).lower()
+    return any(m in message for m in REVERT_ERROR_MESSAGES)
+
+
+def decode_eth_call_result(web3: Web3, call: MulticallCall, batch_result: BatchResult) -> MulticallResult:
+    """Decode the result of a plain `eth_call` in a JSON-RPC batch.
+
+    :raise ValueError:
+        If the node failed to execute the call for a reason that is not a revert.
+        The argument is the error dict, like web3.py request manager does.
+    """
+    if not batch_result.ok:
+        if not is_revert_error(batch_result.error):
+            raise ValueError(batch_result.error)
+        # Revert data is passed in the error by Geth and compatibles
+        revert_data = batch_result.error.get("data") if isinstance(batch_result.error, dict) else None
+        return MulticallResult(call.function, False, HexBytes(revert_data) if isinstance(revert_data, str) else b"", reverted=True, error=str(batch_result.error))
+    return decode_result(web3, call, True, HexBytes(batch_result.result))
+
+
+def batch_call(
+    web3: Web3,
+    calls: Sequence[Union[ContractFunction, MulticallCall]],
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = 100,
+) -> List[MulticallResult]:
+    """Perform many contract function calls as a JSON-RPC batch of `eth_call`.
+
+    An alternative to :py:func:`multicall` for chains without a Multicall contract.
+    Each call is still executed separately by the node,
+    but they are sent in a few HTTP round trips.
+
+    :param web3:
+        Web3 connection
+
+    :param calls:
+        Bound contract functions, or :py:class:`MulticallCall` to disallow failures
+
+    :param block_identifier:
+        Block number or hash to perform the calls at
+
+    :param batch_size:
+        Maximum calls in a single HTTP request
+
+    :return:
+        Results in the order of the calls
+
+    :raise MulticallError:
+        If a call with `allow_failure=False` failed
+
+    :raise ValueError:
+        If the node did not execute a call, e.g. because of a rate limit.
+        Unlike reverts, these are not reported as failed calls, as the call may succeed later.
+    """
+    calls = normalise_calls(calls)
+    batch_results = batch_request(web3, [encode_eth_call(call, block_identifier) for call in calls], batch_size=batch_size)
+    results = [decode_eth_call_result(web3, call, r) for call, r in zip(calls, batch_results)]
+    raise_multicall_errors(calls, results)
+    return results
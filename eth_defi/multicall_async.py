@@ -0,0 +1,120 @@
+"""Batched smart contract reads with Multicall for async Web3.
+
+The same as :py:mod:`eth_defi.multicall`, but the aggregate calls are performed concurrently.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Sequence, Tuple, Union
+
+from eth_typing import HexAddress
+from web3 import Web3
+from web3.contract import Contract, ContractFunction
+from web3.exceptions import ContractLogicError
+from web3.types import BlockIdentifier
+
+from eth_defi import batch_async
+from eth_defi.deploy_async import deploy_contract
+from eth_defi.multicall import (
+    MULTICALL3_ADDRESS,
+    MulticallCall,
+    MulticallResult,
+    decode_eth_call_result,
+    decode_result,
+    encode_call,
+    encode_eth_call,
+    get_multicall_contract,
+    normalise_calls,
+    raise_multicall_errors,
+    split_calls,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def deploy_multicall(web3: Web3, deployer: HexAddress) -> Contract:
+    """Deploy a Multicall contract.
+
+    See :py:func:`eth_defi.multicall.deploy_multicall`.
+    """
+    return await deploy_contract(web3, "Multicall2.json", deployer)
+
+
+async def _aggregate(
+    web3: Web3,
+    multicall_contract: Contract,
+    calls: List[MulticallCall],
+    encoded: List[Tuple[HexAddress, bytes]],
+    block_identifier: BlockIdentifier,
+    transaction: dict,
+) -> List[MulticallResult]:
+    try:
+        results = await multicall_contract.functions.tryAggregate(False, encoded).call(transaction, block_identifier=block_identifier)
+    except (ContractLogicError, ValueError) as e:
+        if len(calls) == 1:
+            return [MulticallResult(calls[0].function, False, b"", reverted=True, error=str(e))]
+        half = len(calls) // 2
+        logger.info("Multicall of %d calls failed, splitting: %s", len(calls), e)
+        first, second = await asyncio.gather(
+            _aggregate(web3, multicall_contract, calls[:half], encoded[:half], block_identifier, transaction),
+            _aggregate(web3, multicall_contract, calls[half:], encoded[half:], block_identifier, transaction),
+        )
+        return first + second
+
+    return [decode_result(web3, call, success, return_data) for call, (success, return_data) in zip(calls, results)]
+
+
+async def multicall(
+    web3: Web3,
+    calls: Sequence[Union[ContractFunction, MulticallCall]],
+    block_identifier: Optional[BlockIdentifier] = None,
+    multicall_address: HexAddress = MULTICALL3_ADDRESS,
+    max_calls: int = 500,
+    max_calldata_bytes: int = 100_000,
+    gas_limit: Optional[int] = None,
+    gas_per_call: int = 1_000_000,
+) -> List[MulticallResult]:
+    """Perform many contract function calls with Multicall.
+
+    See :py:func:`eth_defi.multicall.multicall` for the parameters.
+
+    :return:
+        Results in the order of the calls
+    """
+    assert web3.eth.is_async, "Needs async Web3"
+    assert max_calls > 0
+    calls = normalise_calls(calls)
+    if not calls:
+        return []
+
+    if block_identifier is None:
+        block_identifier = await web3.eth.block_number
+
+    multicall_contract = get_multicall_contract(web3, multicall_address)
+    transaction = {"gas": gas_limit} if gas_limit is not None else {}
+    encoded = [encode_call(call) for call in calls]
+
+    aggregates = [_aggregate(web3, multicall_contract, calls[start:end], encoded[start:end], block_identifier, transaction) for start, end in split_calls(encoded, max_calls, max_calldata_bytes, gas_limit, gas_per_call)]
+    results = [r for aggregate_results in await asyncio.gather(*aggregates) for r in aggregate_results]
+
+    raise_multicall_errors(calls, results)
+    return results
+
+
+async def batch_call(
+    web3: Web3,
+    calls: Sequence[Union[ContractFunction, MulticallCall]],
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = 100,
+) -> List[MulticallResult]:
+    """Perform many contract function calls as a JSON-RPC batch of `eth_call`.
+
+    See :py:func:`eth_defi.multicall.batch_call` for the parameters.
+
+    :return:
+        Results in the order of the calls
+    """
+    calls = normalise_calls(calls)
+    batch_results = await batch_async.batch_request(web3, [encode_eth_call(call, block_identifier) for call in calls], batch_size=batch_size)
+    results = [decode_eth_call_result(web3, call, r) for call, r in zip(calls, batch_results)]
+    raise_multicall_errors(calls, results)
+    return results
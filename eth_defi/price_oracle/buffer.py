@@ -0,0 +1,140 @@
+"""Time-ordered price entry buffer.
+
+:py:class:`PriceEntryBuffer` is the storage of :py:class:`eth_defi.price_oracle.oracle.PriceOracle`.
+
+- Entries are kept sorted by their timestamp in an array with a moving head,
+  so the oldest and the newest entry are available in constant time
+
+- Live feeds add entries in the time order, which is an append.
+  The rare out-of-order entry is inserted at its place found by bisect.
+
+- Truncating old entries is a bisect and moving the head, `O(log n + k)`
+  for `k` discarded entries. The array is compacted when most of it is discarded.
+"""
+import bisect
+import datetime
+import itertools
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from eth_defi.price_oracle.oracle import PriceEntry
+
+
+#: Do not bother to compact arrays with fewer discarded entries than this
+MIN_COMPACT_SIZE = 1024
+
+
+class PriceEntryBuffer:
+    """Price entries sorted by timestamp.
+
+    Entries with the same timestamp are kept in the order they were added.
+    """
+
+    #: The same entry objects are kept and returned,
+    #: so the oracle can index and update them
+    keeps_entries = True
+
+    def __init__(self):
+        # Timestamps kept separately for bisect,
+        # as bisect key functions need Python 3.10
+        self.timestamps: List[datetime.datetime] = []
+        self.entries: List["PriceEntry"] = []
+
+        # Index of the oldest entry still in the buffer
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.entries) - self.head
+
+    def __bool__(self) -> bool:
+        return len(self.entries) > self.head
+
+    def __iter__(self) -> Iterator["PriceEntry"]:
+        """Iterate entries, the oldest first."""
+        return itertools.islice(self.entries, self.head, None)
+
+    def append(self, entry: "PriceEntry") -> Tuple[Optional["PriceEntry"], Optional["PriceEntry"]]:
+        """Add an entry to its place in the time order.
+
+        :return:
+            The entries before and after the added entry, if any.
+            Incremental price functions use these to update their state.
+        """
+        timestamp = entry.timestamp
+        if not self:
+            self.timestamps.append(timestamp)
+            self.entries.append(entry)
+            return None, None
+
+        if timestamp >= self.timestamps[-1]:
+            previous = self.entries[-1]
+            self.timestamps.append(timestamp)
+            self.entries.append(entry)
+            return previous, None
+
+        idx = bisect.bisect_right(self.timestamps, timestamp, lo=self.head)
+        self.timestamps.insert(idx, timestamp)
+        self.entries.insert(idx, entry)
+        previous = self.entries[idx - 1] if idx > self.head else None
+        return previous, self.entries[idx + 1]
+
+    def get_newest(self) -> Optional["PriceEntry"]:
+        if self:
+            return self.entries[-1]
+        return None
+
+    def get_oldest(self) -> Optional["PriceEntry"]:
+        if self:
+            return self.entries[self.head]
+        return None
+
+    def truncate(self, cut_off: datetime.datetime) -> List["PriceEntry"]:
+        """Discard entries older than the cut off timestamp.
+
+        :return:
+            The discarded entries, the oldest first
+        """
+        idx = bisect.bisect_left(self.timestamps, cut_off, lo=self.head)
+        discarded = self.entries[self.head : idx]
+        self.head = idx
+        self._compact()
+        return discarded
+
+    def remove_after_block(self, block_number: int) -> List[Tuple["PriceEntry", Optional["PriceEntry"], Optional["PriceEntry"]]]:
+        """Remove the entries of the blocks after the given block.
+
+        Used to roll back a chain reorganisation. The entries of the newest blocks
+        are at the end of the buffer, so only the end of the buffer is walked.
+        Entries without a block number are kept.
+
+        :return:
+            The removed entries the newest first, with the entries before and after them
+            at the time of the removal
+        """
+        removed = []
+        if not self:
+            return removed
+
+        idx = len(self.entries) - 1
+        # Timestamp of the oldest removed entry
+        stop_timestamp = self.timestamps[idx]
+        while idx >= self.head:
+            entry = self.entries[idx]
+            if entry.block_number is not None and entry.block_number > block_number:
+                stop_timestamp = entry.timestamp
+                next = self.entries[idx + 1] if idx + 1 < len(self.entries) else None
+                del self.timestamps[idx]
+                del self.entries[idx]
+                previous = self.entries[idx - 1] if idx > self.head else None
+                removed.append((entry, previous, next))
+            elif entry.block_number is not None and entry.timestamp < stop_timestamp:
+                # Older blocks from here on
+                break
+            idx -= 1
+        return removed
+
+    def _compact(self):
+        if self.head >= MIN_COMPACT_SIZE and self.head * 2 >= len(self.entries):
+            del self.timestamps[: self.head]
+            del self.entries[: self.head]
+            self.head = 0
@@ -0,0 +1,351 @@
+"""Compact columnar price entry storage.
+
+:py:class:`eth_defi.price_oracle.buffer.PriceEntryBuffer` keeps a :py:class:`eth_defi.price_oracle.oracle.PriceEntry`
+Python object for each sample, with `Decimal`, `datetime` and hex string fields.
+This is hundreds of bytes per sample, which adds up with long time windows of busy pools.
+:py:class:`ColumnarPriceEntryBuffer` stores the samples in NumPy arrays instead:
+
+- Timestamps as `int64` UNIX milliseconds
+
+- Prices as `float64`, or as scaled `int64` with a fixed number of decimals
+
+- Volumes as `float64`, block numbers and log indexes as `int64`
+
+- Transaction and block hashes as 32 byte binary
+
+- Pool addresses interned to `int32` ids
+
+The buffer has the same interface as :py:class:`~eth_defi.price_oracle.buffer.PriceEntryBuffer`,
+so :py:class:`~eth_defi.price_oracle.oracle.PriceOracle` can use either.
+`PriceEntry` objects are created only when they are accessed.
+The columns can be read without creating any objects,
+see :py:meth:`ColumnarPriceEntryBuffer.get_prices` and others.
+
+Example:
+
+.. code-block:: python
+
+    oracle = PriceOracle(
+        TimeWeightedAveragePrice(),
+        target_time_window=datetime.timedelta(days=7),
+        buffer=ColumnarPriceEntryBuffer(),
+    )
+    update_price_oracle_with_sync_events(oracle, executor, web3, pair_address, start_block, end_block)
+    prices = oracle.buffer.get_prices()
+
+.. note ::
+
+    Timestamps are stored with millisecond precision and float prices with float precision.
+
+.. note ::
+
+    The buffer does not keep the entry objects, so :py:class:`~eth_defi.price_oracle.oracle.PriceOracle`
+    cannot index them by transaction. Use it with
+    :py:meth:`~eth_defi.price_oracle.oracle.PriceOracle.add_price_entry` for historical data,
+    not with the reorg safe ingestion of live feeds.
+
+See `scripts/benchmark-price-oracle-memory.py` for the memory usage comparison.
+"""
+import datetime
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from eth_defi.price_oracle.buffer import MIN_COMPACT_SIZE
+from eth_defi.price_oracle.oracle import PriceEntry, PriceSource
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+
+#: Column name -> NumPy type, prices depend on the buffer settings
+_COLUMNS = {
+    "timestamps": np.int64,
+    "prices": None,
+    "volumes": np.float64,
+    "block_numbers": np.int64,
+    "log_indexes": np.int64,
+    "first_seen_block_numbers": np.int64,
+    "sources": np.uint8,
+    "pool_ids": np.int32,
+    "tx_hashes": "S32",
+    "block_hashes": "S32",
+}
+
+#: Marks missing integer fields
+_MISSING = -1
+
+
+class ColumnarPriceEntryBuffer:
+    """Price entries sorted by timestamp, stored in NumPy columns.
+
+    Entries with the same millisecond timestamp are kept in the order they were added.
+    """
+
+    #: Entries are created when accessed, the same entry is not returned twice
+    keeps_entries = False
+
+    def __init__(self, price_decimals: Optional[int] = None, capacity: int = 1024):
+        """
+        :param price_decimals:
+            Store prices as `int64` scaled with this many decimals.
+            If not given, prices are stored as `float64`.
+
+        :param capacity:
+            Initial number of entries to allocate for
+        """
+        assert capacity > 0
+        self.price_decimals = price_decimals
+
+        for name, dtype in _COLUMNS.items():
+            if name == "prices":
+                dtype = np.float64 if price_decimals is None else np.int64
+            setattr(self, name, np.empty(capacity, dtype=dtype))
+
+        # Index of the oldest entry still in the buffer
+        self.head = 0
+
+        # Index after the newest entry
+        self.tail = 0
+
+        # Interned pool addresses
+        self.pool_addresses: List[str] = []
+        self.pool_address_ids: Dict[str, int] = {}
+
+        # PriceSource <-> uint8
+        self.price_sources = list(PriceSource)
+        self.price_source_ids = {source: idx for idx, source in enumerate(self.price_sources)}
+
+    def __len__(self) -> int:
+        return self.tail - self.head
+
+    def __bool__(self) -> bool:
+        return self.tail > self.head
+
+    def __iter__(self) -> Iterator[PriceEntry]:
+        """Iterate entries, the oldest first."""
+        for idx in range(self.head, self.tail):
+            yield self._get_entry(idx)
+
+    def __getitem__(self, idx: int) -> PriceEntry:
+        """Get an entry by its position, the oldest first."""
+        size = len(self)
+        if idx < 0:
+            idx += size
+        if not 0 <= idx < size:
+            raise IndexError(f"Entry {idx} out of range, the buffer has {size} entries")
+        return self._get_entry(self.head + idx)
+
+    def get_capacity(self) -> int:
+        return len(self.timestamps)
+
+    def get_timestamps(self) -> np.ndarray:
+        """UNIX timestamps in milliseconds, the oldest first.
+
+        A view to the buffer, valid until the buffer is modified.
+        """
+        return self.timestamps[self.head : self.tail]
+
+    def get_prices(self) -> np.ndarray:
+        """Prices as floats, the oldest first."""
+        prices = self.prices[self.head : self.tail]
+        if self.price_decimals is None:
+            return prices
+        return prices / 10**self.price_decimals
+
+    def get_volumes(self) -> np.ndarray:
+        """Volumes as floats, the oldest first. Missing volumes are `NaN`."""
+        return self.volumes[self.head : self.tail]
+
+    def get_block_numbers(self) -> np.ndarray:
+        """Block numbers, the oldest first. Missing block numbers are `-1`."""
+        return self.block_numbers[self.head : self.tail]
+
+    def _intern_pool(self, value: Optional[str]) -> int:
+        if value is None:
+            return _MISSING
+        pool_id = self.pool_address_ids.get(value)
+        if pool_id is None:
+            pool_id = len(self.pool_addresses)
+            self.pool_addresses.append(value)
+            self.pool_address_ids[value] = pool_id
+        return pool_id
+
+    def _get_pool(self, pool_id: int) -> Optional[str]:
+        if pool_id == _MISSING:
+            return None
+        return self.pool_addresses[pool_id]
+
+    @staticmethod
+    def _encode_hash(value: Optional[str]) -> bytes:
+        if not value:
+            return b""
+        encoded = bytes.fromhex(value[2:])
+        assert len(encoded) == 32, f"Not a 32 byte hash: {value}"
+        return encoded
+
+    @staticmethod
+    def _decode_hash(value: bytes) -> Optional[str]:
+        if not value:
+            return None
+        # numpy strips the trailing zero bytes
+        return "0x" + value.ljust(32, b"\0").hex()
+
+    def _encode_price(self, price: Decimal):
+        if self.price_decimals is None:
+            return float(price)
+        scaled = int(price.scaleb(self.price_decimals).to_integral_value())
+        assert -(2**63) <= scaled < 2**63, f"Price {price} does not fit int64 with {self.price_decimals} decimals"
+        return scaled
+
+    def _decode_price(self, value) -> Decimal:
+        if self.price_decimals is None:
+            return Decimal(repr(float(value)))
+        return Decimal(int(value)).scaleb(-self.price_decimals)
+
+    def _get_entry(self, idx: int) -> PriceEntry:
+        volume = self.volumes[idx]
+        block_number = int(self.block_numbers[idx])
+        log_index = int(self.log_indexes[idx])
+        first_seen_at_block_number = int(self.first_seen_block_numbers[idx])
+
+        return PriceEntry(
+            timestamp=_EPOCH + int(self.timestamps[idx]) * _MILLISECOND,
+            price=self._decode_price(self.prices[idx]),
+            source=self.price_sources[self.sources[idx]],
+            volume=None if np.isnan(volume) else Decimal(repr(float(volume))),
+            pool_contract_address=self._get_pool(self.pool_ids[idx]),
+            block_number=None if block_number == _MISSING else block_number,
+            tx_hash=self._decode_hash(self.tx_hashes[idx]),
+            log_index=None if log_index == _MISSING else log_index,
+            block_hash=self._decode_hash(self.block_hashes[idx]),
+            first_seen_at_block_number=None if first_seen_at_block_number == _MISSING else first_seen_at_block_number,
+        )
+
+    def _set_entry(self, idx: int, timestamp: int, entry: PriceEntry):
+        self.timestamps[idx] = timestamp
+        self.prices[idx] = self._encode_price(entry.price)
+        self.volumes[idx] = np.nan if entry.volume is None else float(entry.volume)
+        self.block_numbers[idx] = _MISSING if entry.block_number is None else entry.block_number
+        self.log_indexes[idx] = _MISSING if entry.log_index is None else entry.log_index
+        self.first_seen_block_numbers[idx] = _MISSING if entry.first_seen_at_block_number is None else entry.first_seen_at_block_number
+        self.sources[idx] = self.price_source_ids[entry.source]
+        self.pool_ids[idx] = self._intern_pool(entry.pool_contract_address)
+        self.tx_hashes[idx] = self._encode_hash(entry.tx_hash)
+        self.block_hashes[idx] = self._encode_hash(entry.block_hash)
+
+    def _grow(self):
+        capacity = self.get_capacity() * 2
+        for name in _COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self.tail] = column[: self.tail]
+            setattr(self, name, grown)
+
+    def append(self, entry: PriceEntry) -> Tuple[Optional[PriceEntry], Optional[PriceEntry]]:
+        """Add an entry to its place in the time order.
+
+        :return:
+            The entries before and after the added entry, if any.
+            Incremental price functions use these to update their state.
+        """
+        timestamp = (entry.timestamp - _EPOCH) // _MILLISECOND
+
+        if self.tail == self.get_capacity():
+            if self.head > 0:
+                self._compact(force=True)
+            if self.tail == self.get_capacity():
+                self._grow()
+
+        if not self or timestamp >= self.timestamps[self.tail - 1]:
+            idx = self.tail
+        else:
+            idx = self.head + int(np.searchsorted(self.get_timestamps(), timestamp, side="right"))
+            # Make room by moving the newer entries
+            for name in _COLUMNS:
+                column = getattr(self, name)
+                column[idx + 1 : self.tail + 1] = column[idx : self.tail]
+
+        self._set_entry(idx, timestamp, entry)
+        self.tail += 1
+
+        previous = self._get_entry(idx - 1) if idx > self.head else None
+        next = self._get_entry(idx + 1) if idx + 1 < self.tail else None
+        return previous, next
+
+    def get_newest(self) -> Optional[PriceEntry]:
+        if self:
+            return self._get_entry(self.tail - 1)
+        return None
+
+    def get_oldest(self) -> Optional[PriceEntry]:
+        if self:
+            return self._get_entry(self.head)
+        return None
+
+    def truncate(self, cut_off: datetime.datetime) -> List[PriceEntry]:
+        """Discard entries older than the cut off timestamp.
+
+        :return:
+            The discarded entries, the oldest first
+        """
+        cut_off = (cut_off - _EPOCH) // _MILLISECOND
+        idx = self.head + int(np.searchsorted(self.get_timestamps(), cut_off, side="left"))
+        discarded = [self._get_entry(i) for i in range(self.head, idx)]
+        self.head = idx
+        self._compact()
+        return discarded
+
+    def remove_after_block(self, block_number: int) -> List[Tuple[PriceEntry, Optional[PriceEntry], Optional[PriceEntry]]]:
+        """Remove the entries of the blocks after the given block.
+
+        See :py:meth:`eth_defi.price_oracle.buffer.PriceEntryBuffer.remove_after_block`.
+        """
+        removed = []
+        if not self:
+            return removed
+
+        idx = self.tail - 1
+        # Timestamp of the oldest removed entry
+        stop_timestamp = self.timestamps[idx]
+        while idx >= self.head:
+            entry_block_number = self.block_numbers[idx]
+            if entry_block_number > block_number:
+                entry = self._get_entry(idx)
+                stop_timestamp = self.timestamps[idx]
+                next = self._get_entry(idx + 1) if idx + 1 < self.tail else None
+                for name in _COLUMNS:
+                    column = getattr(self, name)
+                    column[idx : self.tail - 1] = column[idx + 1 : self.tail]
+                self.tail -= 1
+                previous = self._get_entry(idx - 1) if idx > self.head else None
+                removed.append((entry, previous, next))
+            elif entry_block_number != _MISSING and self.timestamps[idx] < stop_timestamp:
+                # Older blocks from here on
+                break
+            idx -= 1
+        return removed
+
+    def _compact(self, force=False):
+        if not force and not (self.head >= MIN_COMPACT_SIZE and self.head * 2 >= self.tail):
+            return
+
+        size = len(self)
+        for name in _COLUMNS:
+            column = getattr(self, name)
+            column[:size] = column[self.head : self.tail]
+        self.head = 0
+        self.tail = size
+
+        # Forget pools of the discarded entries
+        pool_ids = self.pool_ids[:size]
+        present = pool_ids != _MISSING
+        used_ids = np.unique(pool_ids[present])
+        if len(used_ids) < len(self.pool_addresses):
+            remap = np.full(len(self.pool_addresses), _MISSING, dtype=np.int32)
+            remap[used_ids] = np.arange(len(used_ids), dtype=np.int32)
+            pool_ids[present] = remap[pool_ids[present]]
+            self.pool_addresses = [self.pool_addresses[i] for i in used_ids]
+            self.pool_address_ids = {address: i for i, address in enumerate(self.pool_addresses)}
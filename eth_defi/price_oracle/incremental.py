@@ -0,0 +1,324 @@
+"""Incremental price functions.
+
+A plain :py:class:`eth_defi.price_oracle.oracle.PriceFunction` goes through all entries
+in the buffer on every :py:meth:`eth_defi.price_oracle.oracle.PriceOracle.calculate_price` call.
+An :py:class:`IncrementalPriceFunction` keeps a running state that
+:py:class:`eth_defi.price_oracle.oracle.PriceOracle` updates when entries are added to
+and truncated from the buffer, so the price query is constant time.
+
+- :py:class:`MeanPrice` - plain mean of the prices
+
+- :py:class:`TimeWeightedAveragePrice` - each price weighted by the duration it was the latest price
+
+- :py:class:`ExponentialMovingAveragePrice` - exponential moving average of the prices in the order they arrived
+
+- :py:class:`VolumeWeightedAveragePrice` - each price weighted by its trade volume
+
+Example:
+
+.. code-block:: python
+
+    oracle = PriceOracle(TimeWeightedAveragePrice())
+    oracle.feed_simple_data(price_data)
+    price = oracle.calculate_price()
+
+.. note ::
+
+    Incremental price functions are stateful.
+    Each oracle needs its own instance.
+
+"""
+import abc
+import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from eth_defi.price_oracle.oracle import PriceEntry
+
+
+#: Durations are counted in integer microseconds to keep the running sums exact
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _duration(start: "PriceEntry", end: "PriceEntry") -> int:
+    return (end.timestamp - start.timestamp) // _MICROSECOND
+
+
+class IncrementalPriceFunction(abc.ABC):
+    """Price function that updates its state when the oracle buffer changes.
+
+    The oracle calls :py:meth:`add` for every added entry and :py:meth:`remove`
+    for every truncated entry. Entries are truncated the oldest first.
+    Entries of rolled back blocks are removed with :py:meth:`retract`.
+
+    The functions can also be used as a plain price function
+    over a list of entries, like :py:func:`eth_defi.price_oracle.oracle.time_weighted_average_price`.
+    """
+
+    @abc.abstractmethod
+    def reset(self):
+        """Clear the running state."""
+
+    @abc.abstractmethod
+    def add(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        """An entry was added to the buffer.
+
+        :param entry:
+            The added entry
+
+        :param previous:
+            The entry before the added entry in the time order, if any
+
+        :param next:
+            The entry after the added entry in the time order, if any.
+            Only set for entries that arrived late.
+        """
+
+    @abc.abstractmethod
+    def remove(self, entry: "PriceEntry", next: Optional["PriceEntry"]):
+        """The oldest entry was truncated from the buffer.
+
+        :param entry:
+            The removed entry
+
+        :param next:
+            The new oldest entry, or `None` if the buffer is now empty
+        """
+
+    def retract(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        """An entry was removed from any position of the buffer, because its block was rolled back.
+
+        If not implemented, the oracle rebuilds the state from the whole buffer.
+
+        :param entry:
+            The removed entry
+
+        :param previous:
+            The entry before the removed entry in the time order, if any
+
+        :param next:
+            The entry after the removed entry in the time order, if any
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def calculate(self) -> Decimal:
+        """Calculate the price from the running state."""
+
+    def __call__(self, events: List["PriceEntry"]) -> Decimal:
+        """Calculate the price over a list of entries sorted by the timestamp.
+
+        Replaces the running state.
+        """
+        self.reset()
+        previous = None
+        for e in events:
+            self.add(e, previous, None)
+            previous = e
+        return self.calculate()
+
+
+class MeanPrice(IncrementalPriceFunction):
+    """Plain mean of the prices in the buffer.
+
+    The same as :py:func:`eth_defi.price_oracle.oracle.time_weighted_average_price`.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.total = Decimal(0)
+        self.count = 0
+
+    def add(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        self.total += entry.price
+        self.count += 1
+
+    def remove(self, entry: "PriceEntry", next: Optional["PriceEntry"]):
+        self.count -= 1
+        if self.count:
+            self.total -= entry.price
+        else:
+            # Do not carry rounding errors over
+            self.total = Decimal(0)
+
+    def retract(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        self.remove(entry, next)
+
+    def calculate(self) -> Decimal:
+        assert self.count, "No entries"
+        return self.total / self.count
+
+
+class TimeWeightedAveragePrice(IncrementalPriceFunction):
+    """Duration weighted average price over the buffer.
+
+    Each price is weighted by how long it was the latest price,
+    from its timestamp to the timestamp of the next entry.
+    The newest price has no weight, as it has not lasted yet.
+
+    If all entries have the same timestamp, the newest price is returned.
+
+    Further reading:
+
+    - https://blog.quantinsti.com/twap/
+
+    - https://analyzingalpha.com/twap
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        #: Sum of price * microseconds
+        self.weighted_total = Decimal(0)
+
+        self.oldest: Optional["PriceEntry"] = None
+        self.newest: Optional["PriceEntry"] = None
+
+    def add(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        if previous is not None:
+            if next is not None:
+                # The previous price no longer lasts until the next entry
+                self.weighted_total -= previous.price * _duration(previous, next)
+            self.weighted_total += previous.price * _duration(previous, entry)
+        else:
+            self.oldest = entry
+
+        if next is not None:
+            self.weighted_total += entry.price * _duration(entry, next)
+        else:
+            self.newest = entry
+
+    def remove(self, entry: "PriceEntry", next: Optional["PriceEntry"]):
+        if next is None:
+            self.reset()
+            return
+        self.weighted_total -= entry.price * _duration(entry, next)
+        self.oldest = next
+
+    def retract(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        if previous is None:
+            self.remove(entry, next)
+            return
+
+        self.weighted_total -= previous.price * _duration(previous, entry)
+        if next is not None:
+            # The previous price now lasts until the next entry
+            self.weighted_total -= entry.price * _duration(entry, next)
+            self.weighted_total += previous.price * _duration(previous, next)
+        else:
+            self.newest = previous
+
+    def calculate(self) -> Decimal:
+        assert self.newest is not None, "No entries"
+        duration = _duration(self.oldest, self.newest)
+        if duration == 0:
+            return self.newest.price
+        return self.weighted_total / duration
+
+
+class ExponentialMovingAveragePrice(IncrementalPriceFunction):
+    """Exponential moving average of the prices.
+
+    Prices are averaged in the order they are added,
+    late entries are not placed back to their time order.
+    Truncating the buffer does not change the average,
+    as the weight of old prices has already decayed.
+    Rolling back blocks recalculates the average over the whole buffer in the time order.
+    """
+
+    def __init__(self, span: int = 20):
+        """
+        :param span:
+            The number of entries the average spans.
+            The smoothing factor is `2 / (span + 1)`.
+        """
+        assert span >= 1
+        self.span = span
+        self.alpha = Decimal(2) / (span + 1)
+        self.reset()
+
+    def reset(self):
+        self.average: Optional[Decimal] = None
+
+    def add(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        if self.average is None:
+            self.average = entry.price
+        else:
+            self.average += self.alpha * (entry.price - self.average)
+
+    def remove(self, entry: "PriceEntry", next: Optional["PriceEntry"]):
+        if next is None:
+            self.reset()
+
+    def calculate(self) -> Decimal:
+        assert self.average is not None, "No entries"
+        return self.average
+
+
+class VolumeWeightedAveragePrice(IncrementalPriceFunction):
+    """Volume weighted average price over the buffer.
+
+    Each price is weighted by :py:attr:`eth_defi.price_oracle.oracle.PriceEntry.volume`.
+    Entries without volume, like liquidity changes, do not affect the price.
+
+    If no entry in the buffer has volume, the newest price is returned.
+
+    For Uniswap v2 pools, volumes are filled in by
+    :py:func:`eth_defi.uniswap_v2.oracle.convert_sync_and_swap_log_results_to_price_entries`.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        #: Sum of price * volume
+        self.weighted_total = Decimal(0)
+        self.volume = Decimal(0)
+
+        #: Number of entries with volume
+        self.count = 0
+
+        self.newest: Optional["PriceEntry"] = None
+
+    def add(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        if entry.volume:
+            self.weighted_total += entry.price * entry.volume
+            self.volume += entry.volume
+            self.count += 1
+        if next is None:
+            self.newest = entry
+
+    def remove(self, entry: "PriceEntry", next: Optional["PriceEntry"]):
+        if next is None:
+            self.reset()
+            return
+        self._subtract(entry)
+
+    def retract(self, entry: "PriceEntry", previous: Optional["PriceEntry"], next: Optional["PriceEntry"]):
+        if previous is None:
+            self.remove(entry, next)
+            return
+        self._subtract(entry)
+        if next is None:
+            self.newest = previous
+
+    def _subtract(self, entry: "PriceEntry"):
+        if entry.volume:
+            self.count -= 1
+            if self.count:
+                self.weighted_total -= entry.price * entry.volume
+                self.volume -= entry.volume
+            else:
+                # Do not carry rounding errors over
+                self.weighted_total = Decimal(0)
+                self.volume = Decimal(0)
+
+    def calculate(self) -> Decimal:
+        assert self.newest is not None, "No entries"
+        if not self.count:
+            return self.newest.price
+        return self.weighted_total / self.volume
@@ -0,0 +1,235 @@
+"""Manage price oracles of many pools with a shared log scan.
+
+Updating each :py:class:`eth_defi.price_oracle.oracle.PriceOracle` separately
+means `eth_getLogs` calls and block header fetches for every pool.
+:py:class:`OracleManager` reads the events of all tracked pools
+with one `eth_getLogs` call per block range, using an address array filter,
+and routes each log to the oracle of its pool.
+
+Example:
+
+.. code-block:: python
+
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+
+    manager = OracleManager(
+        [Pair.events.Sync, Pair.events.Swap],
+        convert_sync_and_swap_log_results_to_price_entries,
+    )
+
+    for address, pair in fetch_pair_details_many(web3, pair_addresses).items():
+        oracle = PriceOracle(TimeWeightedAveragePrice())
+        manager.add_oracle(address, oracle, UniswapV2PriceOracleContext(pair, reverse_token_order=False))
+
+    while True:
+        stats = manager.update_live(web3)
+        price = manager.get_oracle(bnb_busd_address).calculate_price()
+        time.sleep(3)
+
+"""
+import datetime
+import logging
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Protocol, Union
+
+from web3 import Web3
+from web3.contract import ContractEvent
+
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.logresult import LogContext, LogResult
+from eth_defi.event_reader.reader import ProgressUpdate, extract_timestamps_json_rpc, read_events
+from eth_defi.event_reader.timestamp import BlockTimestampExtractor
+from eth_defi.price_oracle.oracle import PriceEntry, PriceOracle
+
+logger = logging.getLogger(__name__)
+
+
+class PriceEntryConverter(Protocol):
+    """Turn event logs to price entries.
+
+    The logs come in the block order and carry the context of their pool.
+    The created entries must have `pool_contract_address` set to route them.
+
+    E.g. :py:func:`eth_defi.uniswap_v2.oracle.convert_sync_and_swap_log_results_to_price_entries`.
+    """
+
+    def __call__(self, log_results: Iterable[LogResult]) -> Iterable[PriceEntry]:
+        """Convert logs of many pools."""
+
+
+class OracleManager:
+    """Hold price oracles of many pools and update them with a shared log scan.
+
+    - Oracles are looked up by the pool address in a dictionary,
+      so routing a log is constant time regardless of the number of pools
+
+    - The last refresh of all oracles is updated from a single block header fetch
+
+    - Entries are added reorg safe, so overlapping block ranges can be read again
+    """
+
+    def __init__(
+        self,
+        events: List[ContractEvent],
+        converter: PriceEntryConverter,
+        chunk_size: int = 100,
+    ):
+        """
+        :param events:
+            Events to read from the pools
+
+        :param converter:
+            Turns the logs to price entries
+
+        :param chunk_size:
+            Block range of each `eth_getLogs` call
+        """
+        assert len(events) > 0
+        self.events = events
+        self.converter = converter
+        self.chunk_size = chunk_size
+
+        #: Lowercased pool address -> oracle
+        self.oracles: Dict[str, PriceOracle] = {}
+
+        #: Lowercased pool address -> context passed to the converter
+        self.contexts: Dict[str, LogContext] = {}
+
+        self._filter: Optional[Filter] = None
+
+    def add_oracle(self, pool_address: str, oracle: PriceOracle, context: LogContext):
+        """Start tracking a pool.
+
+        :param pool_address:
+            Pool contract address
+
+        :param oracle:
+            Oracle to feed with the pool events
+
+        :param context:
+            Pool details for the converter, like :py:class:`eth_defi.uniswap_v2.oracle.UniswapV2PriceOracleContext`
+        """
+        address = pool_address.lower()
+        assert address not in self.oracles, f"Already tracking {pool_address}"
+        self.oracles[address] = oracle
+        self.contexts[address] = context
+        self._filter = None
+
+    def remove_oracle(self, pool_address: str):
+        """Stop tracking a pool."""
+        address = pool_address.lower()
+        del self.oracles[address]
+        del self.contexts[address]
+        self._filter = None
+
+    def get_oracle(self, pool_address: str) -> PriceOracle:
+        """Get the oracle of a pool."""
+        return self.oracles[pool_address.lower()]
+
+    def create_filter(self) -> Filter:
+        """Filter matching the events of all tracked pools."""
+        if self._filter is None:
+            self._filter = Filter.create_filter(list(self.oracles.keys()), self.events)
+        return self._filter
+
+    def _route_logs(self, log_results: Iterable[LogResult]) -> Iterable[LogResult]:
+        for log in log_results:
+            context = self.contexts.get(log["address"])
+            if context is None:
+                # Pool removed while scanning
+                continue
+            log["context"] = context
+            yield log
+
+    def update(
+        self,
+        web3: Web3,
+        start_block: int,
+        end_block: int,
+        notify: Optional[ProgressUpdate] = None,
+        extract_timestamps: Optional[Union[Callable, BlockTimestampExtractor]] = extract_timestamps_json_rpc,
+    ) -> Counter:
+        """Feed all oracles with the events of a block range.
+
+        :param web3:
+            Web3 connection with the middleware cleared
+
+        :param start_block:
+            First block to include data for
+
+        :param end_block:
+            Last block to include data for (inclusive)
+
+        :param notify:
+            Progress callback for the scan
+
+        :param extract_timestamps:
+            How to get the block timestamps, see :py:func:`eth_defi.event_reader.reader.read_events`
+
+        :return:
+            Debug stats
+        """
+        stats = Counter({"created": 0, "reorgs": 0})
+
+        if not self.oracles:
+            return stats
+
+        log_results = read_events(
+            web3,
+            start_block,
+            end_block,
+            self.events,
+            notify=notify,
+            chunk_size=self.chunk_size,
+            filter=self.create_filter(),
+            extract_timestamps=extract_timestamps,
+        )
+
+        for entry in self.converter(self._route_logs(log_results)):
+            oracle = self.oracles[entry.pool_contract_address.lower()]
+            if oracle.add_price_entry_reorg_safe(entry):
+                stats["reorgs"] += 1
+            else:
+                stats["created"] += 1
+
+        return stats
+
+    def update_last_refresh(self, block_number: int, timestamp: datetime.datetime) -> int:
+        """Mark all oracles refreshed at a block and truncate their old data.
+
+        :return:
+            Number of discarded entries
+        """
+        discarded = 0
+        for oracle in self.oracles.values():
+            oracle.update_last_refresh(block_number, timestamp)
+            discarded += oracle.truncate_buffer(timestamp)
+        return discarded
+
+    def update_live(self, web3: Web3, lookback_block_count: int = 5) -> Counter:
+        """Fetch the latest events of all tracked pools.
+
+        The same as :py:func:`eth_defi.uniswap_v2.oracle.update_live_price_feed`,
+        but for all tracked pools with a single log scan.
+
+        :param lookback_block_count:
+            How many blocks back from the chain tip to read
+
+        :return:
+            Debug stats
+        """
+        current_block = web3.eth.block_number
+        start_block = current_block - lookback_block_count
+        end_block = current_block
+
+        stats = self.update(web3, start_block, end_block)
+
+        # Get the last block timestamp
+        timestamps = extract_timestamps_json_rpc(web3, end_block, end_block)
+        unix_timestamp = next(iter(timestamps.values()))
+        last_timestamp = datetime.datetime.utcfromtimestamp(unix_timestamp)
+
+        # Clean old data
+        stats["discarded"] = self.update_last_refresh(end_block, last_timestamp)
+
+        return stats
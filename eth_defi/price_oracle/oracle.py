@@ -7,11 +7,13 @@ like :py:mod:`eth_defi.uniswap_v2.oracle`.
 
 import datetime
 import enum
-import heapq
 import statistics
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Dict, List, Optional, Protocol, Tuple
+from typing import Dict, List, Optional, Protocol, Tuple, Union
+
+from eth_defi.price_oracle.buffer import PriceEntryBuffer
+from eth_defi.price_oracle.incremental import IncrementalPriceFunction
 
 
 class PriceSource(enum.Enum):
@@ -74,10 +76,14 @@ class PriceEntry:
 
     #: Chain reorganisation helper.
     #: This is set on the old event when we detect duplicate entry.
-    #: We never remove items from heap, but mark them deprecated.
+    #: We never remove items from the buffer, but mark them deprecated.
     #: Items are eventually cleaned up when they expire.
     first_seen_at_block_number: Optional[int] = None
 
+    #: Log index of the event within the block.
+    #: Tells apart multiple events of the same transaction.
+    log_index: Optional[int] = None
+
     def __post_init__(self):
         """Some basic data validation."""
         assert isinstance(self.timestamp, datetime.datetime)
@@ -90,7 +96,7 @@ class PriceEntry:
             assert isinstance(self.block_number, int)
 
     def __lt__(self, other):
-        """Needed for heappush.
+        """Order entries by the block number.
 
         https://stackoverflow.com/a/59956131/315168
         """
@@ -109,6 +115,7 @@ class PriceEntry:
         # Only block number or block hash change, otherwise transactions are immutable
         self.block_number = new_entry.block_number
         self.block_hash = new_entry.block_hash
+        self.log_index = new_entry.log_index
 
 
 class PriceFunction(Protocol):
@@ -119,6 +126,9 @@ class PriceFunction(Protocol):
     - Volume weighted average
 
     - Time weighted average
+
+    See also :py:class:`eth_defi.price_oracle.incremental.IncrementalPriceFunction`
+    for price functions that do not need to go through the whole buffer.
     """
 
     def __call__(self, events: List[PriceEntry]) -> Decimal:
@@ -151,7 +161,7 @@ class PriceOracle:
     - Sample data over multiple events
 
     - Rotate ring buffer of events when new data comes in.
-      Uses `Python heapq <https://docs.python.org/3/library/heapq.html>`__ for this.
+      Uses a time-ordered :py:class:`eth_defi.price_oracle.buffer.PriceEntryBuffer` for this.
 
     Example:
 
@@ -188,11 +198,12 @@ class PriceOracle:
 
     def __init__(
         self,
-        price_function: PriceFunction,
+        price_function: Union[PriceFunction, IncrementalPriceFunction],
         target_time_window: datetime.timedelta = datetime.timedelta(minutes=5),
         min_duration: datetime.timedelta = datetime.timedelta(hours=1),
         max_age: datetime.timedelta = datetime.timedelta(hours=4),
         min_entries: int = 8,
+        buffer: Optional[PriceEntryBuffer] = None,
     ):
         """
         Create a new price oracle.
@@ -202,6 +213,10 @@ class PriceOracle:
         :param price_function:
             What function we use to calculate the price based on the events.
             Defaults to time-weighted average price.
+            An :py:class:`eth_defi.price_oracle.incremental.IncrementalPriceFunction`
+            is updated as the entries are added and truncated,
+            making the price calculation constant time.
+            It must not be shared with other oracles.
 
         :param target_time_window:
             What is the target time window for us to calculate
@@ -221,8 +236,16 @@ class PriceOracle:
         :param min_entries:
             The minimum number of entries we want to have to calculate the price reliably.
 
+        :param buffer:
+            Storage for the price entries.
+            Defaults to :py:class:`eth_defi.price_oracle.buffer.PriceEntryBuffer`.
+            Use :py:class:`eth_defi.price_oracle.columnar.ColumnarPriceEntryBuffer`
+            for compact storage of large historical windows.
+
         """
         self.price_function = price_function
+        if isinstance(price_function, IncrementalPriceFunction):
+            price_function.reset()
         self.min_duration = min_duration
 
         self.min_entries = min_entries
@@ -230,9 +253,16 @@ class PriceOracle:
 
         self.target_time_window = target_time_window
 
-        # Buffer of price events using heapq.
-        # The oldest datetime.datetime is the first always the first entry.
-        self.buffer: List[Tuple[datetime.datetime, PriceEntry]] = []
+        # Buffer of price events sorted by their timestamp.
+        # The oldest entry is always the first entry.
+        self.buffer = buffer if buffer is not None else PriceEntryBuffer()
+
+        # Transaction hash -> entries of the transaction, in the order they were added.
+        # Keeps reorg safe ingestion constant time.
+        self.tx_hash_index: Dict[str, List[PriceEntry]] = {}
+
+        # (transaction hash, log index) -> entry
+        self.tx_log_index: Dict[Tuple[str, int], PriceEntry] = {}
 
         # In real-time mode,
         # pairs might not have seen trades for a while,
@@ -298,7 +328,9 @@ class PriceOracle:
 
         """
         self.check_data_quality()
-        events = [tpl[1] for tpl in self.buffer]
+        if isinstance(self.price_function, IncrementalPriceFunction):
+            return self.price_function.calculate()
+        events = list(self.buffer)
         return self.price_function(events)
 
     def add_price_entry(self, evt: PriceEntry):
@@ -307,19 +339,25 @@ class PriceOracle:
         .. note::
 
             It is not safe to call this function multiple times for the same event.
-
-        Further reading
-
-        - https://docs.python.org/3/library/heapq.html
         """
         assert isinstance(evt, PriceEntry)
-        heapq.heappush(self.buffer, (evt.timestamp, evt))
+        previous, next = self.buffer.append(evt)
+        if isinstance(self.price_function, IncrementalPriceFunction):
+            self.price_function.add(evt, previous, next)
+        if self.buffer.keeps_entries:
+            self._index_entry(evt)
 
     def add_price_entry_reorg_safe(self, evt: PriceEntry) -> bool:
         """Add price entry to the ring buffer with support for fixing chain reorganisations.
 
         Transactions may hop between different blocks when the chain tip reorganises,
-        getting a new timestamp. In this case, we update the
+        getting a new timestamp. In this case, we update the block information
+        of the existing entry.
+
+        Entries are looked up from the transaction indexes, so this is constant time
+        regardless of the buffer size.
+        If the entries have `log_index` set, multiple events of the same transaction
+        are told apart.
 
         .. note::
 
@@ -330,33 +368,77 @@ class PriceOracle:
         """
         assert isinstance(evt, PriceEntry)
         assert evt.tx_hash
-
-        existing = self.get_by_transaction_hash(evt.tx_hash)
-        if existing:
-            if existing.block_hash != evt.block_hash:
-                existing.update_chain_reorg(evt)
-        else:
-            heapq.heappush(self.buffer, (evt.timestamp, evt))
+        assert self.buffer.keeps_entries, f"Reorg safe ingestion needs the buffer to keep the entry objects, {self.buffer.__class__.__name__} does not"
+
+        if evt.log_index is not None:
+            existing = self.tx_log_index.get((evt.tx_hash, evt.log_index))
+            if existing is not None and existing.block_hash == evt.block_hash:
+                return False
+
+        entries = self.tx_hash_index.get(evt.tx_hash)
+        if entries:
+            moved = next((e for e in entries if e.block_hash != evt.block_hash), None)
+            if moved is not None:
+                self._update_chain_reorg(moved, evt)
+                return True
+
+            if evt.log_index is None:
+                # Already seen, cannot tell events of the same transaction apart
+                return False
+
+        self.add_price_entry(evt)
+        return False
+
+    def _index_entry(self, evt: PriceEntry):
+        if evt.tx_hash:
+            self.tx_hash_index.setdefault(evt.tx_hash, []).append(evt)
+            if evt.log_index is not None:
+                self.tx_log_index[(evt.tx_hash, evt.log_index)] = evt
+
+    def _unindex_log(self, evt: PriceEntry):
+        key = (evt.tx_hash, evt.log_index)
+        # The key may have been taken over by another entry of the same transaction in a reorg
+        if self.tx_log_index.get(key) is evt:
+            del self.tx_log_index[key]
+
+    def _unindex_entry(self, evt: PriceEntry):
+        if evt.tx_hash:
+            entries = self.tx_hash_index.get(evt.tx_hash, [])
+            entries = [e for e in entries if e is not evt]
+            if entries:
+                self.tx_hash_index[evt.tx_hash] = entries
+            else:
+                self.tx_hash_index.pop(evt.tx_hash, None)
+            self._unindex_log(evt)
+
+    def _update_chain_reorg(self, existing: PriceEntry, evt: PriceEntry):
+        self._unindex_log(existing)
+        existing.update_chain_reorg(evt)
+        if existing.log_index is not None:
+            self.tx_log_index[(existing.tx_hash, existing.log_index)] = existing
 
     def get_by_transaction_hash(self, tx_hash: str) -> Optional[PriceEntry]:
-        """Get an event by transaction hash."""
-        for heap_index, entry in self.buffer:
-            if entry.tx_hash == tx_hash:
-                return entry
+        """Get an event by transaction hash.
+
+        :return:
+            The first added event of the transaction
+        """
+        entries = self.tx_hash_index.get(tx_hash)
+        if entries:
+            return entries[0]
         return None
 
+    def get_by_transaction_log(self, tx_hash: str, log_index: int) -> Optional[PriceEntry]:
+        """Get an event by transaction hash and log index."""
+        return self.tx_log_index.get((tx_hash, log_index))
+
     def get_newest(self) -> Optional[PriceEntry]:
         """Return the newest price entry."""
-        if self.buffer:
-            largest_list = heapq.nlargest(1, self.buffer)
-            return largest_list[0][1]
-        return None
+        return self.buffer.get_newest()
 
     def get_oldest(self) -> Optional[PriceEntry]:
         """Return the oldest price entry."""
-        if self.buffer:
-            return self.buffer[0][1]
-        return None
+        return self.buffer.get_oldest()
 
     def get_buffer_duration(self) -> datetime.timedelta:
         """How long time is the time we have price events in the buffer for."""
@@ -406,17 +488,60 @@ class PriceOracle:
         """
 
         too_old = current_timestamp - self.target_time_window
-        old_buffer_length = len(self.buffer)
+        discarded = self.buffer.truncate(too_old)
+
+        if isinstance(self.price_function, IncrementalPriceFunction):
+            for idx, entry in enumerate(discarded):
+                next = discarded[idx + 1] if idx + 1 < len(discarded) else self.buffer.get_oldest()
+                self.price_function.remove(entry, next)
+
+        if self.buffer.keeps_entries:
+            for entry in discarded:
+                self._unindex_entry(entry)
+
+        return len(discarded)
+
+    def rollback(self, block_number: int) -> int:
+        """Remove the entries of the blocks after the given block.
+
+        Call this when the chain tip is reorganised, see
+        :py:class:`eth_defi.event_reader.tip.ChainTipFollower`.
+        Only the entries of the rolled back blocks are walked.
 
-        self.buffer = [entry for entry in self.buffer if entry[0] >= too_old]
+        :param block_number:
+            The newest block that is still on the canonical chain
 
-        return old_buffer_length - len(self.buffer)
+        :return:
+            Number of removed entries
+        """
+        removed = self.buffer.remove_after_block(block_number)
+
+        if isinstance(self.price_function, IncrementalPriceFunction):
+            try:
+                for entry, previous, next in removed:
+                    self.price_function.retract(entry, previous, next)
+            except NotImplementedError:
+                # Replay the buffer to the price function
+                self.price_function(list(self.buffer))
+
+        if self.buffer.keeps_entries:
+            for entry, previous, next in removed:
+                self._unindex_entry(entry)
+
+        if self.last_refreshed_block_number is not None and self.last_refreshed_block_number > block_number:
+            self.last_refreshed_block_number = block_number
+
+        return len(removed)
 
 
 def time_weighted_average_price(events: List[PriceEntry]) -> Decimal:
     """Calculate TWAP price over all entries in the buffer.
 
-    Calculates the price using :py:func:`statistics.mean`.
+    Calculates the price using :py:func:`statistics.mean`,
+    the entries are not weighted by time.
+
+    For a duration weighted price that is not recalculated over the whole buffer
+    on every query, see :py:class:`eth_defi.price_oracle.incremental.TimeWeightedAveragePrice`.
 
     Further reading:
 
@@ -6,16 +6,18 @@ Deploy ERC-20 tokens to be used within your test suite.
 """
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Optional, Union
+from typing import Dict, Iterable, List, Optional, Union
 
 from eth_tester.exceptions import TransactionFailed
 from eth_typing import HexAddress
 from web3 import Web3
-from web3.contract import Contract
+from web3.contract import Contract, ContractFunction
 from web3.exceptions import BadFunctionCallOutput
+from web3.types import BlockIdentifier
 
 from eth_defi.abi import get_deployed_contract
 from eth_defi.deploy import deploy_contract
+from eth_defi.multicall import MulticallResult, batch_call, multicall
 from eth_defi.utils import sanitise_string
 
 #: List of exceptions JSON-RPC provider can through when ERC-20 field look-up fails
@@ -194,3 +196,103 @@ def fetch_erc20_details(
         supply = None
 
     return TokenDetails(erc_20, name, symbol, supply, decimals)
+
+
+def get_erc20_detail_calls(erc_20: Contract) -> List[ContractFunction]:
+    """The calls needed to read the token details, in the order of :py:func:`decode_erc20_details`."""
+    return [
+        erc_20.functions.symbol(),
+        erc_20.functions.name(),
+        erc_20.functions.decimals(),
+        erc_20.functions.totalSupply(),
+    ]
+
+
+def _decode_string_detail(result: MulticallResult, token_address: str, field: str, max_str_length: int, raise_on_error: bool) -> Optional[str]:
+    if result.success:
+        return sanitise_string(result.result[0:max_str_length])
+
+    if not result.reverted and len(result.return_data) == 32:
+        # Sai Stablecoin uses bytes32 instead of string for name and symbol information
+        # https://etherscan.io/address/0x89d24a6b4ccb1b6faa2625fe562bdd9a23260359#readContract
+        return None
+
+    if raise_on_error:
+        raise TokenDetailError(f"Token {token_address} missing {field}: {result.error}")
+    return None
+
+
+def decode_erc20_details(
+    erc_20: Contract,
+    results: List[MulticallResult],
+    max_str_length: int = 256,
+    raise_on_error=True,
+) -> TokenDetails:
+    """Create token details from the results of :py:func:`get_erc20_detail_calls`.
+
+    Sanitised the same way as :py:func:`fetch_erc20_details` does.
+    """
+    token_address = erc_20.address
+    symbol_result, name_result, decimals_result, supply_result = results
+
+    symbol = _decode_string_detail(symbol_result, token_address, "symbol", max_str_length, raise_on_error)
+    name = _decode_string_detail(name_result, token_address, "name", max_str_length, raise_on_error)
+
+    if decimals_result.success:
+        decimals = decimals_result.result
+    elif raise_on_error:
+        raise TokenDetailError(f"Token {token_address} missing decimals: {decimals_result.error}")
+    else:
+        decimals = 0
+
+    if supply_result.success:
+        supply = supply_result.result
+    elif raise_on_error:
+        raise TokenDetailError(f"Token {token_address} missing totalSupply: {supply_result.error}")
+    else:
+        supply = None
+
+    return TokenDetails(erc_20, name, symbol, supply, decimals)
+
+
+def fetch_erc20_details_many(
+    web3: Web3,
+    token_addresses: Iterable[Union[HexAddress, str]],
+    max_str_length: int = 256,
+    raise_on_error=True,
+    multicall_address: Optional[HexAddress] = None,
+    block_identifier: Optional[BlockIdentifier] = None,
+    batch_size: int = 100,
+) -> Dict[Union[HexAddress, str], TokenDetails]:
+    """Read details of many tokens in a few round trips.
+
+    The same as calling :py:func:`fetch_erc20_details` for each token,
+    but the calls are sent as JSON-RPC batches,
+    or packed into Multicall calls if `multicall_address` is given.
+
+    Example:
+
+    .. code-block:: python
+
+        tokens = fetch_erc20_details_many(web3, [usdc_address, weth_address], multicall_address=MULTICALL3_ADDRESS)
+        assert tokens[usdc_address].decimals == 6
+
+    :param web3: Web3 instance
+    :param token_addresses: ERC-20 contract addresses
+    :param max_str_length: For input sanitisation
+    :param raise_on_error: If set, raise `TokenDetailError` on any error instead of silently ignoring in and setting details to None.
+    :param multicall_address: Use a deployed Multicall contract, see :py:mod:`eth_defi.multicall`
+    :param block_identifier: Block to read the details at, latest by default
+    :param batch_size: Maximum calls in a single JSON-RPC batch
+    :return: Sanitised token info, keyed by the given addresses
+    """
+    token_addresses = list(dict.fromkeys(token_addresses))
+    contracts = [get_deployed_contract(web3, "ERC20MockDecimals.json", address) for address in token_addresses]
+    calls = [call for erc_20 in contracts for call in get_erc20_detail_calls(erc_20)]
+
+    if multicall_address:
+        results = multicall(web3, calls, block_identifier=block_identifier, multicall_address=multicall_address)
+    else:
+        results = batch_call(web3, calls, block_identifier=block_identifier or "latest", batch_size=batch_size)
+
+    return {address: decode_erc20_details(erc_20, results[idx * 4 : idx * 4 + 4], max_str_length, raise_on_error) for idx, (address, erc_20) in enumerate(zip(token_addresses, contracts))}
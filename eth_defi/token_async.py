@@ -3,9 +3,11 @@
 
 import asyncio
 from web3 import Web3
-from typing import Union
+from typing import Dict, Iterable, Optional, Union
 from eth_typing import HexAddress
-from eth_defi.token import TokenDetails, TokenDetailError
+from web3.types import BlockIdentifier
+from eth_defi import multicall_async
+from eth_defi.token import TokenDetails, TokenDetailError, decode_erc20_details, get_erc20_detail_calls
 from eth_defi.deploy_async import deploy_contract
 from eth_defi.abi import Contract, get_deployed_contract
 from eth_defi.utils import sanitise_string
@@ -118,3 +120,31 @@ async def fetch_erc20_details(
         supply = None
 
     return TokenDetails(erc_20, name, symbol, supply, decimals)
+
+
+async def fetch_erc20_details_many(
+    web3: Web3,
+    token_addresses: Iterable[Union[HexAddress, str]],
+    max_str_length: int = 256,
+    raise_on_error=True,
+    multicall_address: Optional[HexAddress] = None,
+    block_identifier: Optional[BlockIdentifier] = None,
+    batch_size: int = 100,
+) -> Dict[Union[HexAddress, str], TokenDetails]:
+    """Read details of many tokens in a few round trips.
+
+    See :py:func:`eth_defi.token.fetch_erc20_details_many` for the parameters.
+
+    :return: Sanitised token info, keyed by the given addresses
+    """
+    assert web3.eth.is_async, "只支持异步RPC"
+    token_addresses = list(dict.fromkeys(token_addresses))
+    contracts = [get_deployed_contract(web3, "ERC20MockDecimals.json", address) for address in token_addresses]
+    calls = [call for erc_20 in contracts for call in get_erc20_detail_calls(erc_20)]
+
+    if multicall_address:
+        results = await multicall_async.multicall(web3, calls, block_identifier=block_identifier, multicall_address=multicall_address)
+    else:
+        results = await multicall_async.batch_call(web3, calls, block_identifier=block_identifier or "latest", batch_size=batch_size)
+
+    return {address: decode_erc20_details(erc_20, results[idx * 4 : idx * 4 + 4], max_str_length, raise_on_error) for idx, (address, erc_20) in enumerate(zip(token_addresses, contracts))}
@@ -0,0 +1,237 @@
+"""Persistent token metadata cache.
+
+Event decoders enrich events with token details (symbol, decimals).
+Reading them takes several JSON-RPC calls per token,
+and every scan would read the same tokens again.
+:py:class:`TokenCache` keeps the details
+
+- in an in-process LRU cache, shared by the reader threads
+
+- optionally in an SQLite database on a disk, keyed by `(chain id, address)`,
+  so a restarted scan does not read any token it has seen before
+
+The cache is passed to the readers as the log context
+and the decoders look up tokens with :py:meth:`TokenCache.get_token_info`.
+
+- Each thread and process uses its own SQLite connection,
+  and the database is in WAL mode, so readers do not block each other
+
+- The cache can be pickled to worker processes.
+  The LRU cache and connections are not copied, the worker reads the same database.
+
+Example:
+
+.. code-block:: python
+
+    token_cache = TokenCache("/tmp/token-cache.sqlite")
+    executor = create_thread_pool_executor(web3_factory, token_cache, max_workers=16)
+    for log_result in read_events_concurrent(executor, start_block, end_block, events, None, context=token_cache):
+        token_cache: TokenCache = log_result["context"]
+        token = token_cache.get_token_info(log_result["event"].web3, token_address)
+
+.. note ::
+
+    Token total supply is stored as it was when the token was first seen.
+
+"""
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Collection, Dict, Optional, Tuple, Union
+
+from eth_typing import HexAddress
+from eth_utils import to_checksum_address
+from web3 import Web3
+
+from eth_defi.abi import get_deployed_contract
+from eth_defi.event_reader.logresult import LogContext
+from eth_defi.token import TokenDetails, fetch_erc20_details_many
+
+logger = logging.getLogger(__name__)
+
+
+#: How many tokens are kept in the in-process LRU cache by default
+DEFAULT_LRU_SIZE = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS token (
+    chain_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    name TEXT,
+    symbol TEXT,
+    decimals INTEGER,
+    total_supply TEXT,
+    PRIMARY KEY (chain_id, address)
+)
+"""
+
+#: SQLite limits the number of query parameters
+_QUERY_BATCH_SIZE = 500
+
+
+class TokenCache(LogContext):
+    """Manage cache of token data when doing event look-ups.
+
+    Do not do extra requests for already known tokens.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[Path, str]] = None,
+        chain_id: Optional[int] = None,
+        lru_size: int = DEFAULT_LRU_SIZE,
+    ):
+        """
+        :param path:
+            SQLite database file.
+            If not given, the tokens are cached only in the memory.
+
+        :param chain_id:
+            Chain id of the tokens.
+            If not given, asked from the node on the first look up.
+
+        :param lru_size:
+            How many tokens to keep in the memory
+        """
+        assert lru_size > 0
+        self.path = str(path) if path is not None else None
+        self.chain_id = chain_id
+        self.lru_size = lru_size
+
+        #: How many tokens have been read over JSON-RPC by this process
+        self.fetched = 0
+
+        self._init_process_state()
+
+        if self.path is not None:
+            # Create the table early, not racing in the worker threads
+            self.get_connection()
+
+    def _init_process_state(self):
+        self.lru: "OrderedDict[Tuple[int, str], TokenDetails]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["lru"]
+        del state["lock"]
+        del state["local"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._init_process_state()
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Get SQLite connection of the current thread."""
+        assert self.path is not None, "No database for the cache"
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def close(self):
+        """Close SQLite connection of the current thread."""
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def get_chain_id(self, web3: Web3) -> int:
+        if self.chain_id is None:
+            self.chain_id = web3.eth.chain_id
+        return self.chain_id
+
+    def _get_memory(self, key: Tuple[int, str]) -> Optional[TokenDetails]:
+        with self.lock:
+            details = self.lru.get(key)
+            if details is not None:
+                self.lru.move_to_end(key)
+            return details
+
+    def _put_memory(self, key: Tuple[int, str], details: TokenDetails):
+        with self.lock:
+            self.lru[key] = details
+            self.lru.move_to_end(key)
+            while len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+
+    def _read_stored(self, web3: Web3, chain_id: int, addresses: Collection[str]) -> Dict[str, TokenDetails]:
+        """Read tokens from the database, keyed by the lowercased address."""
+        connection = self.get_connection()
+        addresses = list(addresses)
+        found = {}
+        for i in range(0, len(addresses), _QUERY_BATCH_SIZE):
+            batch = addresses[i : i + _QUERY_BATCH_SIZE]
+            rows = connection.execute(
+                f"SELECT address, name, symbol, decimals, total_supply FROM token WHERE chain_id = ? AND address IN ({','.join('?' * len(batch))})",
+                [chain_id] + batch,
+            )
+            for address, name, symbol, decimals, total_supply in rows:
+                contract = get_deployed_contract(web3, "ERC20MockDecimals.json", to_checksum_address(address))
+                found[address] = TokenDetails(contract, name, symbol, int(total_supply) if total_supply is not None else None, decimals)
+        return found
+
+    def _write_stored(self, chain_id: int, tokens: Collection[TokenDetails]):
+        connection = self.get_connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO token (chain_id, address, name, symbol, decimals, total_supply) VALUES (?, ?, ?, ?, ?, ?)",
+            [(chain_id, t.address.lower(), t.name, t.symbol, t.decimals, str(t.total_supply) if t.total_supply is not None else None) for t in tokens],
+        )
+
+    def get_token_info(self, web3: Web3, address: Union[HexAddress, str]) -> TokenDetails:
+        """Get details of a token.
+
+        Tokens that do not conform ERC-20 are cached too,
+        with the missing details set to `None`.
+        """
+        return self.get_token_info_many(web3, [address])[address]
+
+    def get_token_info_many(self, web3: Web3, addresses: Collection[Union[HexAddress, str]]) -> Dict[Union[HexAddress, str], TokenDetails]:
+        """Get details of many tokens.
+
+        Tokens not in the cache are read with a single :py:func:`eth_defi.token.fetch_erc20_details_many`.
+
+        Only the details read from the node are cached.
+        If the node failed to answer, e.g. because of a rate limit, the error is raised
+        and the tokens are read again on the next look up.
+
+        :return:
+            Token details keyed by the given addresses
+        """
+        chain_id = self.get_chain_id(web3)
+        found: Dict[str, TokenDetails] = {}
+        missing = set()
+        for address in addresses:
+            lower_address = address.lower()
+            details = self._get_memory((chain_id, lower_address))
+            if details is not None:
+                found[lower_address] = details
+            else:
+                missing.add(lower_address)
+
+        if missing and self.path is not None:
+            stored = self._read_stored(web3, chain_id, missing)
+            for lower_address, details in stored.items():
+                self._put_memory((chain_id, lower_address), details)
+            found.update(stored)
+            missing -= stored.keys()
+
+        if missing:
+            logger.debug("Fetching details for %d tokens", len(missing))
+            fetched = fetch_erc20_details_many(web3, [to_checksum_address(a) for a in missing], raise_on_error=False)
+            with self.lock:
+                self.fetched += len(fetched)
+            if self.path is not None:
+                self._write_stored(chain_id, fetched.values())
+            for details in fetched.values():
+                self._put_memory((chain_id, details.address.lower()), details)
+                found[details.address.lower()] = details
+
+        return {address: found[address.lower()] for address in addresses}
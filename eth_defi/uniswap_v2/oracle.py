@@ -1,18 +1,31 @@
-"""Price oracle implementation for Uniswap v2 pools."""
+"""Price oracle implementation for Uniswap v2 pools.
+
+Prices are read from `Sync` events that carry the pool reserves after each trade
+and liquidity change. The trade volume is read from `Swap` events
+in the same `eth_getLogs` pass and joined to the `Sync` event of the same trade,
+see :py:func:`convert_sync_and_swap_log_results_to_price_entries`.
+"""
 import datetime
+import logging
 from collections import Counter
 from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
 
+import futureproof
 from web3 import Web3
 
 from eth_defi.abi import get_contract
 from eth_defi.event_reader.conversion import convert_int256_bytes_to_int, decode_data
 from eth_defi.event_reader.filter import Filter
-from eth_defi.event_reader.logresult import LogContext
-from eth_defi.event_reader.reader import extract_timestamps_json_rpc, read_events
+from eth_defi.event_reader.logresult import LogContext, LogResult
+from eth_defi.event_reader.reader import ProgressUpdate, extract_timestamps_json_rpc, read_events, read_events_concurrent
+from eth_defi.event_reader.tip import ChainTipFollower
 from eth_defi.price_oracle.oracle import PriceEntry, PriceOracle, PriceSource
 from eth_defi.uniswap_v2.pair import PairDetails, fetch_pair_details
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class UniswapV2PriceOracleContext(LogContext):
@@ -23,10 +36,13 @@ class UniswapV2PriceOracleContext(LogContext):
     reverse_token_order: bool
 
 
-def convert_sync_log_result_to_price_entry(log: dict) -> PriceEntry:
+def convert_sync_log_result_to_price_entry(log: dict, volume: Optional[Decimal] = None) -> PriceEntry:
     """Create a price entry based on Sync eth_getLogs result.
 
     Called by :py:func:`update_price_oracle_with_sync_events_single_thread`.
+
+    :param volume:
+        Trade volume in the quote token, from the matching Swap event
     """
 
     context: UniswapV2PriceOracleContext = log["context"]
@@ -58,62 +74,183 @@ def convert_sync_log_result_to_price_entry(log: dict) -> PriceEntry:
     return PriceEntry(
         timestamp=timestamp,
         price=price,
-        volume=None,  # For volume you would also need to get matching Swap() event
+        volume=volume,
         block_number=int(log["blockNumber"], 16),
         source=PriceSource.uniswap_v2_like_pool_sync_event,
         pool_contract_address=log["address"],
         block_hash=log["blockHash"],
         tx_hash=log["transactionHash"],
+        log_index=int(log["logIndex"], 16),
+    )
+
+
+def convert_swap_log_result_to_volume(log: dict) -> Decimal:
+    """Get the trade volume in the quote token from Swap eth_getLogs result."""
+
+    context: UniswapV2PriceOracleContext = log["context"]
+
+    # amount0In, amount1In, amount0Out, amount1Out
+    data_entries = decode_data(log["data"])
+    amount0 = convert_int256_bytes_to_int(data_entries[0]) + convert_int256_bytes_to_int(data_entries[2])
+    amount1 = convert_int256_bytes_to_int(data_entries[1]) + convert_int256_bytes_to_int(data_entries[3])
+
+    if context.reverse_token_order:
+        return context.pair.token0.convert_to_decimals(amount0)
+    else:
+        return context.pair.token1.convert_to_decimals(amount1)
+
+
+def convert_sync_and_swap_log_results_to_price_entries(log_results: Iterable[LogResult]) -> Iterable[PriceEntry]:
+    """Create price entries with volume from Sync and Swap eth_getLogs results.
+
+    Uniswap v2 pair emits `Sync` right before `Swap` in a trade.
+    The events are joined as they stream in the block order,
+    holding at most one unmatched `Sync` per pair.
+
+    - `Sync` followed by `Swap` of the same transaction becomes an entry with the trade volume
+
+    - `Sync` without `Swap`, from adding or removing liquidity, becomes an entry with zero volume
+
+    :param log_results:
+        Sync and Swap events in the block order.
+        May be from multiple pairs, each with its own :py:class:`UniswapV2PriceOracleContext`.
+
+    :return:
+        Price entries in the order of the `Sync` events of each pair
+    """
+
+    # Pair address -> Sync event waiting for its Swap
+    pending: Dict[str, LogResult] = {}
+
+    for log in log_results:
+        address = log["address"]
+        event_name = log["event"].event_name
+
+        if event_name == "Sync":
+            previous = pending.pop(address, None)
+            if previous is not None:
+                yield convert_sync_log_result_to_price_entry(previous, Decimal(0))
+            pending[address] = log
+        elif event_name == "Swap":
+            sync = pending.pop(address, None)
+            if sync is None or sync["transactionHash"] != log["transactionHash"]:
+                logger.warning("Swap without Sync in the same transaction, pair %s, tx %s", address, log["transactionHash"])
+                if sync is not None:
+                    yield convert_sync_log_result_to_price_entry(sync, Decimal(0))
+                continue
+            yield convert_sync_log_result_to_price_entry(sync, convert_swap_log_result_to_volume(log))
+        else:
+            raise AssertionError(f"Unexpected event {event_name}")
+
+    for sync in pending.values():
+        yield convert_sync_log_result_to_price_entry(sync, Decimal(0))
+
+
+def update_price_oracle_with_sync_events(
+    oracle: PriceOracle,
+    executor: futureproof.ThreadPoolExecutor,
+    web3: Web3,
+    pair_contract_address: str,
+    start_block: int,
+    end_block: int,
+    reverse_token_order=False,
+    with_volume=True,
+    chunk_size: int = 100,
+    notify: Optional[ProgressUpdate] = None,
+    pair_details: Optional[PairDetails] = None,
+):
+    """Feed price oracle data for a given block range using a thread pool.
+
+    - `eth_getLogs` calls are performed concurrently by the thread pool workers
+
+    - The events are added to the oracle in the block order
+
+    - The executor is not created for each call, so it can be shared by many oracles
+      and kept alive for live price feeds
+
+    Example:
+
+    .. code-block: python
+
+        web3_factory = TunedWeb3Factory(json_rpc_url)
+        web3 = web3_factory(None)
+        executor = create_thread_pool_executor(web3_factory, None, max_workers=16)
+
+        oracle = PriceOracle(
+            time_weighted_average_price,
+            max_age=PriceOracle.ANY_AGE,  # We are dealing with historical data
+            min_duration=datetime.timedelta(minutes=1),
+        )
+
+        update_price_oracle_with_sync_events(
+            oracle,
+            executor,
+            web3,
+            bnb_busd_address,
+            start_block,
+            end_block,
+        )
+
+    :param oracle:
+        Price oracle to update
+
+    :param executor:
+        Thread pool executor created with :py:func:`eth_defi.event_reader.web3worker.create_thread_pool_executor`
+
+    :param web3:
+        Web3 connection used to read the pair details
+
+    :param start_block:
+        First block to include data for
+
+    :param end_block:
+        Last block to include data for (inclusive)
+
+    :param reverse_token_order:
+        If pair token0 is the quote token to calculate the price.
+
+    :param with_volume:
+        Read Swap events in the same pass and fill in the trade volume of the entries.
+
+    :param chunk_size:
+        Block range of each `eth_getLogs` call
+
+    :param notify:
+        Progress callback for the scan
+
+    :param pair_details:
+        Pair details, if already known. Otherwise read with :py:func:`fetch_pair_details`.
+    """
+
+    assert pair_contract_address
+
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    events = [Pair.events.Sync, Pair.events.Swap] if with_volume else [Pair.events.Sync]
+
+    filter = Filter.create_filter(pair_contract_address, events)
+
+    if pair_details is None:
+        pair_details = fetch_pair_details(web3, pair_contract_address)
+
+    # Feed oracle with event data from JSON-RPC node
+    log_results = read_events_concurrent(
+        executor,
+        start_block,
+        end_block,
+        events,
+        notify=notify,
+        chunk_size=chunk_size,
+        filter=filter,
+        context=UniswapV2PriceOracleContext(pair_details, reverse_token_order),
     )
 
+    if with_volume:
+        entries = convert_sync_and_swap_log_results_to_price_entries(log_results)
+    else:
+        entries = (convert_sync_log_result_to_price_entry(log_result) for log_result in log_results)
 
-#
-# def update_price_oracle_with_sync_events(
-#     oracle: PriceOracle,
-#     executor: futureproof.ThreadPoolExecutor,
-#     web3_factory: Web3Factory,
-#     pair_contract_address: str,
-#     start_block: int,
-#     end_block: int,
-#     thread_pool_executor: Optional[futureproof.ThreadPoolExecutor],
-#     ):
-#     """Feed price oracle data for a given block range.
-#
-#     - Uses optimised parallel reading thread pool implmentation
-#
-#     - Uses fast multithreaded pool for the event fetch
-#     """
-#
-#     web3 = Web3Factory(None)
-#
-#     Pair = get_contract(web3, "UniswapV2Pair.json")
-#
-#     events = [
-#         Pair.events.Sync
-#     ]
-#
-#     signatures = Pair.events.Sync.build_filter().topics
-#     assert len(signatures) == 1
-#
-#     filter = Filter(
-#         contract_address=pair_contract_address,
-#         bloom=None,
-#         topics={
-#             signatures[0]: Pair.events.Sync,
-#         }
-#     )
-#
-#     for log_result in read_events_concurrent(
-#             web3_factory,
-#             start_block,
-#             end_block,
-#             [Pair.events.Sync],
-#             notify=None,
-#             chunk_size=100,
-#             filter=filter,
-#             context=None,
-#     ):
-#         import ipdb ; ipdb.set_trace()
+    for entry in entries:
+        oracle.add_price_entry(entry)
 
 
 def update_price_oracle_with_sync_events_single_thread(
@@ -123,6 +260,7 @@ def update_price_oracle_with_sync_events_single_thread(
     start_block: int,
     end_block: int,
     reverse_token_order=False,
+    with_volume=True,
 ):
     """Feed price oracle data for a given block range.
 
@@ -170,58 +308,99 @@ def update_price_oracle_with_sync_events_single_thread(
 
     :param reverse_token_order:
         If pair token0 is the quote token to calculate the price.
+
+    :param with_volume:
+        Read Swap events in the same pass and fill in the trade volume of the entries.
+        Needed for volume weighted prices,
+        see :py:class:`eth_defi.price_oracle.incremental.VolumeWeightedAveragePrice`.
     """
 
     assert pair_contract_address
 
     Pair = get_contract(web3, "UniswapV2Pair.json")
+    events = [Pair.events.Sync, Pair.events.Swap] if with_volume else [Pair.events.Sync]
 
-    signatures = Pair.events.Sync.build_filter().topics
-    assert len(signatures) == 1
-
-    filter = Filter(
-        contract_address=pair_contract_address,
-        bloom=None,
-        topics={
-            signatures[0]: Pair.events.Sync,
-        },
-    )
+    filter = Filter.create_filter(pair_contract_address, events)
 
     pool_details = fetch_pair_details(web3, pair_contract_address)
 
     # Feed oracle with event data from JSON-RPC node
-    for log_result in read_events(
+    log_results = read_events(
         web3,
         start_block,
         end_block,
-        [Pair.events.Sync],
+        events,
         notify=None,
         chunk_size=100,
         filter=filter,
         context=UniswapV2PriceOracleContext(pool_details, reverse_token_order),
-    ):
-        entry = convert_sync_log_result_to_price_entry(log_result)
+    )
+
+    if with_volume:
+        entries = convert_sync_and_swap_log_results_to_price_entries(log_results)
+    else:
+        entries = (convert_sync_log_result_to_price_entry(log_result) for log_result in log_results)
+
+    for entry in entries:
         oracle.add_price_entry(entry)
 
 
+def create_live_price_feed_follower(
+    web3: Web3,
+    pair_contract_address: str,
+    reverse_token_order=False,
+    with_volume=True,
+    start_block: Optional[int] = None,
+    history_size: int = 128,
+) -> ChainTipFollower:
+    """Create a chain tip follower for :py:func:`update_live_price_feed`.
+
+    :param start_block:
+        The first block to read. If not given, start from the chain tip.
+
+    :param history_size:
+        How many recent blocks to remember to roll back chain reorganisations
+    """
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    events = [Pair.events.Sync, Pair.events.Swap] if with_volume else [Pair.events.Sync]
+    pair_details = fetch_pair_details(web3, pair_contract_address)
+    return ChainTipFollower(
+        web3,
+        Filter.create_filter(pair_contract_address, events),
+        start_block=start_block,
+        context=UniswapV2PriceOracleContext(pair_details, reverse_token_order),
+        history_size=history_size,
+    )
+
+
 def update_live_price_feed(
     oracle: PriceOracle,
     web3: Web3,
     pair_contract_address: str,
     reverse_token_order=False,
     lookback_block_count: int = 5,
+    with_volume=True,
+    follower: Optional[ChainTipFollower] = None,
 ) -> Counter:
     """Fetch live price of Uniswap v2 pool by listening to Sync event.
 
     We use HTTP polling method, as HTTP polling is supported by free nodes.
 
+    Without a `follower`, the last `lookback_block_count` blocks are read again on every call.
+
     .. warning::
 
-        We do not have bullet-proof  logic to deal with minor chain reorgs.
+        Without a `follower` we do not have bullet-proof logic to deal with minor chain reorgs.
         Some transactions can hop blocks and be rejected in later blocks,
         and we do not deal with this.
-        This is a simple example implementation and may not suitable
-        for production usage.
+
+    :param with_volume:
+        Read Swap events in the same pass and fill in the trade volume of the entries.
+        Must match the `follower`.
+
+    :param follower:
+        Read only the new blocks and roll back the oracle entries of reorganised blocks.
+        Create with :py:func:`create_live_price_feed_follower` and pass the same follower on every call.
 
     :return:
         Debug stats
@@ -236,8 +415,31 @@ def update_live_price_feed(
         }
     )
 
+    if follower is not None:
+        update = follower.poll()
+
+        if update.rollback:
+            stats["reorgs"] += 1
+            stats["retracted"] = oracle.rollback(update.rollback.last_valid_block)
+
+        if with_volume:
+            entries = convert_sync_and_swap_log_results_to_price_entries(update.logs)
+        else:
+            entries = (convert_sync_log_result_to_price_entry(log_result) for log_result in update.logs)
+
+        for entry in entries:
+            oracle.add_price_entry(entry)
+            stats["created"] += 1
+
+        if update.tip:
+            last_timestamp = datetime.datetime.utcfromtimestamp(update.tip.timestamp)
+            oracle.update_last_refresh(update.tip.block_number, last_timestamp)
+            stats["discarded"] = oracle.truncate_buffer(last_timestamp)
+
+        return stats
+
     Pair = get_contract(web3, "UniswapV2Pair.json")
-    events = [Pair.events.Sync]
+    events = [Pair.events.Sync, Pair.events.Swap] if with_volume else [Pair.events.Sync]
 
     pair_details = fetch_pair_details(web3, pair_contract_address)
 
@@ -249,17 +451,23 @@ def update_live_price_feed(
     end_block = current_block
 
     # Feed oracle with event data from JSON-RPC node
-    for log_result in read_events(
+    log_results = read_events(
         web3,
         start_block,
         end_block,
-        [Pair.events.Sync],
+        events,
         notify=None,
         chunk_size=100,
         filter=filter,
         context=UniswapV2PriceOracleContext(pair_details, reverse_token_order),
-    ):
-        entry = convert_sync_log_result_to_price_entry(log_result)
+    )
+
+    if with_volume:
+        entries = convert_sync_and_swap_log_results_to_price_entries(log_results)
+    else:
+        entries = (convert_sync_log_result_to_price_entry(log_result) for log_result in log_results)
+
+    for entry in entries:
         hopped = oracle.add_price_entry_reorg_safe(entry)
         if hopped:
             stats["reorgs"] += 1
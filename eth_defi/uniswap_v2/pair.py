@@ -3,12 +3,13 @@
 """
 
 from dataclasses import dataclass
-from typing import Union
+from typing import Dict, Iterable, Union
 
 from eth_typing import HexAddress
 
 from eth_defi.abi import get_deployed_contract
-from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.multicall import batch_call
+from eth_defi.token import TokenDetails, fetch_erc20_details_many
 
 
 @dataclass
@@ -57,11 +58,48 @@ def fetch_pair_details(web3, pair_contact_address: Union[str, HexAddress]) -> Pa
     token0_address = pool.functions.token0().call()
     token1_address = pool.functions.token1().call()
 
-    token0 = fetch_erc20_details(web3, token0_address)
-    token1 = fetch_erc20_details(web3, token1_address)
+    tokens = fetch_erc20_details_many(web3, [token0_address, token1_address])
+    token0 = tokens[token0_address]
+    token1 = tokens[token1_address]
 
     return PairDetails(
         pool.address,
         token0,
         token1,
     )
+
+
+def fetch_pair_details_many(web3, pair_contact_addresses: Iterable[Union[str, HexAddress]], batch_size: int = 100) -> Dict[Union[str, HexAddress], PairDetails]:
+    """Get pair info for many pairs in a few round trips.
+
+    The same as calling :py:func:`fetch_pair_details` for each pair,
+    but the pair tokens are read with JSON-RPC batches
+    and tokens shared by the pairs are read only once.
+
+    :param web3:
+        Web3 instance
+
+    :param pair_contact_addresses:
+        Smart contract addresses of trading pairs
+
+    :param batch_size:
+        Maximum calls in a single JSON-RPC batch
+
+    :return:
+        Pair info keyed by the given addresses
+    """
+    pair_contact_addresses = list(dict.fromkeys(pair_contact_addresses))
+    pools = [get_deployed_contract(web3, "UniswapV2Pair.json", address) for address in pair_contact_addresses]
+    calls = [call for pool in pools for call in (pool.functions.token0(), pool.functions.token1())]
+    token_addresses = [r.get() for r in batch_call(web3, calls, batch_size=batch_size)]
+
+    tokens = fetch_erc20_details_many(web3, token_addresses, batch_size=batch_size)
+
+    return {
+        address: PairDetails(
+            pool.address,
+            tokens[token_addresses[idx * 2]],
+            tokens[token_addresses[idx * 2 + 1]],
+        )
+        for idx, (address, pool) in enumerate(zip(pair_contact_addresses, pools))
+    }
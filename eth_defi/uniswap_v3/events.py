@@ -13,9 +13,9 @@ Currently we are tracking these events:
 - Burn
 """
 import logging
-import csv
 import datetime
-from pathlib import Path
+from contextlib import ExitStack
+from typing import Optional
 
 from requests.adapters import HTTPAdapter
 from tqdm.auto import tqdm
@@ -29,33 +29,23 @@ from eth_defi.event_reader.conversion import (
     decode_data,
     convert_int256_bytes_to_int,
 )
-from eth_defi.event_reader.logresult import LogContext
-from eth_defi.event_reader.reader import LogResult, read_events_concurrent
+from eth_defi.event_reader.chunk_planner import JSONFileLogDensityState
+from eth_defi.event_reader.concurrency import AIMDConcurrencyLimiter, ConcurrencyStatus
+from eth_defi.event_reader.decode_pool import ProcessPoolDecoder
+from eth_defi.event_reader.reader import LogResult, extract_timestamps_json_rpc, prepare_filter, read_events_concurrent
+from eth_defi.event_reader.sink import create_event_sink
 from eth_defi.event_reader.state import ScanState
+from eth_defi.event_reader.timestamp import JSONRPCBatchTimestampExtractor
+from eth_defi.event_reader.timestamp_store import BlockTimestampStore, StoredTimestampExtractor
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
 from eth_defi.event_reader.web3worker import create_thread_pool_executor
-from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.token_cache import TokenCache
 from eth_defi.uniswap_v3.constants import UNISWAP_V3_FACTORY_CREATED_AT_BLOCK
 
 
 logger = logging.getLogger(__name__)
 
 
-class TokenCache(LogContext):
-    """Manage cache of token data when doing PoolCreated look-up.
-
-    Do not do extra requests for already known tokens.
-    """
-
-    def __init__(self):
-        self.cache = {}
-
-    def get_token_info(self, web3: Web3, address: str) -> TokenDetails:
-        if address not in self.cache:
-            self.cache[address] = fetch_erc20_details(web3, address, raise_on_error=False)
-        return self.cache[address]
-
-
 def _decode_base(log: LogResult) -> dict:
     block_time = datetime.datetime.utcfromtimestamp(log["timestamp"])
 
@@ -237,7 +227,15 @@ def get_event_mapping(web3: Web3) -> dict:
                 "token1_address",
                 "token1_symbol",
             ],
+            "field_types": {
+                "block_number": "int64",
+                "timestamp": "datetime",
+                "log_index": "int64",
+                "fee": "int64",
+            },
             "decode_function": decode_pool_created,
+            # Looks up token details over JSON-RPC
+            "needs_context": True,
         },
         "Swap": {
             "contract_event": Pool.events.Swap,
@@ -253,6 +251,16 @@ def get_event_mapping(web3: Web3) -> dict:
                 "liquidity",
                 "tick",
             ],
+            "field_types": {
+                "block_number": "int64",
+                "timestamp": "datetime",
+                "log_index": "int64",
+                "amount0": "int256",
+                "amount1": "int256",
+                "sqrt_price_x96": "uint256",
+                "liquidity": "uint256",
+                "tick": "int64",
+            },
             "decode_function": decode_swap,
         },
         "Mint": {
@@ -269,6 +277,16 @@ def get_event_mapping(web3: Web3) -> dict:
                 "amount0",
                 "amount1",
             ],
+            "field_types": {
+                "block_number": "int64",
+                "timestamp": "datetime",
+                "log_index": "int64",
+                "tick_lower": "int64",
+                "tick_upper": "int64",
+                "amount": "uint256",
+                "amount0": "uint256",
+                "amount1": "uint256",
+            },
             "decode_function": decode_mint,
         },
         "Burn": {
@@ -285,6 +303,16 @@ def get_event_mapping(web3: Web3) -> dict:
                 "amount0",
                 "amount1",
             ],
+            "field_types": {
+                "block_number": "int64",
+                "timestamp": "datetime",
+                "log_index": "int64",
+                "tick_lower": "int64",
+                "tick_upper": "int64",
+                "amount": "uint256",
+                "amount0": "uint256",
+                "amount1": "uint256",
+            },
             "decode_function": decode_burn,
         },
     }
@@ -298,6 +326,13 @@ def fetch_events_to_csv(
     output_folder: str = "/tmp",
     max_workers: int = 16,
     log_info=print,
+    timestamp_store: Optional[BlockTimestampStore] = None,
+    chunk_size: int = 100,
+    log_density_state: Optional[JSONFileLogDensityState] = None,
+    decode_workers: int = 0,
+    output_format: str = "csv",
+    token_cache: Optional[TokenCache] = None,
+    concurrency_limiter: Optional[AIMDConcurrencyLimiter] = None,
 ):
     """Fetch all tracked Uniswap v3 events to CSV files for notebook analysis.
 
@@ -311,6 +346,9 @@ def fetch_events_to_csv(
 
     - `/tmp/uniswap-v3-burn.csv`
 
+    With `output_format="parquet"` the files are Parquet datasets like `/tmp/uniswap-v3-swap.parquet`,
+    see :py:mod:`eth_defi.event_reader.sink`.
+
     A progress bar and estimation on the completion is rendered for console / Jupyter notebook using `tqdm`.
 
     The scan be resumed using `state` storage to retrieve the last scanned block number from the previous round.
@@ -329,15 +367,40 @@ def fetch_events_to_csv(
     :param max_workers:
         How many threads to allocate for JSON-RPC IO.
         You can increase your EVM node output a bit by making a lot of parallel requests,
-        until you exhaust your nodes IO capacity. Experiement with different values
-        and see how your node performs.
+        until you exhaust your nodes IO capacity.
+        Ignored if `concurrency_limiter` is given.
     :param log_info: Which function to use to output info messages about the progress
+    :param timestamp_store:
+        Persistent block timestamp store for the chain.
+        Rescanning the same block range does not fetch block headers again.
+    :param chunk_size:
+        How many blocks to scan in one eth_getLogs call
+    :param log_density_state:
+        Adapt the eth_getLogs block range to the log density,
+        starting from the density seen in the previous scan.
+        `chunk_size` is then used only for the first scan.
+        Without `timestamp_store`, only the headers of the blocks with logs are fetched.
+    :param decode_workers:
+        Decode Swap, Mint and Burn events in this many worker processes.
+        By default events are decoded in the calling thread.
+    :param output_format:
+        `csv` or `parquet`
+    :param token_cache:
+        Token details cache for PoolCreated events.
+        Use a cache with a database file to avoid reading the same tokens again when the scan is resumed.
+    :param concurrency_limiter:
+        Find the number of parallel requests the node can take, instead of using fixed `max_workers`.
+        The current limit is shown in the progress bar.
+        See :py:mod:`eth_defi.event_reader.concurrency`.
     """
-    token_cache = TokenCache()
+    if token_cache is None:
+        token_cache = TokenCache()
+    if concurrency_limiter is not None:
+        max_workers = concurrency_limiter.max_limit
     http_adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
     web3_factory = TunedWeb3Factory(json_rpc_url, http_adapter)
     web3 = web3_factory(token_cache)
-    executor = create_thread_pool_executor(web3_factory, token_cache, max_workers=max_workers)
+    executor = create_thread_pool_executor(web3_factory, token_cache, max_workers=max_workers, concurrency_limiter=concurrency_limiter)
     event_mapping = get_event_mapping(web3)
     contract_events = [event_data["contract_event"] for event_data in event_mapping.values()]
 
@@ -356,24 +419,51 @@ def fetch_events_to_csv(
     buffers = {}
 
     for event_name, mapping in event_mapping.items():
-        file_path = f"{output_folder}/uniswap-v3-{event_name.lower()}.csv"
-        exists_already = Path(file_path).exists()
-        file_handler = open(file_path, "a", encoding="utf-8")
-        csv_writer = csv.DictWriter(file_handler, fieldnames=mapping["field_names"])
-        if not exists_already:
-            csv_writer.writeheader()
+        sink = create_event_sink(
+            output_format,
+            f"{output_folder}/uniswap-v3-{event_name.lower()}",
+            mapping["field_names"],
+            mapping["field_types"],
+        )
 
         # For each event, we have its own
         # counters and handlers in the context dictionary
         buffers[event_name] = {
             "buffer": [],
             "total": 0,
-            "file_handler": file_handler,
-            "csv_writer": csv_writer,
+            "sink": sink,
         }
 
+    flter = prepare_filter(contract_events)
+
+    if decode_workers:
+        decode_pool = ProcessPoolDecoder(
+            {name: mapping["decode_function"] for name, mapping in event_mapping.items() if not mapping.get("needs_context")},
+            {name: mapping["decode_function"] for name, mapping in event_mapping.items() if mapping.get("needs_context")},
+            max_workers=decode_workers,
+        )
+    else:
+        decode_pool = None
+
+    if log_density_state is not None:
+        chunk_planner = log_density_state.create_planner(flter, initial_chunk_size=chunk_size)
+    else:
+        chunk_planner = None
+
+    if timestamp_store is not None:
+        extract_timestamps = StoredTimestampExtractor(timestamp_store)
+    elif chunk_planner is not None:
+        # The planner grows sparse ranges, fetch the headers of the blocks with logs only
+        extract_timestamps = JSONRPCBatchTimestampExtractor()
+    else:
+        extract_timestamps = extract_timestamps_json_rpc
+
     log_info(f"Scanning block range {restored_start_block:,} - {end_block:,}")
-    with tqdm(total=end_block - restored_start_block) as progress_bar:
+    with tqdm(total=end_block - restored_start_block) as progress_bar, ExitStack() as open_sinks:
+        # Finish the output files also if the scan is interrupted
+        for buffer_data in buffers.values():
+            open_sinks.push(buffer_data["sink"])
+
         #  1. update the progress bar
         #  2. save any events in the buffer in to a file in one go
         def update_progress(
@@ -384,9 +474,13 @@ def fetch_events_to_csv(
             total_events: int,
             last_timestamp: int,
             context: TokenCache,
+            concurrency: Optional[ConcurrencyStatus] = None,
         ):
             nonlocal buffers
 
+            if concurrency is not None:
+                progress_bar.set_postfix(workers=concurrency.limit)
+
             if last_timestamp:
                 # Display progress with the date information
                 d = datetime.datetime.utcfromtimestamp(last_timestamp)
@@ -401,10 +495,9 @@ def fetch_events_to_csv(
             for buffer_data in buffers.values():
                 buffer = buffer_data["buffer"]
 
-                # write events to csv
-                for entry in buffer:
-                    buffer_data["csv_writer"].writerow(entry)
-                    buffer_data["total"] += 1
+                # write events to the output file
+                buffer_data["sink"].write_batch(buffer)
+                buffer_data["total"] += len(buffer)
 
                 # then reset buffer
                 buffer_data["buffer"] = []
@@ -412,27 +505,40 @@ def fetch_events_to_csv(
             # Sync the state of updated events
             state.save_state(current_block)
 
+            if chunk_planner is not None:
+                log_density_state.update(flter, chunk_planner)
+                log_density_state.save()
+
         # Read specified events in block range
-        for log_result in read_events_concurrent(
+        log_results = read_events_concurrent(
             executor,
             restored_start_block,
             end_block,
             events=contract_events,
-            notify=update_progress,
-            chunk_size=100,
+            notify=decode_pool.wrap_notify(update_progress) if decode_pool else update_progress,
+            chunk_size=chunk_size,
             context=token_cache,
-        ):
-            try:
-                # write to correct buffer
-                event_name = log_result["event"].event_name
-                buffer = buffers[event_name]["buffer"]
-                decode_function = event_mapping[event_name]["decode_function"]
-
-                buffer.append(decode_function(log_result))
-            except Exception as e:
-                raise RuntimeError(f"Could not decode {log_result}") from e
-
-    # close files and print stats
+            extract_timestamps=extract_timestamps,
+            filter=flter,
+            chunk_planner=chunk_planner,
+        )
+
+        if decode_pool is not None:
+            with decode_pool:
+                for log_result, decoded in decode_pool.decode(log_results):
+                    buffers[log_result["event"].event_name]["buffer"].append(decoded)
+        else:
+            for log_result in log_results:
+                try:
+                    # write to correct buffer
+                    event_name = log_result["event"].event_name
+                    buffer = buffers[event_name]["buffer"]
+                    decode_function = event_mapping[event_name]["decode_function"]
+
+                    buffer.append(decode_function(log_result))
+                except Exception as e:
+                    raise RuntimeError(f"Could not decode {log_result}") from e
+
+    # print stats
     for event_name, buffer in buffers.items():
-        buffer["file_handler"].close()
         log_info(f"Wrote {buffer['total']} {event_name} events")
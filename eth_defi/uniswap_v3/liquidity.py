@@ -8,6 +8,7 @@ from typing import Iterable, TypedDict
 import pandas as pd
 from eth_typing import HexAddress
 
+from eth_defi.event_reader.sink import load_event_dataframe
 from eth_defi.uniswap_v3.constants import DEFAULT_TICK_SPACINGS
 from eth_defi.uniswap_v3.utils import (
     get_token0_amount_in_range,
@@ -18,6 +19,19 @@ from eth_defi.uniswap_v3.utils import (
 )
 
 
+#: Mint and burn event columns needed to construct tick deltas
+TICK_DELTA_EVENT_COLUMNS = [
+    "block_number",
+    "timestamp",
+    "tx_hash",
+    "log_index",
+    "pool_contract_address",
+    "tick_lower",
+    "tick_upper",
+    "amount",
+]
+
+
 class TickDelta(TypedDict):
     """A dictionary of a tick delta, where liquidity of a tick changes"""
 
@@ -109,13 +123,18 @@ def create_tick_delta_csv(
 ) -> str:
     """Create intermediate tick delta csv based on mint and burn events
 
-    :param mints_csv: Path to mint events CSV
-    :param burns_csv: Path to burn events CSV
+    :param mints_csv: Path to mint events CSV or Parquet dataset
+    :param burns_csv: Path to burn events CSV or Parquet dataset
     :param output_folder: Folder to contain output CSV files, default is /tmp folder
     :return: output CSV path
     """
-    mints_df = pd.read_csv(mints_csv)
-    burns_df = pd.read_csv(burns_csv)
+    mints_df = load_event_dataframe(mints_csv, columns=TICK_DELTA_EVENT_COLUMNS)
+    burns_df = load_event_dataframe(burns_csv, columns=TICK_DELTA_EVENT_COLUMNS)
+
+    # Parquet exports have datetime timestamps, write them the same way as CSV exports
+    for df in (mints_df, burns_df):
+        if pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+            df["timestamp"] = df["timestamp"].map(lambda t: t.isoformat())
 
     # filter out duplicates
     mints_df = mints_df.drop_duplicates(
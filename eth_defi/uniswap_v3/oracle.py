@@ -3,12 +3,13 @@ import datetime
 from collections import Counter
 from dataclasses import dataclass
 from decimal import Decimal
+from typing import Iterable
 
 from requests.adapters import HTTPAdapter
 from web3 import Web3
 
 from eth_defi.abi import get_contract
-from eth_defi.event_reader.logresult import LogContext
+from eth_defi.event_reader.logresult import LogContext, LogResult
 from eth_defi.event_reader.reader import (
     Filter,
     extract_timestamps_json_rpc,
@@ -50,9 +51,9 @@ def convert_swap_event_to_price_entry(log: dict) -> PriceEntry:
     )
 
     if context.reverse_token_order:
-        volume = abs(swap_info["amount1"]) / 10**context.pool.token1.decimals
+        volume = context.pool.token1.convert_to_decimals(abs(swap_info["amount1"]))
     else:
-        volume = abs(swap_info["amount0"]) / 10**context.pool.token0.decimals
+        volume = context.pool.token0.convert_to_decimals(abs(swap_info["amount0"]))
 
     return PriceEntry(
         timestamp=datetime.datetime.utcfromtimestamp(log["timestamp"]),
@@ -63,9 +64,20 @@ def convert_swap_event_to_price_entry(log: dict) -> PriceEntry:
         pool_contract_address=swap_info["pool_contract_address"],
         block_hash=log["blockHash"],
         tx_hash=swap_info["tx_hash"],
+        log_index=swap_info["log_index"],
     )
 
 
+def convert_swap_events_to_price_entries(log_results: Iterable[LogResult]) -> Iterable[PriceEntry]:
+    """Create price entries based on eth_getLogs results of many pools.
+
+    Each log carries the :py:class:`UniswapV3PriceOracleContext` of its pool.
+    Can be used with :py:class:`eth_defi.price_oracle.manager.OracleManager`.
+    """
+    for log in log_results:
+        yield convert_swap_event_to_price_entry(log)
+
+
 def update_price_oracle_concurrent(
     oracle: PriceOracle,
     json_rpc_url: str,
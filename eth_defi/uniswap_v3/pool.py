@@ -5,7 +5,7 @@ from typing import Union
 from eth_typing import HexAddress
 
 from eth_defi.abi import get_deployed_contract
-from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.token import TokenDetails, fetch_erc20_details_many
 
 
 @dataclass
@@ -53,8 +53,9 @@ def fetch_pool_details(web3, pool_contact_address: Union[str, HexAddress]) -> Po
     token0_address = pool.functions.token0().call()
     token1_address = pool.functions.token1().call()
 
-    token0 = fetch_erc20_details(web3, token0_address)
-    token1 = fetch_erc20_details(web3, token1_address)
+    tokens = fetch_erc20_details_many(web3, [token0_address, token1_address])
+    token0 = tokens[token0_address]
+    token1 = tokens[token1_address]
 
     raw_fee = pool.functions.fee().call()
 
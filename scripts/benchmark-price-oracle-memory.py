@@ -0,0 +1,76 @@
+"""Benchmark the memory usage of price oracle buffers.
+
+- Feeds one entry per second with all `PriceEntry` fields set, like a live feed does
+
+- Measures the memory allocated by :py:class:`eth_defi.price_oracle.buffer.PriceEntryBuffer`
+  and :py:class:`eth_defi.price_oracle.columnar.ColumnarPriceEntryBuffer` with `tracemalloc`
+
+To run:
+
+.. code-block:: shell
+
+    python scripts/benchmark-price-oracle-memory.py
+
+Set `ENTRY_COUNT` environment variable to change the buffer size.
+
+"""
+import datetime
+import gc
+import os
+import time
+import tracemalloc
+from decimal import Decimal
+
+from eth_defi.price_oracle.buffer import PriceEntryBuffer
+from eth_defi.price_oracle.columnar import ColumnarPriceEntryBuffer
+from eth_defi.price_oracle.oracle import PriceEntry, PriceSource
+
+
+#: A handful of pools share the buffer entries
+POOL_ADDRESSES = [f"0x{i:040x}" for i in range(10)]
+
+
+def create_entry(i: int, start: datetime.datetime) -> PriceEntry:
+    return PriceEntry(
+        timestamp=start + datetime.timedelta(seconds=i),
+        price=Decimal(1000 + i % 100) / Decimal(7),
+        volume=Decimal(i % 1000),
+        source=PriceSource.uniswap_v2_like_pool_sync_event,
+        pool_contract_address=POOL_ADDRESSES[i % len(POOL_ADDRESSES)],
+        block_number=i // 3,
+        tx_hash=f"0x{i:064x}",
+        log_index=i % 5,
+        # Three entries per block
+        block_hash=f"0x{i // 3:064x}",
+        first_seen_at_block_number=i // 3,
+    )
+
+
+def measure(name: str, buffer, entry_count: int, start: datetime.datetime):
+    """Print the memory held by a buffer filled with entries."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(entry_count):
+        buffer.append(create_entry(i, start))
+    duration = time.perf_counter() - started
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<30} {size / 2**20:10.1f} MB {size / entry_count:8.1f} bytes/entry, peak {peak / 2**20:10.1f} MB, added in {duration:.1f} s")
+    return size
+
+
+def main():
+    entry_count = int(os.environ.get("ENTRY_COUNT", 1_000_000))
+    start = datetime.datetime(2022, 1, 1)
+
+    print(f"Feeding {entry_count:,} entries")
+    objects = measure("PriceEntryBuffer", PriceEntryBuffer(), entry_count, start)
+    floats = measure("ColumnarPriceEntryBuffer", ColumnarPriceEntryBuffer(), entry_count, start)
+    scaled = measure("ColumnarPriceEntryBuffer int64", ColumnarPriceEntryBuffer(price_decimals=8), entry_count, start)
+    print(f"Columnar storage takes {floats / objects:.1%} (float64) and {scaled / objects:.1%} (int64) of the object storage")
+
+
+if __name__ == "__main__":
+    main()
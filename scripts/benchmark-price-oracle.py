@@ -0,0 +1,103 @@
+"""Benchmark price oracle operations with a large buffer.
+
+- Feeds the oracle with one entry per second, including out-of-order entries
+
+- Measures the latency of price calculation, newest/oldest look-ups,
+  reorg safe ingestion and buffer truncation
+
+- Compares the plain price function to incremental price functions
+
+To run:
+
+.. code-block:: shell
+
+    python scripts/benchmark-price-oracle.py
+
+Set `ENTRY_COUNT` environment variable to change the buffer size.
+
+"""
+import datetime
+import os
+import time
+from decimal import Decimal
+
+from eth_defi.price_oracle.incremental import ExponentialMovingAveragePrice, MeanPrice, TimeWeightedAveragePrice
+from eth_defi.price_oracle.oracle import PriceEntry, PriceOracle, PriceSource, time_weighted_average_price
+
+
+def measure(name: str, func, rounds: int = 10):
+    """Print the average latency of a function."""
+    started = time.perf_counter()
+    for i in range(rounds):
+        func()
+    duration = (time.perf_counter() - started) / rounds
+    print(f"{name:<50} {duration * 1000:12.3f} ms")
+
+
+def create_oracle(price_function, entry_count: int) -> PriceOracle:
+    return PriceOracle(
+        price_function,
+        max_age=PriceOracle.ANY_AGE,
+        min_duration=datetime.timedelta(0),
+        target_time_window=datetime.timedelta(seconds=entry_count),
+    )
+
+
+def feed(oracle: PriceOracle, entry_count: int, start: datetime.datetime):
+    for i in range(entry_count):
+        # Every 1000th entry is late by a minute
+        offset = i - 60 if i % 1000 == 999 else i
+        oracle.add_price_entry_reorg_safe(
+            PriceEntry(
+                timestamp=start + datetime.timedelta(seconds=offset),
+                price=Decimal(1000 + i % 100),
+                source=PriceSource.unknown,
+                block_number=i,
+                tx_hash=f"0x{i:064x}",
+                log_index=0,
+                block_hash=f"0x{i:064x}",
+            )
+        )
+
+
+def main():
+    entry_count = int(os.environ.get("ENTRY_COUNT", 1_000_000))
+    start = datetime.datetime(2022, 1, 1)
+
+    oracle = create_oracle(time_weighted_average_price, entry_count)
+
+    print(f"Feeding {entry_count:,} entries")
+    started = time.perf_counter()
+    feed(oracle, entry_count, start)
+    print(f"Added {len(oracle.buffer):,} entries in {time.perf_counter() - started:.1f} s")
+
+    measure("calculate_price()", oracle.calculate_price, rounds=3)
+    measure("get_newest()", oracle.get_newest, rounds=100_000)
+    measure("get_oldest()", oracle.get_oldest, rounds=100_000)
+    measure("check_data_quality()", oracle.check_data_quality, rounds=100_000)
+
+    duplicate = oracle.get_by_transaction_hash(f"0x{entry_count // 2:064x}")
+    measure("add_price_entry_reorg_safe() duplicate", lambda: oracle.add_price_entry_reorg_safe(duplicate), rounds=100_000)
+
+    # Discard 1000 seconds of data per round
+    now = start + datetime.timedelta(seconds=entry_count)
+
+    def truncate():
+        nonlocal now
+        now += datetime.timedelta(seconds=1000)
+        oracle.truncate_buffer(now)
+
+    measure("truncate_buffer() 1000 entries", truncate, rounds=100)
+    print(f"{len(oracle.buffer):,} entries left in the buffer")
+
+    for price_function in (MeanPrice(), TimeWeightedAveragePrice(), ExponentialMovingAveragePrice()):
+        name = price_function.__class__.__name__
+        oracle = create_oracle(price_function, entry_count)
+        started = time.perf_counter()
+        feed(oracle, entry_count, start)
+        print(f"Added {len(oracle.buffer):,} entries with {name} in {time.perf_counter() - started:.1f} s")
+        measure(f"calculate_price() {name}", oracle.calculate_price, rounds=100_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ Also
 
 - Uses HTTP polling method
 
-- Adjusts for minor chain reorgs / unstable chain tip
+- Reads only the new blocks and rolls back minor chain reorgs / unstable chain tip
 
 To run:
 
@@ -26,7 +26,7 @@ from web3 import HTTPProvider, Web3
 from web3.middleware import geth_poa_middleware
 
 from eth_defi.price_oracle.oracle import PriceOracle, time_weighted_average_price
-from eth_defi.uniswap_v2.oracle import update_live_price_feed
+from eth_defi.uniswap_v2.oracle import create_live_price_feed_follower, update_live_price_feed
 from eth_defi.uniswap_v2.pair import fetch_pair_details
 
 
@@ -66,9 +66,11 @@ def main():
     print(f"Starting initial data fetch of {initial_fetch_block_count} blocks")
     update_live_price_feed(oracle, web3, pair_contract_address, reverse_token_order=reverse_token_order, lookback_block_count=initial_fetch_block_count)
 
+    follower = create_live_price_feed_follower(web3, pair_contract_address, reverse_token_order=reverse_token_order, start_block=oracle.last_refreshed_block_number + 1)
+
     print(f"Starting live price feed, TWAP time window is set to {oracle.target_time_window}")
     while True:
-        stats = update_live_price_feed(oracle, web3, pair_contract_address, reverse_token_order=reverse_token_order)
+        stats = update_live_price_feed(oracle, web3, pair_contract_address, reverse_token_order=reverse_token_order, follower=follower)
 
         last_price = oracle.get_newest().price
         twap = oracle.calculate_price()
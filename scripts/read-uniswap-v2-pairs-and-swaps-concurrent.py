@@ -51,7 +51,6 @@ from typing import Optional
 
 from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-from web3 import Web3
 
 from eth_defi.abi import get_contract
 from eth_defi.event_reader.conversion import (
@@ -60,11 +59,10 @@ from eth_defi.event_reader.conversion import (
     convert_uint256_string_to_address,
     decode_data,
 )
-from eth_defi.event_reader.logresult import LogContext
 from eth_defi.event_reader.reader import LogResult, read_events_concurrent
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
 from eth_defi.event_reader.web3worker import create_thread_pool_executor
-from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.token_cache import TokenCache
 
 #: List of output columns to pairs.csv
 PAIR_FIELD_NAMES = [
@@ -95,21 +93,6 @@ SWAP_FIELD_NAMES = [
 ]
 
 
-class TokenCache(LogContext):
-    """Manage cache of token data when doing PairCreated look-up.
-
-    Do not do extra requests for already known tokens.
-    """
-
-    def __init__(self):
-        self.cache = {}
-
-    def get_token_info(self, web3: Web3, address: str) -> TokenDetails:
-        if address not in self.cache:
-            self.cache[address] = fetch_erc20_details(web3, address, raise_on_error=False)
-        return self.cache[address]
-
-
 def decode_pair_created(log: LogResult) -> dict:
     """Process a pair created event.
 
@@ -10,7 +10,8 @@ Overview:
 
 - Events can be pair creation or swap events
 
-- For pair creation events, we perform additional token lookups using Web3 connection
+- For pair creation events, we perform additional token lookups using Web3 connection.
+  Token details are cached in `/tmp/uni-v2-token-cache.sqlite`, so a resumed run does not look them up again
 
 - Demonstrates how to hand tune event decoding
 
@@ -48,9 +49,8 @@ from eth_defi.abi import get_contract
 from eth_defi.event_reader.conversion import convert_uint256_string_to_address, convert_uint256_bytes_to_address, \
     decode_data, convert_int256_bytes_to_int
 from eth_defi.event_reader.fast_json_rpc import patch_web3
-from eth_defi.event_reader.logresult import LogContext
 from eth_defi.event_reader.reader import read_events, LogResult
-from eth_defi.token import fetch_erc20_details, TokenDetails
+from eth_defi.token_cache import TokenCache
 
 
 #: List of output columns to pairs.csv
@@ -82,21 +82,6 @@ SWAP_FIELD_NAMES = [
 ]
 
 
-class TokenCache(LogContext):
-    """Manage cache of token data when doing PairCreated look-up.
-
-    Do not do extra requests for already known tokens.
-    """
-
-    def __init__(self):
-        self.cache = {}
-
-    def get_token_info(self, web3: Web3, address: str) -> TokenDetails:
-        if address not in self.cache:
-            self.cache[address] = fetch_erc20_details(web3, address, raise_on_error=False)
-        return self.cache[address]
-
-
 def save_state(state_fname, last_block):
     """Saves the last block we have read."""
     with open(state_fname, "wt") as f:
@@ -245,6 +230,7 @@ def main():
     pairs_fname = "/tmp/uni-v2-pairs.csv"
     swaps_fname = "/tmp/uni-v2-swaps.csv"
     state_fname = "/tmp/uni-v2-last-block-state.txt"
+    token_cache_fname = "/tmp/uni-v2-token-cache.sqlite"
 
     start_block = restore_state(state_fname, 10_000_835)  # # When Uni v2 was deployed
     end_block = web3.eth.block_number
@@ -254,7 +240,7 @@ def main():
     pairs_event_buffer = []
     swaps_event_buffer = []
 
-    token_cache = TokenCache()
+    token_cache = TokenCache(token_cache_fname)
 
     print(f"Starting to read block range {start_block:,} - {end_block:,}")
 
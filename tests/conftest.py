@@ -0,0 +1,466 @@
+"""Shared test fixtures.
+
+Offline fixtures for the event reader and JSON-RPC helpers.
+
+:py:class:`FakeChain` is a minimal in-memory EVM chain that serves block headers and logs
+in the raw JSON-RPC hex format, the same way a real node does.
+It is exposed over HTTP by :py:class:`FakeJSONRPCServer`, so tests can use
+real `HTTPProvider` connections and thread pools without a network access,
+and over websocket by :py:class:`FakeWebSocketServer`.
+"""
+import gzip
+import http.server
+import json
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pytest
+from eth_bloom import BloomFilter
+
+
+class FakeChain:
+    """In-memory chain serving eth_getLogs and block headers.
+
+    - Block hashes are derived from the block number and the fork id,
+      so a chain reorganisation can be simulated with :py:meth:`reorganise`
+
+    - Logs are stored in block order and carry correct `logsBloom` in block headers
+    """
+
+    def __init__(
+        self,
+        block_count: int = 1000,
+        chain_id: int = 1337,
+        start_timestamp: int = 1_600_000_000,
+        block_time: int = 12,
+    ):
+        self.chain_id = chain_id
+        self.start_timestamp = start_timestamp
+        self.block_time = block_time
+
+        #: block number -> fork id
+        self.forks: Dict[int, int] = {}
+
+        #: block number -> list of raw logs
+        self.logs: Dict[int, List[dict]] = {}
+
+        self.block_count = block_count
+
+        #: Method name -> call count
+        self.calls = Counter()
+
+        #: How many HTTP POST requests we have served
+        self.http_requests = 0
+
+        #: Refuse JSON-RPC batch arrays like some commercial nodes do
+        self.batch_supported = True
+
+        #: Reject JSON-RPC batch arrays longer than this
+        self.max_batch_size: Optional[int] = None
+
+        #: Answer the next JSON-RPC batch arrays with a rate limit error
+        self.batch_failures = 0
+
+        #: tx hash -> raw transaction receipt
+        self.receipts: Dict[str, dict] = {}
+
+        #: Reject eth_getLogs over wider block ranges
+        self.max_block_range: Optional[int] = None
+
+        #: Reject eth_getLogs returning more results
+        self.max_logs: Optional[int] = None
+
+        #: Simulate network latency for each HTTP request, seconds
+        self.response_delay = 0.0
+
+        #: How many HTTP requests are being served now, and the peak
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        #: Answer the next HTTP requests with HTTP 503
+        self.http_failures = 0
+
+        #: Gzip the responses if the client accepts it, and how many were gzipped
+        self.gzip_supported = True
+        self.gzipped_responses = 0
+
+        #: Contract address -> function taking eth_call calldata and returning the return data
+        self.contracts: Dict[str, Callable[[str], str]] = {}
+
+        #: Answer the next eth_call requests with a rate limit error
+        self.eth_call_failures = 0
+
+        self.lock = threading.Lock()
+
+    @property
+    def head(self) -> int:
+        return self.block_count - 1
+
+    def get_block_hash(self, block_number: int) -> str:
+        fork = self.forks.get(block_number, 0)
+        return f"0x{fork:08x}{block_number:056x}"
+
+    def get_timestamp(self, block_number: int) -> int:
+        return self.start_timestamp + block_number * self.block_time
+
+    def add_log(self, block_number: int, address: str, topics: List[str], data: str = "0x") -> dict:
+        """Add a new log entry to a block."""
+        assert block_number <= self.head
+        block_logs = self.logs.setdefault(block_number, [])
+        log_index = len(block_logs)
+        log = {
+            "address": address.lower(),
+            "topics": topics,
+            "data": data,
+            "blockNumber": hex(block_number),
+            "transactionHash": f"0x{block_number:032x}{log_index:032x}",
+            "transactionIndex": hex(log_index),
+            "logIndex": hex(log_index),
+            "removed": False,
+        }
+        block_logs.append(log)
+        return log
+
+    def add_receipt(self, tx_hash: str, block_number: int, status: int = 1) -> dict:
+        """Add a mined transaction."""
+        receipt = {
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "blockHash": self.get_block_hash(block_number),
+            "blockNumber": hex(block_number),
+            "from": "0x" + "00" * 20,
+            "to": "0x" + "11" * 20,
+            "cumulativeGasUsed": "0x5208",
+            "gasUsed": "0x5208",
+            "effectiveGasPrice": "0x3b9aca00",
+            "contractAddress": None,
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": hex(status),
+            "type": "0x2",
+        }
+        self.receipts[tx_hash] = receipt
+        return receipt
+
+    def mine(self, count: int = 1):
+        """Add more empty blocks at the chain tip."""
+        self.block_count += count
+
+    def reorganise(self, first_block: int):
+        """Replace all blocks starting from the given block with new blocks having different hashes.
+
+        Logs in the replaced blocks are dropped.
+        """
+        for block_number in range(first_block, self.block_count):
+            self.forks[block_number] = self.forks.get(block_number, 0) + 1
+            self.logs.pop(block_number, None)
+
+    def get_logs_bloom(self, block_number: int) -> str:
+        bloom = BloomFilter()
+        for log in self.logs.get(block_number, []):
+            bloom.add(bytes.fromhex(log["address"][2:]))
+            for topic in log["topics"]:
+                bloom.add(bytes.fromhex(topic[2:]))
+        return "0x" + int(bloom).to_bytes(256, "big").hex()
+
+    def get_block(self, block_number: int) -> Optional[dict]:
+        if block_number > self.head:
+            return None
+        return {
+            "number": hex(block_number),
+            "hash": self.get_block_hash(block_number),
+            "parentHash": self.get_block_hash(block_number - 1) if block_number > 0 else "0x" + "00" * 32,
+            "timestamp": hex(self.get_timestamp(block_number)),
+            "logsBloom": self.get_logs_bloom(block_number),
+            "transactions": [],
+        }
+
+    def call(self, transaction: dict) -> str:
+        if self.eth_call_failures > 0:
+            self.eth_call_failures -= 1
+            raise FakeJSONRPCError(-32005, "request rate exceeded")
+        contract = self.contracts.get(transaction["to"].lower())
+        if contract is None:
+            return "0x"
+        return contract(transaction["data"])
+
+    def get_logs(self, params: dict) -> List[dict]:
+        from_block = self.parse_block_number(params.get("fromBlock", "latest"))
+        to_block = self.parse_block_number(params.get("toBlock", "latest"))
+
+        if self.max_block_range is not None and to_block - from_block + 1 > self.max_block_range:
+            raise FakeJSONRPCError(-32000, f"exceed maximum block range: {self.max_block_range}")
+
+        addresses = params.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        if addresses:
+            addresses = {a.lower() for a in addresses}
+
+        topic_filter = params.get("topics") or []
+        result = []
+        for block_number in range(from_block, min(to_block, self.head) + 1):
+            for log in self.logs.get(block_number, []):
+                if addresses and log["address"] not in addresses:
+                    continue
+                if not self.match_topics(topic_filter, log["topics"]):
+                    continue
+                out = log.copy()
+                out["blockHash"] = self.get_block_hash(block_number)
+                result.append(out)
+
+        if self.max_logs is not None and len(result) > self.max_logs:
+            raise FakeJSONRPCError(-32005, f"query returned more than {self.max_logs} results")
+
+        return result
+
+    @staticmethod
+    def match_topics(topic_filter: list, topics: list) -> bool:
+        for idx, wanted in enumerate(topic_filter):
+            if wanted is None:
+                continue
+            if idx >= len(topics):
+                return False
+            if isinstance(wanted, list):
+                if topics[idx] not in wanted:
+                    return False
+            elif topics[idx] != wanted:
+                return False
+        return True
+
+    def parse_block_number(self, value: Union[str, int]) -> int:
+        if value in ("latest", "pending", "safe", "finalized"):
+            return self.head
+        if value == "earliest":
+            return 0
+        if isinstance(value, int):
+            return value
+        return int(value, 16)
+
+    def handle(self, request: dict) -> dict:
+        """Serve one JSON-RPC request."""
+        method = request["method"]
+        params = request.get("params", [])
+
+        with self.lock:
+            self.calls[method] += 1
+            try:
+                if method == "eth_chainId":
+                    result = hex(self.chain_id)
+                elif method == "eth_blockNumber":
+                    result = hex(self.head)
+                elif method == "eth_getBlockByNumber":
+                    result = self.get_block(self.parse_block_number(params[0]))
+                elif method == "eth_getBlockByHash":
+                    result = None
+                    for block_number in range(self.block_count):
+                        if self.get_block_hash(block_number) == params[0]:
+                            result = self.get_block(block_number)
+                            break
+                elif method == "eth_getLogs":
+                    result = self.get_logs(params[0])
+                elif method == "eth_getTransactionReceipt":
+                    result = self.receipts.get(params[0])
+                elif method == "eth_call":
+                    result = self.call(params[0])
+                else:
+                    raise FakeJSONRPCError(-32601, f"Method {method} not found")
+            except FakeJSONRPCError as e:
+                return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": e.code, "message": e.message}}
+
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def handle_payload(self, payload: Union[dict, list]) -> Union[dict, list]:
+        self.http_requests += 1
+        if isinstance(payload, list):
+            if not self.batch_supported:
+                return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch requests are not supported"}}
+            if self.max_batch_size is not None and len(payload) > self.max_batch_size:
+                return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch too large"}}
+            if self.batch_failures > 0:
+                self.batch_failures -= 1
+                return {"jsonrpc": "2.0", "id": None, "error": {"code": -32005, "message": "request rate exceeded"}}
+            return [self.handle(r) for r in payload]
+        return self.handle(payload)
+
+
+class FakeJSONRPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeJSONRPCServer:
+    """Serve :py:class:`FakeChain` over HTTP in a background thread."""
+
+    def __init__(self, chain: FakeChain):
+        self.chain = chain
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(handler):
+                length = int(handler.headers["Content-Length"])
+                payload = json.loads(handler.rfile.read(length))
+
+                with chain.lock:
+                    failing = chain.http_failures > 0
+                    if failing:
+                        chain.http_failures -= 1
+
+                if failing:
+                    handler.send_response(503)
+                    handler.send_header("Content-Length", "0")
+                    handler.end_headers()
+                    return
+
+                with chain.lock:
+                    chain.in_flight += 1
+                    chain.max_in_flight = max(chain.max_in_flight, chain.in_flight)
+                try:
+                    if chain.response_delay:
+                        time.sleep(chain.response_delay)
+                    body = json.dumps(chain.handle_payload(payload)).encode("utf-8")
+                finally:
+                    with chain.lock:
+                        chain.in_flight -= 1
+
+                gzipped = chain.gzip_supported and "gzip" in handler.headers.get("Accept-Encoding", "")
+                if gzipped:
+                    body = gzip.compress(body)
+                    with chain.lock:
+                        chain.gzipped_responses += 1
+
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                if gzipped:
+                    handler.send_header("Content-Encoding", "gzip")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeWebSocketServer:
+    """Serve :py:class:`FakeChain` over websocket JSON-RPC with `eth_subscribe("logs")`.
+
+    Runs in the event loop of the test.
+    New logs are pushed to the subscribers with :py:meth:`publish`.
+    """
+
+    def __init__(self, chain: FakeChain):
+        self.chain = chain
+        self.server = None
+
+        #: websocket -> (subscription id, filter params)
+        self.subscriptions = {}
+        self.subscription_count = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def start(self):
+        import websockets
+
+        self.server = await websockets.serve(self.handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, websocket, *args):
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                if request["method"] == "eth_subscribe":
+                    self.subscription_count += 1
+                    subscription_id = hex(self.subscription_count)
+                    self.subscriptions[websocket] = (subscription_id, request["params"][1])
+                    response = {"jsonrpc": "2.0", "id": request["id"], "result": subscription_id}
+                else:
+                    response = self.chain.handle(request)
+                await websocket.send(json.dumps(response))
+        except Exception:
+            pass
+        finally:
+            self.subscriptions.pop(websocket, None)
+
+    async def publish(self, logs: List[dict]):
+        """Push logs to the matching subscriptions."""
+        for websocket, (subscription_id, params) in list(self.subscriptions.items()):
+            addresses = params.get("address")
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            for log in logs:
+                if addresses and log["address"] not in {a.lower() for a in addresses}:
+                    continue
+                if not self.chain.match_topics(params.get("topics") or [], log["topics"]):
+                    continue
+                notification = {"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": subscription_id, "result": log}}
+                await websocket.send(json.dumps(notification))
+
+    async def publish_block(self, block_number: int):
+        """Push the logs of a block like a node does when it sees the block."""
+        await self.publish(self.chain.get_logs({"fromBlock": hex(block_number), "toBlock": hex(block_number)}))
+
+    async def drop_connections(self):
+        """Close all client connections."""
+        for websocket in list(self.subscriptions):
+            await websocket.close()
+        self.subscriptions.clear()
+
+
+@pytest.fixture()
+def fake_chain() -> FakeChain:
+    """In-memory chain with 1000 empty blocks."""
+    return FakeChain()
+
+
+@pytest.fixture()
+def fake_json_rpc_url(fake_chain: FakeChain) -> str:
+    """HTTP JSON-RPC endpoint serving :py:func:`fake_chain`."""
+    server = FakeJSONRPCServer(fake_chain)
+    server.start()
+    yield server.url
+    server.stop()
+
+
+@pytest.fixture()
+def fake_json_rpc_endpoints() -> List[Tuple[FakeChain, str]]:
+    """Three HTTP JSON-RPC endpoints, each serving its own copy of the same chain."""
+    servers = [FakeJSONRPCServer(FakeChain()) for i in range(3)]
+    for server in servers:
+        server.start()
+    yield [(server.chain, server.url) for server in servers]
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture()
+async def fake_websocket_server(fake_chain: FakeChain) -> FakeWebSocketServer:
+    """Websocket JSON-RPC endpoint serving :py:func:`fake_chain`."""
+    server = FakeWebSocketServer(fake_chain)
+    await server.start()
+    yield server
+    await server.stop()
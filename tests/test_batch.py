@@ -0,0 +1,127 @@
+"""JSON-RPC batch requests."""
+import datetime
+
+import pytest
+from web3 import HTTPProvider, Web3
+from web3.eth import AsyncEth
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+from eth_defi import batch_async
+from eth_defi.batch import BatchRequestError, batch_request
+from eth_defi.confirmation import wait_transactions_to_complete
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    return Web3(HTTPProvider(fake_json_rpc_url))
+
+
+def get_header_calls(count: int) -> list:
+    return [("eth_getBlockByNumber", (hex(n), False)) for n in range(count)]
+
+
+def test_batch_split_and_errors(fake_chain, web3):
+    """Calls are split by count and size, errors are mapped to the failed calls."""
+    calls = get_header_calls(25)
+    calls[3] = ("eth_foobar", ())
+
+    results = batch_request(web3, calls, batch_size=10)
+    assert fake_chain.http_requests == 3
+    assert len(results) == 25
+    assert results[0].result["number"] == "0x0"
+    assert results[24].result["number"] == "0x18"
+    assert not results[3].ok
+    assert results[3].error["code"] == -32601
+    with pytest.raises(ValueError):
+        results[3].get()
+
+    # Each encoded entry is 79 bytes, so 3 fit in a batch
+    fake_chain.http_requests = 0
+    batch_request(web3, get_header_calls(10), max_batch_bytes=300)
+    assert fake_chain.http_requests == 4
+
+    with pytest.raises(BatchRequestError):
+        batch_request(web3, calls, raise_on_error=True)
+
+
+def test_batch_too_large_and_refused(fake_chain, web3):
+    """Too large batches are split, refused batches are sent one by one."""
+    fake_chain.max_batch_size = 4
+    results = batch_request(web3, get_header_calls(10))
+    assert [int(r.result["number"], 16) for r in results] == list(range(10))
+
+    fake_chain.max_batch_size = None
+    fake_chain.batch_supported = False
+    fake_chain.http_requests = 0
+    results = batch_request(web3, get_header_calls(5))
+    assert [int(r.result["number"], 16) for r in results] == list(range(5))
+    assert fake_chain.http_requests == 1 + 5
+
+
+def test_batch_throttled(fake_chain, web3):
+    """A throttled batch is raised, not sent again one call at a time."""
+    fake_chain.batch_failures = 1
+    with pytest.raises(ValueError, match="request rate exceeded"):
+        batch_request(web3, get_header_calls(10))
+    assert fake_chain.http_requests == 1
+
+    results = batch_request(web3, get_header_calls(10))
+    assert [int(r.result["number"], 16) for r in results] == list(range(10))
+    assert fake_chain.http_requests == 2
+
+
+async def test_batch_async(fake_chain, fake_json_rpc_url):
+    """Async batches."""
+    web3 = Web3(AsyncHTTPProvider(fake_json_rpc_url), modules={"eth": [AsyncEth]}, middlewares=[])
+    calls = get_header_calls(30)
+    calls[10] = ("eth_foobar", ())
+
+    results = await batch_async.batch_request(web3, calls, batch_size=10)
+    assert fake_chain.http_requests == 3
+    assert results[29].result["number"] == hex(29)
+    assert not results[10].ok
+
+    fake_chain.batch_supported = False
+    results = await batch_async.batch_request(web3, get_header_calls(3))
+    assert [r.result["number"] for r in results] == ["0x0", "0x1", "0x2"]
+
+    fake_chain.batch_supported = True
+    fake_chain.batch_failures = 1
+    fake_chain.http_requests = 0
+    with pytest.raises(ValueError, match="request rate exceeded"):
+        await batch_async.batch_request(web3, get_header_calls(3))
+    assert fake_chain.http_requests == 1
+
+
+async def test_batch_async_retry(fake_chain, fake_json_rpc_url, mocker):
+    """Async batches are retried on HTTP errors."""
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    mocker.patch("eth_defi.batch_async.asyncio.sleep", side_effect=sleep)
+
+    web3 = Web3(AsyncHTTPProvider(fake_json_rpc_url), modules={"eth": [AsyncEth]}, middlewares=[])
+    fake_chain.http_failures = 2
+    results = await batch_async.batch_request(web3, get_header_calls(3), raise_on_error=True)
+    assert [r.result["number"] for r in results] == ["0x0", "0x1", "0x2"]
+    assert fake_chain.http_failures == 0
+    assert sleeps == pytest.approx([5, 6])
+
+
+def test_wait_transactions_batched(fake_chain, web3):
+    """Receipts of all transactions are polled in a single batch."""
+    tx_hashes = [f"0x{i:064x}" for i in range(1, 6)]
+    for tx_hash in tx_hashes:
+        fake_chain.add_receipt(tx_hash, 990)
+
+    receipts = wait_transactions_to_complete(web3, tx_hashes, confirmation_block_count=5, poll_delay=datetime.timedelta(0))
+
+    assert len(receipts) == 5
+    receipt = list(receipts.values())[0]
+    assert receipt.status == 1
+    assert receipt.blockNumber == 990
+    assert fake_chain.calls["eth_getTransactionReceipt"] == 5
+    # eth_chainId and one batch
+    assert fake_chain.http_requests == 2
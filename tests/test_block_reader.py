@@ -24,11 +24,11 @@ from eth_defi.event_reader.conversion import (
     decode_data,
 )
 from eth_defi.event_reader.fast_json_rpc import patch_web3
-from eth_defi.event_reader.logresult import LogContext, LogResult
+from eth_defi.event_reader.logresult import LogResult
 from eth_defi.event_reader.reader import read_events, read_events_concurrent
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
 from eth_defi.event_reader.web3worker import create_thread_pool_executor
-from eth_defi.token import TokenDetails, fetch_erc20_details
+from eth_defi.token_cache import TokenCache
 
 pytestmark = pytest.mark.skipif(
     os.environ.get("JSON_RPC_URL") is None,
@@ -36,21 +36,6 @@ pytestmark = pytest.mark.skipif(
 )
 
 
-class TokenCache(LogContext):
-    """Manage cache of token data when doing PairCreated look-up.
-
-    Do not do extra requests for already known tokens.
-    """
-
-    def __init__(self):
-        self.cache = {}
-
-    def get_token_info(self, web3: Web3, address: str) -> TokenDetails:
-        if address not in self.cache:
-            self.cache[address] = fetch_erc20_details(web3, address, raise_on_error=False)
-        return self.cache[address]
-
-
 def decode_pair_created(log: LogResult) -> dict:
     """Process a pair created event.
 
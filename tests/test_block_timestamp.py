@@ -0,0 +1,99 @@
+"""Log-driven block timestamp fetching."""
+import pytest
+from web3 import HTTPProvider, Web3
+from web3.eth import AsyncEth
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader import reader_async
+from eth_defi.event_reader.reader import read_events
+from eth_defi.event_reader.timestamp import JSONRPCBatchTimestampExtractor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    web3.middleware_onion.clear()
+    return web3
+
+
+@pytest.fixture()
+def sync_event(web3):
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def populated_chain(fake_chain, sync_event):
+    """Sparse logs: a Sync event every 50th block, two events in block 500."""
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(0, fake_chain.block_count, 50):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+    fake_chain.add_log(500, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+    return fake_chain
+
+
+def test_fetch_timestamps_batched(fake_chain, web3):
+    """Block headers are fetched in JSON-RPC batches."""
+    extractor = JSONRPCBatchTimestampExtractor(batch_size=10)
+    timestamps = extractor.fetch_timestamps(web3, set(range(0, 25)))
+    assert timestamps == {n: fake_chain.get_timestamp(n) for n in range(0, 25)}
+    assert fake_chain.calls["eth_getBlockByNumber"] == 25
+    assert fake_chain.http_requests == 3
+
+
+def test_fetch_timestamps_batch_refused(fake_chain, web3):
+    """Fall back to a request per block if the node does not support batches."""
+    fake_chain.batch_supported = False
+    extractor = JSONRPCBatchTimestampExtractor(batch_size=10)
+    timestamps = extractor.fetch_timestamps(web3, {5, 7})
+    assert timestamps == {5: fake_chain.get_timestamp(5), 7: fake_chain.get_timestamp(7)}
+    assert fake_chain.calls["eth_getBlockByNumber"] == 2
+
+
+def test_read_events_only_log_blocks(populated_chain, web3, sync_event):
+    """Only blocks with logs have their headers fetched."""
+    logs = list(
+        read_events(
+            web3,
+            0,
+            999,
+            [sync_event],
+            None,
+            chunk_size=200,
+            extract_timestamps=JSONRPCBatchTimestampExtractor(),
+        )
+    )
+
+    assert len(logs) == 21
+    for log in logs:
+        assert log["timestamp"] == populated_chain.get_timestamp(int(log["blockNumber"], 16))
+
+    # 20 distinct blocks with logs instead of 1000 headers
+    assert populated_chain.calls["eth_getBlockByNumber"] == 20
+    # One eth_getLogs and one header batch per chunk
+    assert populated_chain.http_requests == 5 + 5
+
+
+async def test_read_events_async(populated_chain, fake_json_rpc_url, sync_event):
+    """Async reader uses the same extractor."""
+    web3 = Web3(AsyncHTTPProvider(fake_json_rpc_url), modules={"eth": [AsyncEth]}, middlewares=[])
+
+    logs = []
+    async for log in reader_async.read_events(
+        web3,
+        0,
+        999,
+        [sync_event],
+        None,
+        chunk_size=500,
+        extract_timestamps=JSONRPCBatchTimestampExtractor(batch_size=4),
+    ):
+        logs.append(log)
+
+    assert len(logs) == 21
+    assert logs[-1]["timestamp"] == populated_chain.get_timestamp(950)
+    assert populated_chain.calls["eth_getBlockByNumber"] == 20
@@ -0,0 +1,90 @@
+"""Persistent memory-mapped block timestamp store."""
+import multiprocessing
+
+import pytest
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.reader import read_events_concurrent
+from eth_defi.event_reader.timestamp_store import BlockTimestampStore, StoredTimestampExtractor
+from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def sync_event(fake_json_rpc_url):
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def executor(fake_json_rpc_url):
+    web3_factory = TunedWeb3Factory(fake_json_rpc_url, HTTPAdapter())
+    executor = create_thread_pool_executor(web3_factory, None, max_workers=4)
+    yield executor
+    executor.join()
+
+
+def _fill_every_other(path: str, first_block: int):
+    store = BlockTimestampStore(path, segment_size=64)
+    store.update({n: 1_000_000 + n for n in range(first_block, 200, 2)})
+    store.close()
+
+
+def test_store_persist(tmp_path):
+    """Timestamps survive closing and reopening the store, across segments."""
+    store = BlockTimestampStore.open_chain(tmp_path, chain_id=1, segment_size=64)
+    store.update({5: 1_600_000_000, 63: 1_600_000_012, 64: 1_600_000_024, 1000: 2**32 - 1})
+    assert store.get(6) is None
+    store.close()
+
+    store = BlockTimestampStore.open_chain(tmp_path, chain_id=1, segment_size=64)
+    found, missing = store.get_many([5, 6, 63, 64, 1000])
+    assert found == {5: 1_600_000_000, 63: 1_600_000_012, 64: 1_600_000_024, 1000: 2**32 - 1}
+    assert missing == [6]
+    assert len(store) == 4
+    store.close()
+
+
+def test_store_multiple_processes(tmp_path):
+    """Two processes writing neighbouring slots of the same bitmap bytes do not lose data."""
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_fill_every_other, args=(str(tmp_path), first)) for first in (0, 1)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+
+    store = BlockTimestampStore(tmp_path, segment_size=64)
+    found, missing = store.get_many(range(200))
+    assert missing == []
+    assert found == {n: 1_000_000 + n for n in range(200)}
+    store.close()
+
+
+def test_rescan_no_header_requests(fake_chain, fake_json_rpc_url, executor, sync_event, tmp_path):
+    """Rescanning the same range with the store does not fetch any block headers."""
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(0, fake_chain.block_count, 7):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+
+    store = BlockTimestampStore.open_chain(tmp_path, chain_id=fake_chain.chain_id)
+    extract_timestamps = StoredTimestampExtractor(store)
+
+    def scan():
+        return list(read_events_concurrent(executor, 0, 999, [sync_event], None, chunk_size=100, extract_timestamps=extract_timestamps))
+
+    logs = scan()
+    assert len(logs) == 143
+    assert fake_chain.calls["eth_getBlockByNumber"] == 143
+
+    logs = scan()
+    assert all(log["timestamp"] == fake_chain.get_timestamp(int(log["blockNumber"], 16)) for log in logs)
+    assert fake_chain.calls["eth_getBlockByNumber"] == 143
+    store.close()
@@ -0,0 +1,107 @@
+"""Block header bloom prefiltering."""
+import pytest
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.bloom import BlockBloomStore, BloomPrefilter
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.reader import read_events, read_events_concurrent
+from eth_defi.event_reader.timestamp_store import BlockTimestampStore, StoredTimestampExtractor
+from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+OTHER_ADDRESS = "0x1111111111111111111111111111111111111111"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    web3.middleware_onion.clear()
+    return web3
+
+
+@pytest.fixture()
+def sync_event(web3):
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def sparse_chain(fake_chain, sync_event):
+    """3000 blocks with a few Sync events of our pair and some noise."""
+    fake_chain.mine(2000)
+    signature = sync_event.build_filter().topics[0]
+    for block_number in (150, 160, 2500):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+
+    # The same event of another contract and another event of our contract
+    fake_chain.add_log(1000, OTHER_ADDRESS, [signature], "0x" + "00" * 64)
+    fake_chain.add_log(1200, PAIR_ADDRESS, ["0x" + "22" * 32], "0x")
+    return fake_chain
+
+
+def test_read_events_bloom_prefilter(sparse_chain, web3, sync_event, tmp_path):
+    """eth_getLogs is called only for the candidate ranges, and rescans read no headers."""
+    filter = Filter.create_filter(PAIR_ADDRESS, [sync_event])
+    bloom_store = BlockBloomStore.open_chain(tmp_path / "blooms", 1337)
+    timestamp_store = BlockTimestampStore.open_chain(tmp_path / "timestamps", 1337)
+    prefilter = BloomPrefilter(web3, filter, bloom_store=bloom_store, timestamp_store=timestamp_store)
+
+    notified_blocks = 0
+
+    def notify(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context):
+        nonlocal notified_blocks
+        notified_blocks += chunk_size
+
+    logs = list(
+        read_events(
+            web3,
+            0,
+            2999,
+            None,
+            notify,
+            chunk_size=100,
+            filter=filter,
+            extract_timestamps=StoredTimestampExtractor(timestamp_store),
+            bloom_prefilter=prefilter,
+        )
+    )
+
+    assert [int(log["blockNumber"], 16) for log in logs] == [150, 160, 2500]
+    assert logs[0]["timestamp"] == sparse_chain.get_timestamp(150)
+    assert sparse_chain.calls["eth_getLogs"] == 2
+    assert notified_blocks == 11 + 1
+    assert prefilter.checked_blocks == 3000
+    assert prefilter.candidate_blocks == 3
+
+    # Timestamps came from the headers read by the prefilter
+    assert sparse_chain.calls["eth_getBlockByNumber"] == 3000
+
+    # Rescan is served from the bloom store
+    prefilter = BloomPrefilter(web3, filter, bloom_store=bloom_store)
+    logs = list(read_events(web3, 0, 2999, None, None, chunk_size=100, filter=filter, extract_timestamps=None, bloom_prefilter=prefilter))
+    assert len(logs) == 3
+    assert prefilter.fetched_headers == 0
+    assert sparse_chain.calls["eth_getBlockByNumber"] == 3000
+
+    bloom_store.close()
+    timestamp_store.close()
+
+
+def test_read_events_concurrent_bloom_prefilter(sparse_chain, web3, fake_json_rpc_url, sync_event):
+    """Concurrent reader scans the candidate ranges only, in the block order."""
+    filter = Filter.create_filter([PAIR_ADDRESS, OTHER_ADDRESS], [sync_event])
+    prefilter = BloomPrefilter(web3, filter, header_batch_size=250)
+
+    web3_factory = TunedWeb3Factory(fake_json_rpc_url, HTTPAdapter())
+    executor = create_thread_pool_executor(web3_factory, None, max_workers=4)
+
+    logs = list(read_events_concurrent(executor, 0, 2999, None, None, chunk_size=5, filter=filter, extract_timestamps=None, bloom_prefilter=prefilter))
+    executor.join()
+
+    assert [int(log["blockNumber"], 16) for log in logs] == [150, 160, 1000, 2500]
+    assert sparse_chain.calls["eth_getLogs"] == 4
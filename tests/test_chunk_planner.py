@@ -0,0 +1,145 @@
+"""Adaptive eth_getLogs chunk sizing."""
+import pytest
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+
+from eth_defi.aave_v3.constants import AAVE_V3_NETWORKS
+from eth_defi.aave_v3.events import aave_v3_fetch_events_to_csv
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.chunk_planner import AdaptiveChunkPlanner, JSONFileLogDensityState, is_log_range_error
+from eth_defi.event_reader.json_state import JSONFileScanState
+from eth_defi.event_reader.reader import prepare_filter, read_events, read_events_concurrent
+from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    web3.middleware_onion.clear()
+    return web3
+
+
+@pytest.fixture()
+def sync_event(web3):
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def populated_chain(fake_chain, sync_event):
+    """Empty history until block 8000, then 5 Sync events per block."""
+    fake_chain.mine(9000)
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(8000, fake_chain.block_count):
+        for i in range(5):
+            fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+    return fake_chain
+
+
+def test_planner_grow_and_shrink():
+    """Empty ranges grow the chunk, dense ranges shrink it to the log budget."""
+    planner = AdaptiveChunkPlanner(initial_chunk_size=100, target_logs=1000)
+    planner.record_success(100, 0)
+    assert planner.next_chunk_size() == 200
+    planner.record_success(200, 0)
+    assert planner.next_chunk_size() == 400
+
+    planner.record_success(400, 4000)
+    assert planner.next_chunk_size() == 100
+
+
+def test_planner_max_block_range():
+    """Maximum block range told by the node is respected."""
+    planner = AdaptiveChunkPlanner(initial_chunk_size=20_000)
+    e = ValueError({"code": -32000, "message": "exceed maximum block range: 5000"})
+    assert is_log_range_error(e)
+    planner.record_failure(20_000, e)
+    assert planner.next_chunk_size() == 5000
+    planner.record_success(5000, 0)
+    assert planner.next_chunk_size() == 5000
+
+
+def test_log_range_errors():
+    """Range and response size errors are told apart from throttling."""
+    assert is_log_range_error(ValueError({"code": -32005, "message": "query returned more than 10000 results"}))
+    assert is_log_range_error(ValueError({"code": -32602, "message": "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range"}))
+    assert not is_log_range_error(ValueError({"code": -32005, "message": "rate limit exceeded"}))
+    assert not is_log_range_error(ValueError({"code": -32005, "message": "limit exceeded"}))
+    assert not is_log_range_error(ValueError({"code": -32000, "message": "query timeout exceeded"}))
+
+
+def test_read_events_bisect(populated_chain, web3, sync_event):
+    """Rejected ranges are split and all events are still read in order."""
+    populated_chain.max_logs = 100
+
+    planner = AdaptiveChunkPlanner(initial_chunk_size=1000, target_logs=50)
+    logs = list(read_events(web3, 0, 9999, [sync_event], None, extract_timestamps=None, chunk_planner=planner))
+
+    assert len(logs) == 2000 * 5
+    keys = [(int(log["blockNumber"], 16), int(log["logIndex"], 16)) for log in logs]
+    assert keys == sorted(keys)
+    assert planner.next_chunk_size() == 10
+
+
+def test_read_events_concurrent_adaptive(populated_chain, fake_json_rpc_url, sync_event, tmp_path):
+    """Concurrent reader grows chunks over the empty history and remembers the density."""
+    populated_chain.max_block_range = 500
+
+    web3_factory = TunedWeb3Factory(fake_json_rpc_url, HTTPAdapter())
+    executor = create_thread_pool_executor(web3_factory, None, max_workers=4)
+
+    notified_blocks = 0
+
+    def notify(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context):
+        nonlocal notified_blocks
+        notified_blocks += chunk_size
+
+    state = JSONFileLogDensityState(tmp_path / "density.json")
+    filter = prepare_filter([sync_event])
+    planner = state.create_planner(filter, initial_chunk_size=10, target_logs=100)
+
+    logs = list(read_events_concurrent(executor, 0, 9999, [sync_event], notify, extract_timestamps=None, filter=filter, chunk_planner=planner))
+    executor.join()
+
+    assert len(logs) == 2000 * 5
+    assert notified_blocks == 10_000
+    assert planner.max_chunk_size == 500
+
+    state.update(filter, planner)
+    state.save()
+
+    # The next scan starts with the chunk size close to the dense range needs (20 blocks),
+    # not from the default 100 blocks. The exact value depends on the completion order of the workers.
+    state = JSONFileLogDensityState(tmp_path / "density.json")
+    assert 15 <= state.create_planner(filter, target_logs=100).next_chunk_size() <= 60
+
+
+def test_exporter_grown_chunk_timestamps(fake_chain, fake_json_rpc_url, web3, tmp_path):
+    """Grown chunks of a sparse scan fetch the headers of the blocks with logs only."""
+    fake_chain.mine(29_000)
+    ReserveLogic = get_contract(web3, "aave_v3/ReserveLogic.json")
+    signature = ReserveLogic.events.ReserveDataUpdated.build_filter().topics[0]
+    pool_address = AAVE_V3_NETWORKS["polygon"].pool_address
+    for block_number in (100, 15_000, 29_000):
+        fake_chain.add_log(block_number, pool_address, [signature, "0x" + "00" * 32], "0x" + "00" * 32 * 5)
+
+    aave_v3_fetch_events_to_csv(
+        fake_json_rpc_url,
+        JSONFileScanState(str(tmp_path / "state.json")),
+        "polygon",
+        0,
+        fake_chain.head,
+        output_folder=str(tmp_path),
+        max_workers=2,
+        log_info=lambda message: None,
+        log_density_state=JSONFileLogDensityState(str(tmp_path / "density.json")),
+    )
+
+    assert len((tmp_path / "aave-v3-polygon-reservedataupdated.csv").read_text().splitlines()) == 1 + 3
+    # Far less than the 300 ranges of the initial chunk size
+    assert fake_chain.calls["eth_getLogs"] < 100
+    assert fake_chain.calls["eth_getBlockByNumber"] == 3
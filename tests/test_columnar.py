@@ -0,0 +1,98 @@
+"""Vectorised columnar log decoding."""
+import random
+
+import numpy as np
+import pytest
+
+from eth_defi.event_reader.columnar import decode_logs_columnar
+from eth_defi.event_reader.conversion import (
+    convert_int256_bytes_to_int,
+    convert_uint256_bytes_to_address,
+    decode_data,
+)
+
+
+def make_swap_log(block_number: int, words: list, sender: str) -> dict:
+    return {
+        "address": "0x8AD599C3A0FF1DE082011EFDDC58F1908EB6E6D8",
+        "topics": [
+            "0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67",
+            "0x" + "00" * 12 + sender[2:],
+        ],
+        "data": "0x" + "".join((w % 2**256).to_bytes(32, "big").hex() for w in words),
+        "blockNumber": hex(block_number),
+        "transactionHash": f"0x{block_number:064x}",
+        "logIndex": hex(block_number % 7),
+        "timestamp": 1_600_000_000 + block_number,
+    }
+
+
+@pytest.fixture(scope="module")
+def logs():
+    rng = random.Random(1)
+    edge_values = [0, 1, -1, 2**255 - 1, -(2**255), 2**63, -(2**63) - 1]
+    result = []
+    for i in range(500):
+        amount0 = edge_values[i] if i < len(edge_values) else rng.randint(-(2**255), 2**255 - 1)
+        amount1 = rng.randint(-(2**100), 2**100)
+        sqrt_price = rng.randint(0, 2**160 - 1)
+        liquidity = rng.randint(0, 2**128 - 1)
+        tick = rng.randint(-887272, 887272)
+        sender = "0x" + rng.randbytes(20).hex()
+        result.append(make_swap_log(1000 + i, [amount0, amount1, sqrt_price, liquidity, tick], sender))
+    return result
+
+
+def test_columnar_exact_ints(logs):
+    """256-bit values match the per log decoding exactly."""
+    columns = decode_logs_columnar(logs)
+    assert len(columns) == 500
+
+    amount0 = columns.get_word_int(0, signed=True)
+    sqrt_price = columns.get_word_int(2)
+    liquidity = columns.get_word_int(3)
+    for i, log in enumerate(logs):
+        words = decode_data(log["data"])
+        assert amount0[i] == convert_int256_bytes_to_int(words[0], signed=True)
+        assert sqrt_price[i] == convert_int256_bytes_to_int(words[2])
+        assert liquidity[i] == convert_int256_bytes_to_int(words[3])
+
+    assert amount0[4] == -(2**255)
+    assert columns.get_word_limbs(0)[2].tolist() == [2**64 - 1] * 4
+
+
+def test_columnar_int64_and_float(logs):
+    """Fast paths for small values and floats."""
+    columns = decode_logs_columnar(logs)
+
+    ticks = columns.get_word_int64(4, signed=True)
+    assert ticks.dtype == np.int64
+    assert ticks.tolist() == [convert_int256_bytes_to_int(decode_data(log["data"])[4], signed=True) for log in logs]
+
+    with pytest.raises(OverflowError):
+        columns.get_word_int64(0, signed=True)
+
+    amount1 = columns.get_word_float(1, signed=True)
+    expected = [float(convert_int256_bytes_to_int(decode_data(log["data"])[1], signed=True)) for log in logs]
+    assert amount1 == pytest.approx(expected, rel=1e-12)
+    assert columns.get_word_float(0, signed=True)[2] == -1.0
+
+
+def test_columnar_metadata(logs):
+    """Block numbers, addresses and topics."""
+    columns = decode_logs_columnar(logs)
+    assert columns.block_number[0] == 1000
+    assert columns.log_index[3] == 1003 % 7
+    assert columns.timestamp[-1] == 1_600_000_000 + 1499
+    assert columns.address[0] == "0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8"
+    assert columns.transaction_hash[1] == logs[1]["transactionHash"]
+
+    senders = columns.get_word_address(1, topic=True)
+    for i in (0, 10, 499):
+        raw = bytes.fromhex(logs[i]["topics"][1][2:])
+        assert senders[i] == convert_uint256_bytes_to_address(raw).lower()
+
+
+def test_columnar_empty():
+    columns = decode_logs_columnar([])
+    assert len(columns) == 0
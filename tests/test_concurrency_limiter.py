@@ -0,0 +1,134 @@
+"""Adaptive AIMD concurrency for the event reader workers."""
+import time
+
+import pytest
+import requests
+from requests.exceptions import HTTPError
+from web3 import Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.concurrency import AIMDConcurrencyLimiter, is_throttling_error
+from eth_defi.event_reader.raw_json_rpc import RawJSONRPCProvider, make_raw_request
+from eth_defi.event_reader.reader import read_events_concurrent
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+def create_http_error(status_code: int) -> HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    return HTTPError(f"{status_code} Server Error", response=response)
+
+
+@pytest.fixture()
+def sync_event():
+    Pair = get_contract(Web3(), "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+def test_throttling_errors():
+    """Throttling and timeouts decrease the limit, other errors do not."""
+    assert is_throttling_error(create_http_error(429))
+    assert is_throttling_error(requests.exceptions.ReadTimeout())
+    assert is_throttling_error(ValueError({"code": -32005, "message": "daily request count exceeded, request rate limited"}))
+    assert not is_throttling_error(create_http_error(500))
+    assert not is_throttling_error(ValueError({"code": -32005, "message": "query returned more than 10000 results"}))
+
+
+def test_limiter_additive_increase_multiplicative_decrease():
+    """The limit grows by one per healthy round and halves once per throttled round."""
+    limiter = AIMDConcurrencyLimiter(initial_limit=2, max_limit=4)
+
+    for i in range(2):
+        limiter.record_success(0.01)
+    assert limiter.limit == 3
+    for i in range(3):
+        limiter.record_success(0.01)
+    assert limiter.limit == 4
+    assert limiter.last_change.reason.startswith("healthy round")
+
+    # Capped
+    for i in range(10):
+        limiter.record_success(0.01)
+    assert limiter.limit == 4
+
+    # Slow responses do not grow the limit
+    limiter = AIMDConcurrencyLimiter(initial_limit=2, max_limit=4, smoothing=1.0)
+    limiter.record_success(0.01)
+    for i in range(10):
+        limiter.record_success(0.1)
+    assert limiter.limit == 2
+
+    # All the requests in flight see the same throttling, but it halves the limit only once
+    limiter = AIMDConcurrencyLimiter(initial_limit=8, max_limit=8)
+    generations = [limiter.acquire() for i in range(8)]
+    for generation in generations:
+        limiter.record_error(create_http_error(429), generation)
+    assert limiter.limit == 4
+    assert limiter.last_change.previous_limit == 8
+    assert limiter.last_change.reason.startswith("throttled")
+
+    # Requests started after the decrease can decrease again
+    for i in range(8):
+        limiter.release()
+    limiter.record_error(create_http_error(429), limiter.acquire())
+    assert limiter.limit == 2
+
+
+def test_limiter_request_latency(fake_chain, fake_json_rpc_url):
+    """Latency is measured per JSON-RPC request, not per task."""
+    fake_chain.response_delay = 0.01
+    web3 = Web3(RawJSONRPCProvider(fake_json_rpc_url))
+    limiter = AIMDConcurrencyLimiter(initial_limit=2, max_limit=4)
+
+    with limiter.slot():
+        for i in range(3):
+            make_raw_request(web3, "eth_blockNumber", [])
+        # Decoding and other work of the task
+        time.sleep(0.2)
+
+    assert len(limiter.latencies) == 3
+    assert limiter.latency < 0.1
+    assert limiter.limit == 3
+
+    # Requests outside a slot are not measured
+    make_raw_request(web3, "eth_blockNumber", [])
+    assert len(limiter.latencies) == 3
+
+
+def test_read_events_concurrent_adaptive_concurrency(fake_chain, fake_json_rpc_url, sync_event):
+    """Workers back off on throttling, then raise the concurrency while the node keeps up."""
+    fake_chain.mine(9000)
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(0, fake_chain.block_count, 10):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+
+    fake_chain.response_delay = 0.01
+    fake_chain.http_failures = 1
+
+    def web3_factory(context) -> Web3:
+        web3 = Web3(RawJSONRPCProvider(fake_json_rpc_url, sleep=0))
+        web3.middleware_onion.clear()
+        return web3
+
+    limiter = AIMDConcurrencyLimiter(initial_limit=4, max_limit=8)
+    executor = create_thread_pool_executor(web3_factory, None, concurrency_limiter=limiter)
+    assert executor.max_workers == 8
+
+    statuses = []
+
+    def notify(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context, concurrency=None):
+        statuses.append(concurrency)
+
+    logs = list(read_events_concurrent(executor, 0, 9999, [sync_event], notify, chunk_size=100, extract_timestamps=None))
+    executor.join()
+
+    assert len(logs) == 1000
+    assert limiter.changes[0].limit == 2
+    assert limiter.changes[0].reason.startswith("throttled")
+    assert limiter.limit > 2
+    assert all(s is not None for s in statuses)
+    assert statuses[-1].limit == limiter.limit
+    assert fake_chain.max_in_flight <= 8
@@ -0,0 +1,90 @@
+"""Decode logs in a process pool."""
+import pytest
+from web3 import Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.decode_pool import ProcessPoolDecoder
+from eth_defi.uniswap_v3.events import decode_burn, decode_swap
+
+
+@pytest.fixture(scope="module")
+def pool_events():
+    Pool = get_contract(Web3(), "uniswap_v3/UniswapV3Pool.json")
+    return Pool.events
+
+
+def make_log(event, block_number: int, log_index: int, topics: list, words: list) -> dict:
+    data = "0x" + "".join((w % 2**256).to_bytes(32, "big").hex() for w in words)
+    return {
+        "address": "0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8",
+        "topics": topics,
+        "data": data,
+        "blockNumber": hex(block_number),
+        "transactionHash": f"0x{block_number:064x}",
+        "logIndex": hex(log_index),
+        "timestamp": 1_600_000_000 + block_number * 12,
+        "event": event,
+        "context": object(),  # Not picklable in a useful way, must not be shipped
+    }
+
+
+def generate_logs(pool_events, count: int):
+    tick = (1).to_bytes(32, "big").hex()
+    for i in range(count):
+        if i % 10 == 0:
+            yield make_log(pool_events.Burn, i, 0, ["0x0", "0x" + "00" * 32, "0x" + tick, "0x" + tick], [i, 2 * i, 3 * i])
+        else:
+            yield make_log(pool_events.Swap, i, 0, ["0x0"], [-i, i, 2**160 - 1, 2**128 - 1, -5])
+
+
+def test_decode_pool_order(pool_events):
+    """Decoded results match the single process decoding, in the same order."""
+    logs = list(generate_logs(pool_events, 2000))
+
+    with ProcessPoolDecoder({"Swap": decode_swap}, {"Burn": decode_burn}, max_workers=2, batch_size=64) as decoder:
+        results = list(decoder.decode(logs))
+
+    assert [log for log, decoded in results] == logs
+    for log, decoded in results:
+        if log["event"].event_name == "Swap":
+            assert decoded == decode_swap(log)
+        else:
+            assert decoded == decode_burn(log)
+
+    assert results[1][1]["amount0"] == -1
+    assert results[1][1]["sqrt_price_x96"] == 2**160 - 1
+
+
+def test_decode_pool_deferred_notify(pool_events):
+    """Progress notifications arrive only after the logs before them have been yielded."""
+    yielded = []
+    notified = []
+
+    def notify(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context):
+        # All logs of the earlier block ranges are out
+        assert all(int(log["blockNumber"], 16) < current_block for log, decoded in yielded)
+        assert len(yielded) == current_block
+        notified.append(current_block)
+
+    with ProcessPoolDecoder({"Swap": decode_swap, "Burn": decode_burn}, max_workers=2, batch_size=50) as decoder:
+        wrapped = decoder.wrap_notify(notify)
+
+        def reader():
+            logs = list(generate_logs(pool_events, 1000))
+            for block_num in range(0, 1000, 100):
+                wrapped(block_num, 0, 999, 100, block_num, None, None)
+                yield from logs[block_num : block_num + 100]
+
+        for result in decoder.decode(reader()):
+            yielded.append(result)
+
+    assert notified == list(range(0, 1000, 100))
+    assert len(yielded) == 1000
+
+
+def test_decode_pool_error(pool_events):
+    """Decoding errors in a worker process are raised to the caller."""
+    bad = make_log(pool_events.Swap, 1, 0, ["0x0"], [1])
+    with ProcessPoolDecoder({"Swap": decode_swap}, max_workers=1) as decoder:
+        with pytest.raises(RuntimeError):
+            list(decoder.decode([bad]))
@@ -0,0 +1,144 @@
+"""Event export sinks."""
+import pandas as pd
+import pytest
+from web3 import Web3
+
+from eth_defi.aave_v3.events import get_event_mapping as aave_v3_event_mapping
+from eth_defi.event_reader.sink import CSVEventSink, create_event_sink, load_event_dataframe
+from eth_defi.uniswap_v3.events import get_event_mapping as uniswap_v3_event_mapping
+from eth_defi.uniswap_v3.liquidity import create_tick_delta_csv
+
+
+MINT_FIELD_NAMES = ["block_number", "timestamp", "tx_hash", "log_index", "pool_contract_address", "tick_lower", "tick_upper", "amount", "amount0", "amount1"]
+
+MINT_FIELD_TYPES = {
+    "block_number": "int64",
+    "timestamp": "datetime",
+    "log_index": "int64",
+    "tick_lower": "int64",
+    "tick_upper": "int64",
+    "amount": "uint256",
+    "amount0": "int256",
+    "amount1": "uint256",
+}
+
+
+def make_mint(i: int) -> dict:
+    return {
+        "block_number": 1000 + i,
+        "timestamp": f"2021-05-05T00:00:{i % 60:02d}",
+        "tx_hash": f"0x{i:064x}",
+        "log_index": i % 3,
+        "pool_contract_address": "0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8",
+        "tick_lower": -887220 + i,
+        "tick_upper": 887220 - i,
+        "amount": 2**128 - 1 - i,
+        "amount0": -(2**255) + i,
+        "amount1": 2**256 - 1 - i,
+    }
+
+
+def read_back(row: dict) -> dict:
+    """Row as it is read from a Parquet dataset."""
+    return {**row, "timestamp": pd.Timestamp(row["timestamp"])}
+
+
+def test_parquet_round_trip_and_resume(tmp_path):
+    """256-bit values survive exactly, a resumed scan appends new parts."""
+    pytest.importorskip("pyarrow")
+    base_path = tmp_path / "uniswap-v3-mint"
+    rows = [make_mint(i) for i in range(100)]
+
+    with create_event_sink("parquet", base_path, MINT_FIELD_NAMES, MINT_FIELD_TYPES) as sink:
+        # A part per flush
+        sink.write_batch(rows[:30])
+        sink.write_batch([])
+        sink.write_batch(rows[30:60])
+
+    # Resume
+    with create_event_sink("parquet", base_path, MINT_FIELD_NAMES, MINT_FIELD_TYPES) as sink:
+        sink.write_batch(rows[60:])
+
+    assert len(list((tmp_path / "uniswap-v3-mint.parquet").glob("part-*.parquet"))) == 3
+
+    df = load_event_dataframe(f"{base_path}.parquet")
+    assert list(df.columns) == MINT_FIELD_NAMES
+    assert df.to_dict("records") == [read_back(row) for row in rows]
+    assert df["block_number"].dtype == "int64"
+    assert pd.api.types.is_datetime64_any_dtype(df["timestamp"])
+
+    df = load_event_dataframe(f"{base_path}.parquet", columns=["block_number", "amount0"])
+    assert list(df.columns) == ["block_number", "amount0"]
+    assert df["amount0"].iloc[0] == -(2**255)
+
+
+def test_parquet_sink_killed(tmp_path):
+    """Flushed rows are readable even if the sink is never closed."""
+    pytest.importorskip("pyarrow")
+    base_path = tmp_path / "uniswap-v3-mint"
+    rows = [make_mint(i) for i in range(20)]
+
+    sink = create_event_sink("parquet", base_path, MINT_FIELD_NAMES, MINT_FIELD_TYPES)
+    sink.write_batch(rows[:10])
+    assert load_event_dataframe(f"{base_path}.parquet").to_dict("records") == [read_back(row) for row in rows[:10]]
+
+    # A part being written when the process was killed
+    (tmp_path / "uniswap-v3-mint.parquet" / ".part-00000001.parquet.tmp").write_bytes(b"PAR1")
+    assert len(load_event_dataframe(f"{base_path}.parquet")) == 10
+
+    # Resume
+    with create_event_sink("parquet", base_path, MINT_FIELD_NAMES, MINT_FIELD_TYPES) as sink:
+        sink.write_batch(rows[10:])
+
+    assert not list((tmp_path / "uniswap-v3-mint.parquet").glob(".*"))
+    assert load_event_dataframe(f"{base_path}.parquet").to_dict("records") == [read_back(row) for row in rows]
+
+
+def test_csv_sink_resume(tmp_path):
+    """CSV header is written only once."""
+    file_path = tmp_path / "mint.csv"
+    rows = [make_mint(i) for i in range(10)]
+
+    with CSVEventSink(file_path, MINT_FIELD_NAMES) as sink:
+        sink.write_batch(rows[:5])
+
+    with CSVEventSink(file_path, MINT_FIELD_NAMES) as sink:
+        sink.write_batch(rows[5:])
+
+    df = pd.read_csv(file_path)
+    assert len(df) == 10
+    assert df["block_number"].tolist() == [row["block_number"] for row in rows]
+
+
+def test_tick_delta_from_parquet(tmp_path):
+    """Tick deltas are the same whether events were exported as CSV or Parquet."""
+    pytest.importorskip("pyarrow")
+    mints = [make_mint(i) for i in range(20)]
+    burns = [make_mint(i) for i in range(20, 30)]
+
+    for output_format in ("csv", "parquet"):
+        for name, rows in (("mint", mints), ("burn", burns)):
+            with create_event_sink(output_format, tmp_path / f"uniswap-v3-{name}", MINT_FIELD_NAMES, MINT_FIELD_TYPES) as sink:
+                sink.write_batch(rows)
+
+    csv_output = tmp_path / "csv"
+    parquet_output = tmp_path / "parquet"
+    csv_output.mkdir()
+    parquet_output.mkdir()
+
+    create_tick_delta_csv(tmp_path / "uniswap-v3-mint.csv", tmp_path / "uniswap-v3-burn.csv", csv_output)
+    create_tick_delta_csv(f"{tmp_path}/uniswap-v3-mint.parquet", f"{tmp_path}/uniswap-v3-burn.parquet", parquet_output)
+
+    csv_deltas = (csv_output / "uniswap-v3-tickdeltas.csv").read_text()
+    parquet_deltas = (parquet_output / "uniswap-v3-tickdeltas.csv").read_text()
+    assert csv_deltas == parquet_deltas
+    assert str(2**128 - 1) in parquet_deltas
+
+
+
+def test_exporter_timestamp_type():
+    """Exporters write timestamps as datetime columns, like the lending exporters."""
+    web3 = Web3()
+    mappings = {**uniswap_v3_event_mapping(web3), **aave_v3_event_mapping(web3)}
+    for event_name, mapping in mappings.items():
+        assert mapping["field_types"]["timestamp"] == "datetime", event_name
@@ -0,0 +1,84 @@
+"""Batched contract reads with Multicall."""
+import pytest
+from web3 import EthereumTesterProvider, Web3
+from web3.eth import AsyncEth
+from web3.providers.eth_tester.main import AsyncEthereumTesterProvider
+
+from eth_defi import multicall_async
+from eth_defi.deploy import deploy_contract
+from eth_defi.multicall import MulticallCall, MulticallError, deploy_multicall, multicall
+from eth_defi.token import create_token
+
+
+@pytest.fixture
+def web3():
+    return Web3(EthereumTesterProvider())
+
+
+@pytest.fixture()
+def deployer(web3) -> str:
+    return web3.eth.accounts[0]
+
+
+@pytest.fixture()
+def user_1(web3) -> str:
+    return web3.eth.accounts[1]
+
+
+@pytest.fixture()
+def multicall_address(web3, deployer) -> str:
+    return deploy_multicall(web3, deployer).address
+
+
+def test_multicall_token_details(web3: Web3, deployer: str, user_1: str, multicall_address: str):
+    """Read token details and balances of many tokens, with failing calls."""
+    tokens = [create_token(web3, deployer, f"Token {i}", f"TOK{i}", (i + 1) * 10**18, 6 + i) for i in range(3)]
+    tokens[1].functions.transfer(user_1, 10**17).transact({"from": deployer})
+    # No totalSupply() function, so the call reverts
+    malformed_token = deploy_contract(web3, "MalformedERC20.json", deployer)
+    malformed_token = web3.eth.contract(malformed_token.address, abi=tokens[0].abi)
+
+    calls = []
+    for token in tokens:
+        calls += [token.functions.symbol(), token.functions.decimals(), token.functions.balanceOf(user_1)]
+    calls.append(malformed_token.functions.totalSupply())
+
+    results = multicall(web3, calls, multicall_address=multicall_address, max_calls=4)
+    assert len(results) == 10
+    assert [r.result for r in results[0:3]] == ["TOK0", 6, 0]
+    assert [r.get() for r in results[3:6]] == ["TOK1", 7, 10**17]
+    assert results[6].result == "TOK2"
+    assert not results[9].success
+    with pytest.raises(MulticallError):
+        results[9].get()
+
+    # Calls to an address without code do not decode
+    results = multicall(web3, [tokens[0].functions.name(), web3.eth.contract(user_1, abi=tokens[0].abi).functions.name()], multicall_address=multicall_address)
+    assert results[0].result == "Token 0"
+    assert not results[1].success
+
+    with pytest.raises(MulticallError):
+        multicall(web3, [MulticallCall(malformed_token.functions.totalSupply(), allow_failure=False)], multicall_address=multicall_address)
+
+
+def test_multicall_pinned_block(web3: Web3, deployer: str, user_1: str, multicall_address: str):
+    """Calls are performed at the given block."""
+    token = create_token(web3, deployer, "Token", "TOK", 100 * 10**18)
+    block_number = web3.eth.block_number
+    token.functions.transfer(user_1, 10**18).transact({"from": deployer})
+
+    calls = [token.functions.balanceOf(user_1), token.functions.balanceOf(deployer)]
+    assert [r.result for r in multicall(web3, calls, block_identifier=block_number, multicall_address=multicall_address)] == [0, 100 * 10**18]
+    assert [r.result for r in multicall(web3, calls, multicall_address=multicall_address, gas_limit=3_000_000)] == [10**18, 99 * 10**18]
+
+
+async def test_multicall_async():
+    """Async Multicall."""
+    web3 = Web3(AsyncEthereumTesterProvider(), modules={"eth": [AsyncEth]}, middlewares=[])
+    deployer = (await web3.eth.accounts)[0]
+    multicall_contract = await multicall_async.deploy_multicall(web3, deployer)
+    token = await multicall_async.deploy_contract(web3, "ERC20MockDecimals.json", deployer, "Token", "TOK", 10**18, 6)
+
+    calls = [token.functions.symbol(), token.functions.decimals(), token.functions.balanceOf(deployer)]
+    results = await multicall_async.multicall(web3, calls, multicall_address=multicall_contract.address, max_calls=2)
+    assert [r.result for r in results] == ["TOK", 6, 10**18]
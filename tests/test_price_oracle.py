@@ -20,7 +20,10 @@ from web3.middleware import geth_poa_middleware
 
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
 from eth_defi.price_oracle.oracle import PriceOracle, time_weighted_average_price, NotEnoughData, DataTooOld, \
-    DataPeriodTooShort
+    DataPeriodTooShort, PriceEntry, PriceSource
+from eth_defi.price_oracle.buffer import PriceEntryBuffer
+from eth_defi.price_oracle.columnar import ColumnarPriceEntryBuffer
+from eth_defi.price_oracle.incremental import ExponentialMovingAveragePrice, MeanPrice, TimeWeightedAveragePrice
 from eth_defi.uniswap_v2.oracle import update_price_oracle_with_sync_events_single_thread
 from eth_defi.uniswap_v2.pair import fetch_pair_details
 
@@ -73,8 +76,7 @@ def test_oracle_simple():
 
     oracle.feed_simple_data(price_data)
 
-    # Heap is sorted oldest event first
-    # Heap is sorted oldest event first
+    # Buffer is sorted oldest event first
     assert oracle.get_newest().timestamp == datetime.datetime(2021, 1, 3)
     assert oracle.get_oldest().timestamp == datetime.datetime(2021, 1, 1)
 
@@ -83,7 +85,7 @@ def test_oracle_simple():
 
 
 def test_oracle_feed_data_reverse():
-    """Oracle heap is sorted the same even if we feed data in the reverse order."""
+    """Oracle buffer is sorted the same even if we feed data in the reverse order."""
 
     price_data = {
         datetime.datetime(2021, 1, 3): Decimal(100),
@@ -97,7 +99,7 @@ def test_oracle_feed_data_reverse():
 
     oracle.feed_simple_data(price_data)
 
-    # Heap is sorted oldest event first
+    # Buffer is sorted oldest event first
     assert oracle.get_newest().timestamp == datetime.datetime(2021, 1, 3)
     assert oracle.get_oldest().timestamp == datetime.datetime(2021, 1, 1)
 
@@ -144,6 +146,222 @@ def test_too_narrow_time_window():
         oracle.calculate_price()
 
 
+def test_oracle_reorg_safe_index():
+    """Reorg safe ingestion uses transaction indexes that are kept up to date."""
+
+    def create_entry(minute: int, tx_hash: str, log_index: int, block_hash: str) -> PriceEntry:
+        return PriceEntry(
+            timestamp=datetime.datetime(2021, 1, 1, 0, minute),
+            price=Decimal(100 + minute),
+            source=PriceSource.unknown,
+            block_number=minute,
+            tx_hash=tx_hash,
+            log_index=log_index,
+            block_hash=block_hash,
+        )
+
+    oracle = PriceOracle(time_weighted_average_price, target_time_window=datetime.timedelta(minutes=5))
+
+    for minute in range(10):
+        assert not oracle.add_price_entry_reorg_safe(create_entry(minute, f"0x{minute}", 1, f"0xb{minute}"))
+
+    # Second event of the same transaction, and a duplicate
+    assert not oracle.add_price_entry_reorg_safe(create_entry(9, "0x9", 2, "0xb9"))
+    assert not oracle.add_price_entry_reorg_safe(create_entry(9, "0x9", 2, "0xb9"))
+    assert len(oracle.buffer) == 11
+    assert oracle.get_by_transaction_log("0x9", 2).price == Decimal(109)
+    assert oracle.get_by_transaction_hash("0x9").log_index == 1
+
+    # Both events of the transaction hop to another block
+    assert oracle.add_price_entry_reorg_safe(create_entry(9, "0x9", 2, "0xc9"))
+    assert oracle.add_price_entry_reorg_safe(create_entry(9, "0x9", 3, "0xc9"))
+    assert not oracle.add_price_entry_reorg_safe(create_entry(9, "0x9", 3, "0xc9"))
+    assert len(oracle.buffer) == 11
+    assert [(e.log_index, e.block_hash, e.first_seen_at_block_number) for e in oracle.tx_hash_index["0x9"]] == [(2, "0xc9", 9), (3, "0xc9", 9)]
+    assert oracle.get_by_transaction_log("0x9", 1) is None
+
+    # Truncation removes the entries from the indexes
+    assert oracle.truncate_buffer(datetime.datetime(2021, 1, 1, 0, 9)) == 4
+    assert oracle.get_by_transaction_hash("0x3") is None
+    assert oracle.get_by_transaction_log("0x3", 1) is None
+    assert oracle.get_by_transaction_hash("0x4").price == Decimal(104)
+    assert len(oracle.tx_hash_index) == 6
+
+
+def test_price_entry_buffer():
+    """Buffer keeps entries in the time order through out-of-order adds and truncation."""
+
+    start = datetime.datetime(2021, 1, 1)
+
+    def create_entry(second: int) -> PriceEntry:
+        return PriceEntry(timestamp=start + datetime.timedelta(seconds=second), price=Decimal(second), source=PriceSource.unknown)
+
+    buffer = PriceEntryBuffer()
+    assert not buffer
+    assert buffer.get_newest() is None
+    assert buffer.get_oldest() is None
+
+    # Every 10th entry is late
+    for i in range(5000):
+        buffer.append(create_entry(i - 5 if i % 10 == 9 else i))
+
+    assert len(buffer) == 5000
+    timestamps = [e.timestamp for e in buffer]
+    assert timestamps == sorted(timestamps)
+    assert buffer.get_oldest().price == 0
+    assert buffer.get_newest().price == 4998
+
+    # Entries with the same timestamp keep the order they were added
+    duplicate = create_entry(10)
+    buffer.append(duplicate)
+    assert [e for e in buffer if e.timestamp == duplicate.timestamp][-1] is duplicate
+
+    discarded = buffer.truncate(start + datetime.timedelta(seconds=3000))
+    assert len(discarded) == 3001
+    assert all(e.timestamp < start + datetime.timedelta(seconds=3000) for e in discarded)
+    assert len(buffer) == 2000
+
+    # Most of the array was discarded, so it was compacted
+    assert buffer.head == 0
+    assert buffer.get_oldest().price == 3000
+
+    # Late entry inserted after the moved head
+    buffer.truncate(start + datetime.timedelta(seconds=3100))
+    assert buffer.head > 0
+    buffer.append(create_entry(3100))
+    assert len([e for e in buffer if e.price == 3100]) == 2
+    assert buffer.get_oldest().price == 3100
+    assert len(buffer.truncate(start + datetime.timedelta(seconds=10_000))) == 1901
+    assert not buffer
+
+
+@pytest.mark.parametrize("price_decimals", [None, 8])
+def test_columnar_price_entry_buffer(price_decimals):
+    """Columnar buffer keeps the same entries in the same order as the object buffer."""
+
+    start = datetime.datetime(2021, 1, 1)
+
+    def create_entry(second: int) -> PriceEntry:
+        return PriceEntry(
+            timestamp=start + datetime.timedelta(seconds=second),
+            price=Decimal(second) / Decimal(4),
+            volume=Decimal(second % 7) if second % 3 else None,
+            source=PriceSource.uniswap_v2_like_pool_sync_event,
+            pool_contract_address=f"0x{second // 1000:040x}",
+            block_number=second,
+            tx_hash=f"0x{second + 1:064x}",
+            log_index=second % 4,
+            block_hash=f"0x{second:064x}" if second % 2 else None,
+            first_seen_at_block_number=second,
+        )
+
+    buffer = PriceEntryBuffer()
+    columnar = ColumnarPriceEntryBuffer(price_decimals=price_decimals, capacity=16)
+    assert not columnar
+    assert columnar.get_newest() is None
+    assert columnar.get_oldest() is None
+
+    # Every 10th entry is late
+    for i in range(5000):
+        entry = create_entry(i - 5 if i % 10 == 9 else i)
+        assert buffer.append(entry) == columnar.append(entry)
+
+    assert len(columnar) == 5000
+    assert list(columnar) == list(buffer)
+    assert columnar[0] == buffer.get_oldest() == columnar.get_oldest()
+    assert columnar[-1] == buffer.get_newest() == columnar.get_newest()
+    assert columnar.get_prices().tolist() == [float(e.price) for e in buffer]
+    assert columnar.get_block_numbers().tolist() == [e.block_number for e in buffer]
+
+    assert columnar.truncate(start + datetime.timedelta(seconds=3000)) == buffer.truncate(start + datetime.timedelta(seconds=3000))
+    assert columnar.head == 0
+    assert columnar.pool_addresses == [f"0x{i:040x}" for i in range(3, 5)]
+
+    # Timestamps are stored in milliseconds
+    with_microseconds = PriceEntry(timestamp=start + datetime.timedelta(seconds=6000, microseconds=1500), price=Decimal(1), source=PriceSource.unknown)
+    columnar.append(with_microseconds)
+    assert columnar[-1].timestamp == start + datetime.timedelta(seconds=6000, milliseconds=1)
+    assert columnar[-1].tx_hash is None
+    assert columnar[-1].pool_contract_address is None
+
+    # Oracle calculates the same price from both buffers
+    oracles = [
+        PriceOracle(TimeWeightedAveragePrice(), min_entries=1, min_duration=datetime.timedelta(0), max_age=PriceOracle.ANY_AGE, buffer=b)
+        for b in (PriceEntryBuffer(), ColumnarPriceEntryBuffer(price_decimals=price_decimals))
+    ]
+    for oracle in oracles:
+        for i in range(100):
+            oracle.add_price_entry(create_entry(i * 60))
+    assert oracles[0].calculate_price() == pytest.approx(oracles[1].calculate_price())
+
+    with pytest.raises(AssertionError):
+        oracles[1].add_price_entry_reorg_safe(create_entry(0))
+
+
+def test_incremental_price_functions():
+    """Running price functions match the prices calculated over the whole buffer."""
+
+    start = datetime.datetime(2021, 1, 1)
+
+    def create_entry(minute: int, price: int) -> PriceEntry:
+        return PriceEntry(timestamp=start + datetime.timedelta(minutes=minute), price=Decimal(price), source=PriceSource.unknown)
+
+    def calculate_twap(entries) -> Decimal:
+        weighted = sum(a.price * Decimal((b.timestamp - a.timestamp).total_seconds()) for a, b in zip(entries, entries[1:]))
+        return weighted / Decimal((entries[-1].timestamp - entries[0].timestamp).total_seconds())
+
+    twap_oracle = PriceOracle(TimeWeightedAveragePrice(), min_entries=1, min_duration=datetime.timedelta(0), max_age=PriceOracle.ANY_AGE, target_time_window=datetime.timedelta(minutes=30))
+    mean_oracle = PriceOracle(MeanPrice(), min_entries=1, min_duration=datetime.timedelta(0), max_age=PriceOracle.ANY_AGE, target_time_window=datetime.timedelta(minutes=30))
+
+    # The first price has no duration yet
+    twap_oracle.add_price_entry(create_entry(0, 100))
+    assert twap_oracle.calculate_price() == Decimal(100)
+
+    # 100 for 10 minutes, 200 for 30 minutes
+    twap_oracle.add_price_entry(create_entry(10, 200))
+    twap_oracle.add_price_entry(create_entry(40, 300))
+    assert twap_oracle.calculate_price() == Decimal(175)
+
+    # A late entry splits the 200 period: 200 for 10 minutes and 400 for 20 minutes
+    twap_oracle.add_price_entry(create_entry(20, 400))
+    assert twap_oracle.calculate_price() == Decimal(275)
+
+    # Late entry before the oldest entry
+    twap_oracle.add_price_entry(create_entry(-10, 0))
+    assert twap_oracle.calculate_price() == calculate_twap(list(twap_oracle.buffer))
+
+    # Feed both oracles with a mix of in order and late entries, with truncations
+    for i in range(200):
+        minute = 40 + i * 3 - (7 if i % 5 == 4 else 0)
+        entry = create_entry(minute, 1000 + (i * 37) % 101)
+        twap_oracle.add_price_entry(entry)
+        mean_oracle.add_price_entry(create_entry(minute, 1000 + (i * 37) % 101))
+
+        if i % 20 == 19:
+            now = start + datetime.timedelta(minutes=minute)
+            assert twap_oracle.truncate_buffer(now) > 0
+            mean_oracle.truncate_buffer(now)
+
+        entries = list(twap_oracle.buffer)
+        assert twap_oracle.calculate_price() == pytest.approx(calculate_twap(entries))
+        assert mean_oracle.calculate_price() == pytest.approx(time_weighted_average_price(list(mean_oracle.buffer)))
+
+    # Truncating everything resets the state
+    twap_oracle.truncate_buffer(start + datetime.timedelta(days=7))
+    assert not twap_oracle.buffer
+    twap_oracle.add_price_entry(create_entry(10_000, 5))
+    assert twap_oracle.calculate_price() == Decimal(5)
+
+    # Usable as a plain price function
+    entries = [create_entry(0, 100), create_entry(10, 200), create_entry(40, 300)]
+    assert TimeWeightedAveragePrice()(entries) == Decimal(175)
+    assert MeanPrice()(entries) == Decimal(200)
+
+    # EMA with span 3 has smoothing factor of 0.5
+    ema = ExponentialMovingAveragePrice(span=3)
+    assert ema(entries) == Decimal(225)
+
+
 @pytest.mark.skipif(
     os.environ.get("BNB_CHAIN_JSON_RPC") is None,
     reason="Set BNB_CHAIN_JSON_RPC environment variable to Binance Smart Chain node to run this test",
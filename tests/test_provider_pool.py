@@ -0,0 +1,162 @@
+"""Multi-endpoint JSON-RPC provider pool."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+
+from eth_defi import batch_async
+from eth_defi.batch import batch_request
+from eth_defi.event_reader.provider_pool import ProviderPool, create_async_pooled_web3
+from eth_defi.event_reader.raw_json_rpc import make_raw_request
+from eth_defi.event_reader.web3factory import PooledWeb3Factory
+from eth_defi.middleware import exception_retry_middleware
+
+
+def get_header_calls(block_count: int = 10) -> list:
+    return [("eth_getBlockByNumber", (hex(block_number), False)) for block_number in range(block_count)]
+
+
+def test_pool_failover_circuit_breaker(fake_json_rpc_endpoints):
+    """A failing endpoint is ejected and its requests go to the other endpoints."""
+    (failing, failing_url), (_, url_2), (_, url_3) = fake_json_rpc_endpoints
+    failing.http_failures = 1000
+
+    pool = ProviderPool([failing_url, url_2, url_3], failure_threshold=2, cooldown=60, sleep=0)
+    web3 = PooledWeb3Factory(pool, HTTPAdapter())(None)
+
+    for i in range(200):
+        assert make_raw_request(web3, "eth_getBlockByNumber", ("latest", False))["number"] == hex(999)
+        if pool.endpoints[0].is_open:
+            break
+
+    results = batch_request(web3, get_header_calls(), raise_on_error=True)
+    assert [int(r.result["number"], 16) for r in results] == list(range(10))
+
+    assert pool.endpoints[0].is_open
+    assert 1000 - failing.http_failures == 2
+    assert not pool.endpoints[1].is_open
+    assert not pool.endpoints[2].is_open
+
+
+def test_pool_prefers_fast_endpoint(fake_json_rpc_endpoints):
+    """Slow endpoints get less requests."""
+    (slow, slow_url), (fast_1, url_2), (fast_2, url_3) = fake_json_rpc_endpoints
+    slow.response_delay = 0.05
+
+    pool = ProviderPool([slow_url, url_2, url_3])
+    web3 = PooledWeb3Factory(pool)(None)
+    for i in range(60):
+        make_raw_request(web3, "eth_blockNumber", [])
+
+    assert slow.http_requests < 15
+    assert fast_1.http_requests + fast_2.http_requests > 45
+    assert pool.endpoints[0].latency > pool.endpoints[1].latency
+
+
+def test_pool_hedging(fake_json_rpc_endpoints):
+    """A request slower than the latency percentile of its endpoint is sent to another endpoint."""
+    (slow, slow_url), (_, fast_url), _ = fake_json_rpc_endpoints
+
+    pool = ProviderPool([slow_url, fast_url], hedge_percentile=0.9, hedge_min_samples=5)
+    web3 = PooledWeb3Factory(pool)(None)
+
+    # Learn the normal latencies
+    while min(len(e.latencies) for e in pool.endpoints) < 5:
+        make_raw_request(web3, "eth_blockNumber", [])
+
+    slow.response_delay = 1.0
+    hedged_requests = pool.hedged_requests
+    try:
+        for i in range(50):
+            started = time.monotonic()
+            assert make_raw_request(web3, "eth_blockNumber", []) == hex(999)
+            assert time.monotonic() - started < 0.9
+            if pool.hedged_requests > hedged_requests:
+                break
+        assert pool.hedged_requests > hedged_requests
+    finally:
+        pool.close()
+
+
+def test_pool_hedging_many_workers(fake_json_rpc_endpoints):
+    """Workers do not wait behind each other for the hedging threads and trigger spurious hedges."""
+    (chain_1, url_1), (chain_2, url_2), _ = fake_json_rpc_endpoints
+    chain_1.response_delay = chain_2.response_delay = 0.05
+
+    pool = ProviderPool([url_1, url_2], hedge_percentile=0.99, hedge_min_samples=40)
+    factory = PooledWeb3Factory(pool)
+
+    def worker(i: int):
+        web3 = factory(None)
+        for j in range(20):
+            make_raw_request(web3, "eth_blockNumber", [])
+        return web3.provider.hedge_executor
+
+    try:
+        with ThreadPoolExecutor(max_workers=16) as workers:
+            hedge_executors = list(workers.map(worker, range(16)))
+        assert len(set(hedge_executors)) == 16
+        assert pool.hedged_requests < 32
+    finally:
+        pool.close()
+
+
+async def test_async_pool_failover(fake_json_rpc_endpoints):
+    """Async provider fails over and sends the batches through the pool."""
+    (failing, failing_url), (_, url_2), (_, url_3) = fake_json_rpc_endpoints
+    failing.http_failures = 1000
+
+    pool = ProviderPool([failing_url, url_2, url_3], failure_threshold=2, cooldown=60, sleep=0)
+    web3 = create_async_pooled_web3(pool)
+
+    for i in range(200):
+        assert await web3.eth.block_number == 999
+        if pool.endpoints[0].is_open:
+            break
+
+    results = await batch_async.batch_request(web3, get_header_calls(), raise_on_error=True)
+    assert [int(r.result["number"], 16) for r in results] == list(range(10))
+
+    assert pool.endpoints[0].is_open
+    assert 1000 - failing.http_failures == 2
+
+
+def test_pool_circuit_breaker_recovery():
+    """An ejected endpoint gets a single trial request after the cooldown."""
+    pool = ProviderPool(["http://a", "http://b"], failure_threshold=2, cooldown=0.05)
+    a, b = pool.endpoints
+
+    pool.record_failure(a, ConnectionError())
+    assert not a.is_open
+    pool.record_failure(a, ConnectionError())
+    assert a.is_open
+    assert all(pool.choose() is b for i in range(20))
+
+    time.sleep(0.06)
+    assert pool.choose() is a
+    assert pool.choose() is b
+    pool.record_success(a, 0.01)
+    assert not a.is_open
+
+
+def test_retry_middleware_sleep_per_request(mocker):
+    """The retry sleep starts from the beginning for each request."""
+    sleeps = []
+    mocker.patch("eth_defi.middleware.time.sleep", side_effect=sleeps.append)
+
+    failures = 0
+
+    def make_request(method, params):
+        nonlocal failures
+        failures += 1
+        if failures % 3:
+            raise ConnectionError("Node is down")
+        return {"result": "0x1"}
+
+    middleware = exception_retry_middleware(make_request, None, (ConnectionError,), sleep=5, backoff=1.2)
+    for i in range(2):
+        assert middleware("eth_blockNumber", []) == {"result": "0x1"}
+
+    assert sleeps == pytest.approx([5, 6, 5, 6])
@@ -0,0 +1,83 @@
+"""Lean JSON-RPC transport for the event reader."""
+import pytest
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError
+from web3 import Web3
+from web3.manager import RequestManager
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.chunk_planner import is_log_range_error
+from eth_defi.event_reader.raw_json_rpc import RawJSONRPCProvider, make_raw_request
+from eth_defi.event_reader.reader import read_events_concurrent
+from eth_defi.event_reader.timestamp import JSONRPCBatchTimestampExtractor
+from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def sync_event():
+    Pair = get_contract(Web3(), "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def populated_chain(fake_chain, sync_event):
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(0, 1000, 3):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+    return fake_chain
+
+
+def test_read_events_raw_json_rpc(populated_chain, fake_json_rpc_url, sync_event, monkeypatch):
+    """Workers read logs and timestamps without web3.py request manager, with gzipped responses."""
+
+    def request_blocking(*args, **kwargs):
+        raise AssertionError("Request manager should not be used")
+
+    monkeypatch.setattr(RequestManager, "request_blocking", request_blocking)
+
+    web3_factory = TunedWeb3Factory(fake_json_rpc_url, HTTPAdapter(), raw_json_rpc=True)
+    executor = create_thread_pool_executor(web3_factory, None, max_workers=4)
+
+    logs = list(
+        read_events_concurrent(
+            executor,
+            0,
+            999,
+            [sync_event],
+            None,
+            extract_timestamps=JSONRPCBatchTimestampExtractor(),
+        )
+    )
+    executor.join()
+
+    assert len(logs) == 334
+    assert logs[1]["blockNumber"] == "0x3"
+    assert logs[1]["timestamp"] == populated_chain.get_timestamp(3)
+    assert populated_chain.gzipped_responses == populated_chain.http_requests
+
+
+def test_raw_json_rpc_retry(fake_chain, fake_json_rpc_url):
+    """HTTP errors are retried, JSON-RPC errors are raised like web3.py does."""
+    web3 = Web3(RawJSONRPCProvider(fake_json_rpc_url, sleep=0))
+
+    fake_chain.http_failures = 2
+    block = make_raw_request(web3, "eth_getBlockByNumber", ("0x5", False))
+    assert block["number"] == "0x5"
+    assert fake_chain.http_requests == 1
+
+    fake_chain.http_failures = 10
+    with pytest.raises(HTTPError):
+        make_raw_request(web3, "eth_getBlockByNumber", ("0x5", False))
+    fake_chain.http_failures = 0
+
+    fake_chain.max_block_range = 100
+    with pytest.raises(ValueError) as exc_info:
+        make_raw_request(web3, "eth_getLogs", ({"fromBlock": "0x0", "toBlock": "0x3e7"},))
+    assert is_log_range_error(exc_info.value)
+
+    # Normal web3.py API keeps working
+    assert web3.eth.block_number == 999
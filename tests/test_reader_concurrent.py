@@ -0,0 +1,114 @@
+"""Concurrent event reader against an in-memory JSON-RPC chain."""
+import time
+
+import pytest
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.reader import read_events_concurrent
+from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    return Web3(HTTPProvider(fake_json_rpc_url))
+
+
+@pytest.fixture()
+def sync_event(web3):
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def executor(fake_json_rpc_url):
+    web3_factory = TunedWeb3Factory(fake_json_rpc_url, HTTPAdapter())
+    executor = create_thread_pool_executor(web3_factory, None, max_workers=4)
+    yield executor
+    executor.join()
+
+
+@pytest.fixture()
+def populated_chain(fake_chain, sync_event):
+    """Put a Sync event every third block."""
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(0, fake_chain.block_count, 3):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+    return fake_chain
+
+
+def test_read_events_concurrent_in_order(populated_chain, executor, sync_event):
+    """Events come out in the block order, once, with the range chunked unevenly."""
+
+    notified = []
+
+    def notify(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context):
+        notified.append(current_block)
+
+    logs = list(
+        read_events_concurrent(
+            executor,
+            0,
+            999,
+            [sync_event],
+            notify,
+            chunk_size=7,
+            extract_timestamps=None,
+            max_pending_chunks=5,
+        )
+    )
+
+    block_numbers = [int(log["blockNumber"], 16) for log in logs]
+    assert block_numbers == list(range(0, 1000, 3))
+    assert notified == list(range(0, 1000, 7))
+    assert populated_chain.calls["eth_getLogs"] == len(notified)
+
+
+def test_read_events_concurrent_backpressure(populated_chain, executor, sync_event):
+    """A slow consumer stops new eth_getLogs submissions."""
+
+    reader = read_events_concurrent(
+        executor,
+        0,
+        999,
+        [sync_event],
+        None,
+        chunk_size=10,
+        extract_timestamps=None,
+        max_pending_chunks=3,
+    )
+
+    first = next(reader)
+    assert first["blockNumber"] == "0x0"
+
+    # Give the workers time to run ahead if they could
+    time.sleep(0.5)
+
+    # Three ranges in the window, plus the one we are consuming
+    assert populated_chain.calls["eth_getLogs"] == 4
+
+    reader.close()
+
+
+def test_read_events_concurrent_worker_error(populated_chain, executor, sync_event):
+    """JSON-RPC errors in worker threads are raised to the caller."""
+
+    populated_chain.max_block_range = 5
+
+    with pytest.raises(ValueError):
+        list(
+            read_events_concurrent(
+                executor,
+                0,
+                999,
+                [sync_event],
+                None,
+                chunk_size=10,
+                extract_timestamps=None,
+            )
+        )
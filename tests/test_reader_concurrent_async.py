@@ -0,0 +1,95 @@
+"""Asyncio concurrent event reader against an in-memory JSON-RPC chain."""
+import pytest
+from web3 import Web3
+from web3.eth import AsyncEth
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.reader_async import read_events_concurrent
+from eth_defi.event_reader.timestamp import JSONRPCBatchTimestampExtractor
+from eth_defi.rate import REST_Semaphore
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    return Web3(AsyncHTTPProvider(fake_json_rpc_url), modules={"eth": [AsyncEth]}, middlewares=[])
+
+
+@pytest.fixture()
+def sync_event():
+    Pair = get_contract(Web3(), "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def populated_chain(fake_chain, sync_event):
+    """Put a Sync event every third block."""
+    signature = sync_event.build_filter().topics[0]
+    for block_number in range(0, fake_chain.block_count, 3):
+        fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+    return fake_chain
+
+
+async def test_read_events_concurrent_async_in_order(populated_chain, web3, sync_event):
+    """Events come out in the block order while many eth_getLogs are in flight."""
+    populated_chain.response_delay = 0.02
+
+    notified = []
+
+    def notify(current_block, start_block, end_block, chunk_size, total_events, last_timestamp, context):
+        notified.append(current_block)
+
+    logs = []
+    async for log in read_events_concurrent(
+        web3,
+        0,
+        999,
+        [sync_event],
+        notify,
+        chunk_size=10,
+        extract_timestamps=JSONRPCBatchTimestampExtractor(),
+        max_concurrency=8,
+    ):
+        logs.append(log)
+
+    block_numbers = [int(log["blockNumber"], 16) for log in logs]
+    assert block_numbers == list(range(0, 1000, 3))
+    assert all(log["timestamp"] == populated_chain.get_timestamp(int(log["blockNumber"], 16)) for log in logs)
+    assert notified == list(range(0, 1000, 10))
+    assert 2 < populated_chain.max_in_flight <= 16
+
+
+async def test_read_events_concurrent_async_rate_limiter(populated_chain, web3, sync_event):
+    """The rate limiter caps the block ranges in flight."""
+    populated_chain.response_delay = 0.02
+
+    rate_limiter = REST_Semaphore(2, 0)
+
+    logs = []
+    async for log in read_events_concurrent(
+        web3,
+        0,
+        199,
+        [sync_event],
+        None,
+        chunk_size=10,
+        extract_timestamps=None,
+        max_concurrency=8,
+        rate_limiter=rate_limiter,
+    ):
+        logs.append(log)
+
+    assert len(logs) == 67
+    assert populated_chain.max_in_flight <= 2
+
+
+async def test_read_events_concurrent_async_error(populated_chain, web3, sync_event):
+    """JSON-RPC errors are raised to the caller."""
+    populated_chain.max_block_range = 5
+
+    with pytest.raises(ValueError):
+        async for log in read_events_concurrent(web3, 0, 999, [sync_event], None, chunk_size=10, extract_timestamps=None):
+            pass
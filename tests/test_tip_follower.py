@@ -0,0 +1,147 @@
+"""Chain tip log follower."""
+import datetime
+from decimal import Decimal
+
+import pytest
+from web3 import HTTPProvider, Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.tip import ChainReorganisationTooDeep, ChainTipFollower
+from eth_defi.price_oracle.columnar import ColumnarPriceEntryBuffer
+from eth_defi.price_oracle.incremental import ExponentialMovingAveragePrice, TimeWeightedAveragePrice, VolumeWeightedAveragePrice
+from eth_defi.price_oracle.oracle import PriceEntry, PriceOracle, PriceSource
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    web3.middleware_onion.clear()
+    return web3
+
+
+@pytest.fixture()
+def sync_event(web3):
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+@pytest.fixture()
+def follower(web3, sync_event) -> ChainTipFollower:
+    return ChainTipFollower(web3, Filter.create_filter(PAIR_ADDRESS, [sync_event]), start_block=990, history_size=20)
+
+
+def add_sync(fake_chain, sync_event, block_number: int):
+    signature = sync_event.build_filter().topics[0]
+    fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+
+
+def test_follow_new_blocks(fake_chain, sync_event, follower):
+    """Only the blocks that appeared since the last poll are read."""
+    for block_number in (990, 995, 999):
+        add_sync(fake_chain, sync_event, block_number)
+
+    update = follower.poll()
+    assert update.rollback is None
+    assert [int(log["blockNumber"], 16) for log in update.logs] == [990, 995, 999]
+    assert update.logs[0]["timestamp"] == fake_chain.get_timestamp(990)
+    assert update.logs[0]["event"].event_name == "Sync"
+    assert update.tip.block_number == 999
+    assert update.tip.block_hash == fake_chain.get_block_hash(999)
+
+    # Nothing new
+    assert follower.poll().logs == []
+    assert fake_chain.calls["eth_getLogs"] == 1
+
+    fake_chain.mine(30)
+    add_sync(fake_chain, sync_event, 1010)
+    update = follower.poll()
+    assert [int(log["blockNumber"], 16) for log in update.logs] == [1010]
+    assert update.tip.block_number == 1029
+
+    # Old blocks are forgotten
+    assert len(follower.blocks) == 20
+    assert follower.blocks[0].block_number == 1010
+    assert set(follower.block_logs) == set(range(1010, 1030))
+
+
+def test_follow_reorganisation(fake_chain, sync_event, follower):
+    """Reorganised blocks are rolled back and their logs returned with removed=True."""
+    for block_number in (990, 995, 999):
+        add_sync(fake_chain, sync_event, block_number)
+    follower.poll()
+
+    # Replace blocks 995 - 999 and add one block on the new fork
+    fake_chain.reorganise(995)
+    fake_chain.mine(1)
+    add_sync(fake_chain, sync_event, 997)
+    add_sync(fake_chain, sync_event, 1000)
+
+    update = follower.poll()
+    assert update.rollback.last_valid_block == 994
+    assert [b.block_number for b in update.rollback.removed_blocks] == list(range(995, 1000))
+    assert [(int(log["blockNumber"], 16), log["removed"]) for log in update.removed_logs] == [(999, True), (995, True)]
+    assert [int(log["blockNumber"], 16) for log in update.logs] == [997, 1000]
+    assert [log["blockHash"] for log in update.logs] == [fake_chain.get_block_hash(997), fake_chain.get_block_hash(1000)]
+    assert update.tip.block_number == 1000
+
+    # Deeper than the remembered blocks
+    fake_chain.reorganise(900)
+    fake_chain.mine(1)
+    with pytest.raises(ChainReorganisationTooDeep):
+        follower.poll()
+
+
+@pytest.mark.parametrize("buffer_class", [None, ColumnarPriceEntryBuffer])
+@pytest.mark.parametrize("price_function_class", [TimeWeightedAveragePrice, VolumeWeightedAveragePrice, ExponentialMovingAveragePrice])
+def test_oracle_rollback(buffer_class, price_function_class):
+    """Oracle entries of the rolled back blocks are retracted and the price follows."""
+
+    start = datetime.datetime(2021, 1, 1)
+
+    def create_entry(block_number: int, log_index: int = 0) -> PriceEntry:
+        return PriceEntry(
+            timestamp=start + datetime.timedelta(seconds=block_number * 12),
+            price=Decimal(100 + (block_number * 37) % 11),
+            volume=Decimal(block_number % 3),
+            source=PriceSource.unknown,
+            block_number=block_number,
+            tx_hash=f"0x{block_number:032x}{log_index:032x}",
+            log_index=log_index,
+        )
+
+    def create_oracle() -> PriceOracle:
+        return PriceOracle(
+            price_function_class(),
+            min_entries=1,
+            min_duration=datetime.timedelta(0),
+            max_age=PriceOracle.ANY_AGE,
+            buffer=buffer_class() if buffer_class else None,
+        )
+
+    oracle = create_oracle()
+    for block_number in range(100):
+        oracle.add_price_entry(create_entry(block_number))
+        oracle.add_price_entry(create_entry(block_number, 1))
+
+    # A late entry without a block is kept
+    oracle.add_price_entry(PriceEntry(timestamp=start + datetime.timedelta(seconds=95 * 12 + 1), price=Decimal(1), source=PriceSource.unknown))
+
+    assert oracle.rollback(94) == 10
+    assert oracle.get_newest().price == Decimal(1)
+    assert all(e.block_number is None or e.block_number <= 94 for e in oracle.buffer)
+
+    # The same price as if the rolled back blocks never were there
+    expected = create_oracle()
+    for entry in oracle.buffer:
+        expected.add_price_entry(entry)
+    assert oracle.calculate_price() == pytest.approx(expected.calculate_price())
+
+    if buffer_class is None:
+        assert oracle.get_by_transaction_hash(f"0x{95:032x}{0:032x}") is None
+        assert oracle.get_by_transaction_hash(f"0x{94:032x}{0:032x}") is not None
+
+    assert oracle.rollback(94) == 0
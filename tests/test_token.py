@@ -6,7 +6,8 @@ from eth_tester.exceptions import TransactionFailed
 from web3 import Web3, EthereumTesterProvider
 
 from eth_defi.deploy import deploy_contract
-from eth_defi.token import create_token, fetch_erc20_details, TokenDetailError
+from eth_defi.multicall import MulticallResult, deploy_multicall
+from eth_defi.token import create_token, decode_erc20_details, fetch_erc20_details, fetch_erc20_details_many, get_erc20_detail_calls, TokenDetailError
 
 
 @pytest.fixture
@@ -115,3 +116,42 @@ def test_fetch_token_details_broken_load(web3: Web3, deployer: str):
     malformed_token = deploy_contract(web3, "MalformedERC20.json", deployer)
     with pytest.raises(TokenDetailError):
         fetch_erc20_details(web3, malformed_token.address)
+
+
+def test_fetch_token_details_many(web3: Web3, deployer: str):
+    """Get details of many tokens with batched calls."""
+    tokens = [create_token(web3, deployer, f"Token {i}", f"TOK{i}", 100_000 * 10**18, 6 + i) for i in range(5)]
+    malformed_token = deploy_contract(web3, "MalformedERC20.json", deployer)
+    addresses = [t.address for t in tokens] + [malformed_token.address]
+
+    details = fetch_erc20_details_many(web3, addresses, raise_on_error=False)
+    assert len(details) == 6
+    assert details[tokens[3].address].symbol == "TOK3"
+    assert details[tokens[3].address].decimals == 9
+    assert details[malformed_token.address].symbol == ""
+    assert details[malformed_token.address].decimals == 0
+    assert details[malformed_token.address].total_supply is None
+
+    multicall_contract = deploy_multicall(web3, deployer)
+    details = fetch_erc20_details_many(web3, addresses[0:5], multicall_address=multicall_contract.address)
+    assert details[tokens[4].address].name == "Token 4"
+    assert details[tokens[4].address].total_supply == 100_000 * 10**18
+
+    with pytest.raises(TokenDetailError):
+        fetch_erc20_details_many(web3, addresses)
+
+
+def test_token_details_bytes32_symbol(web3: Web3, deployer: str):
+    """Tokens with bytes32 symbol and name do not raise."""
+    token = create_token(web3, deployer, "Dai Stablecoin v1.0", "SAI", 100_000 * 10**18)
+    symbol, name, decimals, supply = get_erc20_detail_calls(token)
+    bytes32_symbol = b"SAI".ljust(32, b"\0")
+    results = [
+        MulticallResult(symbol, False, bytes32_symbol),
+        MulticallResult(name, False, bytes32_symbol),
+        MulticallResult(decimals, True, b"", result=18),
+        MulticallResult(supply, True, b"", result=100_000 * 10**18),
+    ]
+    details = decode_erc20_details(token, results)
+    assert details.symbol is None
+    assert details.decimals == 18
@@ -19,7 +19,7 @@ from web3.providers.eth_tester.middleware import async_construct_formatting_midd
 from web3.middleware import async_geth_poa_middleware
 from eth_defi.deploy_async import deploy_contract
 from eth_defi.token import TokenDetailError
-from eth_defi.token_async import create_token, fetch_erc20_details
+from eth_defi.token_async import create_token, fetch_erc20_details, fetch_erc20_details_many
 
 @pytest_asyncio.fixture(scope='module')
 def event_loop():
@@ -127,3 +127,13 @@ async def test_fetch_token_details_broken_load(web3: Web3, deployer: str):
     malformed_token = await deploy_contract(web3, "MalformedERC20.json", deployer)
     with pytest.raises(TokenDetailError):
         await fetch_erc20_details(web3, malformed_token.address)
+
+@pytest.mark.asyncio
+async def test_fetch_token_details_many(web3: Web3, deployer: str):
+    """Get details of many tokens with batched calls."""
+    tokens = [await create_token(web3, deployer, f"Token {i}", f"TOK{i}", 100_000 * 10**18, 6 + i) for i in range(3)]
+    malformed_token = await deploy_contract(web3, "MalformedERC20.json", deployer)
+    details = await fetch_erc20_details_many(web3, [t.address for t in tokens] + [malformed_token.address], raise_on_error=False)
+    assert details[tokens[2].address].symbol == "TOK2"
+    assert details[tokens[2].address].decimals == 8
+    assert details[malformed_token.address].total_supply is None
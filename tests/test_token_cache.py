@@ -0,0 +1,90 @@
+"""Persistent token metadata cache."""
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from eth_abi import encode
+from web3 import EthereumTesterProvider, HTTPProvider, Web3
+
+from eth_defi.deploy import deploy_contract
+from eth_defi.token import create_token
+from eth_defi.token_cache import TokenCache
+
+
+@pytest.fixture
+def web3():
+    return Web3(EthereumTesterProvider())
+
+
+@pytest.fixture()
+def deployer(web3) -> str:
+    return web3.eth.accounts[0]
+
+
+def test_token_cache_persistent(web3: Web3, deployer: str, tmp_path):
+    """A new cache with the same database does not read the tokens again."""
+    tokens = [create_token(web3, deployer, f"Token {i}", f"TOK{i}", 2**200, 6) for i in range(4)]
+    malformed_token = deploy_contract(web3, "MalformedERC20.json", deployer)
+    addresses = [t.address for t in tokens] + [malformed_token.address]
+    path = tmp_path / "tokens.sqlite"
+
+    token_cache = TokenCache(path)
+    details = token_cache.get_token_info_many(web3, addresses)
+    assert details[tokens[0].address].symbol == "TOK0"
+    assert token_cache.get_token_info(web3, tokens[1].address.lower()).symbol == "TOK1"
+    assert token_cache.fetched == 5
+
+    token_cache = TokenCache(path, lru_size=2)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        symbols = list(executor.map(lambda a: token_cache.get_token_info(web3, a).symbol, addresses))
+    assert symbols == ["TOK0", "TOK1", "TOK2", "TOK3", ""]
+    assert token_cache.fetched == 0
+
+    token = token_cache.get_token_info(web3, tokens[3].address)
+    assert token.address == tokens[3].address
+    assert token.total_supply == 2**200
+    assert token.decimals == 6
+    assert token_cache.get_token_info(web3, malformed_token.address).total_supply is None
+
+    # Worker processes get a copy that opens its own connection
+    copied = pickle.loads(pickle.dumps(token_cache))
+    assert copied.get_token_info(web3, tokens[2].address).name == "Token 2"
+    assert copied.fetched == 0
+
+    # Tokens are keyed by the chain
+    other_chain = TokenCache(path, chain_id=1)
+    other_chain.get_token_info(web3, tokens[0].address)
+    assert other_chain.fetched == 1
+
+
+def create_fake_token(symbol: str, decimals: int, total_supply: int):
+    """eth_call handler of an ERC-20 token for the fake chain."""
+    return_data = {
+        Web3.keccak(text="symbol()")[0:4].hex(): encode(["string"], [symbol]),
+        Web3.keccak(text="name()")[0:4].hex(): encode(["string"], [f"{symbol} token"]),
+        Web3.keccak(text="decimals()")[0:4].hex(): encode(["uint8"], [decimals]),
+        Web3.keccak(text="totalSupply()")[0:4].hex(): encode(["uint256"], [total_supply]),
+    }
+    return lambda data: "0x" + return_data[data[0:10]].hex()
+
+
+def test_token_cache_transient_error(fake_chain, fake_json_rpc_url, tmp_path):
+    """Tokens read while the node is throttling are not cached."""
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    web3.middleware_onion.clear()
+    address = "0x" + "12" * 20
+    fake_chain.contracts[address] = create_fake_token("USDC", 6, 10**12)
+    path = tmp_path / "tokens.sqlite"
+
+    fake_chain.eth_call_failures = 1
+    token_cache = TokenCache(path)
+    with pytest.raises(ValueError):
+        token_cache.get_token_info(web3, Web3.to_checksum_address(address))
+
+    # Not in the database either
+    token_cache = TokenCache(path)
+    token = token_cache.get_token_info(web3, Web3.to_checksum_address(address))
+    assert token.symbol == "USDC"
+    assert token.decimals == 6
+    assert token_cache.fetched == 1
+    assert fake_chain.calls["eth_call"] == 4 + 4
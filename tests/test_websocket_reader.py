@@ -0,0 +1,90 @@
+"""Websocket log subscription reader against a local websocket stand-in server."""
+import asyncio
+
+import pytest
+from web3 import Web3
+
+from eth_defi.abi import get_contract
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.websocket import WebSocketLogReader
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def sync_event():
+    Pair = get_contract(Web3(), "UniswapV2Pair.json")
+    return Pair.events.Sync
+
+
+def add_sync(fake_chain, sync_event, block_number: int) -> dict:
+    signature = sync_event.build_filter().topics[0]
+    return fake_chain.add_log(block_number, PAIR_ADDRESS, [signature], "0x" + "00" * 64)
+
+
+async def take(logs: asyncio.Queue, count: int) -> list:
+    return [await asyncio.wait_for(logs.get(), timeout=5) for i in range(count)]
+
+
+async def test_websocket_reader(fake_chain, fake_websocket_server, sync_event):
+    """Backfill, live logs, reconnect with gap backfill and removed logs."""
+    add_sync(fake_chain, sync_event, 990)
+    add_sync(fake_chain, sync_event, 995)
+
+    reader = WebSocketLogReader(
+        fake_websocket_server.url,
+        Filter.create_filter(PAIR_ADDRESS, [sync_event]),
+        start_block=990,
+        reconnect_delay=0.01,
+    )
+
+    logs = asyncio.Queue()
+
+    async def consume():
+        async for log in reader:
+            logs.put_nowait(log)
+
+    consumer = asyncio.ensure_future(consume())
+    try:
+        # Backfill from the start block
+        backfilled = await take(logs, 2)
+        assert [int(log["blockNumber"], 16) for log in backfilled] == [990, 995]
+        assert backfilled[0]["timestamp"] == fake_chain.get_timestamp(990)
+        assert backfilled[0]["event"].event_name == "Sync"
+        assert not backfilled[0]["removed"]
+
+        # Pushed live
+        fake_chain.mine(1)
+        add_sync(fake_chain, sync_event, 1000)
+        await fake_websocket_server.publish_block(1000)
+        (live,) = await take(logs, 1)
+        assert int(live["blockNumber"], 16) == 1000
+        assert live["timestamp"] == fake_chain.get_timestamp(1000)
+
+        # Blocks mined while disconnected are read with eth_getLogs
+        await fake_websocket_server.drop_connections()
+        fake_chain.mine(2)
+        add_sync(fake_chain, sync_event, 1000)
+        add_sync(fake_chain, sync_event, 1002)
+        missed = await take(logs, 2)
+        assert [(int(log["blockNumber"], 16), log["logIndex"]) for log in missed] == [(1000, "0x1"), (1002, "0x0")]
+        assert reader.connections == 2
+
+        # The node pushing the head block again after the reconnect is not a duplicate
+        await fake_websocket_server.publish_block(1002)
+        fake_chain.mine(1)
+        add_sync(fake_chain, sync_event, 1003)
+        await fake_websocket_server.publish_block(1003)
+        (live,) = await take(logs, 1)
+        assert int(live["blockNumber"], 16) == 1003
+
+        # Logs retracted by a reorganisation
+        removed = dict(fake_chain.get_logs({"fromBlock": hex(1003), "toBlock": hex(1003)})[0], removed=True)
+        await fake_websocket_server.publish([removed])
+        (retracted,) = await take(logs, 1)
+        assert retracted["removed"]
+        assert retracted["transactionHash"] == live["transactionHash"]
+        assert logs.empty()
+    finally:
+        consumer.cancel()
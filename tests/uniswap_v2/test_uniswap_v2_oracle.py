@@ -0,0 +1,208 @@
+"""Uniswap v2 price oracle with trade volume against an in-memory JSON-RPC chain."""
+import datetime
+from decimal import Decimal
+
+import pytest
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+
+from eth_defi.abi import get_contract, get_deployed_contract
+from eth_defi.event_reader.filter import Filter
+from eth_defi.event_reader.reader import read_events
+from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.event_reader.web3worker import create_thread_pool_executor
+from eth_defi.price_oracle.incremental import MeanPrice, VolumeWeightedAveragePrice
+from eth_defi.price_oracle.manager import OracleManager
+from eth_defi.price_oracle.oracle import PriceOracle
+from eth_defi.token import TokenDetails
+from eth_defi.uniswap_v2.oracle import UniswapV2PriceOracleContext, convert_sync_and_swap_log_results_to_price_entries, update_price_oracle_with_sync_events
+from eth_defi.uniswap_v2.pair import PairDetails
+
+
+PAIR_ADDRESS = "0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16"
+
+
+@pytest.fixture()
+def web3(fake_json_rpc_url) -> Web3:
+    web3 = Web3(HTTPProvider(fake_json_rpc_url))
+    web3.middleware_onion.clear()
+    return web3
+
+
+@pytest.fixture()
+def pair(web3) -> PairDetails:
+    """Pair of 18 decimals base token and 6 decimals quote token."""
+    return create_pair(web3, PAIR_ADDRESS)
+
+
+@pytest.fixture()
+def executor(fake_json_rpc_url):
+    web3_factory = TunedWeb3Factory(fake_json_rpc_url, HTTPAdapter())
+    executor = create_thread_pool_executor(web3_factory, None, max_workers=4)
+    yield executor
+    executor.join()
+
+
+def create_pair(web3: Web3, address: str) -> PairDetails:
+    base = TokenDetails(get_deployed_contract(web3, "ERC20MockDecimals.json", "0x0000000000000000000000000000000000000001"), "Base", "BASE", None, 18)
+    quote = TokenDetails(get_deployed_contract(web3, "ERC20MockDecimals.json", "0x0000000000000000000000000000000000000002"), "Quote", "QUOTE", None, 6)
+    return PairDetails(address, base, quote)
+
+
+def encode_uints(*values: int) -> str:
+    return "0x" + "".join(f"{v:064x}" for v in values)
+
+
+def test_uniswap_v2_oracle_volume(fake_chain, web3: Web3, pair: PairDetails):
+    """Sync and Swap events are joined to price entries with the quote token volume."""
+
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    sync_signature = Pair.events.Sync.build_filter().topics[0]
+    swap_signature = Pair.events.Swap.build_filter().topics[0]
+    address_topic = "0x" + "00" * 32
+
+    def add_sync(block_number: int, base_reserve: int, quote_reserve: int) -> dict:
+        return fake_chain.add_log(block_number, PAIR_ADDRESS, [sync_signature], encode_uints(base_reserve * 10**18, quote_reserve * 10**6))
+
+    def add_swap(sync: dict, base_in: int, quote_in: int, base_out: int, quote_out: int):
+        log = fake_chain.add_log(int(sync["blockNumber"], 16), PAIR_ADDRESS, [swap_signature, address_topic, address_topic], encode_uints(base_in * 10**18, quote_in * 10**6, base_out * 10**18, quote_out * 10**6))
+        log["transactionHash"] = sync["transactionHash"]
+
+    # Buy for 1000 quote at price 1000
+    add_swap(add_sync(10, 10, 10_000), 0, 1000, 1, 0)
+
+    # Liquidity added, no trade
+    add_sync(20, 20, 20_000)
+
+    # Two trades in the same block: sell for 500 quote at price 1500, buy for 1500 at price 2000
+    add_swap(add_sync(30, 10, 15_000), 1, 0, 0, 500)
+    add_swap(add_sync(30, 10, 20_000), 0, 1500, 1, 0)
+
+    # Liquidity removed at the end of the scanned range
+    add_sync(99, 5, 10_000)
+
+    log_results = read_events(
+        web3,
+        0,
+        99,
+        [Pair.events.Sync, Pair.events.Swap],
+        notify=None,
+        chunk_size=50,
+        filter=Filter.create_filter(PAIR_ADDRESS, [Pair.events.Sync, Pair.events.Swap]),
+        context=UniswapV2PriceOracleContext(pair, reverse_token_order=False),
+    )
+
+    oracle = PriceOracle(
+        VolumeWeightedAveragePrice(),
+        max_age=PriceOracle.ANY_AGE,
+        min_duration=datetime.timedelta(0),
+        min_entries=1,
+    )
+
+    for entry in convert_sync_and_swap_log_results_to_price_entries(log_results):
+        oracle.add_price_entry(entry)
+
+    # Both events were read in the same pass
+    assert fake_chain.calls["eth_getLogs"] == 2
+
+    entries = list(oracle.buffer)
+    assert [(e.block_number, e.price, e.volume) for e in entries] == [
+        (10, Decimal(1000), Decimal(1000)),
+        (20, Decimal(1000), Decimal(0)),
+        (30, Decimal(1500), Decimal(500)),
+        (30, Decimal(2000), Decimal(1500)),
+        (99, Decimal(2000), Decimal(0)),
+    ]
+    assert [e.log_index for e in entries] == [0, 0, 0, 2, 0]
+
+    # (1000 * 1000 + 1500 * 500 + 2000 * 1500) / 3000
+    assert oracle.calculate_price() == pytest.approx(Decimal(1583.333333333))
+
+
+def test_oracle_manager(fake_chain, web3: Web3):
+    """Many pair oracles are updated from one log scan."""
+
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    sync_signature = Pair.events.Sync.build_filter().topics[0]
+    addresses = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(100, 150)]
+    untracked_address = Web3.to_checksum_address(f"0x{999:040x}")
+
+    # Pair i trades at price i every 10 blocks
+    for block_number in range(0, 1000, 10):
+        for i, address in enumerate(addresses + [untracked_address]):
+            fake_chain.add_log(block_number, address, [sync_signature], encode_uints(10**18, (i + 1) * 10**6))
+
+    manager = OracleManager([Pair.events.Sync, Pair.events.Swap], convert_sync_and_swap_log_results_to_price_entries, chunk_size=500)
+    for address in addresses:
+        oracle = PriceOracle(MeanPrice(), max_age=PriceOracle.ANY_AGE, min_duration=datetime.timedelta(0), target_time_window=datetime.timedelta(minutes=10))
+        manager.add_oracle(address, oracle, UniswapV2PriceOracleContext(create_pair(web3, address), reverse_token_order=False))
+
+    stats = manager.update(web3, 0, 899)
+    assert stats["created"] == 50 * 90
+
+    # One eth_getLogs for each chunk for all pairs
+    assert fake_chain.calls["eth_getLogs"] == 2
+
+    for i, address in enumerate(addresses):
+        oracle = manager.get_oracle(address)
+        assert len(oracle.buffer) == 90
+        assert oracle.calculate_price() == Decimal(i + 1)
+
+    # Live update overlaps with the already read blocks
+    fake_chain.calls.clear()
+    stats = manager.update_live(web3, lookback_block_count=199)
+    assert stats["created"] == 50 * 20
+    assert stats["reorgs"] == 0
+    assert fake_chain.calls["eth_getLogs"] == 1
+
+    # All oracles are refreshed to the chain tip and old entries discarded
+    tip_timestamp = datetime.datetime.utcfromtimestamp(fake_chain.get_timestamp(fake_chain.head))
+    for address in addresses:
+        oracle = manager.get_oracle(address)
+        assert oracle.last_refreshed_block_number == fake_chain.head
+        assert oracle.last_refreshed_at == tip_timestamp
+        assert oracle.get_oldest().timestamp >= tip_timestamp - datetime.timedelta(minutes=10)
+    assert len(manager.get_oracle(addresses[0]).buffer) == 5
+    assert stats["discarded"] == 50 * 95
+
+    manager.remove_oracle(addresses[0])
+    assert addresses[0].lower() not in manager.create_filter().contract_address
+
+
+def test_update_price_oracle_with_sync_events_concurrent(fake_chain, web3: Web3, executor):
+    """Concurrent backfill feeds the oracles in the block order, sharing the executor."""
+
+    Pair = get_contract(web3, "UniswapV2Pair.json")
+    sync_signature = Pair.events.Sync.build_filter().topics[0]
+    swap_signature = Pair.events.Swap.build_filter().topics[0]
+    other_address = Web3.to_checksum_address(f"0x{999:040x}")
+
+    # Price goes up by one every block, with a trade of one base token
+    for block_number in range(1000):
+        for address in (PAIR_ADDRESS, other_address):
+            price = 1000 + block_number
+            sync = fake_chain.add_log(block_number, address, [sync_signature], encode_uints(1000 * 10**18, price * 1000 * 10**6))
+            swap = fake_chain.add_log(block_number, address, [swap_signature, "0x" + "00" * 32, "0x" + "00" * 32], encode_uints(0, price * 10**6, 10**18, 0))
+            swap["transactionHash"] = sync["transactionHash"]
+
+    for address in (PAIR_ADDRESS, other_address):
+        oracle = PriceOracle(VolumeWeightedAveragePrice(), max_age=PriceOracle.ANY_AGE, min_duration=datetime.timedelta(0))
+
+        update_price_oracle_with_sync_events(
+            oracle,
+            executor,
+            web3,
+            address,
+            0,
+            999,
+            chunk_size=7,
+            pair_details=create_pair(web3, address),
+        )
+
+        entries = list(oracle.buffer)
+        assert [e.block_number for e in entries] == list(range(1000))
+        assert [e.price for e in entries] == [Decimal(1000 + i) for i in range(1000)]
+        assert all(e.volume == e.price for e in entries)
+        assert all(e.pool_contract_address == address.lower() for e in entries)
+
+    assert fake_chain.calls["eth_getLogs"] == 2 * 143
@@ -12,6 +12,7 @@ from eth_defi.uniswap_v2.deployment import (
     deploy_uniswap_v2_like,
 )
 from eth_defi.uniswap_v2.liquidity import get_liquidity
+from eth_defi.uniswap_v2.pair import fetch_pair_details_many
 
 
 @pytest.fixture
@@ -211,3 +212,25 @@ def test_get_liquidity(
 
     assert liquidity_result.get_liquidity_for_token(weth.address) == 10 * 10**18
     assert liquidity_result.block_number > 0
+
+
+def test_fetch_pair_details_many(
+    web3: Web3,
+    deployer: str,
+    uniswap_v2: UniswapV2Deployment,
+    weth: Contract,
+    usdc: Contract,
+):
+    """Read details of many pairs at once."""
+
+    dai = create_token(web3, deployer, "Dai Stablecoin", "DAI", 100_000_000 * 10**18)
+    pair_addresses = []
+    for token in (usdc, dai):
+        token_a, token_b = sorted([weth, token], key=lambda t: int(t.address, 16))
+        pair_addresses.append(deploy_trading_pair(web3, deployer, uniswap_v2, token_a, token_b, 0, 0))
+
+    pairs = fetch_pair_details_many(web3, pair_addresses)
+    assert list(pairs.keys()) == pair_addresses
+    assert {pairs[pair_addresses[0]].token0.symbol, pairs[pair_addresses[0]].token1.symbol} == {"WETH", "USDC"}
+    assert {pairs[pair_addresses[1]].token0.symbol, pairs[pair_addresses[1]].token1.symbol} == {"WETH", "DAI"}
+    assert pairs[pair_addresses[1]].address == pair_addresses[1]
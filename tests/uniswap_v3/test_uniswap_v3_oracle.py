@@ -16,13 +16,18 @@ import pytest
 from web3 import HTTPProvider, Web3
 from web3.middleware import geth_poa_middleware
 
+from eth_defi.abi import get_deployed_contract
 from eth_defi.event_reader.web3factory import TunedWeb3Factory
+from eth_defi.price_oracle.incremental import VolumeWeightedAveragePrice
 from eth_defi.price_oracle.oracle import PriceOracle, time_weighted_average_price
+from eth_defi.token import TokenDetails
 from eth_defi.uniswap_v3.oracle import (
+    UniswapV3PriceOracleContext,
+    convert_swap_events_to_price_entries,
     update_price_oracle_concurrent,
     update_price_oracle_single_thread,
 )
-from eth_defi.uniswap_v3.pool import fetch_pool_details
+from eth_defi.uniswap_v3.pool import PoolDetails, fetch_pool_details
 
 
 @pytest.fixture
@@ -84,13 +89,13 @@ def test_eth_usdc_price_single_thread(web3, usdc_eth_address):
     assert oldest.block_number == 14_000_000
     assert oldest.timestamp == datetime.datetime(2022, 1, 13, 22, 59, 55)
     assert oldest.price == pytest.approx(Decimal("3250.2861765942502643156"))
-    assert oldest.volume == pytest.approx(3.075302542833839)
+    assert oldest.volume == pytest.approx(Decimal("3.075302542833839"))
 
     newest = oracle.get_newest()
     assert newest.block_number == 14_000_097
     assert newest.timestamp == datetime.datetime(2022, 1, 13, 23, 24, 40)
     assert newest.price == pytest.approx(Decimal("3259.0733672883275175991"))
-    assert newest.volume == pytest.approx(1.5725140754556917)
+    assert newest.volume == pytest.approx(Decimal("1.5725140754556917"))
 
     # We have 78 swaps for the duration
     assert len(oracle.buffer) == 78
@@ -134,13 +139,13 @@ def test_eth_usdc_price_concurrent(web3, usdc_eth_address):
     assert oldest.block_number == 14_000_000
     assert oldest.timestamp == datetime.datetime(2022, 1, 13, 22, 59, 55)
     assert oldest.price == pytest.approx(Decimal("3250.2861765942502643156"))
-    assert oldest.volume == pytest.approx(3.075302542833839)
+    assert oldest.volume == pytest.approx(Decimal("3.075302542833839"))
 
     newest = oracle.get_newest()
     assert newest.block_number == 14_000_097
     assert newest.timestamp == datetime.datetime(2022, 1, 13, 23, 24, 40)
     assert newest.price == pytest.approx(Decimal("3259.0733672883275175991"))
-    assert newest.volume == pytest.approx(1.5725140754556917)
+    assert newest.volume == pytest.approx(Decimal("1.5725140754556917"))
 
     # # We have 78 swaps for the duration
     assert len(oracle.buffer) == 78
@@ -148,3 +153,45 @@ def test_eth_usdc_price_concurrent(web3, usdc_eth_address):
 
     # TWAP
     assert oracle.calculate_price() == pytest.approx(Decimal("3253.806086408162965922"))
+
+
+def test_uniswap_v3_vwap():
+    """Swap volumes are decimals and can be used to weight the price."""
+    web3 = Web3()
+    usdc = TokenDetails(get_deployed_contract(web3, "ERC20MockDecimals.json", "0x0000000000000000000000000000000000000001"), "USD Coin", "USDC", None, 6)
+    weth = TokenDetails(get_deployed_contract(web3, "ERC20MockDecimals.json", "0x0000000000000000000000000000000000000002"), "Wrapped Ether", "WETH", None, 18)
+    pool = PoolDetails("0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640", usdc, weth, 500, 0.0005)
+    context = UniswapV3PriceOracleContext(pool, reverse_token_order=True)
+
+    def create_swap_log(block_number: int, amount0: int, amount1: int, tick: int) -> dict:
+        data = "0x" + "".join(f"{v % 2**256:064x}" for v in (amount0, amount1, 0, 0, tick))
+        return {
+            "context": context,
+            "address": pool.address.lower(),
+            "data": data,
+            "blockNumber": hex(block_number),
+            "blockHash": "0x" + f"{block_number:064x}",
+            "transactionHash": "0x" + f"{block_number:064x}",
+            "logIndex": hex(0),
+            "timestamp": 1_600_000_000 + block_number * 12,
+        }
+
+    # Buy 2 WETH, sell 0.5 WETH
+    logs = [
+        create_swap_log(1, 6000 * 10**6, -2 * 10**18, 200_000),
+        create_swap_log(2, -1500 * 10**6, 10**18 // 2, 201_000),
+    ]
+
+    oracle = PriceOracle(
+        VolumeWeightedAveragePrice(),
+        max_age=PriceOracle.ANY_AGE,
+        min_duration=datetime.timedelta(0),
+        min_entries=1,
+    )
+    for entry in convert_swap_events_to_price_entries(logs):
+        oracle.add_price_entry(entry)
+
+    oldest, newest = oracle.get_oldest(), oracle.get_newest()
+    assert oldest.volume == Decimal(2)
+    assert newest.volume == Decimal("0.5")
+    assert oracle.calculate_price() == pytest.approx((oldest.price * 2 + newest.price * Decimal("0.5")) / Decimal("2.5"))